@@ -7,7 +7,7 @@ from skimage.registration import phase_cross_correlation
 from scipy import ndimage as ndi
 import logging
 import dask
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_file_pair_blocks
 
 
 def offset_to_speed(x, y, time_lag, dx, dy):
@@ -184,6 +184,37 @@ def movement_of_storm_fft_l(
     return y1, x1
 
 
+def movement_of_storm_fft_block(
+    filenames, dx, dy, DBZ_THRESHOLD, TIME_RES_SECOND, MAX_MOVEMENT_MPS, config,
+):
+    """
+    Calculate advection for a block of consecutive file pairs.
+
+    Each file is read once, the previous field is kept in memory to pair with the next file.
+    File pairs are (filenames[i], filenames[i + 1]), returns a list of (y_lag, x_lag) for each pair.
+    """
+    ref_varname = config["ref_varname"]
+    results = []
+    dset_prev = None
+    for filename in filenames:
+        with xr.open_dataset(filename) as ds:
+            dset = ds[[ref_varname]].load()
+        if dset_prev is not None:
+            y1, x1 = movement_of_storm_fft(
+                dset_prev,
+                dset,
+                dx=dx,
+                dy=dy,
+                config=config,
+                threshold=DBZ_THRESHOLD,
+                TIME_RES_SECOND=TIME_RES_SECOND,
+                MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
+            )
+            results.append((y1, x1))
+        dset_prev = dset
+    return results
+
+
 def calc_mean_advection(config):
     """
     Calculate domain mean advection.
@@ -231,13 +262,20 @@ def calc_mean_advection(config):
     # Convert data time resolution from [hour] to [second]
     TIME_RES_SECOND = datatimeresolution * 3600
 
+    # Split consecutive file pairs into contiguous blocks, each block reads its files once
+    if run_parallel == 0:
+        nblocks = 1
+    else:
+        nblocks = config.get("advection_nblocks", config.get("nprocesses", 1))
+    blocks = get_file_pair_blocks(len(filelist), 1, nblocks)
+
     # Run advection calculation
     if run_parallel == 0:
         # Serial version
-        final_results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = movement_of_storm_fft_l(
-                ii,
+        block_results = []
+        for istart, iend in blocks:
+            x_y = movement_of_storm_fft_block(
+                filelist[istart:iend + 1],
                 dx=dx,
                 dy=dy,
                 config=config,
@@ -245,14 +283,14 @@ def calc_mean_advection(config):
                 TIME_RES_SECOND=TIME_RES_SECOND,
                 MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
             )
-            final_results.append(x_y)
+            block_results.append(x_y)
 
     elif run_parallel >= 1:
         # Parallel version
         results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = dask.delayed(movement_of_storm_fft_l)(
-                ii,
+        for istart, iend in blocks:
+            x_y = dask.delayed(movement_of_storm_fft_block)(
+                filelist[istart:iend + 1],
                 dx=dx,
                 dy=dy,
                 config=config,
@@ -261,11 +299,13 @@ def calc_mean_advection(config):
                 MAX_MOVEMENT_MPS=MAX_MOVEMENT_MPS,
             )
             results.append(x_y)
-        final_results = dask.compute(*results)
-        dask.distributed.wait(final_results)
+        block_results = dask.compute(*results)
+        dask.distributed.wait(block_results)
 
     else:
         sys.exit('Valid parallelization flag not provided')
+    # Combine file pair results from all blocks
+    final_results = [x_y for block_result in block_results for x_y in block_result]
 
     # Zip the (x, y) and convert them into numpy array
     x_and_y = np.array(tuple(zip(*final_results)))
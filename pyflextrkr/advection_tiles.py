@@ -5,9 +5,10 @@ from netCDF4 import Dataset
 from scipy.signal import medfilt
 from skimage.registration import phase_cross_correlation
 from scipy import ndimage as ndi
+from scipy import fft as sp_fft
 import logging
 import dask
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_file_pair_blocks, get_netcdf_encoding
 
 
 def offset_to_speed(x, y, time_lag, dx, dy):
@@ -98,15 +99,10 @@ def movement_of_storm_fft(
 
     ref_varname = config['ref_varname']
     field_threshold = config['advection_field_threshold']
-    datatimeresolution = config["datatimeresolution"]
     advection_mask_method = config.get('advection_mask_method', 'greater')
     buffer = config.get('advection_buffer', 30)
     size_threshold = config.get('advection_size_threshold', 10)
     tiles = config.get('advection_tiles', [1,1])
-    advection_max_movement_mps = config.get('advection_max_movement_mps', 60)
-
-    # Convert data time resolution from [hour] to [second]
-    TIME_RES_SECOND = datatimeresolution * 3600
 
     field_1 = np.squeeze(dset_1[ref_varname].values)
     field_2 = np.squeeze(dset_2[ref_varname].values)
@@ -189,6 +185,41 @@ def movement_of_storm_fft(
             y_lag[row, col] = y
             x_lag[row, col] = x
 
+    # Remove movement values larger than max speed allowed
+    y_lag, x_lag = remove_fast_advection(y_lag, x_lag, dx, dy, config)
+
+    return y_lag, x_lag
+    # return y_lag[0, 0], x_lag[0, 0]
+
+
+def remove_fast_advection(y_lag, x_lag, dx, dy, config):
+    """
+    Replace advection faster than the max speed allowed and missing advection with 0.
+
+    Args:
+        y_lag: np.array
+            Advection in y-direction [number of grids]
+        x_lag: np.array
+            Advection in x-direction [number of grids]
+        dx: float
+            Grid spacing in x-direction [km]
+        dy: float
+            Grid spacing in y-direction [km]
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        y_lag: np.array
+            Advection in y-direction [number of grids]
+        x_lag: np.array
+            Advection in x-direction [number of grids]
+    """
+    datatimeresolution = config["datatimeresolution"]
+    advection_max_movement_mps = config.get('advection_max_movement_mps', 60)
+
+    # Convert data time resolution from [hour] to [second]
+    TIME_RES_SECOND = datatimeresolution * 3600
+
     # Calculate movement speed
     mag_movement, mag_dir, mag_movement_mps = offset_to_speed(
         x_lag, y_lag, TIME_RES_SECOND, dx, dy,
@@ -199,9 +230,230 @@ def movement_of_storm_fft(
     # Replace NaN values with 0
     x_lag[np.isnan(x_lag)] = np.nanmedian(0)
     y_lag[np.isnan(y_lag)] = np.nanmedian(0)
+    return y_lag, x_lag
+
+
+def movement_of_storm_fft_tiles(
+        dset_1,
+        dset_2,
+        dx,
+        dy,
+        config,
+):
+    """
+    Calculate Movement of labeled storm for all tiles at once.
+
+    Vectorized version of movement_of_storm_fft. Both fields are cut into
+    (tiles_y, tiles_x, ty, tx) tile views, and the masked cross-correlation
+    of all tiles is calculated with one batched FFT. Since the masks are limited
+    to the inside of each tile, the result is the same as movement_of_storm_fft
+    up to floating point round-off.
+
+    Args:
+        dset_1: Xarray DataSet
+            Dataset at current time (t=0)
+        dset_2: Xarray DataSet
+            Dataset at next time (t=1)
+        dx: float
+            Grid spacing in x-direction [km]
+        dy: float
+            Grid spacing in y-direction [km]
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        y_lag: np.array
+            Advection in y-direction [number of grids]
+        x_lag: np.array
+            Advection in x-direction [number of grids]
+    """
+    logger = logging.getLogger(__name__)
+
+    ref_varname = config['ref_varname']
+    field_threshold = config['advection_field_threshold']
+    advection_mask_method = config.get('advection_mask_method', 'greater')
+    buffer = config.get('advection_buffer', 30)
+    size_threshold = config.get('advection_size_threshold', 10)
+    tiles = config.get('advection_tiles', [1,1])
+    fft_workers = config.get('advection_fft_workers', 1)
+
+    field_1 = np.squeeze(dset_1[ref_varname].values)
+    field_2 = np.squeeze(dset_2[ref_varname].values)
+
+    # Mask data by thresholds
+    if advection_mask_method == 'greater':
+        mask_1 = field_1 > field_threshold
+        mask_2 = field_2 > field_threshold
+    elif advection_mask_method == 'smaller':
+        mask_1 = field_1 < field_threshold
+        mask_2 = field_2 < field_threshold
+    else:
+        logger.error(f'Error: Undefined advection_mask_method: {advection_mask_method}')
+        logger.error("Tracking will now exit.")
+        sys.exit()
+
+    tiles_y, tiles_x = tiles[0], tiles[1]
+    dimensions = field_1.shape
+    row_skip = int(dimensions[0] / tiles_y)
+    col_skip = int(dimensions[1] / tiles_x)
+
+    # Buffer the edge of each tile
+    tile_mask = np.zeros((row_skip, col_skip), dtype=bool)
+    tile_mask[buffer:row_skip - buffer, buffer:col_skip - buffer] = True
+    num_points = np.count_nonzero(tile_mask)
+
+    # Cut fields into tiles: [tiles_y, tiles_x, row_skip, col_skip]
+    tiles_field_1 = get_tile_view(field_1, tiles_y, tiles_x)
+    tiles_field_2 = get_tile_view(field_2, tiles_y, tiles_x)
+    tiles_mask_1 = get_tile_view(mask_1, tiles_y, tiles_x) & tile_mask
+    tiles_mask_2 = get_tile_view(mask_2, tiles_y, tiles_x) & tile_mask
+
+    # Masked cross-correlation of all tiles (same order as phase_cross_correlation)
+    xcorr = cross_correlate_masked_tiles(
+        tiles_field_2, tiles_field_1, tiles_mask_2, tiles_mask_1,
+        overlap_ratio=0.7, workers=fft_workers,
+    )
+
+    # Average location of the maximum correlation in each tile
+    xcorr_max = xcorr == np.max(xcorr, axis=(-2, -1), keepdims=True)
+    nmax = np.count_nonzero(xcorr_max, axis=(-2, -1))
+    ycenter = np.sum(xcorr_max * np.arange(xcorr.shape[-2])[:, None], axis=(-2, -1)) / nmax
+    xcenter = np.sum(xcorr_max * np.arange(xcorr.shape[-1])[None, :], axis=(-2, -1)) / nmax
+    # Movement is the shift of the correlation peak from the tile size
+    y_lag = (ycenter - row_skip + 1).astype(np.float32)
+    x_lag = (xcenter - col_skip + 1).astype(np.float32)
+
+    if num_points < size_threshold:
+        x_lag[:] = np.nan
+        y_lag[:] = np.nan
+
+    # Remove movement values larger than max speed allowed
+    y_lag, x_lag = remove_fast_advection(y_lag, x_lag, dx, dy, config)
 
     return y_lag, x_lag
-    # return y_lag[0, 0], x_lag[0, 0]
+
+
+def get_tile_view(data, tiles_y, tiles_x):
+    """
+    Get a view of a 2D array cut into tiles.
+
+    Args:
+        data: np.array
+            2D data array (dimensions: [y, x]).
+        tiles_y: int
+            Number of tiles in y-direction.
+        tiles_x: int
+            Number of tiles in x-direction.
+
+    Returns:
+        tiles_data: np.array
+            Tile view of the data (dimensions: [tiles_y, tiles_x, ty, tx]).
+            Remaining rows/columns that do not fill a tile are excluded.
+    """
+    ty = int(data.shape[0] / tiles_y)
+    tx = int(data.shape[1] / tiles_x)
+    strides = (data.strides[0] * ty, data.strides[1] * tx, data.strides[0], data.strides[1])
+    tiles_data = np.lib.stride_tricks.as_strided(
+        data, shape=(tiles_y, tiles_x, ty, tx), strides=strides, writeable=False,
+    )
+    return tiles_data
+
+
+def cross_correlate_masked_tiles(
+        arr1,
+        arr2,
+        m1,
+        m2,
+        overlap_ratio=0.3,
+        workers=1,
+):
+    """
+    Masked normalized cross-correlation of tiles, batched over the leading dimensions.
+
+    Same as skimage.registration cross_correlate_masked with mode='full' on the last two axes,
+    using real FFTs of all tiles at once.
+
+    Args:
+        arr1: np.array
+            Fixed tiles (dimensions: [..., ty, tx]).
+        arr2: np.array
+            Moving tiles (dimensions: [..., ty, tx]).
+        m1: np.array
+            Mask of valid values in arr1.
+        m2: np.array
+            Mask of valid values in arr2.
+        overlap_ratio: float, default=0.3
+            Min overlap of the masks relative to the max overlap.
+        workers: int, default=1
+            Number of threads for FFT.
+
+    Returns:
+        out: np.array
+            Masked normalized cross-correlation (dimensions: [..., 2*ty-1, 2*tx-1]).
+    """
+    axes = (-2, -1)
+    float_dtype = np.float32 if arr1.dtype == np.float32 else np.float64
+    eps = np.finfo(float_dtype).eps
+
+    # Set values outside of the masks to 0
+    fixed_mask = np.asarray(m1, dtype=bool)
+    moving_mask = np.asarray(m2, dtype=bool)
+    fixed_image = np.where(fixed_mask, arr1, 0).astype(float_dtype)
+    moving_image = np.where(moving_mask, arr2, 0).astype(float_dtype)
+
+    final_shape = tuple(fixed_image.shape[ax] + moving_image.shape[ax] - 1 for ax in axes)
+    fast_shape = tuple(sp_fft.next_fast_len(nn, real=True) for nn in final_shape)
+
+    def fft(x):
+        return sp_fft.rfftn(x, s=fast_shape, axes=axes, workers=workers)
+
+    def ifft(x):
+        return sp_fft.irfftn(x, s=fast_shape, axes=axes, workers=workers)
+
+    # Rotate the moving image by 180 degree
+    rotated_moving_image = moving_image[..., ::-1, ::-1]
+    rotated_moving_mask = moving_mask[..., ::-1, ::-1]
+
+    fixed_fft = fft(fixed_image)
+    rotated_moving_fft = fft(rotated_moving_image)
+    fixed_mask_fft = fft(fixed_mask.astype(float_dtype))
+    rotated_moving_mask_fft = fft(rotated_moving_mask.astype(float_dtype))
+
+    # Calculate overlap of masks at every point in the convolution
+    number_overlap_masked_px = np.fmax(np.round(ifft(rotated_moving_mask_fft * fixed_mask_fft)), eps)
+    masked_correlated_fixed_fft = ifft(rotated_moving_mask_fft * fixed_fft)
+    masked_correlated_rotated_moving_fft = ifft(fixed_mask_fft * rotated_moving_fft)
+
+    numerator = ifft(rotated_moving_fft * fixed_fft)
+    numerator -= masked_correlated_fixed_fft * masked_correlated_rotated_moving_fft / number_overlap_masked_px
+
+    fixed_denom = ifft(rotated_moving_mask_fft * fft(np.square(fixed_image)))
+    fixed_denom -= np.square(masked_correlated_fixed_fft) / number_overlap_masked_px
+    fixed_denom = np.fmax(fixed_denom, 0.0)
+
+    moving_denom = ifft(fixed_mask_fft * fft(np.square(rotated_moving_image)))
+    moving_denom -= np.square(masked_correlated_rotated_moving_fft) / number_overlap_masked_px
+    moving_denom = np.fmax(moving_denom, 0.0)
+
+    denom = np.sqrt(fixed_denom * moving_denom)
+
+    # Slice back to the convolution shape
+    final_slice = (Ellipsis, slice(0, final_shape[0]), slice(0, final_shape[1]))
+    numerator = numerator[final_slice]
+    denom = denom[final_slice]
+    number_overlap_masked_px = number_overlap_masked_px[final_slice]
+
+    # Zero-out pixels where denom is very small
+    tol = 1e3 * eps * np.max(np.abs(denom), axis=axes, keepdims=True)
+    nonzero_indices = denom > tol
+    out = np.zeros_like(denom, dtype=float_dtype)
+    out[nonzero_indices] = numerator[nonzero_indices] / denom[nonzero_indices]
+    np.clip(out, a_min=-1, a_max=1, out=out)
+
+    # Apply overlap ratio threshold
+    number_px_threshold = overlap_ratio * np.max(number_overlap_masked_px, axis=axes, keepdims=True)
+    out[number_overlap_masked_px < number_px_threshold] = 0.0
+    return out
 
 def movement_of_storm_fft_l(
     filenames, dx, dy, config,
@@ -220,6 +472,71 @@ def movement_of_storm_fft_l(
     return y1, x1
 
 
+def load_advection_field(filename, config):
+    """
+    Read the advection reference field from a file into memory.
+
+    Args:
+        filename: string
+            Input file name.
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        dset: Xarray DataSet
+            Dataset containing the reference field.
+    """
+    ref_varname = config['ref_varname']
+    with xr.open_dataset(filename) as ds:
+        dset = ds[[ref_varname]].load()
+    return dset
+
+
+def movement_of_storm_fft_block(
+    filenames, dx, dy, config,
+):
+    """
+    Calculate advection for a block of consecutive file pairs.
+
+    Each file is read once, the previous field is kept in memory to pair with the next file.
+
+    Args:
+        filenames: list
+            Input file names in the block, file pairs are (filenames[i], filenames[i + 1]).
+        dx: float
+            Grid spacing in x-direction [km]
+        dy: float
+            Grid spacing in y-direction [km]
+        config: dictionary
+            Dictionary containing config parameters
+
+    Returns:
+        results: list
+            List of (y_lag, x_lag) advection for each file pair.
+    """
+    # Calculate advection for all tiles at once
+    if config.get('advection_vectorized', 0) == 1:
+        movement_func = movement_of_storm_fft_tiles
+    else:
+        movement_func = movement_of_storm_fft
+
+    results = []
+    dset_prev = None
+    for filename in filenames:
+        dset = load_advection_field(filename, config)
+        if dset_prev is not None:
+            y1, x1 = movement_func(
+                dset_prev,
+                dset,
+                dx=dx,
+                dy=dy,
+                config=config,
+            )
+            results.append((y1, x1))
+        dset_prev = dset
+    return results
+
+
 def calc_mean_advection(config):
     """
     Calculate domain mean advection.
@@ -269,35 +586,44 @@ def calc_mean_advection(config):
     # Number of tiles in y, x direction
     tiles_y, tiles_x = advection_tiles[0], advection_tiles[1]
 
+    # Split consecutive file pairs into contiguous blocks, each block reads its files once
+    if run_parallel == 0:
+        nblocks = 1
+    else:
+        nblocks = config.get("advection_nblocks", config.get("nprocesses", 1))
+    blocks = get_file_pair_blocks(len(filelist), 1, nblocks)
+
     # Run advection calculation
     if run_parallel == 0:
         # Serial version
-        final_results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = movement_of_storm_fft_l(
-                ii,
+        block_results = []
+        for istart, iend in blocks:
+            x_y = movement_of_storm_fft_block(
+                filelist[istart:iend + 1],
                 dx=dx,
                 dy=dy,
                 config=config,
             )
-            final_results.append(x_y)
+            block_results.append(x_y)
 
     elif run_parallel >= 1:
         # Parallel version
         results = []
-        for ii in zip(filelist[:-1], filelist[1:]):
-            x_y = dask.delayed(movement_of_storm_fft_l)(
-                ii,
+        for istart, iend in blocks:
+            x_y = dask.delayed(movement_of_storm_fft_block)(
+                filelist[istart:iend + 1],
                 dx=dx,
                 dy=dy,
                 config=config,
             )
             results.append(x_y)
-        final_results = dask.compute(*results)
-        dask.distributed.wait(final_results)
+        block_results = dask.compute(*results)
+        dask.distributed.wait(block_results)
 
     else:
         sys.exit('Valid parallelization flag not provided')
+    # Combine file pair results from all blocks
+    final_results = [x_y for block_result in block_results for x_y in block_result]
 
     # Zip the (x, y) and convert them into numpy array
     x_and_y = np.array(tuple(zip(*final_results)))
@@ -362,8 +688,7 @@ def calc_mean_advection(config):
     ds_out['speed'].attrs['long_name'] = 'Advection speed'
     ds_out['speed'].attrs['units'] = 'm/s'
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
     # Write to netcdf file
     ds_out.to_netcdf(
         path=output_filename, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding,
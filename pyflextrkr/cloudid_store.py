@@ -0,0 +1,387 @@
+import os
+import sys
+import shutil
+import time
+import logging
+from functools import lru_cache
+import numpy as np
+import xarray as xr
+import dask.array
+from pyflextrkr.ft_utilities import subset_files_timerange
+
+try:
+    import zarr
+    ZARR_AVAILABLE = True
+except ImportError:
+    ZARR_AVAILABLE = False
+
+
+def use_cloudid_zarr(config):
+    """
+    Check if cloudid files are stored in a single Zarr store.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        True if config cloudid_store is 'zarr', False if 'netcdf' (default).
+    """
+    logger = logging.getLogger(__name__)
+    cloudid_store = config.get("cloudid_store", "netcdf")
+    if cloudid_store == "zarr":
+        if not ZARR_AVAILABLE:
+            logger.critical("ERROR: cloudid_store: zarr requires the zarr package.")
+            logger.critical("Tracking will now exit.")
+            sys.exit()
+        return True
+    elif cloudid_store == "netcdf":
+        return False
+    else:
+        logger.critical(f"ERROR: Unknown cloudid_store: {cloudid_store}")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
+
+
+def get_cloudid_store_path(config):
+    """
+    Get the cloudid Zarr store name for the tracking period.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        store_path: string
+            Zarr store path.
+    """
+    tracking_outpath = config["tracking_outpath"]
+    cloudid_filebase = config["cloudid_filebase"]
+    startdate = config["startdate"]
+    enddate = config["enddate"]
+    store_path = f"{tracking_outpath}{cloudid_filebase}{startdate}_{enddate}.zarr"
+    return store_path
+
+
+def get_cloudid_frame_configs(config, nfiles):
+    """
+    Get the config for identifying features in each input file.
+
+    With the Zarr store, each config has the time index of the file in the store
+    (cloudid_store_index). An existing store for the same period is removed.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        nfiles: int
+            Number of input files.
+
+    Returns:
+        frame_configs: list
+            List of config dictionaries, one for each input file.
+    """
+    logger = logging.getLogger(__name__)
+    if not use_cloudid_zarr(config):
+        return [config] * nfiles
+
+    store_path = get_cloudid_store_path(config)
+    if os.path.isdir(store_path):
+        logger.info(f"Removing existing cloudid store: {store_path}")
+        shutil.rmtree(store_path)
+    frame_configs = [{**config, "cloudid_store_index": ii} for ii in range(nfiles)]
+    return frame_configs
+
+
+def write_cloudid(ds_out, cloudid_outfile, config, encoding=None, unlimited_dims=None):
+    """
+    Write a cloudid Dataset to a netCDF file or to its time index in the Zarr store.
+
+    The Zarr store is created by the first frame written, which has the time of all input files
+    in config (cloudid_store_basetime).
+
+    Args:
+        ds_out: Xarray Dataset
+            Cloudid Dataset with one time.
+        cloudid_outfile: string
+            Output cloudid netCDF file name.
+        config: dictionary
+            Dictionary containing config parameters.
+        encoding: dictionary, optional, default=None
+            NetCDF encoding for the variables.
+        unlimited_dims: string or list, optional, default=None
+            NetCDF unlimited dimensions.
+
+    Returns:
+        cloudid_outfile: string
+            Output cloudid netCDF file name.
+    """
+    if not use_cloudid_zarr(config):
+        ds_out.to_netcdf(
+            path=cloudid_outfile, mode="w", format="NETCDF4",
+            unlimited_dims=unlimited_dims, encoding=encoding,
+        )
+        return cloudid_outfile
+
+    store_path = get_cloudid_store_path(config)
+    time_index = config["cloudid_store_index"]
+    ds_frame = get_cloudid_frame(ds_out, config)
+    if "cloudid_store_basetime" in config:
+        init_cloudid_store(ds_frame, store_path, config["cloudid_store_basetime"])
+
+    # Variables without a time dimension are written when the store is created
+    static_vars = [var for var in ds_frame.variables if "time" not in ds_frame[var].dims]
+    ds_frame.drop_vars(static_vars).to_zarr(
+        store_path, region={"time": slice(time_index, time_index + 1)},
+    )
+    return cloudid_outfile
+
+
+def get_cloudid_frame(ds_out, config):
+    """
+    Prepare a cloudid Dataset to be written to the Zarr store.
+
+    The feature dimension is padded to maxnclouds, and base_time is stored as float
+    so that the times not written yet are missing.
+
+    Args:
+        ds_out: Xarray Dataset
+            Cloudid Dataset with one time.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        ds_frame: Xarray Dataset
+            Cloudid Dataset with the feature variables along (time, features).
+    """
+    logger = logging.getLogger(__name__)
+    maxnclouds = config.get("maxnclouds", 1000)
+
+    ds_frame = ds_out.copy()
+    ds_frame["base_time"] = ds_frame["base_time"].astype(float)
+    # Fill values must be in the encoding to write to an existing store
+    for var in ds_frame.variables.values():
+        if "_FillValue" in var.attrs:
+            var.encoding["_FillValue"] = var.attrs.pop("_FillValue")
+    if "features" not in ds_frame.dims:
+        return ds_frame
+
+    nfeatures = ds_frame.sizes["features"]
+    if nfeatures > maxnclouds:
+        logger.critical(f"ERROR: Number of features ({nfeatures}) exceeds maxnclouds ({maxnclouds}).")
+        logger.critical("Increase maxnclouds in config to store cloudid in Zarr.")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
+    ds_frame = ds_frame.reindex(features=np.arange(1, maxnclouds + 1), fill_value=0)
+    for var in ds_frame.data_vars:
+        if ("features" in ds_frame[var].dims) & ("time" not in ds_frame[var].dims):
+            ds_frame[var] = ds_frame[var].expand_dims(time=ds_frame["time"])
+    return ds_frame
+
+
+def init_cloudid_store(ds_frame, store_path, files_basetime):
+    """
+    Create the cloudid Zarr store from the first frame.
+
+    Only the metadata, the time coordinate and the variables without a time dimension are written.
+    The time-dependent variables are chunked by one time so that frames are written independently.
+
+    Args:
+        ds_frame: Xarray Dataset
+            Cloudid Dataset with one time, feature dimension padded.
+        store_path: string
+            Zarr store path.
+        files_basetime: np.array
+            Base time of all input files.
+    """
+    logger = logging.getLogger(__name__)
+    ntimes = len(files_basetime)
+    time_vars = [var for var in ds_frame.data_vars if "time" in ds_frame[var].dims]
+    template = ds_frame.drop_vars(time_vars + ["time"])
+    template = template.assign_coords(
+        time=("time", np.asarray(files_basetime, dtype=ds_frame["time"].dtype), ds_frame["time"].attrs),
+    )
+    for var in time_vars:
+        # Lazy array of the full time series, only its metadata is written
+        shape = (ntimes,) + ds_frame[var].shape[1:]
+        data = dask.array.zeros(shape, dtype=ds_frame[var].dtype, chunks=(1,) + shape[1:])
+        template[var] = (ds_frame[var].dims, data, ds_frame[var].attrs)
+    template.to_zarr(store_path, mode="w", compute=False)
+    logger.info(f"Created cloudid store with {ntimes} times: {store_path}")
+    # Clear cached reads of a previous store in this process
+    _open_cloudid_store.cache_clear()
+    _get_cloudid_store_frames.cache_clear()
+
+
+def get_cloudid_store_stamp(store_path):
+    """
+    Get the modification time of the cloudid Zarr store metadata.
+
+    The metadata is written when the store is created, so the stamp identifies the store version
+    in the cached reads of each process (e.g., persistent Dask workers across runs).
+
+    Args:
+        store_path: string
+            Zarr store path.
+
+    Returns:
+        stamp: int
+            Modification time [ns] of the store metadata, 0 if the store does not exist.
+    """
+    for metadata_file in ["zarr.json", ".zmetadata", ".zgroup"]:
+        metadata_path = os.path.join(store_path, metadata_file)
+        if os.path.isfile(metadata_path):
+            return os.stat(metadata_path).st_mtime_ns
+    return 0
+
+
+@lru_cache(maxsize=8)
+def _open_cloudid_store(store_path, store_stamp, **kwargs):
+    """
+    Open the cloudid Zarr store, cached to open each version of the store once per process.
+    """
+    return xr.open_dataset(store_path, engine="zarr", chunks=None, **kwargs)
+
+
+@lru_cache(maxsize=8)
+def _get_cloudid_store_frames(store_path, store_stamp, tracking_outpath, cloudid_filebase):
+    """
+    Get the cloudid file names and base time of the frames written to the Zarr store.
+
+    Returns:
+        frame_index: dictionary
+            Time index of each cloudid file name in the store.
+        frames_basetime: dictionary
+            Base time of each cloudid file name in the store.
+    """
+    ds = _open_cloudid_store(store_path, store_stamp, decode_times=False, mask_and_scale=True)
+    base_time = ds["base_time"].values
+    frame_index = {}
+    frames_basetime = {}
+    for ii in np.nonzero(np.isfinite(base_time))[0]:
+        timestring = time.strftime("%Y%m%d_%H%M%S", time.gmtime(base_time[ii]))
+        filename = f"{tracking_outpath}{cloudid_filebase}{timestring}.nc"
+        frame_index[filename] = ii
+        frames_basetime[filename] = base_time[ii]
+    return frame_index, frames_basetime
+
+
+def get_cloudid_store_frames(config):
+    """
+    Get the cloudid file names and base time of the frames written to the Zarr store.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        frame_index: dictionary
+            Time index of each cloudid file name in the store.
+        frames_basetime: dictionary
+            Base time of each cloudid file name in the store.
+    """
+    store_path = get_cloudid_store_path(config)
+    return _get_cloudid_store_frames(
+        store_path, get_cloudid_store_stamp(store_path),
+        config["tracking_outpath"], config["cloudid_filebase"],
+    )
+
+
+def subset_cloudid_files(config, start_basetime, end_basetime):
+    """
+    Subset cloudid files within given start and end time.
+
+    With the Zarr store, the file names are not on disk but identify the frames in the store.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+        start_basetime: int
+            Start base time (Epoch time).
+        end_basetime: int
+            End base time (Epoch time).
+
+    Returns:
+        Same as subset_files_timerange.
+    """
+    if not use_cloudid_zarr(config):
+        return subset_files_timerange(
+            config["tracking_outpath"], config["cloudid_filebase"], start_basetime, end_basetime,
+        )
+
+    frame_index, frames_basetime = get_cloudid_store_frames(config)
+    filenames = sorted(frames_basetime, key=frames_basetime.get)
+    files_basetime = np.array([frames_basetime[ifile] for ifile in filenames]).astype(int)
+    fidx = np.where((files_basetime >= start_basetime) & (files_basetime <= end_basetime))[0]
+    data_filenames = [filenames[ii] for ii in fidx]
+    files_basetime = files_basetime[fidx]
+    files_datestring = [time.strftime("%Y%m%d", time.gmtime(bt)) for bt in files_basetime]
+    files_timestring = [time.strftime("%H%M%S", time.gmtime(bt)) for bt in files_basetime]
+    return (
+        data_filenames,
+        files_basetime,
+        files_datestring,
+        files_timestring,
+    )
+
+
+def cloudid_exists(cloudid_file, config):
+    """
+    Check if a cloudid file exists, as a netCDF file or a frame in the Zarr store.
+
+    Args:
+        cloudid_file: string
+            Cloudid file name.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        True if the cloudid file exists.
+    """
+    if not use_cloudid_zarr(config):
+        return os.path.isfile(cloudid_file)
+    frame_index, frames_basetime = get_cloudid_store_frames(config)
+    return cloudid_file in frame_index
+
+
+def open_cloudid(cloudid_file, config, **kwargs):
+    """
+    Open a cloudid file, as a netCDF file or a frame in the Zarr store.
+
+    With the Zarr store, the frame is returned with the same variables and dimensions as the netCDF file.
+
+    Args:
+        cloudid_file: string
+            Cloudid file name.
+        config: dictionary
+            Dictionary containing config parameters.
+        **kwargs:
+            Keyword arguments passed to xarray.open_dataset.
+
+    Returns:
+        ds: Xarray Dataset
+            Cloudid Dataset with one time.
+    """
+    if not use_cloudid_zarr(config):
+        return xr.open_dataset(cloudid_file, **kwargs)
+
+    nfeature_varname = config.get("nfeature_varname", "nfeatures")
+    store_path = get_cloudid_store_path(config)
+    frame_index, frames_basetime = get_cloudid_store_frames(config)
+    if cloudid_file not in frame_index:
+        raise FileNotFoundError(f"{cloudid_file} is not in cloudid store: {store_path}")
+    # Netcdf chunks option does not apply to the store
+    kwargs.pop("chunks", None)
+    ds = _open_cloudid_store(
+        store_path, get_cloudid_store_stamp(store_path), **kwargs,
+    ).isel(time=[frame_index[cloudid_file]])
+    # Closing the frame would close the cached store
+    ds.set_close(None)
+
+    # Remove the padding of the feature dimension
+    if "features" in ds.dims:
+        nfeatures = int(np.squeeze(ds[nfeature_varname].values))
+        ds = ds.isel(features=slice(0, nfeatures))
+        for var in ds.data_vars:
+            if ds[var].dims == ("time", "features"):
+                ds[var] = ds[var].squeeze("time", drop=True)
+    return ds
@@ -44,65 +44,109 @@ def calc_cloud_boundary(height, idxcld, gap, min_thick):
 
     return cloud_base, cloud_top
 
-def echotop_height(dbz3d, height, z_dimname, shape_2d, dbz_thresh, gap, min_thick):
+def calc_first_layer_top(echomask, height, gap):
     """
-    Calculates first layer echo-top height from bottom up.
+    Calculates first layer top height from bottom up for all columns.
+    ----------
+    echomask: np.ndarray(bool)
+        Echo mask array, assumes in [z, ...] order.
+    height: np.array(float)
+        height array (1D or the same shape as echomask).
+    gap: int
+        If a gap larger than this exists, echoes are separated into different layers
+
+    Returns
+    ----------
+    layer_top: np.ndarray(float)
+        First layer top height, NaN for columns without echo.
+    """
+    nz = echomask.shape[0]
+    # Find levels with echo anywhere within the next gap levels above
+    echo_above = np.zeros_like(echomask)
+    for k in range(1, min(int(np.floor(gap)), nz - 1) + 1):
+        echo_above[:-k] |= echomask[k:]
+    # A layer ends at an echo level without echo in the next gap levels,
+    # the first one from bottom up is the top of the first layer
+    layer_end = echomask & ~echo_above
+    itop = np.argmax(layer_end, axis=0)
+    if height.ndim == 1:
+        layer_top = height[itop]
+    else:
+        layer_top = np.take_along_axis(height, itop[np.newaxis], axis=0)[0]
+    layer_top = np.where(echomask.any(axis=0), layer_top, np.nan)
+    return layer_top
+
+def echotop_heights(dbz3d, height, z_dimname, shape_2d, dbz_thresh, gap, min_thick, chunk_size=64):
+    """
+    Calculates first layer echo-top heights from bottom up for multiple reflectivity thresholds.
     ----------
     dbz3d: np.DataArray(float)
         3D reflectivity array (Xarray DataArray), assumes in [z, y, x] order.
     height: np.array(float)
         height array (1D or 3D). For 1D, assumes vertical coordinate only.
         For 3D, assumes in the same order as dbz3d [z, y, x] order.
-    shape_2d: tuple 
+    shape_2d: tuple
         (Number of points on x-direction, Number of points on y-direction)
-    nz: float
-        Number of points on z-direction.
-    dbz_thresh: float
-        Reflectivity threshold to calculate echo-top height.
+    dbz_thresh: list
+        Reflectivity thresholds to calculate echo-top heights.
     gap: int
         If a gap larger than this exists, echoes are separated into different layers
     min_thick: float
         Minimum thickness of an echo layer.
+    chunk_size: int, default=64
+        Number of rows in y-direction processed together for all thresholds.
 
     Returns
     ----------
-    echotop: np.ndarray(float)
-        Echo-top height 2D array.
+    echotops: list
+        Echo-top height 2D arrays for each reflectivity threshold.
     """
 
-    # Create echo-top height array
-    echotop = np.full(shape_2d, np.nan, dtype=np.float32)
+    # Create echo-top height arrays
+    echotops = [np.full(shape_2d, np.nan, dtype=np.float32) for _ in dbz_thresh]
 
-    # Define binary cloud mask using reflectivity threshold
-    cloudmask = dbz3d > dbz_thresh
     # Get numpy array for speed
-    cmask = cloudmask.squeeze().values
-
-    # Find 2D locations with clouds anywhere in the column
-    # Then get y, x indices of those cloudy points
-    yidx, xidx = np.where(cloudmask.max(dim=z_dimname).squeeze().values == 1)
-    # Total number of points with clouds
-    npix_cloud = len(xidx)
-
+    dbz = dbz3d.squeeze().values
+    height = np.asarray(height)
     # Check if height is 1D or 3D
     height_is_1d = height.ndim == 1
 
-    # Loop over each point with clouds
-    for il in range(0, npix_cloud):
-        # Get the profile at location y, x
-        idxcld = np.array(np.where(np.squeeze(cmask[:, yidx[il], xidx[il]]) == 1)[0])
-        # Check if there is any clouds defined
-        if len(idxcld) > 0:
-            # Get height profile: use 1D height directly or extract column from 3D height
-            if height_is_1d:
-                iheight = height
-            else:
-                iheight = height[:, yidx[il], xidx[il]]
-            # Call calc_cloud_boundary to get cloud_base, cloud_top height
-            cb, ct = calc_cloud_boundary(iheight, idxcld, gap, min_thick)
-            # The first layer top (from bottom up) is the lowest layer echo-top height
-            echotop[yidx[il], xidx[il]] = ct[0]
+    # Loop over chunks of rows, compute all thresholds while the chunk is in memory
+    ny = dbz.shape[1]
+    for ystart in range(0, ny, chunk_size):
+        yslice = slice(ystart, min(ystart + chunk_size, ny))
+        idbz = dbz[:, yslice, :]
+        iheight = height if height_is_1d else height[:, yslice, :]
+        for ithresh, thresh in enumerate(dbz_thresh):
+            # Define binary echo mask using reflectivity threshold
+            echotops[ithresh][yslice, :] = calc_first_layer_top(idbz > thresh, iheight, gap)
+
+    return echotops
+
+def echotop_height(dbz3d, height, z_dimname, shape_2d, dbz_thresh, gap, min_thick):
+    """
+    Calculates first layer echo-top height from bottom up.
+    ----------
+    dbz3d: np.DataArray(float)
+        3D reflectivity array (Xarray DataArray), assumes in [z, y, x] order.
+    height: np.array(float)
+        height array (1D or 3D). For 1D, assumes vertical coordinate only.
+        For 3D, assumes in the same order as dbz3d [z, y, x] order.
+    shape_2d: tuple 
+        (Number of points on x-direction, Number of points on y-direction)
+    dbz_thresh: float
+        Reflectivity threshold to calculate echo-top height.
+    gap: int
+        If a gap larger than this exists, echoes are separated into different layers
+    min_thick: float
+        Minimum thickness of an echo layer.
 
+    Returns
+    ----------
+    echotop: np.ndarray(float)
+        Echo-top height 2D array.
+    """
+    echotop = echotop_heights(dbz3d, height, z_dimname, shape_2d, [dbz_thresh], gap, min_thick)[0]
     return echotop
 
 
@@ -6,6 +6,7 @@ import yaml
 import xarray as xr
 import pandas as pd
 import logging
+from functools import lru_cache
 from scipy.sparse import csr_matrix
 
 def setup_logging():
@@ -263,6 +264,31 @@ def subset_files_timerange(
         files_timestring,
     )
 
+def get_file_pair_blocks(nfiles, lag, nblocks):
+    """
+    Split the file pairs (i, i + lag) into contiguous blocks.
+
+    A block (istart, iend) contains the pairs starting at file istart to iend - 1,
+    and reads files istart to iend + lag - 1, so that each file is read once per block.
+
+    Args:
+        nfiles: int
+            Number of files.
+        lag: int
+            Number of files between the two files of a pair.
+        nblocks: int
+            Number of blocks to split the file pairs into.
+
+    Returns:
+        blocks: list
+            List of (istart, iend) start/end file indices for each block.
+    """
+    npairs = max(nfiles - lag, 0)
+    nblocks = max(min(nblocks, npairs), 1)
+    edges = np.round(np.linspace(0, npairs, nblocks + 1)).astype(int)
+    blocks = [(int(edges[ii]), int(edges[ii + 1])) for ii in range(nblocks) if edges[ii + 1] > edges[ii]]
+    return blocks
+
 def get_start_end_basetime_from_filenames(
     data_path,
     data_basename,
@@ -553,6 +579,150 @@ def match_drift_times(
     )
 
 
+def load_tracknumbers(tracknumbers_file):
+    """
+    Load tracknumbers file and flatten the track variables of all cloudid files.
+
+    The track variables are stored as contiguous ragged arrays: the values of cloudid file nf
+    are var[file_offsets[nf]:file_offsets[nf+1]]. Older tracknumbers files with dense
+    [time, nfiles, nclouds] track variables are flattened row by row.
+
+    Args:
+        tracknumbers_file: string
+            Tracknumbers file name.
+
+    Returns:
+        track_dict: dictionary
+            Dictionary containing number of tracks (ntracks), cloudid file names (cloudid_files),
+            start index of each cloudid file (file_offsets),
+            and flattened track variables (track_numbers, track_status, track_mergenumbers,
+            track_splitnumbers, track_reset).
+    """
+    track_varnames = ["track_numbers", "track_status", "track_mergenumbers", "track_splitnumbers", "track_reset"]
+    ds = xr.open_dataset(tracknumbers_file,
+                         mask_and_scale=False,
+                         decode_times=False,
+                         concat_characters=True)
+    nfiles = ds.sizes["nfiles"]
+    track_dict = {
+        "ntracks": int(ds["ntracks"].values.item()),
+        "cloudid_files": ds["cloudid_files"].values,
+    }
+    if "file_nclouds" in ds.data_vars:
+        # Contiguous ragged arrays, number of clouds of each cloudid file is the count variable
+        file_nclouds = ds["file_nclouds"].values
+        for varname in track_varnames:
+            track_dict[varname] = ds[varname].values
+    else:
+        # Dense arrays [time, nfiles, nclouds], flatten rows with the same number of clouds
+        file_nclouds = np.full(nfiles, ds.sizes["nclouds"], dtype=int)
+        for varname in track_varnames:
+            track_dict[varname] = ds[varname].isel(time=0).values.ravel()
+    ds.close()
+    track_dict["file_offsets"] = np.concatenate(([0], np.cumsum(file_nclouds)))
+    return track_dict
+
+
+def build_basetime_index(basetime):
+    """
+    Build a time index of track stats base_time.
+
+    The valid base_time values are sorted once, so that the (track, time) indices matching
+    a pixel file time are found with a binary search instead of scanning all base_time values.
+    The indices for base_time_uniq[i] are indices[offsets[i]:offsets[i+1]], in ascending order.
+
+    Args:
+        basetime: np.ndarray
+            Track stats base_time, dimensions: [tracks, times] or [times].
+
+    Returns:
+        basetime_index: dictionary
+            Dictionary containing sorted unique base times (base_time_uniq),
+            start index of each unique base time (offsets),
+            flattened base_time indices sorted by base time (indices),
+            and shape of the base_time array (shape).
+    """
+    basetime1d = np.ravel(basetime)
+    # Sort the valid base times, stable sort keeps indices of the same time in ascending order
+    indices = np.flatnonzero(np.isfinite(basetime1d))
+    indices = indices[np.argsort(basetime1d[indices], kind="stable")]
+    base_time_uniq, offsets = np.unique(basetime1d[indices], return_index=True)
+    basetime_index = {
+        "base_time_uniq": base_time_uniq,
+        "offsets": np.append(offsets, len(indices)),
+        "indices": indices,
+        "shape": np.shape(basetime),
+    }
+    return basetime_index
+
+
+def match_basetime_index(basetime_index, basetime, dt_thresh):
+    """
+    Find the track stats indices within a time difference threshold of a base time.
+
+    Matches are the same as np.where(np.abs(stats_basetime - basetime) < dt_thresh).
+
+    Args:
+        basetime_index: dictionary
+            Time index from build_basetime_index.
+        basetime: float
+            Base time to match (e.g., pixel file base time).
+        dt_thresh: float
+            Time difference threshold to match the base time.
+
+    Returns:
+        match_indices: tuple
+            Matched indices for each dimension of the base_time array.
+    """
+    base_time_uniq = basetime_index["base_time_uniq"]
+    offsets = basetime_index["offsets"]
+    # Find unique base times near the threshold, then apply the exact threshold
+    istart = np.searchsorted(base_time_uniq, basetime - dt_thresh, side="left")
+    iend = np.searchsorted(base_time_uniq, basetime + dt_thresh, side="right")
+    idx_uniq = istart + np.flatnonzero(np.abs(base_time_uniq[istart:iend] - basetime) < dt_thresh)
+    if len(idx_uniq) > 0:
+        idx = np.sort(basetime_index["indices"][offsets[idx_uniq[0]]:offsets[idx_uniq[-1] + 1]])
+    else:
+        idx = np.zeros(0, dtype=np.int64)
+    return np.unravel_index(idx, basetime_index["shape"])
+
+
+def match_nearest_basetime_index(basetime_index, basetime):
+    """
+    Find the index of the nearest base time for each of the input base times.
+
+    Matches are the same as np.nanargmin(np.abs(basetime_array - basetime)) for a 1D base_time array,
+    where the first index is returned if several base times have the same time difference.
+
+    Args:
+        basetime_index: dictionary
+            Time index from build_basetime_index for a 1D base_time array.
+        basetime: np.ndarray
+            Base times to match.
+
+    Returns:
+        nearest_index: np.ndarray
+            Index of the nearest base time for each input base time.
+    """
+    base_time_uniq = basetime_index["base_time_uniq"]
+    # Index of the first occurrence of each unique base time
+    first_index = basetime_index["indices"][basetime_index["offsets"][:-1]]
+    nuniq = len(base_time_uniq)
+    basetime = np.asarray(basetime)
+    # Unique base times before and after each input base time
+    iafter = np.clip(np.searchsorted(base_time_uniq, basetime), 1, nuniq - 1)
+    ibefore = iafter - 1
+    if nuniq == 1:
+        iafter = ibefore = np.zeros_like(iafter)
+    dt_before = np.abs(base_time_uniq[ibefore] - basetime)
+    dt_after = np.abs(base_time_uniq[iafter] - basetime)
+    # Take the closer time, or the first occurrence if the time differences are equal
+    use_after = (dt_after < dt_before) | (
+        (dt_after == dt_before) & (first_index[iafter] < first_index[ibefore])
+    )
+    return np.where(use_after, first_index[iafter], first_index[ibefore])
+
+
 def load_sparse_trackstats(
         max_trackduration,
         statistics_file,
@@ -620,6 +790,7 @@ def convert_trackstats_sparse2dense(
         times_dimname,
         fillval,
         fillval_f,
+        config=None,
 ):
     """
     Convert sparse trackstats netCDF file to dense trackstats netCDF file.
@@ -643,6 +814,8 @@ def convert_trackstats_sparse2dense(
             Missing value for int type variables.
         fillval_f: float
             Missing value for float type variables.
+        config: dictionary, optional, default=None
+            Dictionary containing config parameters, for the netCDF encoding.
 
     Returns:
         True.
@@ -705,8 +878,7 @@ def convert_trackstats_sparse2dense(
     # Define output Xarray dataset
     dsout = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
     # Write to netcdf file
     dsout.to_netcdf(
         path=filename_dense,
@@ -716,3 +888,284 @@ def convert_trackstats_sparse2dense(
         encoding=encoding
     )
     return True
+
+# Default encoding for each netCDF variable class, see get_netcdf_encoding
+NETCDF_ENCODING_DEFAULTS = {
+    "coords": {"compression": None},
+    "labels": {"compression": "zlib"},
+    "masks": {"compression": "zlib"},
+    "floats": {"compression": "zlib"},
+    "others": {"compression": "zlib"},
+}
+
+# netCDF4 flags for compression filters that depend on the netCDF-C build
+NETCDF_COMPRESSION_SUPPORT = {
+    "zstd": "__has_zstandard_support__",
+    "bzip2": "__has_bzip2_support__",
+    "szip": "__has_szip_support__",
+    "blosc_lz": "__has_blosc_support__",
+    "blosc_lz4": "__has_blosc_support__",
+    "blosc_lz4hc": "__has_blosc_support__",
+    "blosc_zlib": "__has_blosc_support__",
+    "blosc_zstd": "__has_blosc_support__",
+}
+
+def get_netcdf_variable_class(ds, varname):
+    """
+    Get the encoding class of a variable.
+
+    Args:
+        ds: Xarray Dataset
+            Dataset to write.
+        varname: string
+            Variable name.
+
+    Returns:
+        var_class: string
+            'coords', 'labels', 'masks', 'floats', or 'others' (e.g., strings, datetimes).
+    """
+    dtype = ds[varname].dtype
+    if varname in ds.coords:
+        return "coords"
+    elif (dtype.kind == "b") | ((dtype.kind in "iu") & (dtype.itemsize == 1)):
+        return "masks"
+    elif dtype.kind in "iu":
+        return "labels"
+    elif dtype.kind == "f":
+        return "floats"
+    else:
+        return "others"
+
+@lru_cache(maxsize=None)
+def get_netcdf_compression(compression):
+    """
+    Get the netCDF4 encoding for a compression filter, zlib if the filter is not available.
+
+    Args:
+        compression: string
+            Compression filter name (e.g., 'zlib', 'zstd', 'blosc_lz4'), None for no compression.
+
+    Returns:
+        comp: dictionary
+            Compression encoding.
+    """
+    logger = logging.getLogger(__name__)
+    if (compression is None) or (compression == "none"):
+        return {}
+    elif compression == "zlib":
+        return {"zlib": True}
+    elif compression in NETCDF_COMPRESSION_SUPPORT:
+        import netCDF4
+        if getattr(netCDF4, NETCDF_COMPRESSION_SUPPORT[compression], False):
+            return {"compression": compression}
+        logger.warning(f"Compression {compression} is not supported by the netCDF library, using zlib.")
+        return {"zlib": True}
+    else:
+        logger.warning(f"Unknown compression: {compression}, using zlib.")
+        return {"zlib": True}
+
+def get_downcast_dtype(values, dtype, fillvalue=None, unsigned=True):
+    """
+    Get the smallest integer type (int16, uint16, int32) that holds the values.
+
+    Args:
+        values: np.ndarray
+            Integer values.
+        dtype: np.dtype
+            Current type.
+        fillvalue: int, optional, default=None
+            Fill value that must also fit.
+        unsigned: bool, optional, default=True
+            Allow unsigned type (not supported by NETCDF4_CLASSIC format).
+
+    Returns:
+        dtype: np.dtype
+            Smallest integer type, or the current type if no smaller type fits.
+    """
+    if values.size == 0:
+        return dtype
+    vmin = values.min()
+    vmax = values.max()
+    if fillvalue is not None:
+        vmin = min(vmin, fillvalue)
+        vmax = max(vmax, fillvalue)
+    for new_dtype in [np.dtype("int16"), np.dtype("uint16"), np.dtype("int32")]:
+        if new_dtype.itemsize >= dtype.itemsize:
+            break
+        if (new_dtype.kind == "u") & (not unsigned):
+            continue
+        if (np.iinfo(new_dtype).min <= vmin) & (vmax <= np.iinfo(new_dtype).max):
+            return new_dtype
+    return dtype
+
+
+def get_netcdf_encoding(ds, config, encoding=None, format="NETCDF4"):
+    """
+    Get the netCDF encoding for all variables of a Dataset from the config encoding policy.
+
+    Variables are grouped in classes, each with its own options in config netcdf_encoding:
+        coords: coordinate variables (not compressed by default, unless compressed by the writer)
+        labels: integer variables (e.g., feature/track numbers, counts)
+        masks: boolean and 1-byte integer variables (e.g., flags, classifications)
+        floats: floating point variables
+        others: other variables (e.g., strings, datetimes)
+    Options are:
+        compression: 'zlib' (default), 'zstd', 'blosc_lz4', etc. if supported by the netCDF library, or None
+        complevel: compression level
+        shuffle: shuffle filter
+        chunks: dictionary of chunk size for each dimension name (default: netCDF library chunking)
+        least_significant_digit: precision retained for floats
+        downcast: store integers as the smallest type that holds the values (int16, uint16, int32)
+    Options at the top level of netcdf_encoding apply to all classes,
+    and options for single variables are set in netcdf_encoding['variables'][varname].
+
+    Args:
+        ds: Xarray Dataset
+            Dataset to write.
+        config: dictionary
+            Dictionary containing config parameters, None for the default encoding.
+        encoding: dictionary, optional, default=None
+            Writer specific encoding of the variables (e.g., dtype, _FillValue), takes precedence.
+            Its compression (e.g., zlib) is used unless compression is set in config netcdf_encoding.
+        format: string, optional, default="NETCDF4"
+            NetCDF file format.
+
+    Returns:
+        encoding: dictionary
+            Encoding for Dataset.to_netcdf.
+    """
+    policy = config.get("netcdf_encoding", None) if config is not None else None
+    if policy is None:
+        policy = {}
+    if encoding is None:
+        encoding = {}
+    var_policy = policy.get("variables", {})
+    common = {key: value for key, value in policy.items()
+              if (key not in NETCDF_ENCODING_DEFAULTS) & (key != "variables")}
+
+    out_encoding = {}
+    for varname in ds.variables:
+        var_class = get_netcdf_variable_class(ds, varname)
+        var_encoding = dict(encoding.get(varname, {}))
+        policy_options = {
+            **common,
+            **policy.get(var_class, {}),
+            **var_policy.get(varname, {}),
+        }
+        options = {**NETCDF_ENCODING_DEFAULTS[var_class], **policy_options}
+
+        # Compression set by the writer is kept, unless compression is set in config
+        compression_keys = ["zlib", "compression", "complevel", "shuffle"]
+        writer_compression = ("compression" not in policy_options) & \
+            any(key in var_encoding for key in compression_keys)
+        if writer_compression:
+            comp = {}
+        else:
+            comp = dict(get_netcdf_compression(options.get("compression")))
+            for key in compression_keys:
+                var_encoding.pop(key, None)
+        if len(comp) > 0:
+            comp["complevel"] = options.get("complevel", 4)
+            comp["shuffle"] = options.get("shuffle", True)
+        # Chunk size for each dimension, capped by the dimension size
+        chunks = options.get("chunks", None)
+        if (chunks is not None) & (ds[varname].ndim > 0):
+            comp["chunksizes"] = tuple(
+                max(1, min(chunks.get(dim, ds.sizes[dim]), ds.sizes[dim])) for dim in ds[varname].dims
+            )
+        if (var_class == "floats") & (options.get("least_significant_digit", None) is not None):
+            comp["least_significant_digit"] = options["least_significant_digit"]
+
+        # Writer specific encoding takes precedence
+        comp.update(var_encoding)
+
+        # Store integers as the smallest type that holds the values
+        dtype = np.dtype(comp.get("dtype", ds[varname].dtype))
+        if options.get("downcast", False) & (var_class in ["labels", "masks"]) & (dtype.kind in "iu"):
+            fillvalue = comp.get("_FillValue", ds[varname].attrs.get("_FillValue", None))
+            new_dtype = get_downcast_dtype(
+                ds[varname].values, dtype, fillvalue, unsigned=(format != "NETCDF4_CLASSIC"),
+            )
+            if new_dtype != dtype:
+                comp["dtype"] = new_dtype
+        out_encoding[varname] = comp
+    return out_encoding
+
+
+# Integer types for label arrays (feature/track numbers) and flag arrays (cloud types, track status)
+LABEL_DTYPE = np.dtype("int32")
+FLAG_DTYPE = np.dtype("int8")
+
+
+def get_compact_dtype(maxvalue, minvalue=0, dtypes=(LABEL_DTYPE,), name="values"):
+    """
+    Get the first integer type that holds the values, exit if none does (overflow).
+
+    Args:
+        maxvalue: int
+            Maximum value to store.
+        minvalue: int, optional, default=0
+            Minimum value to store (including fill values).
+        dtypes: tuple, optional, default=(LABEL_DTYPE,)
+            Integer types to choose from, in order of preference.
+        name: string, optional, default="values"
+            Name of the values, for the error message.
+
+    Returns:
+        dtype: np.dtype
+            Integer type.
+    """
+    logger = logging.getLogger(__name__)
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if (info.min <= minvalue) & (maxvalue <= info.max):
+            return np.dtype(dtype)
+    logger.critical(f"ERROR: {name} range [{minvalue}, {maxvalue}] overflows {np.dtype(dtypes[-1]).name}.")
+    logger.critical("Tracking will now exit.")
+    sys.exit()
+
+
+def get_label_dtype(maxvalue, minvalue=0, unsigned=False, name="labels"):
+    """
+    Get the integer type for a label array.
+
+    Labels are LABEL_DTYPE (int32). Arrays that only hold non-negative values (e.g., lookup indices)
+    can use uint16 if the values fit.
+
+    Args:
+        maxvalue: int
+            Maximum label (e.g., number of features).
+        minvalue: int, optional, default=0
+            Minimum label (including fill values).
+        unsigned: bool, optional, default=False
+            Allow uint16 for non-negative labels.
+        name: string, optional, default="labels"
+            Name of the labels, for the error message.
+
+    Returns:
+        dtype: np.dtype
+            Integer type.
+    """
+    dtypes = (np.dtype("uint16"), LABEL_DTYPE) if unsigned else (LABEL_DTYPE,)
+    return get_compact_dtype(maxvalue, minvalue=minvalue, dtypes=dtypes, name=name)
+
+
+def get_flag_dtype(maxvalue, minvalue=0, name="flags"):
+    """
+    Get the integer type for a flag array.
+
+    Flags are FLAG_DTYPE (int8), or int16 if the values (e.g., fill value -9999) do not fit.
+
+    Args:
+        maxvalue: int
+            Maximum flag value.
+        minvalue: int, optional, default=0
+            Minimum flag value (including fill values).
+        name: string, optional, default="flags"
+            Name of the flags, for the error message.
+
+    Returns:
+        dtype: np.dtype
+            Integer type.
+    """
+    return get_compact_dtype(maxvalue, minvalue=minvalue, dtypes=(FLAG_DTYPE, np.dtype("int16")), name=name)
@@ -1,9 +1,19 @@
+import sys
 import logging
 import numpy as np
 from collections import deque
+from scipy.sparse import coo_matrix
 from skimage.segmentation import watershed
 from skimage.feature import peak_local_max
+from skimage.measure import regionprops_table
 from scipy.ndimage import label
+from pyflextrkr.ft_utilities import LABEL_DTYPE, get_label_dtype
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 def sort_renumber(
     labelcell_number2d,
@@ -30,82 +40,10 @@ def sort_renumber(
             Number of pixels for each labeled cell in 1D.
     """
 
-    # Create output arrays
-    sortedlabelcell_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
-
-    # Get number of labeled cells
-    nlabelcells = np.nanmax(labelcell_number2d)
-
-    # Check if there is any cells identified
-    if nlabelcells > 0:
-
-        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
-        # Loop over each labeled cell
-        for ilabelcell in range(1, nlabelcells + 1):
-            # Count number of pixels for the cell
-            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
-            # Check if grid_area is supplied
-            if grid_area is None:
-                # If cell npix > min size threshold
-                if ilabelcell_npix > min_size:
-                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
-            else:
-                # If grid_area is supplied, sum grid area for the cell
-                ilabelcell_area = np.sum(grid_area[labelcell_number2d == ilabelcell])
-                # If cell area > min size threshold
-                if ilabelcell_area > min_size:
-                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
-
-
-        # # This faster approach does not work
-        # # Because when labelcell_number2d is not sequentially numbered (e.g., when some cells are removed)
-        # # This approach does not get the same sequence with the above one
-        # # Count number of pixels for each unique cells
-        # cellnum, labelcell_npix = np.unique(labelcell_number2d, return_counts=True)
-        # # Remove background and cells below size threshold
-        # labelcell_npix = labelcell_npix[(cellnum > 0)]
-        # labelcell_npix[(labelcell_npix <= min_size)] = -999
-
-        # Check if any of the cells passes the size threshold test
-        ivalidcells = np.where(labelcell_npix > 0)[0]
-        # ivalidcells = np.array(np.where(labelcell_npix > 0))[0, :]
-        ncells = len(ivalidcells)
-
-        if ncells > 0:
-            # Isolate cells that satisfy size threshold
-            # Add one since label numbers start at 1 and indices, which validcells reports starts at 0
-            labelcell_number1d = np.copy(ivalidcells) + 1
-            labelcell_npix = labelcell_npix[ivalidcells]
-
-            # Sort cells from largest to smallest and get the sorted index
-            order = np.argsort(labelcell_npix)[::-1]
-            # order = order[::-1]  # Reverses the order
-
-            # Sort the cells by size
-            sortedcell_npix = np.copy(labelcell_npix[order])
-            sortedcell_number1d = np.copy(labelcell_number1d[order])
-
-            # Loop over the 2D cell number to re-number them by size
-            cellstep = 0
-            for icell in range(0, ncells):
-                # Find 2D indices that match the cell number
-                sortedcell_indices = np.where(
-                    labelcell_number2d == sortedcell_number1d[icell]
-                )
-                # Get one of the dimensions from the 2D indices to count the size
-                nsortedcellindices = len(sortedcell_indices[1])
-                # Check if the size matches the sorted cell size
-                if nsortedcellindices == sortedcell_npix[icell]:
-                    # Renumber the cell in 2D
-                    cellstep += 1
-                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
-
-        else:
-            # Return an empty array
-            sortedcell_npix = np.zeros(0)
-    else:
-        # Return an empty array
-        sortedcell_npix = np.zeros(0)
+    # Get the renumbering table sorted by cell size
+    renumber_table, sortedcell_npix = get_renumber_table(labelcell_number2d, min_size, grid_area=grid_area)
+    # Renumber the cells in 2D
+    sortedlabelcell_number2d = apply_renumber_table(labelcell_number2d, renumber_table)
 
     return (
         sortedlabelcell_number2d,
@@ -139,36 +77,65 @@ def sort_renumber2vars(
             Number of pixels for each labeled cell in 1D.
     """
 
-    # Create output arrays
-    sortedlabelcell_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
-    sortedlabelcell2_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
+    # Get the renumbering table sorted by cell size
+    renumber_table, sortedcell_npix = get_renumber_table(labelcell_number2d, min_cellpix)
+    # Use the same table to renumber both variables in 2D
+    sortedlabelcell_number2d = apply_renumber_table(labelcell_number2d, renumber_table)
+    sortedlabelcell2_number2d = apply_renumber_table(labelcell2_number2d, renumber_table)
+
+    return (
+        sortedlabelcell_number2d,
+        sortedlabelcell2_number2d,
+        sortedcell_npix,
+    )
+
+
+def get_renumber_table(
+    labelcell_number2d,
+    min_size,
+    grid_area=None,
+):
+    """
+    Get a lookup table that renumbers labeled cells by size (largest = 1), removing cells smaller than min_size.
 
+    Args:
+        labelcell_number2d: np.ndarray()
+            Labeled cell number array in 2D.
+        min_size: float
+            Minimum size to count as a cell.
+            If grid_area is None, this should be the minimum number of pixels.
+            If grid_area is supplied, this should be the minimum area.
+        grid_area: np.ndarray(), optional, default=None
+            Area of each grid. Dimensions must match labelcell_number2d.
+
+    Returns:
+        renumber_table: np.ndarray(LABEL_DTYPE)
+            New cell number for each original cell number (index), 0 for removed cells.
+        sortedcell_npix: np.ndarray(int)
+            Number of pixels for each renumbered cell in 1D.
+    """
     # Get number of labeled cells
-    nlabelcells = np.nanmax(labelcell_number2d)
+    nlabelcells = np.nanmax(labelcell_number2d) if np.size(labelcell_number2d) > 0 else 0
 
     # Check if there is any cells identified
     if nlabelcells > 0:
-
-        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
-        # Loop over each labeled cell
-        for ilabelcell in range(1, nlabelcells + 1):
-            # Count number of pixels for the cell
-            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
-            # Check if cell satisfies size threshold
-            if ilabelcell_npix > min_cellpix:
-                labelcell_npix[ilabelcell - 1] = ilabelcell_npix
-
-        # # This faster approach does not work
-        # # Because when labelcell_number2d is not sequentially numbered (e.g., when some cells are removed)
-        # # This approach does not get the same sequence with the above one
-        # # Count number of pixels for each unique cells
-        # cellnum, labelcell_npix2 = np.unique(labelcell_number2d, return_counts=True)
-        # # Remove background and cells below size threshold
-        # labelcell_npix2 = labelcell_npix2[(cellnum > 0)]
-        # labelcell_npix2[(labelcell_npix2 <= min_cellpix)] = -999
+        nlabelcells = int(nlabelcells)
+        # Count number of pixels (and area) for each labeled cell
+        labelcell_number1d = np.ravel(labelcell_number2d)
+        incell = (labelcell_number1d >= 1) & (labelcell_number1d <= nlabelcells)
+        labelcell_number1d = labelcell_number1d[incell].astype(int)
+        labelcell_npix = np.bincount(labelcell_number1d, minlength=nlabelcells + 1)[1:]
+        if grid_area is None:
+            cell_size = labelcell_npix
+        else:
+            cell_size = np.bincount(
+                labelcell_number1d, weights=np.ravel(grid_area)[incell], minlength=nlabelcells + 1,
+            )[1:]
+        # Remove cells that do not pass the size threshold test
+        labelcell_npix = np.where(cell_size > min_size, labelcell_npix, -999)
 
         # Check if any of the cells passes the size threshold test
-        ivalidcells = np.array(np.where(labelcell_npix > 0))[0, :]
+        ivalidcells = np.where(labelcell_npix > 0)[0]
         ncells = len(ivalidcells)
 
         if ncells > 0:
@@ -178,45 +145,40 @@ def sort_renumber2vars(
             labelcell_npix = labelcell_npix[ivalidcells]
 
             # Sort cells from largest to smallest and get the sorted index
-            order = np.argsort(labelcell_npix)
-            order = order[::-1]  # Reverses the order
+            order = np.argsort(labelcell_npix)[::-1]
 
             # Sort the cells by size
             sortedcell_npix = np.copy(labelcell_npix[order])
             sortedcell_number1d = np.copy(labelcell_number1d[order])
 
-            # Loop over the 2D cell number to re-number them by size
-            cellstep = 0
-            for icell in range(0, ncells):
-                # Find 2D indices that match the cell number
-                # Use the same sorted index to label labelcell2_number2d
-                sortedcell_indices = np.where(
-                    labelcell_number2d == sortedcell_number1d[icell]
-                )
-                sortedcell2_indices = np.where(
-                    labelcell2_number2d == sortedcell_number1d[icell]
-                )
-                # Get one of the dimensions from the 2D indices to count the size
-                nsortedcellindices = len(sortedcell_indices[1])
-                # Check if the size matches the sorted cell size
-                if nsortedcellindices == sortedcell_npix[icell]:
-                    # Renumber the cell in 2D
-                    cellstep += 1
-                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
-                    sortedlabelcell2_number2d[sortedcell2_indices] = np.copy(cellstep)
+            # Renumber the cells by size
+            renumber_table = np.zeros(nlabelcells + 1, dtype=get_label_dtype(ncells))
+            renumber_table[sortedcell_number1d] = np.arange(1, ncells + 1)
+            return renumber_table, sortedcell_npix
 
-        else:
-            # Return an empty array
-            sortedcell_npix = np.zeros(0)
-    else:
-        # Return an empty array
-        sortedcell_npix = np.zeros(0)
+    # Return an empty table and array
+    return np.zeros(1, dtype=LABEL_DTYPE), np.zeros(0)
 
-    return (
-        sortedlabelcell_number2d,
-        sortedlabelcell2_number2d,
-        sortedcell_npix,
-    )
+
+def apply_renumber_table(labelcell_number2d, renumber_table):
+    """
+    Renumber labeled cells using a lookup table from get_renumber_table.
+
+    Args:
+        labelcell_number2d: np.ndarray()
+            Labeled cell number array in 2D.
+        renumber_table: np.ndarray(int)
+            New cell number for each original cell number (index).
+
+    Returns:
+        sortedlabelcell_number2d: np.ndarray(LABEL_DTYPE)
+            Renumbered cell number array in 2D, 0 for cell numbers outside of the table.
+    """
+    # Cell numbers outside of the table are set to 0
+    incell = (labelcell_number2d >= 1) & (labelcell_number2d < len(renumber_table))
+    sortedlabelcell_number2d = np.zeros(np.shape(labelcell_number2d), dtype=renumber_table.dtype)
+    sortedlabelcell_number2d[incell] = renumber_table[labelcell_number2d[incell].astype(int)]
+    return sortedlabelcell_number2d
 
 
 def link_pf_tb(
@@ -256,109 +218,251 @@ def link_pf_tb(
     pf_convcold_cloudnumber = np.copy(convcold_cloudnumber)
     pf_cloudnumber = np.copy(cloudnumber)
 
-    # Create a 2D index array with the same shape as the full image
-    # This index array is used to map the indices of indices back to the full image
-    arrayindex2d = np.reshape(np.arange(tb.size), tb.shape)
-
     # If number of PF > 0, proceed
     if npf > 0:
-
-        # Initiallize masks to keep track of which clouds have been renumbered
-        pf_convcold_mask = np.zeros(tb.shape, dtype=int)
-        pf_cloud_mask = np.zeros(tb.shape, dtype=int)
-
-        # Loop over each PF
-        for ipf in range(1, npf):
-
-            # Find pixel index for this PF
-            pfidx = np.where(pf_number == ipf)
-            npix_pf = len(pfidx[0])
-
-            if npix_pf > 0:
-                # Get unique cloud number defined within this PF
-                # cn_uniq = np.unique(convcold_cloudnumber[pfidx])
-                cn_uniq = np.unique(pf_convcold_cloudnumber[pfidx])
-
-                # Find actual clouds (cloudnumber > 0)
-                cn_uniq = cn_uniq[np.where(cn_uniq > 0)]
-                nclouds_uniq = len(cn_uniq)
-                # If there is at least 1 cloud, proceed
-                if nclouds_uniq >= 1:
-
-                    # Loop over each cloudnumber and get the size
-                    npix_uniq = np.zeros(nclouds_uniq, dtype=np.int64)
-                    for ic in range(0, nclouds_uniq):
-                        # Find pixels for each cloud, save the size
-                        # npix_uniq[ic] = len(np.where(convcold_cloudnumber == cn_uniq[ic])[0])
-                        npix_uniq[ic] = len(
-                            np.where(pf_convcold_cloudnumber == cn_uniq[ic])[0]
-                        )
-
-                    # Find cloud number that has maximum size
-                    cn_max = cn_uniq[np.argmax(npix_uniq)]
-
-                    # Loop over each cloudnumber again
-                    for ic in range(0, nclouds_uniq):
-
-                        # Find pixel locations within each cloud, and mask = 0 (cloud has not been renumbered)
-                        # idx_convcold = np.where((convcold_cloudnumber == cn_uniq[ic]) & (pf_convcold_mask == 0))
-                        idx_convcold = np.where(
-                            (pf_convcold_cloudnumber == cn_uniq[ic])
-                            & (pf_convcold_mask == 0)
-                        )
-                        # idx_cloud = np.where((cloudnumber == cn_uniq[ic]) & (pf_cloud_mask == 0))
-                        idx_cloud = np.where(
-                            (pf_cloudnumber == cn_uniq[ic]) & (pf_cloud_mask == 0)
-                        )
-                        if len(idx_convcold[0]) > 0:
-                            # Renumber the cloud to the largest cloud number (that overlaps with this PF)
-                            pf_convcold_cloudnumber[idx_convcold] = cn_max
-                            pf_convcold_mask[idx_convcold] = 1
-                        if len(idx_cloud[0]) > 0:
-                            # Renumber the cloud to the largest cloud number (that overlaps with this PF)
-                            pf_cloudnumber[idx_cloud] = cn_max
-                            pf_cloud_mask[idx_cloud] = 1
-
-                    # Find area within the PF that has no cloudnumber, Tb < warm threshold, and has not been labeled yet
-                    #                     idx_nocloud = np.asarray((pf_convcold_cloudnumber[pfidx] == 0) & (tb[pfidx] < tb_thresh) & (pf_convcold_mask[pfidx] == 0)).nonzero()
-                    idx_nocloud = np.asarray(
-                        (pf_convcold_cloudnumber[pfidx] == 0)
-                        & (pf_convcold_mask[pfidx] == 0)
-                    ).nonzero()
-                    if np.count_nonzero(idx_nocloud) > 0:
-                        # At this point, idx_nocloud is a 1D index referring to the subset within pfidx
-                        # Applying idx_nocloud of pfidx to the 2D full image index array gets the 1D indices referring to the full image,
-                        # then unravel_index converts those 1D indices back to 2D, which can then be applied to the 2D full image
-                        idx_loc = np.unravel_index(
-                            arrayindex2d[pfidx][idx_nocloud], tb.shape
-                        )
-                        # Label the no cloud area using the largest cloud number
-                        pf_convcold_cloudnumber[idx_loc] = cn_max
-                        pf_convcold_mask[idx_loc] = 1
-
-                    # Find area within the PF that has no cloudnumber, Tb < warm threshold, and has not been labeled yet
-                    #                     idx_nocloud = np.asarray((pf_cloudnumber[pfidx] == 0) & (tb[pfidx] < tb_thresh) & (pf_cloud_mask[pfidx] == 0)).nonzero()
-                    idx_nocloud = np.asarray(
-                        (pf_cloudnumber[pfidx] == 0) & (pf_cloud_mask[pfidx] == 0)
-                    ).nonzero()
-                    if np.count_nonzero(idx_nocloud) > 0:
-                        idx_loc = np.unravel_index(
-                            arrayindex2d[pfidx][idx_nocloud], tb.shape
-                        )
-                        # Label the no cloud area using the largest cloud number
-                        pf_cloudnumber[idx_loc] = cn_max
-                        pf_cloud_mask[idx_loc] = 1
-
-    else:
-        # Pass input variables to output if no PFs are defined
-        pf_convcold_cloudnumber = np.copy(convcold_cloudnumber)
-        pf_cloudnumber = np.copy(cloudnumber)
+        npf = int(npf)
+        pf_number1d = np.ravel(pf_number)
+        convcold1d = np.ravel(convcold_cloudnumber)
+        cloud1d = np.ravel(cloudnumber)
+        nlabels = int(max(np.max(convcold1d, initial=0), np.max(cloud1d, initial=0))) + 1
+
+        # PFs are processed in order from 1 to npf-1
+        inpf = (pf_number1d >= 1) & (pf_number1d < npf)
+        # Unique (PF, cloud) overlap pairs, sorted by PF then cloud number
+        overlap = inpf & (convcold1d > 0)
+        pf_cloud_pairs = np.unique(
+            pf_number1d[overlap].astype(np.int64) * nlabels + convcold1d[overlap].astype(np.int64)
+        )
+        pair_pf, pair_cloud = np.divmod(pf_cloud_pairs, nlabels)
+        pf_uniq, pf_start = np.unique(pair_pf, return_index=True)
+        pf_end = np.append(pf_start[1:], len(pair_pf))
+        # First pixel of each PF
+        pf_number_inpf = pf_number1d[inpf].astype(np.int64)
+        pf_first = np.zeros(npf + 1, dtype=np.int64)
+        pf_uniq_all, pf_first_inpf = np.unique(pf_number_inpf, return_index=True)
+        pf_first[pf_uniq_all] = np.flatnonzero(inpf)[pf_first_inpf]
+        # Number of no cloud pixels within each PF that are labeled with the largest cloud number,
+        # the no cloud area is not labeled if it is only the first pixel of the PF
+        pf_nocloud_npix = np.bincount(
+            pf_number1d[inpf & (convcold1d == 0)].astype(np.int64), minlength=npf + 1,
+        )
+        pf_nocloud_npix[(pf_nocloud_npix == 1) & (convcold1d[pf_first] == 0)] = 0
+
+        # Size of each cloud, updated as clouds are renumbered
+        cloud_npix = np.bincount(convcold1d[convcold1d > 0].astype(np.int64), minlength=nlabels)
+        # Current cloud number of each input cloud number
+        convcold_map = np.arange(nlabels)
+        cloud_map = np.arange(nlabels)
+        # Clouds that have been renumbered are not changed by subsequent PFs
+        convcold_renumbered = np.zeros(nlabels, dtype=bool)
+        cloud_renumbered = np.zeros(nlabels, dtype=bool)
+        # Largest cloud number of each PF
+        pf_cn_max = np.zeros(npf + 1, dtype=get_label_dtype(nlabels))
+
+        # Loop over each PF that has at least 1 cloud
+        for ipf, istart, iend in zip(pf_uniq, pf_start, pf_end):
+            # Get unique cloud number defined within this PF
+            cn_uniq = np.unique(convcold_map[pair_cloud[istart:iend]])
+            # Find cloud number that has maximum size
+            cn_max = cn_uniq[np.argmax(cloud_npix[cn_uniq])]
+            pf_cn_max[ipf] = cn_max
+
+            # Renumber the clouds that have not been renumbered to the largest cloud number
+            cn_renumber = cn_uniq[~convcold_renumbered[cn_uniq]]
+            cn_move = cn_renumber[cn_renumber != cn_max]
+            cloud_npix[cn_max] += np.sum(cloud_npix[cn_move]) + pf_nocloud_npix[ipf]
+            cloud_npix[cn_move] = 0
+            convcold_map[cn_move] = cn_max
+            convcold_renumbered[cn_renumber] = True
+            convcold_renumbered[cn_max] = True
+
+            cn_renumber = cn_uniq[~cloud_renumbered[cn_uniq]]
+            cloud_map[cn_renumber] = cn_max
+            cloud_renumbered[cn_renumber] = True
+
+        # Renumber clouds, and label the no cloud area within each PF using the largest cloud number
+        for out_number, in_number1d, number_map in zip(
+            (pf_convcold_cloudnumber, pf_cloudnumber),
+            (convcold1d, cloud1d),
+            (convcold_map, cloud_map),
+        ):
+            out_number1d = out_number.reshape(-1)
+            iscloud = in_number1d > 0
+            out_number1d[iscloud] = number_map[in_number1d[iscloud].astype(np.int64)]
+            # The no cloud area is not labeled if it is only the first pixel of the PF,
+            # consistent with the previous count of nonzero indices within the PF
+            nocloud_npix = np.bincount(pf_number_inpf[in_number1d[inpf] == 0], minlength=npf + 1)
+            pf_fill = np.where(
+                (nocloud_npix == 1) & (in_number1d[pf_first] == 0), 0, pf_cn_max,
+            )
+            pf_fill1d = np.zeros(len(pf_number1d), dtype=pf_cn_max.dtype)
+            pf_fill1d[inpf] = pf_fill[pf_number_inpf]
+            isnocloud = (in_number1d == 0) & (pf_fill1d > 0)
+            out_number1d[isnocloud] = pf_fill1d[isnocloud]
 
     return (
         pf_convcold_cloudnumber,
         pf_cloudnumber,
     )
 
+def get_overlap_links(
+    reference_number,
+    new_number,
+    nreference,
+    nnew,
+    nmaxlinks,
+    othresh,
+    fillval,
+):
+    """
+    Links labeled features in a reference and a new array by pixel overlap.
+
+    The reference x new pixel-overlap (contingency) matrix is built in one pass
+    as a sparse matrix over the paired label arrays, from which the forward/backward
+    links, overlap fractions and linked feature sizes are read.
+
+    Args:
+        reference_number: np.ndarray(int)
+            Labeled feature number array at the reference time.
+        new_number: np.ndarray(int)
+            Labeled feature number array at the new time. Dimensions must match reference_number.
+        nreference: int
+            Number of rows in the forward link arrays (features in reference array + 1).
+        nnew: int
+            Number of rows in the backward link arrays (features in new array + 1).
+        nmaxlinks: int
+            Maximum number of features that any single feature can be linked to.
+        othresh: float
+            Overlap fraction threshold to link two features.
+        fillval: int
+            Fill value for the output arrays.
+
+    Returns:
+        reference_forward_index: np.ndarray(int)
+            New feature numbers linked to each reference feature, dimensions: [1, nreference, nmaxlinks].
+        reference_forward_size: np.ndarray(int)
+            Number of pixels of the linked new features, dimensions: [1, nreference, nmaxlinks].
+        new_backward_index: np.ndarray(int)
+            Reference feature numbers linked to each new feature, dimensions: [1, nnew, nmaxlinks].
+        new_backward_size: np.ndarray(int)
+            Number of pixels of the linked reference features, dimensions: [1, nnew, nmaxlinks].
+    """
+    reference_number = np.asarray(reference_number).ravel()
+    new_number = np.asarray(new_number).ravel()
+    # Number of features may be read from file as a 1-element array
+    nreference = int(np.squeeze(nreference))
+    nnew = int(np.squeeze(nnew))
+
+    # Shift labels to start from 0 for counting (missing values may be negative)
+    ref_offset = min(np.min(reference_number, initial=0), 0)
+    new_offset = min(np.min(new_number, initial=0), 0)
+    ref_idx = reference_number - ref_offset
+    new_idx = new_number - new_offset
+
+    # Count number of pixels for each label
+    ref_npix = np.bincount(ref_idx)
+    new_npix = np.bincount(new_idx)
+
+    # Count overlapping pixels for each reference-new label pair
+    mask = (reference_number != 0) & (new_number != 0)
+    overlap = coo_matrix(
+        (np.ones(np.count_nonzero(mask), dtype=np.int64), (ref_idx[mask], new_idx[mask])),
+        shape=(len(ref_npix), len(new_npix)),
+    ).tocsr()
+    overlap.sum_duplicates()
+    overlap.sort_indices()
+
+    # Forward: reference rows, new columns
+    reference_forward_index, reference_forward_size = _select_overlap_links(
+        overlap, ref_offset, new_offset, ref_npix, new_npix,
+        nreference, nmaxlinks, othresh, fillval,
+        "More than " + str(int(nmaxlinks)) + " clouds in new file match with reference cloud?!",
+    )
+    # Backward: new rows, reference columns
+    overlap = overlap.T.tocsr()
+    overlap.sort_indices()
+    new_backward_index, new_backward_size = _select_overlap_links(
+        overlap, new_offset, ref_offset, new_npix, ref_npix,
+        nnew, nmaxlinks, othresh, fillval,
+        "More than " + str(int(nmaxlinks)) + " clouds in reference file match with new cloud?!",
+    )
+
+    return (
+        reference_forward_index,
+        reference_forward_size,
+        new_backward_index,
+        new_backward_size,
+    )
+
+
+def _select_overlap_links(
+    overlap,
+    row_offset,
+    col_offset,
+    row_npix,
+    col_npix,
+    nrows,
+    nmaxlinks,
+    othresh,
+    fillval,
+    exit_message,
+):
+    """
+    Selects links passing the overlap threshold from a sparse overlap matrix.
+
+    Args:
+        overlap: scipy.sparse.csr_matrix
+            Overlap pixel counts, with sorted column indices in each row.
+        row_offset: int
+            Label value of row 0.
+        col_offset: int
+            Label value of column 0.
+        row_npix: np.ndarray(int)
+            Number of pixels for each row label.
+        col_npix: np.ndarray(int)
+            Number of pixels for each column label.
+        nrows: int
+            Number of output rows, for labels 1 to nrows.
+        nmaxlinks: int
+            Maximum number of links per row.
+        othresh: float
+            Overlap fraction threshold.
+        fillval: int
+            Fill value for the output arrays.
+        exit_message: string
+            Message when a row has more than nmaxlinks links.
+
+    Returns:
+        link_index: np.ndarray(int)
+            Linked column labels, dimensions: [1, nrows, nmaxlinks].
+        link_size: np.ndarray(int)
+            Number of pixels of the linked column labels, dimensions: [1, nrows, nmaxlinks].
+    """
+    link_index = np.full((1, int(nrows), int(nmaxlinks)), fillval, dtype=int)
+    link_size = np.full((1, int(nrows), int(nmaxlinks)), fillval, dtype=int)
+
+    # Expand the sparse matrix to (row, column, count) entries, ordered by row then column
+    row_idx = np.repeat(np.arange(overlap.shape[0]), np.diff(overlap.indptr))
+    col_idx = overlap.indices
+    row_label = row_idx + row_offset
+
+    # Keep rows within the output range that satisfy the overlap requirement
+    valid = (row_label >= 1) & (row_label <= nrows)
+    valid[valid] = (overlap.data[valid] / row_npix[row_idx[valid]].astype(float)) > othresh
+    row_label = row_label[valid]
+    col_idx = col_idx[valid]
+
+    if len(row_label) > 0:
+        # Position of each link within its row
+        link_rank = np.arange(len(row_label)) - np.searchsorted(row_label, row_label, side="left")
+        if np.max(link_rank) >= nmaxlinks:
+            sys.exit(exit_message)
+        link_index[0, row_label - 1, link_rank] = col_idx + col_offset
+        link_size[0, row_label - 1, link_rank] = col_npix[col_idx]
+
+    return link_index, link_size
+
+
 def olr_to_tb(OLR):
     """
     Convert OLR to IR brightness temperature.
@@ -416,7 +520,7 @@ def get_neighborhood(point, grid):
     return next_points  # Would probably be faster to pass in deque and directly add rather than a sublist.
 
 
-def grow_cells(grid):
+def grow_cells(grid, method="numba"):
     """
     Fast algorithm to grow and label areas based on nearest distance to the seeded regions.
 
@@ -424,11 +528,29 @@ def grow_cells(grid):
         grid: np.array
             Array containing labeled seeded regions (values > 0).
             Areas for growing = 0, areas excluded = -1.
+        method: string, optional, default="numba"
+            Implementation to use: 'numba' (compiled, falls back to 'numpy' if numba is not installed),
+            'numpy' (vectorized), or 'python'.
 
     Returns:
         grid: np.array
             Array containing labels after growth.
     """
+    global _numba_fallback_logged
+    logger = logging.getLogger(__name__)
+    if method == "numba":
+        if NUMBA_AVAILABLE:
+            return grow_cells_numba(grid)
+        if not _numba_fallback_logged:
+            logger.warning("numba is not installed, grow_cells uses the NumPy implementation.")
+            _numba_fallback_logged = True
+        return grow_cells_numpy(grid)
+    elif method == "numpy":
+        return grow_cells_numpy(grid)
+    elif method != "python":
+        logger.critical(f"Error: unknown grow_cells method: {method}")
+        sys.exit("Code exits in grow_cells.")
+
     seed_points = np.where(grid > 0)
     point_que = deque(
         [
@@ -458,6 +580,188 @@ def grow_cells(grid):
     return grid
 
 
+def grow_cells_numba(grid):
+    """
+    Compiled version of grow_cells, producing identical output.
+
+    Args:
+        grid: np.array
+            Array containing labeled seeded regions (values > 0).
+            Areas for growing = 0, areas excluded = -1.
+
+    Returns:
+        grid: np.array
+            Array containing labels after growth.
+    """
+    seed_points = np.where(grid > 0)
+    # Use the same seed points queue as the Python implementation
+    nseeds = np.count_nonzero(seed_points[0])
+    _grow_cells_kernel(grid, seed_points[0][:nseeds], seed_points[1][:nseeds])
+    return grid
+
+
+def grow_cells_numpy(grid):
+    """
+    Vectorized NumPy version of grow_cells, producing identical output.
+
+    The breadth-first queue is processed one layer at a time, a layer being the points added to the queue
+    by the points of the previous layer, in the same order. Each point takes the mode of the labels in its
+    3x3 neighborhood from the previous layers and from the points before it in the same layer.
+    Points that depend on labels not resolved yet in the same layer are resolved in further passes.
+
+    Args:
+        grid: np.array
+            Array containing labeled seeded regions (values > 0).
+            Areas for growing = 0, areas excluded = -1.
+
+    Returns:
+        grid: np.array
+            Array containing labels after growth.
+    """
+    ny, nx = grid.shape
+    seed_points = np.where(grid > 0)
+    # Use the same seed points queue as the Python implementation
+    nseeds = np.count_nonzero(seed_points[0])
+    # Pad the grid with excluded points, so that all neighbors are within the flattened array
+    nxp = nx + 2
+    pad_grid = np.full((ny + 2, nxp), -1, dtype=np.int64)
+    pad_grid[1:-1, 1:-1] = grid
+    flat_grid = pad_grid.reshape(-1)
+    # Flattened index offsets of the neighbors, in the order they are added to the queue,
+    # and of the 3x3 neighborhood
+    offsets = np.array([dy * nxp + dx for dy in range(-1, 2) for dx in range(-1, 2) if (dy != 0) | (dx != 0)])
+    offsets9 = np.array([dy * nxp + dx for dy in range(-1, 2) for dx in range(-1, 2)])
+    # Position of the points in the current layer, -1 for other points
+    layer_rank = np.full(flat_grid.size, -1, dtype=np.int64)
+
+    layer = (seed_points[0][:nseeds] + 1) * nxp + seed_points[1][:nseeds] + 1
+    while True:
+        # Add the unlabeled neighbors to the next layer, in the order they are first found
+        neighbors = (layer[:, None] + offsets[None, :]).ravel()
+        neighbors = neighbors[flat_grid[neighbors] == 0]
+        _, first_index = np.unique(neighbors, return_index=True)
+        layer = neighbors[np.sort(first_index)]
+        if len(layer) == 0:
+            break
+        flat_grid[layer] = -1
+
+        # Label the layer
+        npoints = len(layer)
+        layer_rank[layer] = np.arange(npoints)
+        neighbor_rank = layer_rank[layer[:, None] + offsets9[None, :]]
+        # Labels from the previous layers, and neighbors before each point in the same layer
+        known_labels = np.where(neighbor_rank >= 0, 0, flat_grid[layer[:, None] + offsets9[None, :]])
+        known_labels[known_labels < 0] = 0
+        before = (neighbor_rank >= 0) & (neighbor_rank < np.arange(npoints)[:, None])
+        neighbor_rank[~before] = 0
+        layer_labels = np.zeros(npoints, dtype=np.int64)
+        unresolved = np.ones(npoints, dtype=bool)
+        while np.any(unresolved):
+            ipoint = np.flatnonzero(unresolved)
+            irank = neighbor_rank[ipoint]
+            ibefore = before[ipoint]
+            labels = known_labels[ipoint] + np.where(ibefore, layer_labels[irank], 0)
+            nunknown = np.count_nonzero(ibefore & unresolved[irank], axis=1)
+            # Mode of the labels, the smallest label for ties
+            labels = np.sort(labels, axis=1)
+            counts = np.count_nonzero(labels[:, :, None] == labels[:, None, :], axis=2)
+            counts[labels == 0] = 0
+            imode = np.argmax(counts, axis=1)
+            mode_label = labels[np.arange(len(ipoint)), imode]
+            mode_count = counts[np.arange(len(ipoint)), imode]
+            other_count = np.max(np.where(labels != mode_label[:, None], counts, 0), axis=1)
+            # The mode is final if the unresolved neighbors cannot change it
+            resolved = (nunknown == 0) | (mode_count > other_count + nunknown)
+            layer_labels[ipoint[resolved]] = mode_label[resolved]
+            unresolved[ipoint[resolved]] = False
+        flat_grid[layer] = layer_labels
+        layer_rank[layer] = -1
+
+    grid[:, :] = pad_grid[1:-1, 1:-1]
+    return grid
+
+
+def _grow_cells_queue(grid, seed_y, seed_x):
+    """
+    Grow labels from a queue of seed points in place (breadth-first).
+
+    Each point takes the most frequent label (smallest label for ties) among its 3x3 neighborhood
+    when it is removed from the queue, same as grow_cells.
+
+    Args:
+        grid: np.array
+            Array containing labeled seeded regions (values > 0).
+            Areas for growing = 0, areas excluded = -1.
+        seed_y: np.array
+            Row indices of the seed points.
+        seed_x: np.array
+            Column indices of the seed points.
+
+    Returns:
+        None.
+    """
+    ny, nx = grid.shape
+    nseeds = len(seed_y)
+    # Each unlabeled point is added to the queue at most once
+    queue_y = np.empty(nseeds + ny * nx, dtype=np.int64)
+    queue_x = np.empty(nseeds + ny * nx, dtype=np.int64)
+    queue_y[:nseeds] = seed_y
+    queue_x[:nseeds] = seed_x
+    head = 0
+    tail = nseeds
+    neighbor_labels = np.zeros(9, dtype=np.int64)
+    neighbor_counts = np.zeros(9, dtype=np.int64)
+    while head < tail:
+        y = queue_y[head]
+        x = queue_x[head]
+        head += 1
+        # Add unlabeled neighbors to the queue
+        for dy in range(-1, 2):
+            for dx in range(-1, 2):
+                yy = y + dy
+                xx = x + dx
+                if yy < 0 or yy >= ny or xx < 0 or xx >= nx:
+                    continue
+                if dy == 0 and dx == 0:
+                    continue
+                if grid[yy, xx] == 0:
+                    grid[yy, xx] = -1
+                    queue_y[tail] = yy
+                    queue_x[tail] = xx
+                    tail += 1
+        # Label the point with the mode of the labeled neighbors
+        if grid[y, x] < 1:
+            nlabels = 0
+            for yy in range(max(y - 1, 0), min(y + 2, ny)):
+                for xx in range(max(x - 1, 0), min(x + 2, nx)):
+                    value = grid[yy, xx]
+                    if value > 0:
+                        for ilabel in range(nlabels):
+                            if neighbor_labels[ilabel] == value:
+                                neighbor_counts[ilabel] += 1
+                                break
+                        else:
+                            neighbor_labels[nlabels] = value
+                            neighbor_counts[nlabels] = 1
+                            nlabels += 1
+            if nlabels > 0:
+                mode_label = neighbor_labels[0]
+                mode_count = neighbor_counts[0]
+                for ilabel in range(1, nlabels):
+                    if (neighbor_counts[ilabel] > mode_count) or \
+                        (neighbor_counts[ilabel] == mode_count and neighbor_labels[ilabel] < mode_label):
+                        mode_label = neighbor_labels[ilabel]
+                        mode_count = neighbor_counts[ilabel]
+                grid[y, x] = mode_label
+
+
+_numba_fallback_logged = False
+if NUMBA_AVAILABLE:
+    _grow_cells_kernel = njit(cache=True)(_grow_cells_queue)
+else:
+    _grow_cells_kernel = _grow_cells_queue
+
+
 def skimage_watershed(fvar, config):
     """
     Label objects with skimage.watershed function
@@ -818,6 +1122,164 @@ def get_cloud_boundary(icloudlocationx, icloudlocationy, xdim, ydim):
         maxx = maxx + buffer + 1
     return maxx, maxy, minx, miny
 
+#-----------------------------------------------------------------------
+def get_label_pixel_index(labelmap):
+    """
+    Make an index of the pixel locations of all labels in a 2D labeled array.
+
+    The labeled pixels are sorted by label once, so the pixels of any label are found
+    in O(number of pixels of the label) with get_label_pixels.
+
+    Args:
+        labelmap: numpy array
+            Labeled 2D array, labels > 0.
+
+    Returns:
+        pixel_index: dictionary
+            Dictionary containing flattened pixel indices sorted by label (pixel_indices),
+            start index (label_start) and number of pixels (label_npix) of each label,
+            and shape of the labeled array (shape).
+    """
+    labelmap1d = np.ravel(labelmap)
+    # Sort labeled pixels by label, stable sort keeps pixels of each label in the order of np.where
+    pixel_indices = np.flatnonzero(labelmap1d > 0)
+    labels = labelmap1d[pixel_indices].astype(np.int64)
+    isort = np.argsort(labels, kind="stable")
+    label_npix = np.bincount(labels, minlength=1)
+    pixel_index = {
+        "pixel_indices": pixel_indices[isort],
+        "label_start": np.cumsum(label_npix) - label_npix,
+        "label_npix": label_npix,
+        "shape": np.shape(labelmap),
+    }
+    return pixel_index
+
+#-----------------------------------------------------------------------
+def get_label_pixels(pixel_index, labels):
+    """
+    Get pixel locations of labels from a pixel index.
+
+    Args:
+        pixel_index: dictionary
+            Pixel index from get_label_pixel_index.
+        labels: numpy array
+            Labels to get pixel locations, labels not in the labeled array have no pixels.
+
+    Returns:
+        locationy: numpy array
+            Pixel location indices in y-direction, concatenated in the order of labels.
+        locationx: numpy array
+            Pixel location indices in x-direction, concatenated in the order of labels.
+    """
+    label_npix = pixel_index["label_npix"]
+    labels = np.atleast_1d(labels)
+    # Keep labels within the labeled array
+    labels = labels[(labels > 0) & (labels < len(label_npix))].astype(np.int64)
+    pixel_indices = np.concatenate([
+        pixel_index["pixel_indices"][pixel_index["label_start"][ilabel]:
+                                     pixel_index["label_start"][ilabel] + label_npix[ilabel]]
+        for ilabel in labels
+    ] + [np.zeros(0, dtype=np.int64)])
+    locationy, locationx = np.unravel_index(pixel_indices, pixel_index["shape"])
+    return locationy, locationx
+
+#-----------------------------------------------------------------------
+def calc_label_shape_stats(labelmap, nlabels, intensity_image, pixel_radius):
+    """
+    Calculate shape statistics of labeled features 1 to nlabels together.
+
+    Args:
+        labelmap: numpy array
+            Labeled 2D array.
+        nlabels: int
+            Number of labels to calculate statistics.
+        intensity_image: numpy array
+            Intensity image for weighted centroids, same shape as labelmap.
+        pixel_radius: float
+            Pixel radius.
+
+    Returns:
+        shape_stats_dict: dictionary
+            Dictionary containing shape statistics of each label, dimensions: [nlabels].
+            Lengths are scaled by pixel_radius and orientation is in degrees.
+            Centroids are indices in the labeled array.
+    """
+    labelmap = np.where(labelmap <= nlabels, labelmap, 0)
+    props = regionprops_table(
+        labelmap,
+        intensity_image=intensity_image,
+        properties=(
+            "label", "eccentricity", "inertia_tensor_eigvals", "orientation",
+            "perimeter", "centroid", "centroid_weighted",
+        ),
+    )
+    ilabel = props["label"] - 1
+    shape_stats_dict = {}
+    for key, value in {
+        "eccentricity": props["eccentricity"],
+        "majoraxis": (4 * np.sqrt(props["inertia_tensor_eigvals-0"])) * pixel_radius,
+        # Minor axis length is undefined if the eigenvalue is negative due to numerical error
+        "minoraxis": np.where(
+            props["inertia_tensor_eigvals-1"] >= 0,
+            (4 * np.sqrt(np.abs(props["inertia_tensor_eigvals-1"]))) * pixel_radius,
+            np.nan,
+        ),
+        "orientation": props["orientation"] * (180 / float(np.pi)),
+        "perimeter": props["perimeter"] * pixel_radius,
+        "ycentroid": props["centroid-0"],
+        "xcentroid": props["centroid-1"],
+        "yweightedcentroid": props["centroid_weighted-0"],
+        "xweightedcentroid": props["centroid_weighted-1"],
+    }.items():
+        shape_stats_dict[key] = np.full(nlabels, np.nan, dtype=float)
+        shape_stats_dict[key][ilabel] = value
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shape_stats_dict["aspectratio"] = np.divide(
+            shape_stats_dict["majoraxis"], shape_stats_dict["minoraxis"]
+        )
+    return shape_stats_dict
+
+#-----------------------------------------------------------------------
+def get_centroid_latlon(ycentroid, xcentroid, miny, minx, lat, lon, fillval_f):
+    """
+    Get lat/lon of centroids in a subset of the full domain.
+
+    Args:
+        ycentroid: numpy array
+            Centroid y-indices in the subset.
+        xcentroid: numpy array
+            Centroid x-indices in the subset.
+        miny: int
+            Lower-left corner Y index of the subset.
+        minx: int
+            Lower-left corner X index of the subset.
+        lat: numpy array
+            2D latitude array of the full domain.
+        lon: numpy array
+            2D longitude array of the full domain.
+        fillval_f: float
+            Fill value for centroids outside of the domain.
+
+    Returns:
+        centroid_lon: numpy array
+            Centroid longitude.
+        centroid_lat: numpy array
+            Centroid latitude.
+    """
+    ny, nx = lon.shape
+    centroid_lon = np.full(len(ycentroid), fillval_f, dtype=float)
+    centroid_lat = np.full(len(ycentroid), fillval_f, dtype=float)
+    # Shift the centroids by minx/miny, round the centroid values as indices
+    valid = np.isfinite(ycentroid) & np.isfinite(xcentroid)
+    iy = np.round(ycentroid[valid] + miny).astype(int)
+    ix = np.round(xcentroid[valid] + minx).astype(int)
+    # Apply the indices within the domain to get centroid lat/lon
+    inside = (0 < iy) & (iy < ny) & (0 < ix) & (ix < nx)
+    ivalid = np.flatnonzero(valid)[inside]
+    centroid_lon[ivalid] = lon[iy[inside], ix[inside]]
+    centroid_lat[ivalid] = lat[iy[inside], ix[inside]]
+    return centroid_lon, centroid_lat
+
 #-----------------------------------------------------------------------
 def find_max_indices_to_roll(mask_map, xdim, ydim):
     """
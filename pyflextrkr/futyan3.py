@@ -3,6 +3,7 @@ def futyan3(ir, pixel_radius, tb_threshs, area_thresh, warmanvilexpansion):
     # Import modules
     import numpy as np
     from scipy.ndimage import label, binary_dilation, generate_binary_structure
+    from pyflextrkr.ft_utilities import FLAG_DTYPE, get_label_dtype
 
     ######################################################################
     # Define constants:
@@ -20,7 +21,7 @@ def futyan3(ir, pixel_radius, tb_threshs, area_thresh, warmanvilexpansion):
 
     ######################################################################
     # Use thresholds to make a map of all brightnes temperatures that fit within the criteria for convective, cold anvil, and warm anvil points. Cores = 1. Cold anvils = 2. Warm anvils = 3. Other = 4. Clear = 5. Areas do not overlap
-    final_cloudtype = np.ones((ny, nx), dtype=int) * -1
+    final_cloudtype = np.full((ny, nx), -1, dtype=FLAG_DTYPE)
     final_cloudtype[np.where(ir < thresh_core)] = 1
     final_cloudtype[np.where((ir >= thresh_core) & (ir < thresh_cold))] = 2
     final_cloudtype[np.where((ir >= thresh_cold) & (ir < thresh_warm))] = 3
@@ -29,7 +30,7 @@ def futyan3(ir, pixel_radius, tb_threshs, area_thresh, warmanvilexpansion):
 
     ######################################################################
     # Create map of potential features to track. These features encompass the cores and cold anvils
-    convective_flag = np.zeros((ny, nx), dtype=int)
+    convective_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     convective_flag[ir < thresh_cold] = 1
 
     #####################################################################
@@ -77,7 +78,7 @@ def futyan3(ir, pixel_radius, tb_threshs, area_thresh, warmanvilexpansion):
             final_convarea = approved_convarea[ordered]
 
             # Create a map of the new labels. Needed for get warm anvil portion portion
-            final_cloudnumber = np.zeros((ny, nx), dtype=int)
+            final_cloudnumber = np.zeros((ny, nx), dtype=get_label_dtype(approved_number))
             for corrected, ifeature in enumerate(approved_convnumber):
                 final_cloudnumber[np.where(convective_label == ifeature)] = (
                     corrected + 1
@@ -3,14 +3,22 @@ import time
 import sys
 import os
 from netCDF4 import Dataset
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 import xarray as xr
 import logging
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, match_drift_times, get_netcdf_encoding, \
+    get_label_dtype, get_flag_dtype
+from pyflextrkr.cloudid_store import subset_cloudid_files, open_cloudid
+from pyflextrkr.tracksingle_drift import stream_singletrack_links
 
 def gettracknumbers(config):
     """
     Track features sequentially from the single track files.
 
+    If link_and_number is set in config, features are linked while streaming the cloudid files
+    in time order instead of reading the single track files (Step 2 is not needed).
+
     Arguments:
         config: dictionary
             Dictionary containing config parameters.
@@ -28,11 +36,13 @@ def gettracknumbers(config):
     startdate = config["startdate"]
     enddate = config["enddate"]
     timegap = config["timegap"]
-    maxnclouds = config["maxnclouds"]
     featuresize_varname = config.get("featuresize_varname", "npix_feature")
     start_basetime = config["start_basetime"]
     end_basetime = config["end_basetime"]
     fillval = config["fillval"]
+    cloudid_filebase = config.get("cloudid_filebase", None)
+    driftfile = config.get("driftfile", None)
+    link_and_number = config.get("link_and_number", False)
 
     logger = logging.getLogger(__name__)
     np.set_printoptions(threshold=np.inf)
@@ -41,129 +51,106 @@ def gettracknumbers(config):
     # Set track numbers output file name
     tracknumbers_outfile = f"{stats_outpath}{tracknumbers_filebase}{startdate}_{enddate}.nc"
 
-    # Identify files to process
-    files, \
-    files_basetime, \
-    files_datestring, \
-    files_timestring = subset_files_timerange(tracking_outpath,
-                                              singletrack_filebase,
-                                              start_basetime,
-                                              end_basetime)
+    if link_and_number:
+        # Link features while streaming the cloudid files, without reading single track files
+        logger.info('Linking features in cloudid files (link_and_number mode)')
+        cloudidfiles, \
+        cloudidfiles_basetime, \
+        cloudidfiles_datestring, \
+        cloudidfiles_timestring = subset_cloudid_files(config,
+                                                       start_basetime,
+                                                       end_basetime)
+        # Match advection data times with cloudid times
+        drift_data = None
+        if driftfile is not None:
+            datetime_drift_match, \
+            xdrifts_match, \
+            ydrifts_match = match_drift_times(cloudidfiles_datestring,
+                                              cloudidfiles_timestring,
+                                              driftfile=driftfile)
+            drift_data = list(zip(datetime_drift_match, xdrifts_match, ydrifts_match))
+        nfiles = len(cloudidfiles) - 1
+        singletracks = stream_singletrack_links(
+            cloudidfiles, cloudidfiles_basetime, config, drift_data=drift_data,
+        )
+    else:
+        # Identify files to process
+        files, \
+        files_basetime, \
+        files_datestring, \
+        files_timestring = subset_files_timerange(tracking_outpath,
+                                                  singletrack_filebase,
+                                                  start_basetime,
+                                                  end_basetime)
+        nfiles = len(files)
+        singletracks = read_singletrack_files(files, config)
 
     ############################################################################
     # Initialize matrices
-    nfiles = len(files)
     logger.info(f"Total number of files to process: {nfiles}")
 
-    fillval_f = np.nan
-    missingfrac = 0.3
-    nfiles_m = int(nfiles*(1.+missingfrac))
-    tracknumber = np.full((1, nfiles_m, maxnclouds), fillval, dtype=int)
-    referencetrackstatus = np.full((nfiles_m, maxnclouds), fillval_f, dtype=float)
-    newtrackstatus = np.full((nfiles_m, maxnclouds), fillval_f, dtype=float)
-    trackstatus = np.full((1, nfiles_m, maxnclouds), fillval, dtype=int)
-    trackmergenumber = np.full((1, nfiles_m, maxnclouds), fillval, dtype=int)
-    tracksplitnumber = np.full((1, nfiles_m, maxnclouds), fillval, dtype=int)
-    basetime = np.empty(nfiles_m, dtype="datetime64[s]")
-    trackreset = np.full((1, nfiles_m, maxnclouds), fillval, dtype=int)
-
-    ############################################################################
-    # Load first file
-    logger.debug("Processing first file")
-    logger.debug(f"tracking_outpath: {tracking_outpath}")
-    logger.debug(f"files[0]: {files[0]}")
-    # singletracking_data = Dataset(tracking_outpath + files[0], "r")
-    singletracking_data = Dataset(files[0], "r")
-
-    # Number of clouds in reference file
-    nclouds_reference = int(np.nanmax(singletracking_data["nclouds_ref"][:]) + 1)
-    basetime_ref = singletracking_data["basetime_ref"][:]
-    ref_file = f"{tracking_outpath}{singletracking_data.getncattr('ref_file')}"
-    singletracking_data.close()
-
-    # Make sure number of clouds does not exceed maximum.
-    if nclouds_reference > maxnclouds:
-        logger.critical(f"Error: Number of clouds in reference file exceed allowed maximum number of clouds")
-        logger.critical(f"nclouds_reference: {nclouds_reference}, nmaxclouds: {maxnclouds}")
-        logger.critical("Increase maxnclouds in the config file.")
-        sys.exit("Code exits in gettracks.py")
-
-    # Isolate file name and add it to the filelist
-    basetime[0] = basetime_ref.item()
-
-    temp_referencefile = os.path.basename(ref_file)
-    strlength = len(temp_referencefile)
-    cloudidfiles = np.chararray((nfiles_m, int(strlength)))
-    cloudidfiles[0, :] = list(os.path.basename(ref_file))
-
-    # Initate track numbers
-    tracknumber[0, 0, 0 : int(nclouds_reference)] = (
-        np.arange(0, int(nclouds_reference)) + 1
-    )
-    itrack = nclouds_reference + 1
-
-    # Record that the tracks are being reset / initialized
-    trackreset[0, 0, :] = 1
+    # Each time index (cloudid file) holds one row sized to the number of clouds in that file
+    tracknumber = []
+    referencetrackstatus = []
+    newtrackstatus = []
+    trackmergenumber = []
+    tracksplitnumber = []
+    trackreset = []
+    basetime = []
+    cloudidfile_names = []
 
     ###########################################################################
     # Loop over files and generate tracks
-    logger.debug("Loop through the rest of the files")
+    logger.debug("Loop through the files")
     logger.debug(f"Number of files: {str(nfiles)}")
     logger.debug((time.ctime()))
     ifill = 0
+    ifile = -1
 
-    for ifile in range(0, nfiles):
-        logger.info(os.path.basename(files[ifile]))
+    for ifile, singletrack in enumerate(singletracks):
+        logger.info(singletrack["new_file"])
 
         ######################################################################
-        # Load single track file
-        # logger.debug('Load track data')
-        # logger.debug((time.ctime()))
-        # singletracking_data = Dataset(tracking_outpath + files[ifile], "r")
-        singletracking_data = Dataset(files[ifile], "r")
+        # Get linking information of this pair of files
         # Number of clouds in reference file
-        nclouds_reference = int(np.nanmax(singletracking_data["nclouds_ref"][:]) + 1)
-        nclouds_new = int(np.nanmax(singletracking_data["nclouds_new"][:]) + 1)
-        basetime_ref = singletracking_data["basetime_ref"][:]
-        basetime_new = singletracking_data["basetime_new"][:]
+        nclouds_reference = int(singletrack["nclouds_ref"])
         # Number of clouds in new file
-        refcloud_forward_index = singletracking_data["refcloud_forward_index"][:].astype(int)
+        nclouds_new = int(singletrack["nclouds_new"])
+        basetime_ref = singletrack["basetime_ref"]
+        basetime_new = singletrack["basetime_new"]
+        refcloud_forward_index = singletrack["refcloud_forward_index"]
         # Each row represents a cloud in the reference file and
         # the numbers in that row are indices of clouds in new file linked that cloud in the reference file
-        newcloud_backward_index = singletracking_data["newcloud_backward_index"][:].astype(int)
+        newcloud_backward_index = singletrack["newcloud_backward_index"]
         # Each row represents a cloud in the new file and
         # the numbers in that row are indices of clouds in the reference file linked that cloud in the new file
-        ref_file = f"{tracking_outpath}{singletracking_data.getncattr('ref_file')}"
-        new_file = f"{tracking_outpath}{singletracking_data.getncattr('new_file')}"
-        ref_date = f"{singletracking_data.getncattr('ref_date')}"
-        new_date = f"{singletracking_data.getncattr('new_date')}"
-
-        singletracking_data.close()
-
-        # Make sure number of clouds does not exceed maximum
-        if nclouds_reference > maxnclouds:
-            logger.critical(f"Error: Number of clouds in reference file exceed allowed maximum number of clouds")
-            logger.critical(f"nclouds_reference: {nclouds_reference}, nmaxclouds: {maxnclouds}")
-            logger.critical("Increase maxnclouds in the config file.")
-            sys.exit("Code exits in gettracks.py")
-
-        ########################################################################
-        # Load cloudid files
-        # logger.debug('Load cloudid files')
-        # logger.debug((time.ctime()))
-        # Reference cloudid file
-        referencecloudid_data = Dataset(ref_file, "r")
-        npix_reference = referencecloudid_data[featuresize_varname][:]
-        referencecloudid_data.close()
-
-        # New cloudid file
-        newcloudid_data = Dataset(new_file, "r")
-        npix_new = newcloudid_data[featuresize_varname][:]
-        newcloudid_data.close()
-
-        # Remove possible extra time dimension to make sure npix is a 1D array
-        # npix_reference = npix_reference.squeeze()
-        # npix_new = npix_new.squeeze()
+        ref_file = singletrack["ref_file"]
+        new_file = singletrack["new_file"]
+        ref_date = singletrack["ref_date"]
+        new_date = singletrack["new_date"]
+        npix_reference = singletrack["npix_ref"]
+        npix_new = singletrack["npix_new"]
+
+        if ifile == 0:
+            ####################################################################
+            # Initialize tracks using the first reference file
+            logger.debug("Processing first file")
+            # Isolate file name and add it to the filelist
+            basetime.append(basetime_ref.item())
+            cloudidfile_names.append(ref_file)
+            append_file_rows(
+                nclouds_reference, fillval, tracknumber, referencetrackstatus, newtrackstatus,
+                trackmergenumber, tracksplitnumber, trackreset,
+            )
+
+            # Initate track numbers
+            tracknumber[0][0 : int(nclouds_reference)] = (
+                np.arange(0, int(nclouds_reference)) + 1
+            )
+            itrack = nclouds_reference + 1
+
+            # Record that the tracks are being reset / initialized
+            trackreset[0][:] = 1
 
         ########################################################################
         # Check time gap between consecutive track files
@@ -189,141 +176,57 @@ def gettracknumbers(config):
                 logger.info(f"New track starts on: {new_date}")
 
                 # Flag the previous file as the last file
-                trackreset[0, ifill, :] = 2
+                trackreset[ifill][:] = 2
 
                 # No need to skip time index (discussed with Jianfeng Li, Zhe Feng, 5/20/2024)
                 # ifill = ifill + 2
                 ifill = ifill + 1
 
                 # Fill tracking matrices with reference data and record that the track ended
-                cloudidfiles[ifill, :] = list(os.path.basename(ref_file))
-                basetime[ifill] = basetime_ref.item()
+                cloudidfile_names.append(ref_file)
+                basetime.append(basetime_ref.item())
+                append_file_rows(
+                    nclouds_reference, fillval, tracknumber, referencetrackstatus, newtrackstatus,
+                    trackmergenumber, tracksplitnumber, trackreset,
+                )
 
                 # Record that break in data occurs
-                trackreset[0, ifill, :] = 1
+                trackreset[ifill][:] = 1
 
                 # Treat all clouds in the reference file as new clouds
                 for ncr in range(1, nclouds_reference + 1):
-                    tracknumber[0, ifill, ncr - 1] = itrack
+                    tracknumber[ifill][ncr - 1] = itrack
                     itrack = itrack + 1
 
         time_prev = time_new
-        cloudidfiles[ifill + 1, :] = list(os.path.basename(new_file))
-        basetime[ifill + 1] = basetime_new.item()
+        cloudidfile_names.append(new_file)
+        basetime.append(basetime_new.item())
+        append_file_rows(
+            nclouds_new, fillval, tracknumber, referencetrackstatus, newtrackstatus,
+            trackmergenumber, tracksplitnumber, trackreset,
+        )
 
         ########################################################################################
         # Compare forward and backward single track matirces to link new and reference clouds
+        # Build a directed graph linking reference and new clouds, and label its components
+        link_graph = get_link_graph(
+            refcloud_forward_index, newcloud_backward_index, nclouds_reference, nclouds_new,
+        )
         # Intiailize matrix for this time period
-        # logger.debug('Generating tracks')
-        # logger.debug((time.ctime()))
         trackfound = np.ones(nclouds_reference + 1, dtype=int) * -9999
 
         # Loop over all reference clouds
-        # logger.debug('Looping over all clouds in the reference file')
-        # logger.debug(('Number of clouds to process: ' + str(nclouds_reference)))
-        # logger.debug((time.ctime()))
         for ncr in np.arange(
             1, nclouds_reference + 1
         ):  # Looping over each reference cloud. Start at 1 since clouds numbered starting at 1.
-            # logger.debug(('Reference cloud #: ' + str(ncr)))
-            # logger.debug((time.ctime()))
             if trackfound[ncr - 1] < 1:
 
                 # Find all clouds (both forward and backward) associated with this reference cloud
-                nreferenceclouds = 0
-                ntemp_referenceclouds = 1  # Start by forcing to see if track exists
-                temp_referenceclouds = [ncr]
-
-                trackpresent = 0
-                # logger.debug('Finding all associated clouds')
-                # logger.debug((time.ctime()))
-                while ntemp_referenceclouds > nreferenceclouds:
-                    associated_referenceclouds = np.copy(temp_referenceclouds).astype(
-                        int
-                    )
-                    nreferenceclouds = ntemp_referenceclouds
-
-                    for nr in range(0, nreferenceclouds):
-                        # logger.debug(('Processing cloud #: ' + str(nr)))
-                        # logger.debug((time.ctime()))
-                        tempncr = associated_referenceclouds[nr]
-
-                        # Find indices of forward linked clouds.
-                        # Need to subtract one since looping based on core number and
-                        # since python starts with indices at zero.
-                        # Row of that core is one less than its number.
-                        newforwardindex = np.array(
-                            np.where(refcloud_forward_index[0, tempncr - 1, :] > 0)
-                        )
-                        nnewforward = np.shape(newforwardindex)[1]
-                        if nnewforward > 0:
-                            core_newforward = refcloud_forward_index[
-                                0, tempncr - 1, newforwardindex[0, :]
-                            ]
-
-                        # Find indices of backwards linked clouds
-                        newbackwardindex = np.array(
-                            np.where(newcloud_backward_index[0, :, :] == tempncr)
-                        )
-                        nnewbackward = np.shape(newbackwardindex)[1]
-                        if nnewbackward > 0:
-                            # Need to add one since want the core index, which starts at one.
-                            # But this is using that row number, which starts at zero.
-                            core_newbackward = (newbackwardindex[0, :] + 1)
-
-                        # Put all the indices associated with new clouds linked to the reference cloud in one vector
-                        if nnewforward > 0:
-                            if trackpresent == 0:
-                                associated_newclouds = core_newforward[:].astype(int)
-                                trackpresent = trackpresent + 1
-                            else:
-                                associated_newclouds = np.append(
-                                    associated_newclouds, core_newforward.astype(int)
-                                )
-
-                        if nnewbackward > 0:
-                            if trackpresent == 0:
-                                associated_newclouds = core_newbackward[:]
-                                trackpresent = trackpresent + 1
-                            else:
-                                associated_newclouds = np.append(
-                                    associated_newclouds, core_newbackward.astype(int)
-                                )
-
-                        if nnewbackward == 0 and nnewforward == 0:
-                            associated_newclouds = []
-
-                        # If the reference cloud is linked to a new cloud
-                        if trackpresent > 0:
-                            # Sort and find the unique new clouds associated with the reference cloud
-                            if len(associated_newclouds) > 1:
-                                associated_newclouds = np.unique(
-                                    np.sort(associated_newclouds)
-                                )
-                            nnewclouds = len(associated_newclouds)
-
-                            # Find reference clouds associated with each new cloud.
-                            # Look to see if these new clouds are linked to other cells in the reference file as well.
-                            for nnew in range(0, nnewclouds):
-                                # Find associated reference clouds
-                                referencecloudindex = np.array(
-                                    np.where(
-                                        refcloud_forward_index[0, :, :]
-                                        == associated_newclouds[nnew]
-                                    )
-                                )
-                                nassociatedreference = np.shape(referencecloudindex)[1]
-                                if nassociatedreference > 0:
-                                    temp_referenceclouds = np.append(
-                                        temp_referenceclouds, referencecloudindex[0] + 1
-                                    )
-                                    temp_referenceclouds = np.unique(
-                                        np.sort(temp_referenceclouds)
-                                    )
-
-                            ntemp_referenceclouds = len(temp_referenceclouds)
-                        else:
-                            nnewclouds = 0
+                associated_referenceclouds, associated_newclouds = get_associated_clouds(
+                    ncr, link_graph,
+                )
+                nreferenceclouds = len(associated_referenceclouds)
+                nnewclouds = len(associated_newclouds)
 
                 #################################################################
                 # Now get the track status
@@ -337,6 +240,7 @@ def gettracknumbers(config):
                     largestreferenceindex = np.argmax(allreferencepix)
                     # Cloud number of the largest reference cloud
                     largest_referencecloud = associated_referenceclouds[largestreferenceindex]
+                    largest_tracknumber = np.copy(tracknumber[ifill][largest_referencecloud - 1])
 
                     # Largest new cloud
                     # Need to subtract one since associated_newclouds gives cloud number and the matrix starts at zero
@@ -345,166 +249,67 @@ def gettracknumbers(config):
                     # Cloud number of the largest new cloud
                     largest_newcloud = associated_newclouds[largestnewindex]
 
+                    # Smaller reference clouds (merging) and smaller new clouds (splitting)
+                    small_referenceclouds = associated_referenceclouds[
+                        associated_referenceclouds != largest_referencecloud
+                    ]
+                    small_newclouds = associated_newclouds[
+                        associated_newclouds != largest_newcloud
+                    ]
+
                     if nnewclouds == 1 and nreferenceclouds == 1:
                         ############################################################
                         # Simple continuation
-
-                        # Check trackstatus already has a valid value.
-                        # This will prtrack splits from a previous step being overwritten
-
-                        # logger.debug(trackstatus[ifill,ncr-1])
-                        referencetrackstatus[ifill, ncr - 1] = 1
+                        referencetrackstatus[ifill][ncr - 1] = 1
                         trackfound[ncr - 1] = 1
-                        tracknumber[0, ifill + 1, associated_newclouds - 1] = np.copy(
-                            tracknumber[0, ifill, ncr - 1]
+                        tracknumber[ifill + 1][associated_newclouds - 1] = np.copy(
+                            tracknumber[ifill][ncr - 1]
                         )
 
                     elif nreferenceclouds > 1:
                         ##############################################################
                         # Merging only
-
-                        # Loop through the reference clouds and assign the track to the largest one,
-                        # the rest just go away
+                        # Assign the track to the largest reference cloud, the rest just go away
+                        trackfound[associated_referenceclouds - 1] = 1
                         if nnewclouds == 1:
-                            for tempreferencecloud in associated_referenceclouds:
-                                trackfound[tempreferencecloud - 1] = 1
-
-                                # If this reference cloud is the largest fragment of the merger,
-                                # label this reference time (file) as the larger part of merger (2)
-                                # and merging at the next time (ifile + 1)
-                                if tempreferencecloud == largest_referencecloud:
-                                    referencetrackstatus[
-                                        ifill, tempreferencecloud - 1
-                                    ] = 2
-                                    tracknumber[
-                                        0, ifill + 1, associated_newclouds - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
-                                # If this reference cloud is the smaller fragment of the merger,
-                                # label the reference time (ifile) as the small merger (12)
-                                # and merging at the next time (file + 1)
-                                else:
-                                    referencetrackstatus[
-                                        ifill, tempreferencecloud - 1
-                                    ] = 21
-                                    trackmergenumber[
-                                        0, ifill, tempreferencecloud - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
+                            # Label the largest reference cloud as the larger part of merger (2)
+                            # and merging at the next time (ifill + 1)
+                            referencetrackstatus[ifill][largest_referencecloud - 1] = 2
+                            tracknumber[ifill + 1][associated_newclouds - 1] = largest_tracknumber
+                            # Label the smaller reference clouds as the small merger (21)
+                            referencetrackstatus[ifill][small_referenceclouds - 1] = 21
+                            trackmergenumber[ifill][small_referenceclouds - 1] = largest_tracknumber
 
                         #################################################################
                         # Merging and spliting
                         else:
-
-                            # Loop over the reference clouds and assign the track the largest one
-                            for tempreferencecloud in associated_referenceclouds:
-                                trackfound[tempreferencecloud - 1] = 1
-
-                                # If this is the larger fragment ofthe merger,
-                                # label the reference time (ifill) as large merger (2)
-                                # and the actual merging track at the next time [ifill+1]
-                                if tempreferencecloud == largest_referencecloud:
-                                    referencetrackstatus[
-                                        ifill, tempreferencecloud - 1
-                                    ] = (2 + 13)
-                                    tracknumber[
-                                        0, ifill + 1, largest_newcloud - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
-                                # For the smaller fragment of the merger,
-                                # label the reference time (ifill) as the small merge and
-                                # have the actual merging occur at the next time (ifill+1)
-                                else:
-                                    referencetrackstatus[
-                                        ifill, tempreferencecloud - 1
-                                    ] = (21 + 13)
-                                    trackmergenumber[
-                                        0, ifill, tempreferencecloud - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
-
-                            # Loop through the new clouds and assign the smaller ones a new track
-                            for tempnewcloud in associated_newclouds:
-
-                                # For the smaller fragment of the split,
-                                # label the new time (ifill+1) as the small split
-                                # because the cloud only occurs at the new time step
-                                if tempnewcloud != largest_newcloud:
-                                    newtrackstatus[ifill + 1, tempnewcloud - 1] = 31
-
-                                    tracknumber[0, ifill + 1, tempnewcloud - 1] = itrack
-                                    itrack = itrack + 1
-
-                                    tracksplitnumber[
-                                        0, ifill + 1, tempnewcloud - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
-
-                                    trackreset[0, ifill + 1, tempnewcloud - 1] = 0
-                                # For the larger fragment of the split,
-                                # label the new time (ifill+1) as the large split
-                                # so that is consistent with the small fragments.
-                                # The track continues to follow this cloud so the tracknumber is not incramented.
-                                else:
-                                    newtrackstatus[ifill + 1, tempnewcloud - 1] = 3
-                                    tracknumber[
-                                        0, ifill + 1, tempnewcloud - 1
-                                    ] = np.copy(
-                                        tracknumber[
-                                            0, ifill, largest_referencecloud - 1
-                                        ]
-                                    )
+                            # Label the largest reference cloud as large merger (2)
+                            # and the actual merging track at the next time [ifill+1]
+                            referencetrackstatus[ifill][largest_referencecloud - 1] = (2 + 13)
+                            tracknumber[ifill + 1][largest_newcloud - 1] = largest_tracknumber
+                            # Label the smaller reference clouds as the small merge and
+                            # have the actual merging occur at the next time (ifill+1)
+                            referencetrackstatus[ifill][small_referenceclouds - 1] = (21 + 13)
+                            trackmergenumber[ifill][small_referenceclouds - 1] = largest_tracknumber
+
+                            # Assign the smaller new clouds a new track
+                            itrack = assign_split_tracks(
+                                small_newclouds, largest_newcloud, largest_tracknumber, itrack, ifill,
+                                tracknumber, newtrackstatus, tracksplitnumber, trackreset,
+                            )
 
                     #####################################################################
                     # Splitting only
                     elif nnewclouds > 1:
-                        # logger.debug('Splitting only')
-                        # logger.debug((time.ctime()))
                         # Label reference cloud as a pure split
-                        referencetrackstatus[ifill, ncr - 1] = 13
-                        tracknumber[0, ifill, ncr - 1] = np.copy(
-                            tracknumber[0, ifill, largest_referencecloud - 1]
-                        )
+                        referencetrackstatus[ifill][ncr - 1] = 13
+                        tracknumber[ifill][ncr - 1] = largest_tracknumber
 
-                        # Loop over the clouds and assign new tracks to the smaller ones
-                        for tempnewcloud in associated_newclouds:
-                            # For the smaller fragment of the split,
-                            # label the new time (ifill+1) as teh small split (13)
-                            # because the cloud only occurs at the new time.
-                            if tempnewcloud != largest_newcloud:
-                                newtrackstatus[ifill + 1, tempnewcloud - 1] = 31
-
-                                tracknumber[0, ifill + 1, tempnewcloud - 1] = itrack
-                                itrack = itrack + 1
-
-                                tracksplitnumber[
-                                    0, ifill + 1, tempnewcloud - 1
-                                ] = np.copy(tracknumber[0, ifill, ncr - 1])
-
-                                trackreset[0, ifill + 1, tempnewcloud - 1] = 0
-                            # For the larger fragment of the split,
-                            # label new time (ifill+1) as the large split (3)
-                            # so that is consistent with the small fragments
-                            else:
-                                newtrackstatus[ifill + 1, tempnewcloud - 1] = 3
-                                tracknumber[0, ifill + 1, tempnewcloud - 1] = np.copy(
-                                    tracknumber[0, ifill, ncr - 1]
-                                )
+                        # Assign the smaller new clouds a new track
+                        itrack = assign_split_tracks(
+                            small_newclouds, largest_newcloud, tracknumber[ifill][ncr - 1], itrack, ifill,
+                            tracknumber, newtrackstatus, tracksplitnumber, trackreset,
+                        )
 
                     else:
                         sys.exit(str(ncr) + " How did we get here?")
@@ -515,40 +320,46 @@ def gettracknumbers(config):
 
                     trackfound[ncr - 1] = 1
 
-                    referencetrackstatus[ifill, ncr - 1] = 0
+                    referencetrackstatus[ifill][ncr - 1] = 0
 
         ##############################################################################
         # Find any clouds in the new track that don't have a track number.
         # These are new clouds this file
 
         for ncn in range(1, int(nclouds_new) + 1):
-            if tracknumber[0, ifill + 1, ncn - 1] < 0:
-                tracknumber[0, ifill + 1, ncn - 1] = itrack
+            if tracknumber[ifill + 1][ncn - 1] < 0:
+                tracknumber[ifill + 1][ncn - 1] = itrack
                 itrack = itrack + 1
 
-                trackreset[0, ifill + 1, ncn - 1] = 0
+                trackreset[ifill + 1][ncn - 1] = 0
 
-        #############################################################################
-        # Flag the last file in the dataset
-        if ifile == nfiles - 1:
-            logger.debug("WE ARE AT THE LAST FILE")
-            for ncn in range(1, int(nclouds_new) + 1):
-                trackreset[0, ifill + 1, :] = 2
-            ifill = ifill + 1
-            break
+        # Check that the track numbers fit the track number rows (exits on overflow)
+        get_label_dtype(itrack, name="track numbers")
 
         ##############################################################################
         # Increment to next fill
         ifill = ifill + 1
 
-    trackstatus[0, :, :] = np.nansum(
-        np.dstack((referencetrackstatus, newtrackstatus)), 2
-    )
-    trackstatus[np.isnan(trackstatus)] = -9999
+    if ifile < 0:
+        logger.critical("Error: No linked pairs of files found for tracking.")
+        sys.exit("Code exits in gettracks.py")
+
+    #############################################################################
+    # Flag the last file in the dataset
+    trackreset[ifill][:] = 2
+
+    trackstatus = [
+        np.nansum(np.stack((refstatus, newstatus)), 0).astype(int)
+        for refstatus, newstatus in zip(referencetrackstatus, newtrackstatus)
+    ]
 
     logger.debug("Tracking Done")
 
     nfiles = ifill + 1
+    # Number of clouds in each cloudid file
+    file_nclouds = np.array([len(row) for row in tracknumber])
+    cloudidfiles = np.array([list(name) for name in cloudidfile_names], dtype="S1")
+    strlength = cloudidfiles.shape[1]
 
     # #################################################################
     # # Create histograms of the values in tracknumber.
@@ -612,18 +423,18 @@ def gettracknumbers(config):
     # Define output variables dictionary
     var_dict = {
         "ntracks": (["time"], np.array([itrack])),
-        "basetimes": (["nfiles"], basetime[:nfiles].astype("datetime64[ns]")),
-        "cloudid_files": (["nfiles", "ncharacters"], cloudidfiles[:nfiles,:]),
-        "track_numbers": (["time", "nfiles", "nclouds"], tracknumber[:,:nfiles,:]),
-        "track_status": (["time", "nfiles", "nclouds"], trackstatus[:,:nfiles,:].astype(int)),
-        "track_mergenumbers": (["time", "nfiles", "nclouds"], trackmergenumber[:,:nfiles,:]),
-        "track_splitnumbers": (["time", "nfiles", "nclouds"], tracksplitnumber[:,:nfiles,:]),
-        "track_reset": (["time", "nfiles", "nclouds"], trackreset[:,:nfiles,:]),
+        "basetimes": (["nfiles"], np.array(basetime, dtype="datetime64[s]").astype("datetime64[ns]")),
+        "cloudid_files": (["nfiles", "ncharacters"], cloudidfiles),
+        "file_nclouds": (["nfiles"], file_nclouds),
+        "track_numbers": (["clouds"], np.concatenate(tracknumber)),
+        "track_status": (["clouds"], np.concatenate(trackstatus)),
+        "track_mergenumbers": (["clouds"], np.concatenate(trackmergenumber)),
+        "track_splitnumbers": (["clouds"], np.concatenate(tracksplitnumber)),
+        "track_reset": (["clouds"], np.concatenate(trackreset)),
         }
     coord_dict = {
         "time": (["time"], np.arange(0, 1)),
         "nfiles": (["nfiles"], np.arange(nfiles)),
-        "nclouds": (["nclouds"], np.arange(0, maxnclouds)),
         "ncharacters": (["ncharacters"], np.arange(0, strlength)),
     }
     gattr_dict = {
@@ -653,10 +464,16 @@ def gettracknumbers(config):
     ds_out.cloudid_files.attrs["long_name"] = "filename of each cloudid file used during tracking"
     ds_out.cloudid_files.attrs["units"] = "unitless"
 
+    ds_out.file_nclouds.attrs["long_name"] = "number of clouds in each cloudid file"
+    ds_out.file_nclouds.attrs["sample_dimension"] = "clouds"
+    ds_out.file_nclouds.attrs["usage"] = "Track variables are contiguous ragged arrays along the clouds dimension. " + \
+    "Values of cloudid file n are [sum(file_nclouds[:n]), sum(file_nclouds[:n+1])), " + \
+    "ordered by cloud number (ex. 0=cloud 1, 1000=cloud 1001)."
+    ds_out.file_nclouds.attrs["units"] = "unitless"
+
     ds_out.track_numbers.attrs["long_name"] = "cloud track number"
-    ds_out.track_numbers.attrs["usage"] = "size: 1 by time by number of clouds. " + \
-    "Each column represents a cloudid file (time dimension). " + \
-    "Each row represents a cloud in that file (ex. row 0=cloud 1, row 1000=cloud 1001) through time. " + \
+    ds_out.track_numbers.attrs["usage"] = "size: total number of clouds in all cloudid files. " + \
+    "Clouds of each cloudid file are stored contiguously in time order (see file_nclouds). " + \
     "The values indicate the track that cloud is in. This follows the largest cloud in mergers and splits."
 
     ds_out.track_numbers.attrs["units"] = "unitless"
@@ -675,8 +492,7 @@ def gettracknumbers(config):
     ] = "Number of the track that this small cloud merges into"
     ds_out.track_mergenumbers.attrs[
         "usage"
-    ] = "size: 1 by time by number of clouds. Each column represents a cloudid file (time dimension). " + \
-        "Each row represets a cloud in that file through time. " + \
+    ] = "size: total number of clouds in all cloudid files (see file_nclouds). " + \
         "Values give the track number associated with the small clouds in mergers."
 
     ds_out.track_mergenumbers.attrs["units"] = "unitless"
@@ -688,8 +504,7 @@ def gettracknumbers(config):
     ] = "Number of the track that this small cloud splits from"
     ds_out.track_splitnumbers.attrs[
         "usage"
-    ] = "size: 1 by time by number of clouds. Each column represents a cloudid file (time). " + \
-        "Each row represets a cloud in that file through time. " + \
+    ] = "size: total number of clouds in all cloudid files (see file_nclouds). " + \
         "Values give the track number associated with the small clouds in the split"
     ds_out.track_splitnumbers.attrs["units"] = "unitless"
     ds_out.track_splitnumbers.attrs["valid_min"] = 1
@@ -700,7 +515,7 @@ def gettracknumbers(config):
     ] = "flag of track starts and abrupt track stops"
     ds_out.track_reset.attrs[
         "usage"
-    ] = "Each row represents a cloudid file. Each column represents a cloud in that file. " + \
+    ] = "size: total number of clouds in all cloudid files (see file_nclouds). " + \
         "Numbers indicate if the track started or adruptly ended during this file."
     ds_out.track_reset.attrs[
         "values"
@@ -711,29 +526,309 @@ def gettracknumbers(config):
     ds_out.track_reset.attrs["valid_min"] = 0
     ds_out.track_reset.attrs["valid_max"] = 2
 
+    # Set encoding/compression for all variables
+    encoding = get_netcdf_encoding(ds_out, config, encoding={
+        "ntracks": {"dtype": "int", "zlib": True},
+        "basetimes": {
+            "dtype": "int64",
+            "zlib": True,
+            "units": "seconds since 1970-01-01",
+        },
+        "cloudid_files": {
+            "zlib": True,
+        },
+        "file_nclouds": {"dtype": "int", "zlib": True},
+        "track_numbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
+        "track_status": {"dtype": "int", "zlib": True, "_FillValue": -9999},
+        "track_mergenumbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
+        "track_splitnumbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
+        "track_reset": {"dtype": "int", "zlib": True, "_FillValue": -9999},
+    }, format="NETCDF4_CLASSIC")
     # Write netcdf file
     ds_out.to_netcdf(
         path=tracknumbers_outfile,
         mode="w",
         format="NETCDF4_CLASSIC",
         # unlimited_dims="ntracks",
-        encoding={
-            "ntracks": {"dtype": "int", "zlib": True},
-            "basetimes": {
-                "dtype": "int64",
-                "zlib": True,
-                "units": "seconds since 1970-01-01",
-            },
-            "cloudid_files": {
-                "zlib": True,
-            },
-            "track_numbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
-            "track_status": {"dtype": "int", "zlib": True, "_FillValue": -9999},
-            "track_mergenumbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
-            "track_splitnumbers": {"dtype": "int", "zlib": True, "_FillValue": -9999},
-            "track_reset": {"dtype": "int", "zlib": True, "_FillValue": -9999},
-        },
+        encoding=encoding,
     )
     logger.info(tracknumbers_outfile)
     logger.info('Get track numbers done.')
     return tracknumbers_outfile
+
+
+def get_link_graph(
+    refcloud_forward_index,
+    newcloud_backward_index,
+    nclouds_reference,
+    nclouds_new,
+):
+    """
+    Build a directed graph linking reference and new clouds, and label its strongly connected components.
+
+    Reference clouds are nodes [0, nclouds_reference), new clouds are nodes
+    [nclouds_reference, nclouds_reference + nclouds_new).
+    A reference cloud links to a new cloud through either the forward or the backward index,
+    while a new cloud links to a reference cloud only through the forward index.
+
+    Arguments:
+        refcloud_forward_index: np.ndarray(int)
+            New cloud numbers linked to each reference cloud, dimensions: [1, nclouds_reference, nlinks].
+        newcloud_backward_index: np.ndarray(int)
+            Reference cloud numbers linked to each new cloud, dimensions: [1, nclouds_new, nlinks].
+        nclouds_reference: int
+            Number of reference clouds.
+        nclouds_new: int
+            Number of new clouds.
+
+    Returns:
+        link_graph: dictionary
+            Component label of each node, nodes sorted by component,
+            and the graph linking components to each other.
+    """
+    refcloud_forward_index = np.asarray(refcloud_forward_index)[0, :nclouds_reference, :]
+    newcloud_backward_index = np.asarray(newcloud_backward_index)[0, :nclouds_new, :]
+    nnodes = nclouds_reference + nclouds_new
+
+    # Forward links: reference cloud -> new cloud
+    f_ref, f_link = np.nonzero(
+        (refcloud_forward_index > 0) & (refcloud_forward_index <= nclouds_new)
+    )
+    f_new = nclouds_reference + refcloud_forward_index[f_ref, f_link] - 1
+    # Backward links: new cloud -> reference cloud
+    b_new, b_link = np.nonzero(
+        (newcloud_backward_index > 0) & (newcloud_backward_index <= nclouds_reference)
+    )
+    b_ref = newcloud_backward_index[b_new, b_link] - 1
+    b_new = nclouds_reference + b_new
+
+    # Edges: reference -> new (forward and backward links), new -> reference (forward links)
+    src = np.concatenate((f_ref, b_ref, f_new))
+    dst = np.concatenate((f_new, b_new, f_ref))
+    graph = coo_matrix(
+        (np.ones(len(src), dtype=np.int8), (src, dst)), shape=(nnodes, nnodes),
+    ).tocsr()
+
+    # Strongly connected components (clouds that are all linked to each other)
+    ncomponents, component = connected_components(graph, directed=True, connection="strong")
+    # Sort nodes by component, keeping nodes within each component in increasing order
+    component_nodes = np.argsort(component, kind="stable")
+    component_start = np.searchsorted(component[component_nodes], np.arange(ncomponents + 1))
+
+    # Links between components (one-way links, e.g., a reference cloud linked to a new cloud only backward)
+    src_component = component[src]
+    dst_component = component[dst]
+    cross = src_component != dst_component
+    component_graph = coo_matrix(
+        (np.ones(np.count_nonzero(cross), dtype=np.int8), (src_component[cross], dst_component[cross])),
+        shape=(ncomponents, ncomponents),
+    ).tocsr()
+
+    link_graph = {
+        "nclouds_reference": nclouds_reference,
+        "component": component,
+        "component_nodes": component_nodes,
+        "component_start": component_start,
+        "component_indptr": component_graph.indptr,
+        "component_indices": component_graph.indices,
+    }
+    return link_graph
+
+
+def get_associated_clouds(ncr, link_graph):
+    """
+    Find all reference and new clouds associated with a reference cloud.
+
+    The associated clouds are all clouds reachable from the reference cloud in the link graph,
+    which are the same clouds found by searching forward and backward links repeatedly.
+
+    Arguments:
+        ncr: int
+            Reference cloud number.
+        link_graph: dictionary
+            Link graph from get_link_graph.
+
+    Returns:
+        associated_referenceclouds: np.ndarray(int)
+            Sorted reference cloud numbers.
+        associated_newclouds: np.ndarray(int)
+            Sorted new cloud numbers.
+    """
+    nclouds_reference = link_graph["nclouds_reference"]
+    component_nodes = link_graph["component_nodes"]
+    component_start = link_graph["component_start"]
+    component_indptr = link_graph["component_indptr"]
+    component_indices = link_graph["component_indices"]
+
+    # Find components reachable from the component of this reference cloud
+    components = [link_graph["component"][ncr - 1]]
+    visited = set(components)
+    icomp = 0
+    while icomp < len(components):
+        comp = components[icomp]
+        for next_comp in component_indices[component_indptr[comp]:component_indptr[comp + 1]]:
+            if next_comp not in visited:
+                visited.add(next_comp)
+                components.append(next_comp)
+        icomp += 1
+
+    # Get the clouds in these components
+    if len(components) == 1:
+        nodes = component_nodes[component_start[components[0]]:component_start[components[0] + 1]]
+    else:
+        nodes = np.sort(np.concatenate(
+            [component_nodes[component_start[comp]:component_start[comp + 1]] for comp in components]
+        ))
+    associated_referenceclouds = nodes[nodes < nclouds_reference] + 1
+    associated_newclouds = nodes[nodes >= nclouds_reference] - nclouds_reference + 1
+    return associated_referenceclouds, associated_newclouds
+
+
+def assign_split_tracks(
+    small_newclouds,
+    largest_newcloud,
+    split_tracknumber,
+    itrack,
+    ifill,
+    tracknumber,
+    newtrackstatus,
+    tracksplitnumber,
+    trackreset,
+):
+    """
+    Assign track numbers and status to new clouds split from a track.
+
+    Arguments:
+        small_newclouds: np.ndarray(int)
+            Sorted smaller new cloud numbers of the split.
+        largest_newcloud: int
+            Largest new cloud number of the split.
+        split_tracknumber: int
+            Track number that the clouds split from.
+        itrack: int
+            Next available track number.
+        ifill: int
+            Time index of the reference file.
+        tracknumber: list
+            Track number rows of each time index, updated in place.
+        newtrackstatus: list
+            Track status rows of new clouds, updated in place.
+        tracksplitnumber: list
+            Split track number rows, updated in place.
+        trackreset: list
+            Track reset rows, updated in place.
+
+    Returns:
+        itrack: int
+            Next available track number.
+    """
+    nsmall = len(small_newclouds)
+    # For the smaller fragments of the split,
+    # label the new time (ifill+1) as the small split (31)
+    # because the cloud only occurs at the new time step
+    newtrackstatus[ifill + 1][small_newclouds - 1] = 31
+    tracknumber[ifill + 1][small_newclouds - 1] = itrack + np.arange(nsmall)
+    tracksplitnumber[ifill + 1][small_newclouds - 1] = split_tracknumber
+    trackreset[ifill + 1][small_newclouds - 1] = 0
+    # For the larger fragment of the split,
+    # label the new time (ifill+1) as the large split (3)
+    # The track continues to follow this cloud so the tracknumber is not incremented.
+    newtrackstatus[ifill + 1][largest_newcloud - 1] = 3
+    tracknumber[ifill + 1][largest_newcloud - 1] = split_tracknumber
+    return itrack + nsmall
+
+
+def append_file_rows(
+    nclouds,
+    fillval,
+    tracknumber,
+    referencetrackstatus,
+    newtrackstatus,
+    trackmergenumber,
+    tracksplitnumber,
+    trackreset,
+):
+    """
+    Append a row for the next cloudid file to the track variables.
+
+    Arguments:
+        nclouds: int
+            Number of clouds in the cloudid file.
+        fillval: int
+            Missing value for int type variables.
+        tracknumber, trackmergenumber, tracksplitnumber: list
+            Rows of track number (LABEL_DTYPE) variables, updated in place.
+        trackreset: list
+            Rows of track reset flag variable, updated in place.
+        referencetrackstatus, newtrackstatus: list
+            Rows of float type track status variables, updated in place.
+
+    Returns:
+        None.
+    """
+    for rows in (tracknumber, trackmergenumber, tracksplitnumber):
+        rows.append(np.full(nclouds, fillval, dtype=get_label_dtype(0, minvalue=fillval)))
+    trackreset.append(np.full(nclouds, fillval, dtype=get_flag_dtype(2, minvalue=fillval, name="track_reset")))
+    for rows in (referencetrackstatus, newtrackstatus):
+        rows.append(np.full(nclouds, np.nan, dtype=float))
+    return
+
+
+def read_singletrack_files(files, config):
+    """
+    Read linking information from the single track files.
+
+    Arguments:
+        files: list
+            Single track file names, sorted by time.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Yields:
+        singletrack: dictionary
+            Linking information of a pair of files.
+    """
+    tracking_outpath = config["tracking_outpath"]
+    featuresize_varname = config.get("featuresize_varname", "npix_feature")
+
+    for ifile in range(0, len(files)):
+        # Load single track file
+        singletracking_data = Dataset(files[ifile], "r")
+        # Number of clouds in reference and new file
+        nclouds_reference = int(np.nanmax(singletracking_data["nclouds_ref"][:]) + 1)
+        nclouds_new = int(np.nanmax(singletracking_data["nclouds_new"][:]) + 1)
+        basetime_ref = singletracking_data["basetime_ref"][:]
+        basetime_new = singletracking_data["basetime_new"][:]
+        refcloud_forward_index = singletracking_data["refcloud_forward_index"][:].astype(int)
+        newcloud_backward_index = singletracking_data["newcloud_backward_index"][:].astype(int)
+        ref_file = singletracking_data.getncattr('ref_file')
+        new_file = singletracking_data.getncattr('new_file')
+        ref_date = f"{singletracking_data.getncattr('ref_date')}"
+        new_date = f"{singletracking_data.getncattr('new_date')}"
+        singletracking_data.close()
+
+        # Load cloudid files to get feature sizes
+        # Reference cloudid file
+        referencecloudid_data = open_cloudid(f"{tracking_outpath}{os.path.basename(ref_file)}", config)
+        npix_reference = referencecloudid_data[featuresize_varname].values
+        referencecloudid_data.close()
+
+        # New cloudid file
+        newcloudid_data = open_cloudid(f"{tracking_outpath}{os.path.basename(new_file)}", config)
+        npix_new = newcloudid_data[featuresize_varname].values
+        newcloudid_data.close()
+
+        yield {
+            "nclouds_ref": nclouds_reference,
+            "nclouds_new": nclouds_new,
+            "basetime_ref": basetime_ref,
+            "basetime_new": basetime_new,
+            "refcloud_forward_index": refcloud_forward_index,
+            "newcloud_backward_index": newcloud_backward_index,
+            "ref_file": os.path.basename(ref_file),
+            "new_file": os.path.basename(new_file),
+            "ref_date": ref_date,
+            "new_date": new_date,
+            "npix_ref": npix_reference,
+            "npix_new": npix_new,
+        }
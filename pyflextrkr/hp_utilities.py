@@ -1,7 +1,9 @@
 
+import numpy as np
 import xarray as xr
 import pandas as pd
 import healpix as hp
+from pyflextrkr.static_cache import get_static_field
 
 def remap_healpix_to_latlon_grid(ds_hp, latlon_filename, config):
     """
@@ -32,6 +34,48 @@ def remap_healpix_to_latlon_grid(ds_hp, latlon_filename, config):
     time_coord = ds_hp[time_coordname]
     time_pd = pd.to_datetime(time_coord.dt.strftime("%Y-%m-%dT%H:%M:%S").item())
 
+    # Get the HEALPix pixels of the lat-lon grid (cached for all times in this process)
+    pix, lon_grid, lat_grid = get_static_field(
+        get_healpix_latlon_index, latlon_filename,
+        int(ds_hp.crs.healpix_nside), x_dimname, y_dimname, x_coordname, y_coordname,
+        config=config,
+    )
+
+    # Remap DataSet to lat/lon grid
+    ds_out = ds_hp.isel(cell=pix).expand_dims({time_dimname:[time_pd]}).compute()
+
+    # Add lat-lon grid as data variables to the output Dataset
+    # Create plain DataArrays without coordinate metadata to avoid merge conflicts
+    ds_out[x_coordname] = xr.DataArray(lon_grid, dims=(y_dimname, x_dimname))
+    ds_out[y_coordname] = xr.DataArray(lat_grid, dims=(y_dimname, x_dimname))
+
+    return ds_out
+
+
+def get_healpix_latlon_index(latlon_filename, nside, x_dimname, y_dimname, x_coordname, y_coordname):
+    """
+    Get the HEALPix pixels that are closest to the points of a 2D lat-lon grid.
+
+    Parameters
+    ----------
+    latlon_filename : str
+        Path to the netCDF file containing the target lat-lon grid.
+    nside : int
+        HEALPix nside of the input data.
+    x_dimname, y_dimname : str
+        Lat-lon grid dimension names.
+    x_coordname, y_coordname : str
+        Lat-lon grid 2D coordinate names.
+
+    Returns
+    -------
+    pix : xarray.DataArray
+        HEALPix pixel index of each grid point.
+    lon_grid : numpy.ndarray
+        Longitude of the grid points.
+    lat_grid : numpy.ndarray
+        Latitude of the grid points.
+    """
     # Read lat-lon grid file
     ds_grid = xr.open_dataset(latlon_filename, decode_timedelta=False)
 
@@ -45,23 +89,46 @@ def remap_healpix_to_latlon_grid(ds_hp, latlon_filename, config):
     # Drop the unwanted coordinates
     ds_grid = ds_grid.drop_vars(coords_to_drop)
     # Get lat & lon grids
-    lon_grid = ds_grid[x_coordname]
-    lat_grid = ds_grid[y_coordname]
+    lon_grid = ds_grid[x_coordname].load()
+    lat_grid = ds_grid[y_coordname].load()
+    ds_grid.close()
 
     # Find the HEALPix pixels that are closest to the target grid points
     # Since lat_grid and lon_grid are already 2D, pass them directly as separate arguments
     pix = xr.DataArray(
-        hp.ang2pix(ds_hp.crs.healpix_nside, lon_grid, lat_grid, nest=True, lonlat=True),
+        hp.ang2pix(nside, lon_grid, lat_grid, nest=True, lonlat=True),
         coords={y_dimname: lat_grid[y_dimname], x_dimname: lon_grid[x_dimname]},
         dims=(y_dimname, x_dimname),
     )
-    
-    # Remap DataSet to lat/lon grid
-    ds_out = ds_hp.isel(cell=pix).expand_dims({time_dimname:[time_pd]}).compute()
+    return pix, lon_grid.values, lat_grid.values
 
-    # Add lat-lon grid as data variables to the output Dataset
-    # Create plain DataArrays without coordinate metadata to avoid merge conflicts
-    ds_out[x_coordname] = xr.DataArray(lon_grid.values, dims=(y_dimname, x_dimname))
-    ds_out[y_coordname] = xr.DataArray(lat_grid.values, dims=(y_dimname, x_dimname))
 
-    return ds_out
\ No newline at end of file
+def get_healpix_grid_index(grid_filename, nside, x_dimname, y_dimname):
+    """
+    Get the HEALPix pixels that are closest to the points of a grid with 1D lat/lon coordinates.
+
+    Parameters
+    ----------
+    grid_filename : str
+        Path to the netCDF file containing the target grid (lat, lon coordinates).
+    nside : int
+        HEALPix nside of the input data.
+    x_dimname, y_dimname : str
+        Output x, y dimension names.
+
+    Returns
+    -------
+    pix : xarray.DataArray
+        HEALPix pixel index of each grid point.
+    """
+    ds_grid = xr.open_dataset(grid_filename)
+    lon = ds_grid.lon.values
+    lat = ds_grid.lat.values
+    ds_grid.close()
+
+    # Find the HEALPix pixels that are closest to the target grid points
+    pix = xr.DataArray(
+        hp.ang2pix(nside, *np.meshgrid(lon, lat), nest=True, lonlat=True),
+        coords=((y_dimname, lat), (x_dimname, lon)),
+    )
+    return pix
@@ -3,6 +3,7 @@ import numpy as np
 import time
 import xarray as xr
 import logging
+from pyflextrkr.ft_utilities import get_netcdf_encoding
 
 def idcell_csapr(
     input_filename,
@@ -125,8 +126,7 @@ def idcell_csapr(
         os.remove(cloudid_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
     # Write to netcdf file
     dsout.to_netcdf(path=cloudid_outfile,
                     mode='w',
@@ -6,8 +6,9 @@ import logging
 from pyflextrkr.steiner_func import make_dilation_step_func
 from pyflextrkr.steiner_func import mod_steiner_classification
 from pyflextrkr.steiner_func import expand_conv_core
-from pyflextrkr.echotop_func import echotop_height
+from pyflextrkr.echotop_func import echotop_heights
 from pyflextrkr.netcdf_io import write_radar_cellid
+from pyflextrkr.cloudid_store import use_cloudid_zarr
 from pyflextrkr.hp_utilities import remap_healpix_to_latlon_grid
 
 def idcells_reflectivity(
@@ -84,6 +85,11 @@ def idcells_reflectivity(
     # Get time coordinate to check if we need to loop over multiple times
     time_coords_all = comp_dict['time_coords']
     ntimes = len(time_coords_all)
+    # The cloudid store has one time index for each input file
+    if use_cloudid_zarr(config) & (ntimes > 1):
+        logger.critical(f"ERROR: cloudid_store: zarr requires one time per input file, found {ntimes}.")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
     
     # Loop over each time step
     cloudid_outfiles = []
@@ -177,17 +183,11 @@ def idcells_reflectivity(
             echotop40 = np.full(shape_2d, np.nan, dtype=np.float32)
             echotop50 = np.full(shape_2d, np.nan, dtype=np.float32)
         else:
-            # Use unified echotop_height function (handles both 1D and 3D height arrays)
-            echotop10 = echotop_height(dbz3d_filt, height, z_dimname, shape_2d,
-                                       dbz_thresh=10, gap=echotop_gap, min_thick=0)
-            echotop20 = echotop_height(dbz3d_filt, height, z_dimname, shape_2d,
-                                       dbz_thresh=20, gap=echotop_gap, min_thick=0)
-            echotop30 = echotop_height(dbz3d_filt, height, z_dimname, shape_2d,
-                                       dbz_thresh=30, gap=echotop_gap, min_thick=0)
-            echotop40 = echotop_height(dbz3d_filt, height, z_dimname, shape_2d,
-                                       dbz_thresh=40, gap=echotop_gap, min_thick=0)
-            echotop50 = echotop_height(dbz3d_filt, height, z_dimname, shape_2d,
-                                       dbz_thresh=50, gap=echotop_gap, min_thick=0)
+            # Calculate echo-top heights for all thresholds (handles both 1D and 3D height arrays)
+            echotop10, echotop20, echotop30, echotop40, echotop50 = echotop_heights(
+                dbz3d_filt, height, z_dimname, shape_2d,
+                dbz_thresh=[10, 20, 30, 40, 50], gap=echotop_gap, min_thick=0,
+            )
 
         del dbz3d_filt
         # Put all Steiner parameters in a dictionary
@@ -5,6 +5,7 @@ import xarray as xr
 from scipy.signal import medfilt2d
 from scipy.ndimage import label, filters
 from pyflextrkr import netcdf_io as net
+from pyflextrkr.ft_utilities import LABEL_DTYPE
 
 def idclouds_gpmmergir(
     filename,
@@ -274,7 +275,7 @@ def idclouds_gpmmergir(
                                     dtype=float,
                                 )
                                 final_pf_number = np.full(
-                                    final_convcold_cloudnumber.shape, 0, dtype=int
+                                    final_convcold_cloudnumber.shape, 0, dtype=LABEL_DTYPE
                                 )
                                 # Make a copy of the original arrays
                                 final_cloudnumber_orig = final_cloudnumber
@@ -287,7 +288,7 @@ def idclouds_gpmmergir(
                                 final_convcold_cloudnumber.shape, np.nan, dtype=float
                             )
                             final_pf_number = np.full(
-                                final_convcold_cloudnumber.shape, 0, dtype=int
+                                final_convcold_cloudnumber.shape, 0, dtype=LABEL_DTYPE
                             )
                             # Make a copy of the original arrays
                             final_cloudnumber_orig = final_cloudnumber
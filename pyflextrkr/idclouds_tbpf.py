@@ -13,7 +13,9 @@ from pyflextrkr.futyan3 import futyan3
 from pyflextrkr.label_and_grow_cold_clouds import label_and_grow_cold_clouds
 from pyflextrkr.ftfunctions import sort_renumber, sort_renumber2vars, link_pf_tb, pad_and_extend, call_adjust_axis 
 from pyflextrkr.sl3d_func import run_sl3d
-from pyflextrkr.ft_utilities import get_timestamp_from_filename_single
+from pyflextrkr.static_cache import get_static_field
+from pyflextrkr.ft_utilities import get_timestamp_from_filename_single, LABEL_DTYPE
+from pyflextrkr.cloudid_store import use_cloudid_zarr
 
 def idclouds_tbpf(
     input_data,
@@ -102,19 +104,15 @@ def idclouds_tbpf(
 
     # Zarr format (assumes HEALPix for now)
     if input_format.lower() == "zarr":
-        import healpix as hp
+        from pyflextrkr.hp_utilities import get_healpix_grid_index
 
-        # Read landmask file to get target lat/lon grid
+        # Find the HEALPix pixels that are closest to the landmask lat/lon grid points
+        # (cached for all times in this process)
         landmask_filename = config.get('landmask_filename', None)
-        dslm = xr.open_dataset(landmask_filename)
-        lon = dslm.lon.values
-        lat = dslm.lat.values
-        dslm.close()
-
-        # Find the HEALPix pixels that are closest to the target grid points
-        pix = xr.DataArray(
-            hp.ang2pix(input_data.crs.healpix_nside, *np.meshgrid(lon, lat), nest=True, lonlat=True),
-            coords=((y_dimname, lat), (x_dimname, lon)),
+        pix = get_static_field(
+            get_healpix_grid_index, landmask_filename,
+            int(input_data.crs.healpix_nside), x_dimname, y_dimname,
+            config=config,
         )
         # Convert time coordinate to Pandas datetime
         # Note this would change the calendar type of the original time coordinate
@@ -231,6 +229,17 @@ def idclouds_tbpf(
 
     # Loop over each time
     ntimes = get_length(time_decode)
+    # The cloudid store has one time index for each input file
+    if use_cloudid_zarr(config):
+        if idclouds_hourly == 1:
+            iminutes = np.atleast_1d(time_decode.dt.minute.values)
+            nframes = np.count_nonzero(np.absolute(iminutes - idclouds_minute) < idclouds_dt_thresh)
+        else:
+            nframes = ntimes
+        if nframes > 1:
+            logger.critical(f"ERROR: cloudid_store: zarr requires one time per input file, found {nframes}.")
+            logger.critical("Tracking will now exit.")
+            sys.exit()
     for tt in range(ntimes):
         # Process time variable
         iTime = time_decode[tt]
@@ -449,7 +458,7 @@ def idclouds_tbpf(
                                 dtype=float,
                             )
                             final_pf_number = np.full(
-                                final_convcold_cloudnumber.shape, 0, dtype=int
+                                final_convcold_cloudnumber.shape, 0, dtype=LABEL_DTYPE
                             )
                             # Make a copy of the original arrays
                             final_cloudnumber_orig = final_cloudnumber
@@ -462,7 +471,7 @@ def idclouds_tbpf(
                             final_convcold_cloudnumber.shape, np.nan, dtype=float
                         )
                         final_pf_number = np.full(
-                            final_convcold_cloudnumber.shape, 0, dtype=int
+                            final_convcold_cloudnumber.shape, 0, dtype=LABEL_DTYPE
                         )
                         # Make a copy of the original arrays
                         final_cloudnumber_orig = final_cloudnumber
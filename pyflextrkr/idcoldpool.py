@@ -5,10 +5,16 @@ import time
 import xarray as xr
 import pandas as pd
 import logging
+import scipy
 from scipy import integrate
 from scipy.ndimage import gaussian_filter
 from pyflextrkr.ftfunctions import sort_renumber, skimage_watershed, adjust_pbc_watershed
-from pyflextrkr.ft_utilities import get_timestamp_from_filename_single
+from pyflextrkr.ft_utilities import get_timestamp_from_filename_single, get_netcdf_encoding
+from pyflextrkr.cloudid_store import use_cloudid_zarr, write_cloudid
+
+# scipy.integrate.simpson corrects the last interval for an even number of points (Cartwright) since scipy 1.11,
+# older versions average Simpson's rule on the first and the last N-2 intervals (even='avg')
+SIMPSON_CARTWRIGHT = tuple(int(v) for v in scipy.__version__.split(".")[:2]) >= (1, 11)
 
 #---------------------------------------------------------------------------------
 def calculate_buoyancy_dmean(ds, var='thetav'):
@@ -37,7 +43,7 @@ def calculate_buoyancy_dmean(ds, var='thetav'):
     return ds_buoyancy
 
 #---------------------------------------------------------------------------------
-def calc_coldpool_intensity(buoy, zz, threshold=-0.005, min_cp_depth=0):
+def calc_coldpool_intensity(buoy, zz, threshold=-0.005, min_cp_depth=0, method="vectorized"):
     """
     Calculates cold-pool intensity, essentially the integrated buoyancy from the surface up to where the threshold value is crossed.
     Original author: William.Gustafson@pnnl.gov
@@ -53,11 +59,20 @@ def calc_coldpool_intensity(buoy, zz, threshold=-0.005, min_cp_depth=0):
             Buoyancy threshold for determining top of cold pool [m/s^2]
         min_cp_depth: float, default=0
             Minimum cold pool depth threshold [m].
+        method: string, default="vectorized"
+            Implementation to use: 'vectorized' (all columns at once), or 'loop' (loop over each column).
 
     Returns:
         cp_dict: dictionary
             Dictionary containing cold pool variables.
     """
+    if method == "vectorized":
+        return calc_coldpool_intensity_vectorized(buoy, zz, threshold=threshold, min_cp_depth=min_cp_depth)
+    elif method != "loop":
+        logger = logging.getLogger(__name__)
+        logger.critical(f"Error: unknown calc_coldpool_intensity method: {method}")
+        sys.exit("Code exits in calc_coldpool_intensity.")
+
     # Find column-min buoyancy (buoy dimensions: [Z, Y, X])
     # jpool, ipool = np.where(np.nanmin(buoy, axis=0) < threshold)
 
@@ -116,6 +131,133 @@ def calc_coldpool_intensity(buoy, zz, threshold=-0.005, min_cp_depth=0):
     }
     return cp_dict
 
+#---------------------------------------------------------------------------------
+def calc_coldpool_intensity_vectorized(buoy, zz, threshold=-0.005, min_cp_depth=0, chunk_size=64):
+    """
+    Vectorized version of calc_coldpool_intensity, producing the same output within floating point round-off.
+
+    The first layer below the threshold from the surface up is found for all columns at once,
+    and buoyancy is integrated with the same composite Simpson's rule as scipy.integrate.simpson
+    of the installed scipy version, using cumulative sums of the Simpson segments along z.
+
+    Arguments:
+        buoy: numpy array [z, y, x]
+            Buoyancy 3D array.
+        zz: numpy array [z, y, x] or [z]
+            Height profile on center points [m]
+        threshold: float, default=-0.005
+            Buoyancy threshold for determining top of cold pool [m/s^2]
+        min_cp_depth: float, default=0
+            Minimum cold pool depth threshold [m].
+        chunk_size: int, default=64
+            Number of rows in y-direction processed together.
+
+    Returns:
+        cp_dict: dictionary
+            Dictionary containing cold pool variables.
+    """
+    buoy = np.asarray(buoy)
+    nk, nj, ni = buoy.shape
+    zz = np.broadcast_to(np.asarray(zz).reshape(nk, -1, 1) if np.ndim(zz) == 1 else np.asarray(zz), buoy.shape)
+
+    # Initialize arrays
+    cp_intensity = np.zeros([nj, ni], dtype=np.float32)
+    depthpool = np.zeros_like(cp_intensity)
+    depth_base = np.zeros_like(cp_intensity)
+    depth_top = np.zeros_like(cp_intensity)
+
+    def take_level(data, k):
+        # Get values at level k of each column
+        return np.take_along_axis(data, np.maximum(k, 0)[np.newaxis], axis=0)[0]
+
+    def simpson_cumsum(y, h, kstart):
+        # Simpson's rule for each segment of 3 points (irregularly spaced) starting from level kstart,
+        # and the cumulative integral over the first n segments, starting from 0 segments
+        nseg = (len(y) - 1 - kstart) // 2
+        h0 = h[kstart:kstart+2*nseg:2]
+        h1 = h[kstart+1:kstart+2*nseg:2]
+        hsum = h0 + h1
+        hprod = h0 * h1
+        h0divh1 = np.true_divide(h0, h1, out=np.zeros_like(h0), where=h1 != 0)
+        seg = hsum / 6.0 * (
+            y[kstart:kstart+2*nseg:2] * (2.0 - np.true_divide(1.0, h0divh1, out=np.zeros_like(h0divh1), where=h0divh1 != 0)) +
+            y[kstart+1:kstart+2*nseg:2] * (hsum * np.true_divide(hsum, hprod, out=np.zeros_like(hsum), where=hprod != 0)) +
+            y[kstart+2:kstart+2*nseg+1:2] * (2.0 - h0divh1)
+        )
+        return np.concatenate((np.zeros((1,) + y.shape[1:]), np.cumsum(seg, axis=0)), axis=0)
+
+    for jstart in range(0, nj, chunk_size):
+        jslice = slice(jstart, min(jstart + chunk_size, nj))
+        ibuoy = buoy[:, jslice, :]
+        izz = zz[:, jslice, :]
+
+        # Levels with buoyancy < threshold
+        below = ibuoy < threshold
+        # Top of the first layer from the lowest level (i.e., 'surface' cold pools),
+        # the lowest level above the surface with buoyancy >= threshold ends the layer
+        ktop = np.where(below.all(axis=0), nk - 1, np.argmin(below, axis=0) - 1)
+        ktop = np.maximum(ktop, 0)
+        zz_bot = izz[0]
+        zz_top = np.take_along_axis(izz, ktop[np.newaxis], axis=0)[0]
+        z_depth = zz_top - zz_bot
+        # Columns with surface cold pool that exceed min coldpool depth
+        valid = below[0] & (z_depth > min_cp_depth)
+
+        h = np.diff(izz, axis=0).astype(float)
+        seg_cumsum = simpson_cumsum(ibuoy, h, 0)
+
+        # Number of points in the layer, and complete segments within the layer
+        npts = ktop + 1
+        integrated_buoyancy = np.take_along_axis(seg_cumsum, ((npts - 1) // 2)[np.newaxis], axis=0)[0]
+
+        # Even number of points: add the last interval
+        y1 = take_level(ibuoy, npts - 1)
+        y2 = take_level(ibuoy, npts - 2)
+        # Two points: trapezoidal rule
+        two_pts = npts == 2
+        last_dx = take_level(izz, npts - 1) - take_level(izz, npts - 2)
+        integrated_buoyancy[two_pts] = (0.5 * last_dx * (y1 + y2))[two_pts]
+        even_pts = (npts % 2 == 0) & (npts >= 4)
+        if SIMPSON_CARTWRIGHT:
+            # Four or more points: correction for the last interval according to Cartwright
+            y3 = take_level(ibuoy, npts - 3)
+            hm2 = take_level(h, npts - 3)
+            hm1 = take_level(h, npts - 2)
+            den = 6 * (hm1 + hm2)
+            alpha = np.true_divide(2 * hm1 ** 2 + 3 * hm2 * hm1, den, out=np.zeros_like(den), where=den != 0)
+            den = 6 * hm2
+            beta = np.true_divide(hm1 ** 2 + 3.0 * hm2 * hm1, den, out=np.zeros_like(den), where=den != 0)
+            den = 6 * hm2 * (hm2 + hm1)
+            eta = np.true_divide(1 * hm1 ** 3, den, out=np.zeros_like(den), where=den != 0)
+            integrated_buoyancy[even_pts] += (alpha * y1 + beta * y2 - eta * y3)[even_pts]
+        elif nk >= 4:
+            # Four or more points: average of Simpson's rule on the first N-2 intervals + trapezoidal rule
+            # on the last interval, and trapezoidal rule on the first interval + Simpson's rule on the last N-2 intervals
+            last_simpson = np.take_along_axis(
+                simpson_cumsum(ibuoy, h, 1), ((npts - 2) // 2)[np.newaxis], axis=0,
+            )[0]
+            first_trapz = 0.5 * h[0] * (ibuoy[0] + ibuoy[1])
+            last_trapz = 0.5 * last_dx * (y1 + y2)
+            integrated_buoyancy[even_pts] = (
+                0.5 * (integrated_buoyancy + last_trapz + first_trapz + last_simpson)
+            )[even_pts]
+
+        depthpool[jslice][valid] = z_depth[valid]
+        depth_base[jslice][valid] = zz_bot[valid]
+        depth_top[jslice][valid] = zz_top[valid]
+        # Compute cold pool intensity (Bryan & Parker 2010; Rotunno et al. 1988)
+        with np.errstate(invalid='ignore'):
+            cp_intensity[jslice][valid] = np.sqrt(-2.0 * integrated_buoyancy[valid])
+
+    # Put variables to dictionary
+    cp_dict = {
+        'cp_depth': depthpool,
+        'cp_intensity': cp_intensity,
+        'cp_base': depth_base,
+        'cp_top': depth_top,
+    }
+    return cp_dict
+
 #---------------------------------------------------------------------------------
 def filter_nonsfc_coldpool(cp_dict, zz_bot):
     """
@@ -192,6 +334,7 @@ def idcoldpool(
     # label_method = config.get("label_method", "ndimage.label")
     buoy_thresh = config.get("buoy_thresh")
     min_cp_depth = config.get("min_cp_depth")
+    coldpool_method = config.get("coldpool_intensity_method", "vectorized")
     buoy_smooth_sigma = config.get("buoy_smooth_sigma", 1)
     pixel_radius = config.get("pixel_radius")
     # R_earth = config.get("R_earth")
@@ -240,6 +383,11 @@ def idcoldpool(
 
     # Read data variables
     ntimes = ds.sizes[time_dimname]
+    # The cloudid store has one time index for each input file
+    if use_cloudid_zarr(config) & (ntimes > 1):
+        logger.critical(f"ERROR: cloudid_store: zarr requires one time per input file, found {ntimes}.")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
     x_coord = ds.coords[x_coordname]
     y_coord = ds.coords[y_coordname]
     z_coord = ds.coords[z_coordname]
@@ -289,7 +437,8 @@ def idcoldpool(
         fvar = field_var.data[tt,:,:,:].squeeze()
 
         # Calculate cold pool intensity
-        cp_dict = calc_coldpool_intensity(fvar, zz, threshold=buoy_thresh, min_cp_depth=min_cp_depth)
+        cp_dict = calc_coldpool_intensity(fvar, zz, threshold=buoy_thresh, min_cp_depth=min_cp_depth,
+                                          method=coldpool_method)
 
         # Filter points where cold pool bottom is not at the lowest height
         zz_bot = zz[0,:,:].squeeze()
@@ -421,15 +570,9 @@ def idcoldpool(
             os.remove(cloudid_outfile)
 
         # Set encoding/compression for all variables
-        comp = dict(zlib=True)
-        encoding = {var: comp for var in dsout.data_vars}
+        encoding = get_netcdf_encoding(dsout, config)
         # Write to netcdf file
-        dsout.to_netcdf(
-            path=cloudid_outfile,
-            mode='w',
-            format='NETCDF4',
-            encoding=encoding
-        )
+        write_cloudid(dsout, cloudid_outfile, config, encoding=encoding)
         logger.info(f"{cloudid_outfile}")
         # import matplotlib.pyplot as plt
         # import pdb; pdb.set_trace()
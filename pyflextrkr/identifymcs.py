@@ -4,7 +4,7 @@ import os
 import sys
 import xarray as xr
 import logging
-from pyflextrkr.ft_utilities import load_sparse_trackstats
+from pyflextrkr.ft_utilities import load_sparse_trackstats, get_netcdf_encoding
 from pyflextrkr.smooth_trajectory import smooth_trajectory
 
 def identifymcs_tb(config):
@@ -424,8 +424,7 @@ def identifymcs_tb(config):
         os.remove(statistics_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
 
     # Write to netcdf file
     dsout.to_netcdf(path=statistics_outfile, mode="w",
@@ -1,3 +1,4 @@
+import os
 import sys
 import glob
 import logging
@@ -5,7 +6,9 @@ import xarray as xr
 import pandas as pd
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange, convert_to_cftime
+from pyflextrkr.ft_utilities import subset_files_timerange, convert_to_cftime, convert_cftime_to_standard
+from pyflextrkr.cloudid_store import use_cloudid_zarr, get_cloudid_store_path, get_cloudid_frame_configs
+from pyflextrkr.static_cache import preload_static_fields_workers
 
 def idfeature_driver(config):
     """
@@ -113,23 +116,31 @@ def idfeature_driver(config):
         # Get the number of time steps
         nfiles = ds.sizes['time']
         logger.info(f"Total number of time steps to process: {nfiles}")
-
-        # Serial
-        if run_parallel == 0:
-            for ifile in range(0, nfiles):
-                # Subset one time from the DataSets and combine them
-                id_feature(ds.isel(time=ifile), config)
-        # Parallel
-        elif run_parallel >= 1:
-            results = []
-            for ifile in range(0, nfiles):
-                # Subset one time from the DataSets and combine them
-                result = dask.delayed(id_feature)(ds.isel(time=ifile), config)
-                results.append(result)
-            final_result = dask.compute(*results)
-            wait(final_result)
+        # Subset one time from the DataSets and combine them
+        get_input = lambda ifile: ds.isel(time=ifile)
+        # Get the base time of each time step
+        if calendar in ['proleptic_gregorian', 'gregorian', 'standard']:
+            files_datetime = pd.DatetimeIndex(ds['time'].values)
         else:
-            sys.exit('Valid parallelization flag not provided')
+            files_datetime = convert_cftime_to_standard(ds['time'].values)
+        files_basetime = (files_datetime - pd.Timestamp('1970-01-01')) // pd.Timedelta('1s')
+        files_basetime = files_basetime.values
+
+        # Get the HEALPix pixels of the target lat/lon grid once on each worker
+        if (run_parallel >= 1) & ("crs" in ds.variables):
+            from pyflextrkr.hp_utilities import get_healpix_grid_index, get_healpix_latlon_index
+            nside = int(ds.crs.healpix_nside)
+            if "tb_pf" in feature_type:
+                preload_static_fields_workers([(
+                    get_healpix_grid_index, config.get("landmask_filename", ""),
+                    (nside, config.get("x_dimname", "lon"), config.get("y_dimname", "lat")),
+                )], config)
+            elif "radar_cells" in feature_type:
+                preload_static_fields_workers([(
+                    get_healpix_latlon_index, config.get("latlon_filename", ""),
+                    (nside, config.get("latlon_x_dimname", "x"), config.get("latlon_y_dimname", "y"),
+                     config.get("latlon_x_coordname", "longitude"), config.get("latlon_y_coordname", "latitude")),
+                )], config)
 
     elif input_format.lower() == "netcdf":
 
@@ -145,23 +156,43 @@ def idfeature_driver(config):
         )
         # Get file list
         rawdatafiles = infiles_info[0]
+        files_basetime = infiles_info[1]
         nfiles = len(rawdatafiles)
         logger.info(f"Total number of files to process: {nfiles}")
+        get_input = lambda ifile: rawdatafiles[ifile]
 
-        # Serial
-        if run_parallel == 0:
-            for ifile in range(0, nfiles):
-                id_feature(rawdatafiles[ifile], config)
-        # Parallel
-        elif run_parallel >= 1:
-            results = []
-            for ifile in range(0, nfiles):
-                result = dask.delayed(id_feature)(rawdatafiles[ifile], config)
-                results.append(result)
-            final_result = dask.compute(*results)
-            wait(final_result)
-        else:
-            sys.exit('Valid parallelization flag not provided')
+    else:
+        logger.critical(f"ERROR: Unknown input_format: {input_format}")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
+
+    # Get config for each file, with its time index in the cloudid store if used
+    frame_configs = get_cloudid_frame_configs(config, nfiles)
+    ifile_start = 0
+    if use_cloudid_zarr(config):
+        # The first file written creates the cloudid store, process files serially until then
+        store_path = get_cloudid_store_path(config)
+        for ifile in range(0, nfiles):
+            init_config = dict(frame_configs[ifile], cloudid_store_basetime=files_basetime)
+            id_feature(get_input(ifile), init_config)
+            ifile_start = ifile + 1
+            if os.path.isdir(store_path):
+                break
+
+    # Serial
+    if run_parallel == 0:
+        for ifile in range(ifile_start, nfiles):
+            id_feature(get_input(ifile), frame_configs[ifile])
+    # Parallel
+    elif run_parallel >= 1:
+        results = []
+        for ifile in range(ifile_start, nfiles):
+            result = dask.delayed(id_feature)(get_input(ifile), frame_configs[ifile])
+            results.append(result)
+        final_result = dask.compute(*results)
+        wait(final_result)
+    else:
+        sys.exit('Valid parallelization flag not provided')
 
     logger.info('Done with features from raw data.')
     return
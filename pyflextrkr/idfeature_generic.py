@@ -7,7 +7,8 @@ import pandas as pd
 import logging
 from scipy.ndimage import label
 from pyflextrkr.ftfunctions import sort_renumber, skimage_watershed
-from pyflextrkr.ft_utilities import get_timestamp_from_filename_single
+from pyflextrkr.ft_utilities import get_timestamp_from_filename_single, get_netcdf_encoding
+from pyflextrkr.cloudid_store import use_cloudid_zarr, write_cloudid
 
 def idfeature_generic(
     input_filename,
@@ -95,6 +96,11 @@ def idfeature_generic(
 
     # Read data variables
     ntimes = ds.sizes[time_dimname]
+    # The cloudid store has one time index for each input file
+    if use_cloudid_zarr(config) & (ntimes > 1):
+        logger.critical(f"ERROR: cloudid_store: zarr requires one time per input file, found {ntimes}.")
+        logger.critical("Tracking will now exit.")
+        sys.exit()
     x_coord = ds.coords[x_coordname]
     y_coord = ds.coords[y_coordname]
     time_decode = ds[time_coordname]
@@ -246,15 +252,9 @@ def idfeature_generic(
             os.remove(cloudid_outfile)
 
         # Set encoding/compression for all variables
-        comp = dict(zlib=True)
-        encoding = {var: comp for var in dsout.data_vars}
+        encoding = get_netcdf_encoding(dsout, config)
         # Write to netcdf file
-        dsout.to_netcdf(
-            path=cloudid_outfile,
-            mode='w',
-            format='NETCDF4',
-            encoding=encoding
-        )
+        write_cloudid(dsout, cloudid_outfile, config, encoding=encoding)
         logger.info(f"{cloudid_outfile}")
 
     return cloudid_outfile
\ No newline at end of file
@@ -5,6 +5,7 @@ import xarray as xr
 import logging
 from scipy.ndimage import label
 from pyflextrkr.ftfunctions import sort_renumber
+from pyflextrkr.ft_utilities import get_netcdf_encoding
 
 def idvorticity_era5(
     input_filename,
@@ -141,8 +142,7 @@ def idvorticity_era5(
             os.remove(cloudid_outfile)
 
         # Set encoding/compression for all variables
-        comp = dict(zlib=True)
-        encoding = {var: comp for var in dsout.data_vars}
+        encoding = get_netcdf_encoding(dsout, config)
         # Write to netcdf file
         dsout.to_netcdf(path=cloudid_outfile,
                         mode='w',
@@ -1,8 +1,9 @@
 import logging
 import numpy as np
-from scipy.ndimage import label, binary_dilation, generate_binary_structure
+from scipy.ndimage import label
 from astropy.convolution import Box2DKernel, convolve
 from pyflextrkr.ftfunctions import sort_renumber, grow_cells, pad_and_extend, call_adjust_axis
+from pyflextrkr.ft_utilities import LABEL_DTYPE, FLAG_DTYPE, get_label_dtype
 
 
 def label_and_grow_cold_clouds(
@@ -43,6 +44,8 @@ def label_and_grow_cold_clouds(
 
     # Periodic boundary conditions 
     pbc_direction  = config.get('pbc_direction', 'none') 
+    # Implementation to grow cold cores ('numba', 'numpy' or 'python')
+    grow_cells_method = config.get('grow_cells_method', 'numba')
 
     # Separate array threshold
     thresh_core = tb_threshs[0]  # Convective core threshold [K]
@@ -102,9 +105,9 @@ def label_and_grow_cold_clouds(
 
 
     # Create empty arrays
-    labelcorecold_number2d = np.zeros((ny, nx), dtype=int)
-    sortedcorecold_number2d = np.zeros((ny, nx), dtype=int)
-    final_corecoldwarmnumber = np.zeros((ny, nx), dtype=int)
+    labelcorecold_number2d = np.zeros((ny, nx), dtype=LABEL_DTYPE)
+    sortedcorecold_number2d = np.zeros((ny, nx), dtype=LABEL_DTYPE)
+    final_corecoldwarmnumber = np.zeros((ny, nx), dtype=LABEL_DTYPE)
     labelcorecold_npix = []
     sortedcore_npix = []
     sortedcold_npix = []
@@ -134,7 +137,7 @@ def label_and_grow_cold_clouds(
             labelcorecold_number2d[cold_threshold_map] = -1
 
             # Then we grow out seed points
-            labelcorecold_number2d = grow_cells(labelcorecold_number2d)
+            labelcorecold_number2d = grow_cells(labelcorecold_number2d, method=grow_cells_method)
 
             # Then just to match before we put back old labels.
             labelcorecold_number2d[
@@ -156,7 +159,7 @@ def label_and_grow_cold_clouds(
         # Label cold anvils that do not have a cold core
 
         # Find indices that satisfy cold anvil threshold or convective core threshold and is not labeled
-        isolated_flag = np.zeros((ny, nx), dtype=int)
+        isolated_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
         isolated_indices = np.where(
             (labelcorecold_number2d == 0) & ((coldanvil_flag > 0) | (core_flag > 0))
         )
@@ -201,7 +204,7 @@ def label_and_grow_cold_clouds(
         # Re-number clouds
 
 
-        sortedcorecoldisolated_number2d = np.zeros((ny, nx), dtype=int)
+        sortedcorecoldisolated_number2d = np.zeros((ny, nx), dtype=get_label_dtype(ncorecoldisolated))
         final_ncorepix = np.ones(ncorecoldisolated, dtype=int) * -9999
         final_ncoldpix = np.ones(ncorecoldisolated, dtype=int) * -9999
         final_nwarmpix = np.ones(ncorecoldisolated, dtype=int) * -9999
@@ -243,7 +246,7 @@ def label_and_grow_cold_clouds(
         ##########################################################
         # Loop through clouds and only keep those where core + cold anvil exceed threshold
         if ncorecold > 0:
-            labelcorecold_number2d = np.zeros((ny, nx), dtype=int)
+            labelcorecold_number2d = np.zeros((ny, nx), dtype=get_label_dtype(ncorecold))
             labelcore_npix = np.ones(ncorecold, dtype=int) * -9999
             labelcold_npix = np.ones(ncorecold, dtype=int) * -9999
             labelwarm_npix = np.ones(ncorecold, dtype=int) * -9999
@@ -295,7 +298,7 @@ def label_and_grow_cold_clouds(
                 # Re-number cores
                 sortedcorecold_number1d = np.copy(labelcorecold_number1d[order])
 
-                sortedcorecold_number2d = np.zeros((ny, nx), dtype=int)
+                sortedcorecold_number2d = np.zeros((ny, nx), dtype=LABEL_DTYPE)
                 corecoldstep = 0
                 for isortedcorecold in range(0, ncorecold):
                     sortedcorecold_indices = np.where(
@@ -318,8 +321,8 @@ def label_and_grow_cold_clouds(
             final_nwarmpix = np.copy(sortedwarm_npix)
             final_ncorecoldpix = final_ncorepix + final_ncoldpix
         else:
-            final_corecoldnumber = np.zeros((ny, nx), dtype=int)
-            final_corecoldwarmnumber = np.zeros((ny, nx), dtype=int)
+            final_corecoldnumber = np.zeros((ny, nx), dtype=LABEL_DTYPE)
+            final_corecoldwarmnumber = np.zeros((ny, nx), dtype=LABEL_DTYPE)
             final_ncorecold = 0
             final_ncorepix = np.zeros((1,), dtype=int)
             final_ncoldpix = np.zeros((1,), dtype=int)
@@ -333,97 +336,10 @@ def label_and_grow_cold_clouds(
             labelcorecoldwarm_number2d = np.copy(final_corecoldnumber)
             ncorecoldwarmpix = np.copy(final_ncorecoldpix)
 
-            keepspreading = 1
-            # Keep looping through dilating code as long as at least one feature is growing.
-            # At this point limit it to 20 dilations. Remove this once use real data.
-            while keepspreading > 0:
-                keepspreading = 0
-
-                # Loop through each feature
-                for ifeature in range(1, final_ncorecold + 1):
-                    # Create map of single feature
-                    featuremap = np.copy(labelcorecoldwarm_number2d)
-                    featuremap[labelcorecoldwarm_number2d != ifeature] = 0
-                    featuremap[labelcorecoldwarm_number2d == ifeature] = 1
-
-                    # Find maximum extent of the of the feature
-                    extenty = np.nansum(featuremap, axis=1)
-                    extenty = np.array(np.where(extenty > 0))[0, :]
-                    miny = extenty[0]
-                    maxy = extenty[-1]
-
-                    extentx = np.nansum(featuremap, axis=0)
-                    extentx = np.array(np.where(extentx > 0))[0, :]
-                    minx = extentx[0]
-                    maxx = extentx[-1]
-
-                    # Subset ir and map data to smaller region around feature.
-                    # This reduces computation time. Add a 10 pixel buffer around the edges of the feature.
-                    if minx <= 10:
-                        minx = 0
-                    else:
-                        minx = minx - 10
-
-                    if maxx >= nx - 10:
-                        maxx = nx
-                    else:
-                        maxx = maxx + 11
-
-                    if miny <= 10:
-                        miny = 0
-                    else:
-                        miny = miny - 10
-
-                    if maxy >= ny - 10:
-                        maxy = ny
-                    else:
-                        maxy = maxy + 11
-
-                    irsubset = ir[miny:maxy, minx:maxx]
-                    fullsubset = labelcorecoldwarm_number2d[miny:maxy, minx:maxx]
-                    featuresubset = featuremap[miny:maxy, minx:maxx]
-
-                    # Dilate cloud region
-                    dilationstructure = generate_binary_structure(
-                        2, 1
-                    )  # Defines shape of growth. This grows one pixel as a cross
-
-                    dilatedsubset = binary_dilation(
-                        featuresubset, structure=dilationstructure, iterations=1
-                    ).astype(featuremap.dtype)
-
-                    # Isolate region that was dilated.
-                    expansionzone = dilatedsubset - featuresubset
-
-                    # Only keep pixels in dilated regions that are below the warm anvil threshold
-                    # and are not associated with another feature
-                    expansionzone[
-                        np.where((expansionzone == 1) & (fullsubset != 0))
-                    ] = 0
-                    expansionzone[
-                        np.where((expansionzone == 1) & (irsubset >= thresh_warm))
-                    ] = 0
-
-                    # Find indices of accepted dilated regions
-                    expansionindices = np.column_stack(np.where(expansionzone == 1))
-
-                    # Add the accepted dilated region to the map of the cloud numbers
-                    labelcorecoldwarm_number2d[
-                        expansionindices[:, 0] + miny, expansionindices[:, 1] + minx
-                    ] = ifeature
-
-                    # Add the number of expanded pixels to pixel count
-                    ncorecoldwarmpix[ifeature - 1] = (
-                        len(expansionindices[:, 0]) + ncorecoldwarmpix[ifeature - 1]
-                    )
-
-                    # Count the number of dilated pixels. Add to the keepspreading variable.
-                    # As long as this variables is > 0 the code continues to run the dilating portion.
-                    # Also at this point have a requirement that can't dilate more than 20 times.
-                    # This shoudl be removed when have actual data.
-                    keepspreading = keepspreading + len(
-                        np.extract(expansionzone == 1, expansionzone)
-                    )
+            # Grow all features into the warm anvil simultaneously, one pixel per pass
+            expand_warm_anvil(
+                labelcorecoldwarm_number2d, ncorecoldwarmpix, ir, thresh_warm, final_ncorecold,
+            )
 
             ##############################################################################
             # Save final matrices
@@ -504,6 +420,75 @@ def label_and_grow_cold_clouds(
     }
 
 
+def expand_warm_anvil(
+    labelcorecoldwarm_number2d,
+    ncorecoldwarmpix,
+    ir,
+    thresh_warm,
+    nfeatures,
+):
+    """
+    Expand features into the warm anvil, one pixel (as a cross) per pass until no feature grows.
+
+    In each pass, an unlabeled pixel below the warm anvil threshold that is next to a feature
+    is added to that feature. If a pixel is next to more than one feature, the smallest feature number wins.
+    Only pixels added in the previous pass (the growth front) are searched for neighbors.
+
+    Args:
+        labelcorecoldwarm_number2d: np.array
+            Array containing labeled features, updated in place.
+        ncorecoldwarmpix: np.array
+            Number of pixels for each feature, updated in place.
+        ir: np.array
+            Array containing IR Tb data.
+        thresh_warm: float
+            Tb threshold to define warm anvil.
+        nfeatures: int
+            Number of features.
+
+    Returns:
+        None.
+    """
+    ny, nx = labelcorecoldwarm_number2d.shape
+    label1d = labelcorecoldwarm_number2d.ravel()
+    # Pixels that can be grown into (NaN Tb is not excluded)
+    growable1d = (label1d == 0) & ~(np.ravel(ir) >= thresh_warm)
+    # Start the growth front from all feature pixels
+    front = np.flatnonzero((label1d >= 1) & (label1d <= nfeatures))
+    while len(front) > 0:
+        front_y, front_x = np.divmod(front, nx)
+        front_label = label1d[front]
+        # Neighbors of the front pixels (up, down, left, right)
+        neighbors = np.concatenate((
+            front[front_y > 0] - nx,
+            front[front_y < ny - 1] + nx,
+            front[front_x > 0] - 1,
+            front[front_x < nx - 1] + 1,
+        ))
+        neighbor_label = np.concatenate((
+            front_label[front_y > 0],
+            front_label[front_y < ny - 1],
+            front_label[front_x > 0],
+            front_label[front_x < nx - 1],
+        ))
+        grow = growable1d[neighbors]
+        neighbors = neighbors[grow]
+        neighbor_label = neighbor_label[grow]
+        # Assign each pixel to the smallest neighboring feature number
+        order = np.lexsort((neighbor_label, neighbors))
+        neighbors = neighbors[order]
+        neighbor_label = neighbor_label[order]
+        first = np.ones(len(neighbors), dtype=bool)
+        first[1:] = neighbors[1:] != neighbors[:-1]
+        front = neighbors[first]
+        label1d[front] = neighbor_label[first]
+        growable1d[front] = False
+        # Add the number of expanded pixels to pixel count
+        ncorecoldwarmpix += np.bincount(neighbor_label[first], minlength=nfeatures + 1)[1:nfeatures + 1]
+    labelcorecoldwarm_number2d[...] = label1d.reshape(ny, nx)
+    return
+
+
 def find_and_label_cold_cores(smoothir, thresh_core):
     """
     Label cold cores using ndimage.label.
@@ -522,7 +507,7 @@ def find_and_label_cold_cores(smoothir, thresh_core):
 
     """
     # Find cold cores in smoothed data
-    smoothcore_flag = np.zeros(smoothir.shape, dtype=int)
+    smoothcore_flag = np.zeros(smoothir.shape, dtype=FLAG_DTYPE)
     smoothcore_indices = np.where(smoothir < thresh_core)
     nsmoothcorepix = np.shape(smoothcore_indices)[1]
     if nsmoothcorepix > 0:
@@ -595,8 +580,8 @@ def generate_pixel_identification_from_threshold(
         final_cloudid: np.array
             Array containing cloud type pixel flag.
     """
-    final_cloudid = np.zeros((ny, nx), dtype=int)
-    core_flag = np.zeros((ny, nx), dtype=int)
+    final_cloudid = np.zeros((ny, nx), dtype=FLAG_DTYPE)
+    core_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     # Flag cold core
     core_indices = np.where(ir < thresh_core)
     ncorepix = np.shape(core_indices)[1]
@@ -604,28 +589,28 @@ def generate_pixel_identification_from_threshold(
         core_flag[core_indices] = 1
         final_cloudid[core_indices] = 1
     # Flag cold anvil
-    coldanvil_flag = np.zeros((ny, nx), dtype=int)
+    coldanvil_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     coldanvil_indices = np.where((ir >= thresh_core) & (ir < thresh_cold))
     ncoldanvilpix = np.shape(coldanvil_indices)[1]
     if ncoldanvilpix > 0:
         coldanvil_flag[coldanvil_indices] = 1
         final_cloudid[coldanvil_indices] = 2
     # Flag warm anvil
-    warmanvil_flag = np.zeros((ny, nx), dtype=int)
+    warmanvil_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     warmanvil_indices = np.where((ir >= thresh_cold) & (ir < thresh_warm))
     nwarmanvilpix = np.shape(warmanvil_indices)[1]
     if nwarmanvilpix > 0:
         warmanvil_flag[coldanvil_indices] = 1
         final_cloudid[warmanvil_indices] = 3
     # Flag warm clouds
-    othercloud_flag = np.zeros((ny, nx), dtype=int)
+    othercloud_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     othercloud_indices = np.where((ir >= thresh_warm) & (ir < thresh_cloud))
     nothercloudpix = np.shape(othercloud_indices)[1]
     if nothercloudpix > 0:
         othercloud_flag[othercloud_indices] = 1
         final_cloudid[othercloud_indices] = 4
     # Flag clear area
-    clear_flag = np.zeros((ny, nx), dtype=int)
+    clear_flag = np.zeros((ny, nx), dtype=FLAG_DTYPE)
     clear_indices = np.where(ir >= thresh_cloud)
     nclearpix = np.shape(clear_indices)[1]
     if nclearpix > 0:
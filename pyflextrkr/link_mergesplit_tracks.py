@@ -4,7 +4,7 @@ import os
 import sys
 import xarray as xr
 import logging
-from pyflextrkr.ft_utilities import load_sparse_trackstats
+from pyflextrkr.ft_utilities import load_sparse_trackstats, get_netcdf_encoding
 
 def link_mergesplit_tracks(config):
     """
@@ -303,8 +303,7 @@ def link_mergesplit_tracks(config):
         os.remove(statistics_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
 
     # Write to netcdf file
     dsout.to_netcdf(path=statistics_outfile, mode="w",
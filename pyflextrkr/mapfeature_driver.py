@@ -4,8 +4,9 @@ import logging
 import numpy as np
 import xarray as xr
 import dask
-from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from dask.distributed import wait, as_completed, get_client
+from pyflextrkr.ft_utilities import build_basetime_index, match_basetime_index
+from pyflextrkr.cloudid_store import subset_cloudid_files
 from pyflextrkr.mapfeature_func import map_feature
 
 def mapfeature_driver(
@@ -60,46 +61,61 @@ def mapfeature_driver(
     tracks_dimname = config.get("tracks_dimname", "tracks")
     times_dimname = config.get("times_dimname", "times")
     fillval = config.get("fillval", -9999)
+    # Option to stream track stats in sparse form instead of loading the dense arrays
+    stream_stats = config.get("mapfeature_stream_stats", 0)
 
     #########################################################################################
     # Read track stats
     trackstats_file = f"{stats_path}{trackstats_filebase}{startdate}_{enddate}.nc"
-    ds = xr.open_dataset(
-        trackstats_file,
-        mask_and_scale=False,
-        decode_times=False,
-    ).compute()
-    # Get track stats variable names
-    stats_varnames = list(ds.data_vars)
-    # Get track stats dimensions
-    ntracks = ds.sizes[tracks_dimname]
-    ntimes = ds.sizes[times_dimname]
-    # Get track variables
-    stats_basetime = ds["base_time"].data
-    stats_cloudnumber = ds["cloudnumber"].data
-    stats_trackstatus = ds["track_status"].data
-    trackstats_comments = ds["track_status"].comments
-    ds.close()
+    if stream_stats == 1:
+        # Read only the track stats needed for mapping, in sparse form
+        stats_dict = load_mapfeature_stats(trackstats_file, config)
+        stats_trackindex = stats_dict["track_index"]
+        stats_basetime = stats_dict["base_time"]
+        stats_cloudnumber = stats_dict["cloudnumber"]
+        stats_trackstatus = stats_dict["track_status"]
+        trackstats_comments = stats_dict["track_status_comments"]
+        stats_mergetracknumber = stats_dict["merge_tracknumbers"]
+        stats_splittracknumber = stats_dict["split_tracknumbers"]
+        stats_mergecloudnumber = stats_dict["merge_cloudnumber"]
+        stats_splitcloudnumber = stats_dict["split_cloudnumber"]
+    else:
+        ds = xr.open_dataset(
+            trackstats_file,
+            mask_and_scale=False,
+            decode_times=False,
+        ).compute()
+        # Get track stats variable names
+        stats_varnames = list(ds.data_vars)
+        # Get track stats dimensions
+        ntracks = ds.sizes[tracks_dimname]
+        ntimes = ds.sizes[times_dimname]
+        # Get track variables
+        stats_basetime = ds["base_time"].data
+        stats_cloudnumber = ds["cloudnumber"].data
+        stats_trackstatus = ds["track_status"].data
+        trackstats_comments = ds["track_status"].comments
+        ds.close()
 
-    # Put merge/split tracknumbers & cloudnumbers in a list
-    ms_tracknumber = ["merge_tracknumbers", "split_tracknumbers"]
-    ms_cloudnumber = ["merge_cloudnumber", "split_cloudnumber"]
+        # Put merge/split tracknumbers & cloudnumbers in a list
+        ms_tracknumber = ["merge_tracknumbers", "split_tracknumbers"]
+        ms_cloudnumber = ["merge_cloudnumber", "split_cloudnumber"]
 
-    # Check if tracknumber are in the stats dataset
-    if (set(ms_tracknumber).issubset(set(stats_varnames))):
-        stats_mergetracknumber = ds["merge_tracknumbers"].data
-        stats_splittracknumber = ds["split_tracknumbers"].data
-    else:
-        stats_mergetracknumber = np.full((ntracks, ntimes), fillval, dtype=int)
-        stats_splittracknumber = np.full((ntracks, ntimes), fillval, dtype=int)
+        # Check if tracknumber are in the stats dataset
+        if (set(ms_tracknumber).issubset(set(stats_varnames))):
+            stats_mergetracknumber = ds["merge_tracknumbers"].data
+            stats_splittracknumber = ds["split_tracknumbers"].data
+        else:
+            stats_mergetracknumber = np.full((ntracks, ntimes), fillval, dtype=int)
+            stats_splittracknumber = np.full((ntracks, ntimes), fillval, dtype=int)
 
-    # Check if cloudnumber are in the stats dataset
-    if (set(ms_cloudnumber).issubset(set(stats_varnames))):
-        stats_mergecloudnumber = ds["merge_cloudnumber"].data
-        stats_splitcloudnumber = ds["split_cloudnumber"].data
-    else:
-        stats_mergecloudnumber = np.full((ntracks, ntimes, nmaxlinks), fillval, dtype=int)
-        stats_splitcloudnumber = np.full((ntracks, ntimes, nmaxlinks), fillval, dtype=int)
+        # Check if cloudnumber are in the stats dataset
+        if (set(ms_cloudnumber).issubset(set(stats_varnames))):
+            stats_mergecloudnumber = ds["merge_cloudnumber"].data
+            stats_splitcloudnumber = ds["split_cloudnumber"].data
+        else:
+            stats_mergecloudnumber = np.full((ntracks, ntimes, nmaxlinks), fillval, dtype=int)
+            stats_splitcloudnumber = np.full((ntracks, ntimes, nmaxlinks), fillval, dtype=int)
 
     #########################################################################################
     # Identify files to process
@@ -108,30 +124,41 @@ def mapfeature_driver(
     cloudidfiles, \
     cloudidfiles_basetime, \
     cloudidfiles_datestring, \
-    cloudidfiles_timestring = subset_files_timerange(tracking_outpath,
-                                                     cloudid_filebase,
-                                                     start_basetime,
-                                                     end_basetime)
+    cloudidfiles_timestring = subset_cloudid_files(config,
+                                                   start_basetime,
+                                                   end_basetime)
     nfiles = len(cloudidfiles)
     logger.info(f"Total number of files to process: {nfiles}")
 
+    # Build a time index to match track stats times with the cloudid files
+    stats_basetime_index = build_basetime_index(stats_basetime)
+
+    if (run_parallel >= 1) & (stream_stats == 1):
+        # Limit the number of tasks in flight, so that only their track stats slices are held
+        client = get_client()
+        max_inflight = config.get("mapfeature_max_inflight", 2 * sum(client.nthreads().values()))
+        futures = as_completed()
+
     results = []
     # Loop over each pixel file
     for ifile in range(0, nfiles):
         # Find all matching time indices from stats file to the current cloudid file
-        itrack, itime = np.array(
-            np.where(
-                np.abs(stats_basetime - cloudidfiles_basetime[ifile]) < match_pixel_dt_thresh)
+        # The indices are [tracks, times] for dense track stats, or [sparse index] for sparse track stats
+        match_indices = match_basetime_index(
+            stats_basetime_index, cloudidfiles_basetime[ifile], match_pixel_dt_thresh,
         )
 
         # Get cloudnumbers for this time (file)
-        file_trackindex = itrack
-        file_cloudnumber = stats_cloudnumber[itrack, itime]
-        file_trackstatus = stats_trackstatus[itrack, itime]
+        if stream_stats == 1:
+            file_trackindex = stats_trackindex[match_indices]
+        else:
+            file_trackindex = match_indices[0]
+        file_cloudnumber = stats_cloudnumber[match_indices]
+        file_trackstatus = stats_trackstatus[match_indices]
 
         # Cloudnumbers for merge/split
-        file_mergecloudnumber = stats_mergecloudnumber[itrack, itime, :]
-        file_splitcloudnumber = stats_splitcloudnumber[itrack, itime, :]
+        file_mergecloudnumber = stats_mergecloudnumber[match_indices]
+        file_splitcloudnumber = stats_splitcloudnumber[match_indices]
         if (file_mergecloudnumber.size > 0) & (file_splitcloudnumber.size > 0):
             # Get number of max merge/split for all clouds at this time (file)
             max_merge = np.sum(file_mergecloudnumber > 0, axis=1).max()
@@ -141,8 +168,8 @@ def mapfeature_driver(
             file_splitcloudnumber = file_splitcloudnumber[:, :max_split]
 
         # General merge/split tracknumber
-        file_mergetracknumber = stats_mergetracknumber[itrack, itime]
-        file_splittracknumber = stats_splittracknumber[itrack, itime]
+        file_mergetracknumber = stats_mergetracknumber[match_indices]
+        file_splittracknumber = stats_splittracknumber[match_indices]
 
         # Serial
         if run_parallel == 0:
@@ -161,6 +188,29 @@ def mapfeature_driver(
                 pixeltracking_outpath,
                 pixeltracking_filebase,
             )
+        # Parallel, streaming track stats
+        elif (run_parallel >= 1) & (stream_stats == 1):
+            # Wait for a task to finish before submitting more
+            if futures.count() >= max_inflight:
+                next(futures).result()
+            result = client.submit(
+                map_feature,
+                cloudidfiles[ifile],
+                cloudidfiles_basetime[ifile],
+                file_trackindex,
+                file_cloudnumber,
+                file_trackstatus,
+                file_mergetracknumber,
+                file_splittracknumber,
+                file_mergecloudnumber,
+                file_splitcloudnumber,
+                trackstats_comments,
+                config,
+                pixeltracking_outpath,
+                pixeltracking_filebase,
+                pure=False,
+            )
+            futures.add(result)
         # Parallel
         elif run_parallel >= 1:
             result = dask.delayed(map_feature)(
@@ -182,10 +232,102 @@ def mapfeature_driver(
         else:
             sys.exit('Valid parallelization flag not provided.')
 
-    if run_parallel >= 1:
+    if (run_parallel >= 1) & (stream_stats == 1):
+        # Wait for the remaining tasks
+        for future in futures:
+            future.result()
+    elif run_parallel >= 1:
         # Trigger dask computation
         final_result = dask.compute(*results)
         wait(final_result)
 
     logger.info('Done with mapping features to pixel-level files')
-    return
\ No newline at end of file
+    return
+
+
+def load_mapfeature_stats(trackstats_file, config):
+    """
+    Load track stats variables needed for mapping features in sparse form.
+
+    The track stats file is read in chunks of tracks, and only the valid (track, time) entries
+    are kept. Merge/split cloud numbers are trimmed to the number of links in use.
+
+    Args:
+        trackstats_file: string
+            Track statistics file name.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        stats_dict: dictionary
+            Dictionary containing track index (track_index) and track stats variables
+            (base_time, cloudnumber, track_status, merge_tracknumbers, split_tracknumbers,
+            merge_cloudnumber, split_cloudnumber) for each valid entry,
+            and track status explanation (track_status_comments).
+    """
+    tracks_dimname = config.get("tracks_dimname", "tracks")
+    fillval = config.get("fillval", -9999)
+    chunksize = config.get("mapfeature_stats_chunksize", 10000)
+
+    ds = xr.open_dataset(
+        trackstats_file,
+        mask_and_scale=False,
+        decode_times=False,
+    )
+    stats_varnames = list(ds.data_vars)
+    ntracks = ds.sizes[tracks_dimname]
+
+    # Put merge/split tracknumbers & cloudnumbers in a list
+    ms_tracknumber = ["merge_tracknumbers", "split_tracknumbers"]
+    ms_cloudnumber = ["merge_cloudnumber", "split_cloudnumber"]
+    varnames_2d = ["base_time", "cloudnumber", "track_status"]
+    varnames_3d = []
+    # Check if tracknumber/cloudnumber are in the stats dataset
+    if (set(ms_tracknumber).issubset(set(stats_varnames))):
+        varnames_2d = varnames_2d + ms_tracknumber
+    if (set(ms_cloudnumber).issubset(set(stats_varnames))):
+        varnames_3d = ms_cloudnumber
+
+    stats_dict = {key: [] for key in ["track_index"] + varnames_2d + varnames_3d}
+    if ntracks == 0:
+        # No tracks, keep empty entries with the number of links in the file
+        stats_dict["track_index"].append(np.zeros(0, dtype=np.int64))
+        for varname in varnames_2d:
+            stats_dict[varname].append(ds[varname].data.reshape(-1))
+        for varname in varnames_3d:
+            stats_dict[varname].append(ds[varname].data.reshape(0, ds[varname].shape[-1]))
+    # Loop over chunks of tracks
+    for itrack0 in range(0, ntracks, chunksize):
+        ds_chunk = ds.isel({tracks_dimname: slice(itrack0, itrack0 + chunksize)})
+        # Find valid entries from base_time
+        itrack, itime = np.nonzero(np.isfinite(ds_chunk["base_time"].data))
+        stats_dict["track_index"].append(itrack + itrack0)
+        for varname in varnames_2d:
+            stats_dict[varname].append(ds_chunk[varname].data[itrack, itime])
+        for varname in varnames_3d:
+            ms_cloudnumber_chunk = ds_chunk[varname].data[itrack, itime, :]
+            # Keep links up to the last one in use
+            nlinks = np.count_nonzero(np.cumsum((ms_cloudnumber_chunk > 0).any(axis=0)[::-1]))
+            stats_dict[varname].append(ms_cloudnumber_chunk[:, :nlinks])
+    trackstats_comments = ds["track_status"].comments
+    ds.close()
+
+    for varname in ["track_index"] + varnames_2d:
+        stats_dict[varname] = np.concatenate(stats_dict[varname])
+    nentries = len(stats_dict["track_index"])
+    for varname in varnames_3d:
+        # Pad the chunks to the same number of links
+        nlinks = max(values.shape[1] for values in stats_dict[varname])
+        stats_dict[varname] = np.concatenate([
+            np.pad(values, ((0, 0), (0, nlinks - values.shape[1])), constant_values=fillval)
+            for values in stats_dict[varname]
+        ])
+    # Fill missing merge/split variables
+    for varname in ms_tracknumber:
+        if varname not in stats_dict:
+            stats_dict[varname] = np.full(nentries, fillval, dtype=int)
+    for varname in ms_cloudnumber:
+        if varname not in stats_dict:
+            stats_dict[varname] = np.full((nentries, 0), fillval, dtype=int)
+    stats_dict["track_status_comments"] = trackstats_comments
+    return stats_dict
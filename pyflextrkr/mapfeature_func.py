@@ -3,6 +3,8 @@ import time
 import os
 import logging
 import xarray as xr
+from pyflextrkr.cloudid_store import open_cloudid
+from pyflextrkr.ft_utilities import get_netcdf_encoding, LABEL_DTYPE, get_label_dtype, get_flag_dtype
 
 def map_feature(
         cloudid_filename,
@@ -68,8 +70,9 @@ def map_feature(
     # Get cloudid file associated with this time
     file_datetime = time.strftime("%Y%m%d_%H%M%S", time.gmtime(np.copy(filebasetime)))
     # Load cloudid data
-    ds_in = xr.open_dataset(
+    ds_in = open_cloudid(
         cloudid_filename,
+        config,
         decode_times=False,
         mask_and_scale=False
     )
@@ -90,96 +93,92 @@ def map_feature(
 
     ################################################################
     # Create map of status and track number for every feature in this file
-    statusmap = np.full((1, ny, nx), fillval, dtype=int)
-    trackmap = np.zeros((1, ny, nx), dtype=int)
-    allmergemap = np.zeros((1, ny, nx), dtype=int)
-    allsplitmap = np.zeros((1, ny, nx), dtype=int)
-
-    trackmap_include_ms = np.zeros((1, ny, nx), dtype=int)
-    trackmap_merge = np.zeros((1, ny, nx), dtype=int)
-    trackmap_split = np.zeros((1, ny, nx), dtype=int)
+    # Each map is a lookup table indexed by feature number, applied to the feature number array
+    # Pixels outside the valid feature numbers point to the last (fill) element of the lookup tables
+    isfeature = feature_number >= 0
+    nlut = int(np.max(feature_number[isfeature], initial=0)) + 1
+    feature_index = np.where(isfeature, feature_number, nlut).astype(
+        get_label_dtype(nlut, unsigned=True, name=feature_varname)
+    )
+    feature_npix = np.bincount(feature_index.ravel(), minlength=nlut + 1)
 
     # Check number of matched features
     nmatchcloud = len(file_cloudnumber)
     if nmatchcloud > 0:
-        ##############################################################
-        # Loop over each instance matching the trackstats time
-        for jj in range(0, nmatchcloud):
-            # Get cloud number
-            jjcloudnumber = file_cloudnumber[jj]
-            jjstatus = file_trackstatus[jj]
-
-            # Get the mask matching this feature number
-            cmask = feature_number == jjcloudnumber
-
-            # Label this feature with the track number.
-            # Need to add one to the cloud number since have the index number and we want the track number
-            if np.count_nonzero(cmask) > 0:
-                trackmap[0, cmask] = file_trackindex[jj] + 1
-                trackmap_include_ms[0, cmask] = file_trackindex[jj] + 1
-                statusmap[0, cmask] = jjstatus
-            else:
-                logger.warning(f"Warning: No matching cloud pixel found: {jjcloudnumber}")
-
-            ###########################################################
-            # Find splitting clouds
-            jjsplit = np.where(file_splitcloudnumber[jj, :] > 0)[0]
-            # Loop through splitting clouds if present
-            if len(jjsplit) > 0:
-                for isplit in jjsplit:
-                    # Get mask matching the splitting cloud
-                    is_number = file_splitcloudnumber[jj, isplit]
-                    s_cmask = feature_number == is_number
-                    # Label this cloud with the track number
-                    if np.count_nonzero(s_cmask) > 0:
-                        trackmap_include_ms[0, s_cmask] = file_trackindex[jj] + 1
-                        trackmap_split[0, s_cmask] = file_trackindex[jj] + 1
-                    else:
-                        logger.warning(f"Warning: No matching splitting cloud found: {is_number}")
-
-            ###########################################################
-            # Find merging clouds
-            jjmerge = np.where(file_mergecloudnumber[jj, :] > 0)[0]
-            # Loop through merging clouds if present
-            if len(jjmerge) > 0:
-                for imerge in jjmerge:
-                    # Get mask matching the merging cloud
-                    im_number = file_mergecloudnumber[jj, imerge]
-                    m_cmask = feature_number == im_number
-                    # Label this cloud with the track number
-                    if np.count_nonzero(m_cmask) > 0:
-                        trackmap_include_ms[0, m_cmask] = file_trackindex[jj] + 1
-                        trackmap_merge[0, m_cmask] = file_trackindex[jj] + 1
-                    else:
-                        logger.warning(f"Warning: No matching merging cloud found: {im_number}")
-
-            ###########################################################
-            # Get split tracknumber within this time
-            jjallsplit = file_splittracknumber[jj]
-            # Count valid split cloudnumbers (> 0)
-            splitpresent = np.count_nonzero(jjallsplit > 0)
-            if splitpresent > 0:
-                # Find valid split tracknumbers (> 0)
-                splittracks = jjallsplit[jjallsplit > 0]
-                splitcloudid = jjcloudnumber[jjallsplit > 0]
-                if len(splittracks) > 0:
-                    for isplit in range(0, len(splittracks)):
-                        s_cmask = feature_number == splitcloudid[isplit]
-                        allsplitmap[0, s_cmask] = splittracks[isplit]
-
-            ###########################################################
-            # Get merge tracknumber within this time
-            jjallmerge = file_mergetracknumber[jj]
-            # Count valid split cloudnumbers (> 0)
-            mergepresent = np.count_nonzero(jjallmerge > 0)
-            if mergepresent > 0:
-                # Find valid merge tracknumbers (> 0)
-                mergetracks = jjallmerge[jjallmerge > 0]
-                mergecloudid = jjcloudnumber[jjallmerge > 0]
-                if len(mergetracks) > 0:
-                    for imerge in range(0, len(mergetracks)):
-                        m_cmask = feature_number == mergecloudid[imerge]
-                        allmergemap[0, m_cmask] = mergetracks[imerge]
+        file_cloudnumber = np.asarray(file_cloudnumber)
+        file_tracknumber = np.asarray(file_trackindex) + 1
+        file_mergetracknumber = np.asarray(file_mergetracknumber)
+        file_splittracknumber = np.asarray(file_splittracknumber)
+        file_mergecloudnumber = np.asarray(file_mergecloudnumber).reshape(nmatchcloud, -1)
+        file_splitcloudnumber = np.asarray(file_splitcloudnumber).reshape(nmatchcloud, -1)
+        # Compact integer types for the track number and status maps
+        track_dtype = get_label_dtype(
+            max(np.max(file_tracknumber), np.max(file_mergetracknumber), np.max(file_splittracknumber)),
+            name="track numbers",
+        )
+        status_dtype = get_flag_dtype(
+            np.max(file_trackstatus), minvalue=min(np.min(file_trackstatus), fillval), name="track_status",
+        )
+
+        # Warn about features without matching pixels
+        for jjcloudnumber in file_cloudnumber[get_feature_npix(file_cloudnumber, feature_npix, nlut) == 0]:
+            logger.warning(f"Warning: No matching cloud pixel found: {jjcloudnumber}")
+        split_number = file_splitcloudnumber[file_splitcloudnumber > 0]
+        for is_number in split_number[get_feature_npix(split_number, feature_npix, nlut) == 0]:
+            logger.warning(f"Warning: No matching splitting cloud found: {is_number}")
+        merge_number = file_mergecloudnumber[file_mergecloudnumber > 0]
+        for im_number in merge_number[get_feature_npix(merge_number, feature_npix, nlut) == 0]:
+            logger.warning(f"Warning: No matching merging cloud found: {im_number}")
+
+        # Label each feature with the track number.
+        # Need to add one to the cloud number since have the index number and we want the track number
+        trackmap_lut = get_feature_lut(file_cloudnumber, file_tracknumber, nlut, 0, track_dtype)
+        statusmap_lut = get_feature_lut(file_cloudnumber, file_trackstatus, nlut, fillval, status_dtype)
+
+        # Label the splitting/merging clouds with the track number
+        split_tracknumber = np.broadcast_to(file_tracknumber[:, None], file_splitcloudnumber.shape)
+        merge_tracknumber = np.broadcast_to(file_tracknumber[:, None], file_mergecloudnumber.shape)
+        trackmap_split_lut = get_feature_lut(
+            split_number, split_tracknumber[file_splitcloudnumber > 0], nlut, 0, track_dtype,
+        )
+        trackmap_merge_lut = get_feature_lut(
+            merge_number, merge_tracknumber[file_mergecloudnumber > 0], nlut, 0, track_dtype,
+        )
+        # Each feature is labeled in order, followed by its splitting and merging clouds
+        ms_cloudnumber = np.hstack((
+            file_cloudnumber[:, None],
+            np.where(file_splitcloudnumber > 0, file_splitcloudnumber, -1),
+            np.where(file_mergecloudnumber > 0, file_mergecloudnumber, -1),
+        ))
+        ms_tracknumber = np.broadcast_to(file_tracknumber[:, None], ms_cloudnumber.shape)
+        trackmap_include_ms_lut = get_feature_lut(ms_cloudnumber, ms_tracknumber, nlut, 0, track_dtype)
+
+        # Label each feature with the split/merge track number
+        issplit = file_splittracknumber > 0
+        ismerge = file_mergetracknumber > 0
+        allsplitmap_lut = get_feature_lut(
+            file_cloudnumber[issplit], file_splittracknumber[issplit], nlut, 0, track_dtype,
+        )
+        allmergemap_lut = get_feature_lut(
+            file_cloudnumber[ismerge], file_mergetracknumber[ismerge], nlut, 0, track_dtype,
+        )
+    else:
+        trackmap_lut = np.zeros(nlut + 1, dtype=LABEL_DTYPE)
+        statusmap_lut = np.full(nlut + 1, fillval, dtype=get_flag_dtype(0, minvalue=fillval, name="track_status"))
+        trackmap_include_ms_lut = trackmap_lut
+        trackmap_merge_lut = trackmap_lut
+        trackmap_split_lut = trackmap_lut
+        allmergemap_lut = trackmap_lut
+        allsplitmap_lut = trackmap_lut
+
+    feature_index = feature_index.reshape(1, ny, nx)
+    trackmap = trackmap_lut[feature_index]
+    statusmap = statusmap_lut[feature_index]
+    allmergemap = allmergemap_lut[feature_index]
+    allsplitmap = allsplitmap_lut[feature_index]
+    trackmap_include_ms = trackmap_include_ms_lut[feature_index]
+    trackmap_merge = trackmap_merge_lut[feature_index]
+    trackmap_split = trackmap_split_lut[feature_index]
 
 
     # Handle special variables for specific feature_type
@@ -302,8 +301,7 @@ def map_feature(
         os.remove(tracksmap_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
     # Write to netCDF file
     ds_out.to_netcdf(
         path=tracksmap_outfile,
@@ -315,3 +313,59 @@ def map_feature(
     logger.info(f"{tracksmap_outfile}")
 
     return tracksmap_outfile
+
+
+def get_feature_lut(feature_numbers, values, nlut, fillval, dtype=LABEL_DTYPE):
+    """
+    Make a lookup table that maps feature numbers to values.
+
+    Args:
+        feature_numbers: np.array
+            Feature numbers.
+        values: np.array
+            Values for each feature number, same shape as feature_numbers.
+        nlut: int
+            Number of valid feature numbers (maximum feature number + 1).
+        fillval: int
+            Fill value for feature numbers without a value.
+        dtype: np.dtype, optional, default=LABEL_DTYPE
+            Integer type of the lookup table.
+
+    Returns:
+        lut: np.array
+            Lookup table, dimensions: [nlut + 1], the last element is the fill value.
+    """
+    lut = np.full(nlut + 1, fillval, dtype=dtype)
+    feature_numbers = np.ravel(feature_numbers)
+    values = np.ravel(values)
+    # Feature numbers outside of the valid range do not match any pixel
+    valid = (feature_numbers >= 0) & (feature_numbers < nlut)
+    feature_numbers = feature_numbers[valid].astype(np.int64)
+    values = values[valid]
+    # Repeated feature numbers take the last value, same as labeling the features in order
+    _, idx_last = np.unique(feature_numbers[::-1], return_index=True)
+    idx_last = len(feature_numbers) - 1 - idx_last
+    lut[feature_numbers[idx_last]] = values[idx_last]
+    return lut
+
+
+def get_feature_npix(feature_numbers, feature_npix, nlut):
+    """
+    Get the number of pixels for each feature number.
+
+    Args:
+        feature_numbers: np.array
+            Feature numbers.
+        feature_npix: np.array
+            Number of pixels for each valid feature number, dimensions: [nlut + 1].
+        nlut: int
+            Number of valid feature numbers (maximum feature number + 1).
+
+    Returns:
+        npix: np.array
+            Number of pixels for each feature number.
+    """
+    valid = (feature_numbers >= 0) & (feature_numbers < nlut)
+    npix = np.zeros(len(feature_numbers), dtype=np.int64)
+    npix[valid] = feature_npix[feature_numbers[valid].astype(np.int64)]
+    return npix
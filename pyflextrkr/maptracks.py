@@ -7,6 +7,7 @@ Created on Wed Jul 15 10:56:04 2020
 """
 
 # Purpose: Take the MCS identified in the previous steps and create pixel level maps of these storms. One netcdf file is create for each time step.
+# Note: this legacy module reads cloudid netCDF files directly, it does not support cloudid_store: zarr.
 
 # Author: Original IDL code written by Zhe Feng (zhe.feng@pnnl.gov), Python version written by Hannah C. Barnes (hannah.barnes@pnnl.gov)
 
@@ -126,7 +127,7 @@ def maptracks_wrf_pf(zipped_inputs):
     logger.info(("cloudid file: " + cloudid_filename))
     logger.info(("rain accumulation file: " + irainaccumulationfile))
 
-    # Load cloudid data
+    # Load cloudid data (netCDF files only, cloudid_store: zarr is not supported)
     logger.info("Load cloudid data")
     cloudiddata = Dataset(cloudid_filename, "r")
     cloudid_cloudnumber = cloudiddata["convcold_cloudnumber"][:]
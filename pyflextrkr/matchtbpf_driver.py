@@ -6,7 +6,9 @@ import time
 import logging
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import build_basetime_index, match_basetime_index, get_netcdf_encoding
+from pyflextrkr.cloudid_store import subset_cloudid_files
+from pyflextrkr.static_cache import preload_static_fields_workers, get_landmask_field
 # from pyflextrkr.matchtbpf_func import matchtbpf_singlefile
 
 def match_tbpf_tracks(config):
@@ -72,12 +74,10 @@ def match_tbpf_tracks(config):
 
     #########################################################################################
     # Find cloudid files and get their basetime
-    infiles_info = subset_files_timerange(
-        tracking_outpath,
-        cloudid_filebase,
+    infiles_info = subset_cloudid_files(
+        config,
         config["start_basetime"],
         config["end_basetime"],
-        # time_format="yyyymodd_hhmmss",
     )
     cloudidfile_list = infiles_info[0]
     cloudidfile_basetime = infiles_info[1]
@@ -89,6 +89,13 @@ def match_tbpf_tracks(config):
     logger.debug("Looping over each pixel file")
     logger.debug((time.ctime()))
 
+    # Build a time index to match MCS track stats times with the cloudid files
+    ir_basetime_index = build_basetime_index(ir_basetime)
+
+    # Load the landmask once on each worker
+    if run_parallel >= 1:
+        preload_static_fields_workers([get_landmask_field(config)], config)
+
     # Create a list to store matchindices for each pixel file
     trackindices_all = []
     timeindices_all = []
@@ -99,10 +106,10 @@ def match_tbpf_tracks(config):
         filename = cloudidfile_list[ifile]
 
         # Find all matching time indices from MCS stats file to the current cloudid file
-        matchindices = np.array(np.where(np.abs(ir_basetime - cloudidfile_basetime[ifile]) < match_pixel_dt_thresh))
         # The returned match indices are for [tracks, times] dimensions respectively
-        idx_track = matchindices[0]
-        idx_time = matchindices[1]
+        idx_track, idx_time = match_basetime_index(
+            ir_basetime_index, cloudidfile_basetime[ifile], match_pixel_dt_thresh,
+        )
 
         # Get cloudnumbers for this time (file)
         file_cloudnumber = ir_cloudnumber[idx_track, idx_time]
@@ -238,8 +245,7 @@ def match_tbpf_tracks(config):
         os.remove(statistics_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
 
     # Write to netcdf file
     dsout.to_netcdf(path=statistics_outfile, mode="w",
@@ -5,12 +5,12 @@ import logging
 import warnings
 import xarray as xr
 from scipy.ndimage import label
-from skimage.measure import regionprops
-from math import pi
 from scipy.stats import skew
 from pyflextrkr.ftfunctions import sort_renumber
-from pyflextrkr.ft_utilities import subset_ds_geolimit
-from pyflextrkr.ftfunctions import circular_mean, get_cloud_boundary, find_max_indices_to_roll, subset_roll_map
+from pyflextrkr.cloudid_store import cloudid_exists, open_cloudid
+from pyflextrkr.static_cache import get_static_field, get_landmask_field
+from pyflextrkr.ftfunctions import circular_mean, get_cloud_boundary, find_max_indices_to_roll, subset_roll_map, \
+    get_label_pixel_index, get_label_pixels, calc_label_shape_stats, get_centroid_latlon
 
 def matchtbpf_singlefile(
     cloudid_filename,
@@ -50,12 +50,7 @@ def matchtbpf_singlefile(
     nmaxpf = config["nmaxpf"]
     # pfdatasource = config["pfdatasource"]
     landmask_filename = config.get("landmask_filename", "")
-    landmask_varname = config.get("landmask_varname", "")
     landfrac_thresh = config.get("landfrac_thresh", 0)
-    landmask_x_dimname = config.get("landmask_x_dimname", None)
-    landmask_y_dimname = config.get("landmask_y_dimname", None)
-    landmask_x_coordname = config.get("landmask_x_coordname", None)
-    landmask_y_coordname = config.get("landmask_y_coordname", None)
     # Parameters for handling perdiodic boundary condition
     pbc_direction = config.get("pbc_direction", "none")
     max_feature_frac_x = 0.95   # Max fraction of domain size for a feature in x-direction
@@ -64,31 +59,24 @@ def matchtbpf_singlefile(
     fillval = config["fillval"]
     fillval_f = np.nan
 
-    # Read landmask file
+    # Read landmask file, subset to match geolimit (cached for all files in this process)
     if os.path.isfile(landmask_filename):
-        dslm = xr.open_dataset(landmask_filename).squeeze()
-        # Subset landmask to match geolimit
-        dslm = subset_ds_geolimit(
-            dslm, config,
-            x_coordname=landmask_x_coordname,
-            y_coordname=landmask_y_coordname,
-            x_dimname=landmask_x_dimname,
-            y_dimname=landmask_y_dimname,
-        )
-        landmask = dslm[landmask_varname].squeeze().data
+        loader, landmask_filename, args = get_landmask_field(config)
+        landmask = get_static_field(loader, landmask_filename, *args, config=config)
     else:
         landmask = None
 
 
     # Read cloudid file
-    if os.path.isfile(cloudid_filename):
+    if cloudid_exists(cloudid_filename, config):
         logger.info(cloudid_filename)
 
         # Load cloudid data
         logger.debug("Loading cloudid data")
         logger.debug(cloudid_filename)
-        ds = xr.open_dataset(
+        ds = open_cloudid(
             cloudid_filename,
+            config,
             mask_and_scale=False,
             decode_times=False,
         )
@@ -148,6 +136,9 @@ def matchtbpf_singlefile(
             pf_lat_maxrainrate = np.full((nmatchcloud, nmaxpf), fillval_f, dtype=float)
             basetime = np.full(nmatchcloud, fillval_f, dtype=float)
 
+            # Index the pixel locations of all clouds in this file
+            cloud_pixel_index = get_label_pixel_index(cloudnumbermap)
+
             # Loop over each matched cloud number
             for imatchcloud in range(nmatchcloud):
 
@@ -156,43 +147,22 @@ def matchtbpf_singlefile(
                 ittsplitcloudnumber = ir_splitcloudnumber[imatchcloud]
                 basetime[imatchcloud] = cloudid_basetime
 
-                #########################################################################
-                # Intialize matrices for only MCS data
-                rainrate_map = np.full((ydim, xdim), np.nan, dtype=float)
-                lon_map = np.full((ydim, xdim), np.nan, dtype=float)
-                lat_map = np.full((ydim, xdim), np.nan, dtype=float)
-                logger.debug(
-                    ("rainrate_map allocation size: ", rainrate_map.shape)
-                )
-
                 ############################################################################
                 # Find matching cloud number
-                icloudlocationy, icloudlocationx = np.array(
-                    np.where(cloudnumbermap == ittcloudnumber)
-                )
+                icloudlocationy, icloudlocationx = get_label_pixels(cloud_pixel_index, ittcloudnumber)
                 ncloudpix = len(icloudlocationy)
 
                 if ncloudpix > 0:
                     logger.debug("IR Clouds Present")
                     # Add merge/split cloud pixel locations
                     icloudlocationx, \
-                    icloudlocationy = add_merge_split_cloud_locations(cloudnumbermap,
+                    icloudlocationy = add_merge_split_cloud_locations(cloud_pixel_index,
                                                                       icloudlocationx,
                                                                       icloudlocationy,
                                                                       ittmergecloudnumber,
                                                                       ittsplitcloudnumber,
                                                                       logger)
 
-                    ########################################################################
-                    # Fill matrices with MCS data
-                    logger.debug("Fill map with data")
-                    rainrate_map[icloudlocationy, icloudlocationx] = np.copy(
-                        rawrainratemap[icloudlocationy, icloudlocationx]
-                    )
-                    lon_map[icloudlocationy, icloudlocationx] = np.copy(lon[icloudlocationy, icloudlocationx])
-                    lat_map[icloudlocationy, icloudlocationx] = np.copy(lat[icloudlocationy, icloudlocationx])
-
-
                     ########################################################################
                     ## Isolate small region of cloud data around mcs at this time
                     logger.debug("Calculate new shape statistics")
@@ -202,7 +172,22 @@ def matchtbpf_singlefile(
                                                                 icloudlocationy,
                                                                 xdim,
                                                                 ydim)
-                    
+
+                    ########################################################################
+                    # Fill matrices within the cloud boundary with MCS data
+                    logger.debug("Fill map with data")
+                    rainrate_map = np.full((maxy - miny, maxx - minx), np.nan, dtype=float)
+                    lon_map = np.full((maxy - miny, maxx - minx), np.nan, dtype=float)
+                    lat_map = np.full((maxy - miny, maxx - minx), np.nan, dtype=float)
+                    logger.debug(
+                        ("rainrate_map allocation size: ", rainrate_map.shape)
+                    )
+                    isublocationy = icloudlocationy - miny
+                    isublocationx = icloudlocationx - minx
+                    rainrate_map[isublocationy, isublocationx] = rawrainratemap[icloudlocationy, icloudlocationx]
+                    lon_map[isublocationy, isublocationx] = lon[icloudlocationy, icloudlocationx]
+                    lat_map[isublocationy, isublocationx] = lat[icloudlocationy, icloudlocationx]
+
                     # Check cloud boundary span
                     # If boundary span > X fraction of domain, and periodic boundary condition is set,
                     # roll the data such that the cloud does not span across the domain boundary
@@ -217,9 +202,9 @@ def matchtbpf_singlefile(
                             sub_mask, xdim, ydim,
                         )
                         # Subset rainrate over the cloud shield
-                        sub_rainrate = np.copy(rainrate_map[miny:maxy, minx:maxx])
-                        sub_lon = np.copy(lon_map[miny:maxy, minx:maxx])
-                        sub_lat = np.copy(lat_map[miny:maxy, minx:maxx])
+                        sub_rainrate = rainrate_map
+                        sub_lon = lon_map
+                        sub_lat = lat_map
                         # Check sub_rainrate array size and 
                         # make sure there are pixels above the rainrate threshold
                         if (sub_rainrate.size > 0) and \
@@ -241,7 +226,7 @@ def matchtbpf_singlefile(
                             lat_roll = sub_lat
                     else:
                         # Isolate region over the cloud shield
-                        sub_rainrate_map = np.copy(rainrate_map[miny:maxy, minx:maxx])
+                        sub_rainrate_map = rainrate_map
                         shift_x_right = 0
                         shift_y_top = 0
                         lon_roll = None
@@ -638,12 +623,24 @@ def calc_pf_stats(
     pfaccumrain = np.full(npf_save, fillval_f, dtype=float)
     pfaccumrainheavy = np.full(npf_save, fillval_f, dtype=float)
     logger.debug(
-        "Looping through each feature to calculate statistics"
+        "Calculating statistics of all features"
     )
     logger.debug(("Number of PFs " + str(numpf)))
 
-    # Get the shape of the full data array
-    ny, nx = lon.shape
+    # Index the pixel locations of all PFs
+    pf_pixel_index = get_label_pixel_index(pfnumberlabelmap)
+
+    # Find indices of the max rain rate
+    iipfy_max, iipfx_max = np.unravel_index(
+        np.nanargmax(sub_rainrate_map), sub_rainrate_map.shape
+    )
+    if roll_flag:
+        # Remove NaN values from the rolled lon/lat arrays
+        lon_roll_v = lon_roll[~np.isnan(lon_roll)]
+        lat_roll_v = lat_roll[~np.isnan(lat_roll)]
+        # Calculate circular mean of lon/lat
+        pflon_roll = circular_mean(lon_roll_v, lon_min, lon_max)
+        pflat_roll = circular_mean(lat_roll_v, lat_min, lat_max)
 
     ###############################################
     # Loop through each PF
@@ -651,25 +648,9 @@ def calc_pf_stats(
 
         #######################################
         # Find indices of the PF
-        iipfy, iipfx = np.array(
-            np.where(pfnumberlabelmap == ipf)
-        )
+        iipfy, iipfx = get_label_pixels(pf_pixel_index, ipf)
         iipfnpix = len(iipfy)
 
-        # Find indices of the PF with heavy rain
-        iipfy_heavy, iipfx_heavy = np.array(
-            np.where(
-                (pfnumberlabelmap == ipf)
-                & (sub_rainrate_map > heavy_rainrate_thresh)
-            )
-        )
-        iipfnpix_heavy = len(iipfy_heavy)
-
-        # Find indices of the PF with max rain rate
-        iipfy_max, iipfx_max = np.unravel_index(
-            np.nanargmax(sub_rainrate_map), sub_rainrate_map.shape
-        )
-
         # Double check to make sure PF pixel count is the same
         if iipfnpix == pf_npix[ipf - 1]:
             ##########################################
@@ -679,86 +660,21 @@ def calc_pf_stats(
             pfnpix[ipf - 1] = np.copy(iipfnpix)
             pfid[ipf - 1] = np.copy(int(ipf))
             if roll_flag:
-                # Remove NaN values from the rolled lon/lat arrays
-                lon_roll_v = lon_roll[~np.isnan(lon_roll)]
-                lat_roll_v = lat_roll[~np.isnan(lat_roll)]
-                # Calculate circular mean of lon/lat
-                pflon[ipf - 1] = circular_mean(lon_roll_v, lon_min, lon_max)
-                pflat[ipf - 1] = circular_mean(lat_roll_v, lat_min, lat_max)
+                pflon[ipf - 1] = pflon_roll
+                pflat[ipf - 1] = pflat_roll
             else:
                 pflon[ipf - 1] = np.nanmean(lon[iipfy[:] + miny, iipfx[:] + minx])
                 pflat[ipf - 1] = np.nanmean(lat[iipfy[:] + miny, iipfx[:] + minx])
 
-            pfrainrate[ipf - 1] = np.nanmean(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfmaxrainrate[ipf - 1] = np.nanmax(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfskewness[ipf - 1] = skew(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfaccumrain[ipf - 1] = np.nansum(sub_rainrate_map[iipfy[:], iipfx[:]])
-            if iipfnpix_heavy > 0:
-                pfaccumrainheavy[ipf - 1] = np.nansum(
-                    sub_rainrate_map[iipfy_heavy[:], iipfx_heavy[:]]
-                )
-
-            # Generate a binary map of PF
-            iipfflagmap = np.zeros((subdimy, subdimx), dtype=int)
-            iipfflagmap[iipfy, iipfx] = 1
-
-            # Geometric statistics
-            _sub_rainrate_map = np.copy(sub_rainrate_map)
-            _sub_rainrate_map[np.isnan(_sub_rainrate_map)] = -9999
-            pfproperties = regionprops(
-                iipfflagmap,
-                intensity_image=_sub_rainrate_map,
-            )
-            pfeccentricity[ipf - 1] = pfproperties[0].eccentricity
-            pfmajoraxis[ipf - 1] = (
-                    pfproperties[0].major_axis_length * pixel_radius
-            )
-
-            # Need to treat minor axis length with an error except
-            # since the python algorithm occasionally throws an error.
-            try:
-                pfminoraxis[ipf - 1] = (
-                        pfproperties[0].minor_axis_length
-                        * pixel_radius
-                )
-            except ValueError:
-                pass
-            if ~np.isnan(pfminoraxis[ipf - 1]) or \
-                    ~np.isnan(pfmajoraxis[ipf - 1]):
-                pfaspectratio[ipf - 1] = np.divide(
-                    pfmajoraxis[ipf - 1], pfminoraxis[ipf - 1]
-                )
-            pforientation[ipf - 1] = (
-                                         pfproperties[0].orientation
-                                     ) * (180 / float(pi))
-            pfperimeter[ipf - 1] = (
-                    pfproperties[0].perimeter * pixel_radius
-            )
-            [
-                ycentroid,
-                xcentroid,
-            ] = pfproperties[0].centroid
-            [
-                yweightedcentroid,
-                xweightedcentroid,
-            ] = pfproperties[0].weighted_centroid
-
-            # Shift the centroids by minx/miny
-            # since the PF is a subset from the full image
-            # Round the centroid values as indices
-            # TODO: the lat/lon values below are not correct for PFs at the boundary of the domain
-            ycentroid = int(np.round(ycentroid + miny))
-            xcentroid = int(np.round(xcentroid + minx))
-            yweightedcentroid = int(np.round(yweightedcentroid + miny))
-            xweightedcentroid = int(np.round(xweightedcentroid + minx))
-
-            # Apply the indices to get centroid lat/lon
-            if (0 < (ycentroid) < ny) & (0 < (xcentroid) < nx):
-                pflon_centroid[ipf-1] = lon[ycentroid, xcentroid]
-                pflat_centroid[ipf-1] = lat[ycentroid, xcentroid]
-            if (0 < (yweightedcentroid) < ny) & (0 < (xweightedcentroid) < nx):
-                pflon_weightedcentroid[ipf-1] = lon[yweightedcentroid, xweightedcentroid]
-                pflat_weightedcentroid[ipf-1] = lat[yweightedcentroid, xweightedcentroid]
+            iipfrainrate = sub_rainrate_map[iipfy, iipfx]
+            pfrainrate[ipf - 1] = np.nanmean(iipfrainrate)
+            pfmaxrainrate[ipf - 1] = np.nanmax(iipfrainrate)
+            pfskewness[ipf - 1] = skew(iipfrainrate)
+            pfaccumrain[ipf - 1] = np.nansum(iipfrainrate)
+            # PF pixels with heavy rain
+            iipfrainrate_heavy = iipfrainrate[iipfrainrate > heavy_rainrate_thresh]
+            if len(iipfrainrate_heavy) > 0:
+                pfaccumrainheavy[ipf - 1] = np.nansum(iipfrainrate_heavy)
 
             # Shift the x, y indices by minx/miny
             pflon_maxrainrate[ipf - 1] = lon[iipfy_max + miny, iipfx_max + minx]
@@ -766,6 +682,28 @@ def calc_pf_stats(
 
         else:
             sys.exit("Error: PF pixel count not matching!")
+
+    ###############################################
+    # Geometric statistics of all PFs
+    _sub_rainrate_map = np.copy(sub_rainrate_map)
+    _sub_rainrate_map[np.isnan(_sub_rainrate_map)] = -9999
+    pf_shape_stats = calc_label_shape_stats(
+        pfnumberlabelmap, npf_save, _sub_rainrate_map, pixel_radius,
+    )
+    pfeccentricity[:] = pf_shape_stats["eccentricity"]
+    pfmajoraxis[:] = pf_shape_stats["majoraxis"]
+    pfminoraxis[:] = pf_shape_stats["minoraxis"]
+    pfaspectratio[:] = pf_shape_stats["aspectratio"]
+    pforientation[:] = pf_shape_stats["orientation"]
+    pfperimeter[:] = pf_shape_stats["perimeter"]
+    # Get centroid lat/lon
+    # TODO: the lat/lon values below are not correct for PFs at the boundary of the domain
+    pflon_centroid, pflat_centroid = get_centroid_latlon(
+        pf_shape_stats["ycentroid"], pf_shape_stats["xcentroid"], miny, minx, lat, lon, fillval_f,
+    )
+    pflon_weightedcentroid, pflat_weightedcentroid = get_centroid_latlon(
+        pf_shape_stats["yweightedcentroid"], pf_shape_stats["xweightedcentroid"], miny, minx, lat, lon, fillval_f,
+    )
     logger.debug("Loop done")
 
     # Put all variables in dictionary for output
@@ -795,7 +733,7 @@ def calc_pf_stats(
     return pf_stats_dict
 
 def add_merge_split_cloud_locations(
-        cloudnumbermap,
+        cloud_pixel_index,
         icloudlocationx,
         icloudlocationy,
         ittmergecloudnumber,
@@ -806,67 +744,32 @@ def add_merge_split_cloud_locations(
     Add pixel location indices of merge and split clouds to the current cloud indices.
 
     Args:
-        cloudnumbermap:
-        icloudlocationt:
-        icloudlocationx:
-        icloudlocationy:
-        ittmergecloudnumber:
-        ittsplitcloudnumber:
-        logger:
+        cloud_pixel_index: dictionary
+            Pixel index of the cloudnumber map from get_label_pixel_index.
+        icloudlocationx: numpy array
+            Cloud location indices in x-direction.
+        icloudlocationy: numpy array
+            Cloud location indices in y-direction.
+        ittmergecloudnumber: numpy array
+            Cloudnumbers for merging clouds.
+        ittsplitcloudnumber: numpy array
+            Cloudnumbers for splitting clouds.
+        logger: logger
+            Logger.
 
     Returns:
-        icloudlocationt: t-indices
         icloudlocationx: x-indices
         icloudlocationy: y-indices
     """
     ######################################################################
-    # Check if any small clouds merge
-    logger.debug("Finding mergers")
-    idmergecloudnumber = np.array(np.where(ittmergecloudnumber > 0))[0,:]
-    nmergecloud = len(idmergecloudnumber)
-    if nmergecloud > 0:
-        # Loop over each merging cloud
-        for imc in idmergecloudnumber:
-            # Find location of the merging cloud
-            (
-                imergelocationy,
-                imergelocationx,
-            ) = np.array(
-                np.where(cloudnumbermap == ittmergecloudnumber[imc])
-            )
-            nmergepix = len(imergelocationy)
-
-            # Add merge pixes to mcs pixels
-            if nmergepix > 0:
-                icloudlocationy = np.hstack(
-                    (icloudlocationy, imergelocationy)
-                )
-                icloudlocationx = np.hstack(
-                    (icloudlocationx, imergelocationx)
-                )
-    ######################################################################
-    # Check if any small clouds split
-    logger.debug("Finding splits")
-    idsplitcloudnumber = np.array(np.where(ittsplitcloudnumber > 0))[0,:]
-    nsplitcloud = len(idsplitcloudnumber)
-    if nsplitcloud > 0:
-        # Loop over each merging cloud
-        for imc in idsplitcloudnumber:
-            # Find location of the merging cloud
-            (
-                isplitlocationy,
-                isplitlocationx,
-            ) = np.array(
-                np.where(cloudnumbermap == ittsplitcloudnumber[imc])
-            )
-            nsplitpix = len(isplitlocationy)
-
-            # Add split pixels to mcs pixels
-            if nsplitpix > 0:
-                icloudlocationy = np.hstack(
-                    (icloudlocationy, isplitlocationy)
-                )
-                icloudlocationx = np.hstack(
-                    (icloudlocationx, isplitlocationx)
-                )
+    # Find location of the merging and splitting clouds
+    logger.debug("Finding mergers and splits")
+    ms_cloudnumber = np.concatenate((
+        ittmergecloudnumber[ittmergecloudnumber > 0],
+        ittsplitcloudnumber[ittsplitcloudnumber > 0],
+    ))
+    ilocationy, ilocationx = get_label_pixels(cloud_pixel_index, ms_cloudnumber)
+    # Add merge/split pixels to mcs pixels
+    icloudlocationy = np.hstack((icloudlocationy, ilocationy))
+    icloudlocationx = np.hstack((icloudlocationx, ilocationx))
     return icloudlocationx, icloudlocationy
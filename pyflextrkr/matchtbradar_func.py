@@ -4,12 +4,17 @@ import sys
 import logging
 import xarray as xr
 from scipy.ndimage import label
-from skimage.measure import regionprops
-from math import pi
 from scipy.stats import skew
 import warnings
-from pyflextrkr.ftfunctions import sort_renumber
-from pyflextrkr.ft_utilities import subset_ds_geolimit
+from pyflextrkr.ftfunctions import (
+    sort_renumber,
+    get_label_pixel_index,
+    get_label_pixels,
+    calc_label_shape_stats,
+    get_centroid_latlon,
+)
+from pyflextrkr.cloudid_store import cloudid_exists, open_cloudid
+from pyflextrkr.static_cache import get_static_field, get_landmask_field
 
 def matchtbpf_singlefile(
     cloudid_filename,
@@ -53,41 +58,29 @@ def matchtbpf_singlefile(
     nmaxcore = nmaxpf
     # nmaxcore = config.get("nmaxcore", 10)
     landmask_filename = config.get("landmask_filename", "")
-    landmask_varname = config.get("landmask_varname", "")
     landfrac_thresh = config.get("landfrac_thresh", 0)
-    landmask_x_dimname = config.get("landmask_x_dimname", None)
-    landmask_y_dimname = config.get("landmask_y_dimname", None)
-    landmask_x_coordname = config.get("landmask_x_coordname", None)
-    landmask_y_coordname = config.get("landmask_y_coordname", None)
 
     fillval = config["fillval"]
     fillval_f = np.nan
 
-    # Read landmask file
+    # Read landmask file, subset to match geolimit (cached for all files in this process)
     if os.path.isfile(landmask_filename):
-        dslm = xr.open_dataset(landmask_filename)
-        # Subset landmask to match geolimit
-        dslm = subset_ds_geolimit(
-            dslm, config,
-            x_coordname=landmask_x_coordname,
-            y_coordname=landmask_y_coordname,
-            x_dimname=landmask_x_dimname,
-            y_dimname=landmask_y_dimname,
-        )
-        landmask = dslm[landmask_varname].squeeze().data
+        loader, landmask_filename, args = get_landmask_field(config)
+        landmask = get_static_field(loader, landmask_filename, *args, config=config)
     else:
         landmask = None
 
 
     # Read cloudid file
-    if os.path.isfile(cloudid_filename):
+    if cloudid_exists(cloudid_filename, config):
         logger.info(cloudid_filename)
 
         # Load cloudid data
         logger.debug("Loading cloudid data")
         logger.debug(cloudid_filename)
-        ds = xr.open_dataset(
+        ds = open_cloudid(
             cloudid_filename,
+            config,
             mask_and_scale=False,
             decode_times=False,
         )
@@ -190,6 +183,9 @@ def matchtbpf_singlefile(
             pf_coremaxechotop45 = np.full((nmatchcloud, nmaxcore), fillval_f, dtype=float)
             pf_coremaxechotop50 = np.full((nmatchcloud, nmaxcore), fillval_f, dtype=float)
 
+            # Index the pixel locations of all clouds in this file
+            cloud_pixel_index = get_label_pixel_index(cloudnumbermap)
+
             # Loop over each matched cloud number
             for imatchcloud in range(nmatchcloud):
 
@@ -198,70 +194,22 @@ def matchtbpf_singlefile(
                 ittsplitcloudnumber = ir_splitcloudnumber[imatchcloud]
                 basetime[imatchcloud] = cloudid_basetime
 
-                #########################################################################
-                # Intialize matrices for only MCS data
-                rainrate_map = np.full((ydim, xdim), np.nan, dtype=float)
-                reflectivity_map = np.full((ydim, xdim), np.nan, dtype=float)
-                sl3d_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop10_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop20_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop30_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop40_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop45_map = np.full((ydim, xdim), np.nan, dtype=float)
-                echotop50_map = np.full((ydim, xdim), np.nan, dtype=float)
-                logger.debug(
-                    ("rainrate_map allocation size: ", rainrate_map.shape)
-                )
-
                 ############################################################################
                 # Find matching cloud number
-                icloudlocationy, icloudlocationx = np.array(
-                    np.where(cloudnumbermap == ittcloudnumber)
-                )
+                icloudlocationy, icloudlocationx = get_label_pixels(cloud_pixel_index, ittcloudnumber)
                 ncloudpix = len(icloudlocationy)
 
                 if ncloudpix > 0:
                     logger.debug("IR Clouds Present")
                     # Add merge/split cloud pixel locations
                     icloudlocationx, \
-                    icloudlocationy = add_merge_split_cloud_locations(cloudnumbermap,
+                    icloudlocationy = add_merge_split_cloud_locations(cloud_pixel_index,
                                                                       icloudlocationx,
                                                                       icloudlocationy,
                                                                       ittmergecloudnumber,
                                                                       ittsplitcloudnumber,
                                                                       logger)
 
-                    ########################################################################
-                    # Fill matrices with MCS data
-                    logger.debug("Fill map with data")
-                    rainrate_map[icloudlocationy, icloudlocationx] = np.copy(
-                        rawrainratemap[icloudlocationy, icloudlocationx]
-                    )
-                    reflectivity_map[icloudlocationy, icloudlocationx] = np.copy(
-                        reflectivity[icloudlocationy, icloudlocationx]
-                    )
-                    sl3d_map[icloudlocationy, icloudlocationx] = np.copy(
-                        sl3d[icloudlocationy, icloudlocationx]
-                    )
-                    echotop10_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop10[icloudlocationy, icloudlocationx]
-                    )
-                    echotop20_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop20[icloudlocationy, icloudlocationx]
-                    )
-                    echotop30_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop30[icloudlocationy, icloudlocationx]
-                    )
-                    echotop40_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop40[icloudlocationy, icloudlocationx]
-                    )
-                    echotop45_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop45[icloudlocationy, icloudlocationx]
-                    )
-                    echotop50_map[icloudlocationy, icloudlocationx] = np.copy(
-                        echotop50[icloudlocationy, icloudlocationx]
-                    )
-
                     ########################################################################
                     ## Isolate small region of cloud data around mcs at this time
                     logger.debug("Calculate new shape statistics")
@@ -272,16 +220,24 @@ def matchtbpf_singlefile(
                                                                 xdim,
                                                                 ydim)
 
-                    # Isolate region over the cloud shield
-                    sub_rainrate_map = np.copy(rainrate_map[miny:maxy, minx:maxx])
-                    sub_reflectivity_map = np.copy(reflectivity_map[miny:maxy, minx:maxx])
-                    sub_sl3d_map = np.copy(sl3d_map[miny:maxy, minx:maxx])
-                    sub_echotop10_map = np.copy(echotop10_map[miny:maxy, minx:maxx])
-                    sub_echotop20_map = np.copy(echotop20_map[miny:maxy, minx:maxx])
-                    sub_echotop30_map = np.copy(echotop30_map[miny:maxy, minx:maxx])
-                    sub_echotop40_map = np.copy(echotop40_map[miny:maxy, minx:maxx])
-                    sub_echotop45_map = np.copy(echotop45_map[miny:maxy, minx:maxx])
-                    sub_echotop50_map = np.copy(echotop50_map[miny:maxy, minx:maxx])
+                    ########################################################################
+                    # Fill matrices within the cloud boundary with MCS data
+                    logger.debug("Fill map with data")
+                    subshape = (maxy - miny, maxx - minx)
+                    isublocationy = icloudlocationy - miny
+                    isublocationx = icloudlocationx - minx
+                    sub_maps = []
+                    for var_map in (rawrainratemap, reflectivity, sl3d, echotop10, echotop20,
+                                    echotop30, echotop40, echotop45, echotop50):
+                        sub_map = np.full(subshape, np.nan, dtype=float)
+                        sub_map[isublocationy, isublocationx] = var_map[icloudlocationy, icloudlocationx]
+                        sub_maps.append(sub_map)
+                    sub_rainrate_map, sub_reflectivity_map, sub_sl3d_map, \
+                    sub_echotop10_map, sub_echotop20_map, sub_echotop30_map, \
+                    sub_echotop40_map, sub_echotop45_map, sub_echotop50_map = sub_maps
+                    logger.debug(
+                        ("rainrate_map allocation size: ", sub_rainrate_map.shape)
+                    )
 
                     # Calculate total rainfall within the cold cloud shield
                     total_rain[imatchcloud] = np.nansum(sub_rainrate_map)
@@ -1004,19 +960,22 @@ def calc_cc_stats(
     )
     logger.debug(("Number of cores " + str(numcc)))
 
-    # Get the shape of the full data array
-    ny, nx = lon.shape
+    # Index the pixel locations of all cores
+    cc_pixel_index = get_label_pixel_index(ccnumberlabelmap)
+    # Cores with matching pixel count
+    cc_match = np.zeros(ncc_save, dtype=bool)
 
     ###############################################
-    # Loop through each PF
+    # Loop through each core
     for icc in range(1, ncc_save + 1):
         #######################################
         # Find indices of the core
-        iiccy, iiccx = np.where(ccnumberlabelmap == icc)
+        iiccy, iiccx = get_label_pixels(cc_pixel_index, icc)
         iiccnpix = len(iiccy)
 
         # Double check to make sure PF pixel count is the same
         if iiccnpix == cc_npix[icc - 1]:
+            cc_match[icc - 1] = True
             ##########################################
             # Compute core statistics
 
@@ -1037,53 +996,30 @@ def calc_cc_stats(
                     ccmaxechotop45[icc - 1] = np.nanmax(sub_echotop45_map[iiccy, iiccx])
                     ccmaxechotop50[icc - 1] = np.nanmax(sub_echotop50_map[iiccy, iiccx])
 
-            # Generate a binary map of core
-            iiccflagmap = np.zeros((subdimy, subdimx), dtype=int)
-            iiccflagmap[iiccy, iiccx] = 1
-
-            # Geometric statistics
-            _sub_reflectivity_map = np.copy(sub_reflectivity_map)
-            _sub_reflectivity_map[np.isnan(_sub_reflectivity_map)] = -9999
-            # _sub_reflectivity_map = np.full((subdimy, subdimx), -9999, dtype=float)
-            # _sub_reflectivity_map[iiccy, iiccx] = sub_reflectivity_map[iiccy, iiccx]
-            ccproperties = regionprops(
-                iiccflagmap,
-                intensity_image=_sub_reflectivity_map,
-            )
-
-            cceccentricity[icc - 1] = ccproperties[0].eccentricity
-            ccmajoraxis[icc - 1] = ccproperties[0].major_axis_length * pixel_radius
-
-            # Need to treat minor axis length with an error except
-            # since the python algorithm occasionally throws an error.
-            try:
-                ccminoraxis[icc - 1] = (ccproperties[0].minor_axis_length * pixel_radius)
-            except ValueError:
-                pass
-            if ~np.isnan(ccminoraxis[icc - 1]) or ~np.isnan(ccmajoraxis[icc - 1]):
-                ccaspectratio[icc - 1] = np.divide(ccmajoraxis[icc - 1], ccminoraxis[icc - 1])
-            ccorientation[icc - 1] = (ccproperties[0].orientation) * (180 / float(pi))
-            ccperimeter[icc - 1] = (ccproperties[0].perimeter * pixel_radius)
-            [ycentroid, xcentroid] = ccproperties[0].centroid
-            [yweightedcentroid, xweightedcentroid] = ccproperties[0].weighted_centroid
-
-            # Shift the centroids by minx/miny
-            # since the core is a subset from the full image
-            # Round the centroid values as indices
-            if (~np.isnan(ycentroid)) & (~np.isnan(xcentroid)):
-                ycentroid = int(np.round(ycentroid + miny))
-                xcentroid = int(np.round(xcentroid + minx))
-            if (~np.isnan(yweightedcentroid)) & (~np.isnan(xweightedcentroid)):
-                yweightedcentroid = int(np.round(yweightedcentroid + miny))
-                xweightedcentroid = int(np.round(xweightedcentroid + minx))
-
-            # Apply the indices to get centroid lat/lon
-            if (0 < (ycentroid) < ny) & (0 < (xcentroid) < nx):
-                cclon_centroid[icc - 1] = lon[ycentroid, xcentroid]
-                cclat_centroid[icc - 1] = lat[ycentroid, xcentroid]
-            if (0 < (yweightedcentroid) < ny) & (0 < (xweightedcentroid) < nx):
-                cclon_weightedcentroid[icc - 1] = lon[yweightedcentroid, xweightedcentroid]
-                cclat_weightedcentroid[icc - 1] = lat[yweightedcentroid, xweightedcentroid]
+    ###############################################
+    # Geometric statistics of all cores
+    _sub_reflectivity_map = np.copy(sub_reflectivity_map)
+    _sub_reflectivity_map[np.isnan(_sub_reflectivity_map)] = -9999
+    cc_shape_stats = calc_label_shape_stats(
+        ccnumberlabelmap, ncc_save, _sub_reflectivity_map, pixel_radius,
+    )
+    cceccentricity[cc_match] = cc_shape_stats["eccentricity"][cc_match]
+    ccmajoraxis[cc_match] = cc_shape_stats["majoraxis"][cc_match]
+    ccminoraxis[cc_match] = cc_shape_stats["minoraxis"][cc_match]
+    ccaspectratio[cc_match] = cc_shape_stats["aspectratio"][cc_match]
+    ccorientation[cc_match] = cc_shape_stats["orientation"][cc_match]
+    ccperimeter[cc_match] = cc_shape_stats["perimeter"][cc_match]
+    # Get centroid lat/lon
+    _lon_centroid, _lat_centroid = get_centroid_latlon(
+        cc_shape_stats["ycentroid"], cc_shape_stats["xcentroid"], miny, minx, lat, lon, fillval_f,
+    )
+    cclon_centroid[cc_match] = _lon_centroid[cc_match]
+    cclat_centroid[cc_match] = _lat_centroid[cc_match]
+    _lon_centroid, _lat_centroid = get_centroid_latlon(
+        cc_shape_stats["yweightedcentroid"], cc_shape_stats["xweightedcentroid"], miny, minx, lat, lon, fillval_f,
+    )
+    cclon_weightedcentroid[cc_match] = _lon_centroid[cc_match]
+    cclat_weightedcentroid[cc_match] = _lat_centroid[cc_match]
 
     # Put all variables in dictionary for output
     cc_stats_dict = {
@@ -1199,8 +1135,13 @@ def calc_pf_stats(
     )
     logger.debug(("Number of PFs " + str(numpf)))
 
-    # Get the shape of the full data array
-    ny, nx = lon.shape
+    # Index the pixel locations of all PFs
+    pf_pixel_index = get_label_pixel_index(pfnumberlabelmap)
+
+    # Find indices of the max rain rate
+    iipfy_max, iipfx_max = np.unravel_index(
+        np.nanargmax(sub_rainrate_map), sub_rainrate_map.shape
+    )
 
     ###############################################
     # Loop through each PF
@@ -1208,37 +1149,9 @@ def calc_pf_stats(
 
         #######################################
         # Find indices of the PF
-        iipfy, iipfx = np.array(
-            np.where(pfnumberlabelmap == ipf)
-        )
+        iipfy, iipfx = get_label_pixels(pf_pixel_index, ipf)
         iipfnpix = len(iipfy)
 
-        # Find indices of the PF with heavy rain
-        iipfy_heavy, iipfx_heavy = np.array(
-            np.where(
-                (pfnumberlabelmap == ipf)
-                & (sub_rainrate_map > heavy_rainrate_thresh)
-            )
-        )
-        iipfnpix_heavy = len(iipfy_heavy)
-
-        # Find indices of the PF with max rain rate
-        iipfy_max, iipfx_max = np.unravel_index(
-            np.nanargmax(sub_rainrate_map), sub_rainrate_map.shape
-        )
-
-        # Find convective indices
-        iipfy_cc, iipfx_cc = np.where(
-            (pfnumberlabelmap == ipf) & (sub_sl3d_map >= 1) & (sub_sl3d_map <= 2)
-        )
-        iipfnpix_cc = len(iipfy_cc)
-
-        # Find stratiform indices
-        iipfy_sf, iipfx_sf = np.where(
-            (pfnumberlabelmap == ipf) & (sub_sl3d_map == 3)
-        )
-        iipfnpix_sf = len(iipfy_sf)
-
         # Double check to make sure PF pixel count is the same
         if iipfnpix == pf_npix[ipf - 1]:
             ##########################################
@@ -1250,27 +1163,37 @@ def calc_pf_stats(
             pflon[ipf - 1] = np.nanmean(lon[iipfy[:] + miny, iipfx[:] + minx])
             pflat[ipf - 1] = np.nanmean(lat[iipfy[:] + miny, iipfx[:] + minx])
 
-            pfrainrate[ipf - 1] = np.nanmean(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfmaxrainrate[ipf - 1] = np.nanmax(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfskewness[ipf - 1] = skew(sub_rainrate_map[iipfy[:], iipfx[:]])
-            pfaccumrain[ipf - 1] = np.nansum(sub_rainrate_map[iipfy[:], iipfx[:]])
-            if iipfnpix_heavy > 0:
-                pfaccumrainheavy[ipf - 1] = np.nansum(
-                    sub_rainrate_map[iipfy_heavy[:], iipfx_heavy[:]]
-                )
+            iipfrainrate = sub_rainrate_map[iipfy, iipfx]
+            pfrainrate[ipf - 1] = np.nanmean(iipfrainrate)
+            pfmaxrainrate[ipf - 1] = np.nanmax(iipfrainrate)
+            pfskewness[ipf - 1] = skew(iipfrainrate)
+            pfaccumrain[ipf - 1] = np.nansum(iipfrainrate)
+            # PF pixels with heavy rain
+            iipfrainrate_heavy = iipfrainrate[iipfrainrate > heavy_rainrate_thresh]
+            if len(iipfrainrate_heavy) > 0:
+                pfaccumrainheavy[ipf - 1] = np.nansum(iipfrainrate_heavy)
+
+            # Convective/stratiform pixels within the PF
+            iipfsl3d = sub_sl3d_map[iipfy, iipfx]
+            iipfcc = (iipfsl3d >= 1) & (iipfsl3d <= 2)
+            iipfsf = iipfsl3d == 3
+            iipfnpix_cc = np.count_nonzero(iipfcc)
+            iipfnpix_sf = np.count_nonzero(iipfsf)
 
             # Convective/stratiform rain statistics
-            pfccnpix[ipf - 1] = np.copy(len(iipfy_cc))
-            pfsfnpix[ipf - 1] = np.copy(len(iipfy_sf))
+            pfccnpix[ipf - 1] = np.copy(iipfnpix_cc)
+            pfsfnpix[ipf - 1] = np.copy(iipfnpix_sf)
             if iipfnpix_cc > 0:
-                pfccrainrate[ipf - 1] = np.nanmean(sub_rainrate_map[iipfy_cc, iipfx_cc])
-                pfccrainamount[ipf - 1] = np.nansum(sub_rainrate_map[iipfy_cc, iipfx_cc])
+                pfccrainrate[ipf - 1] = np.nanmean(iipfrainrate[iipfcc])
+                pfccrainamount[ipf - 1] = np.nansum(iipfrainrate[iipfcc])
             if iipfnpix_sf > 0:
-                pfsfrainrate[ipf - 1] = np.nanmean(sub_rainrate_map[iipfy_sf, iipfx_sf])
-                pfsfrainamount[ipf - 1] = np.nansum(sub_rainrate_map[iipfy_sf, iipfx_sf])
+                pfsfrainrate[ipf - 1] = np.nanmean(iipfrainrate[iipfsf])
+                pfsfrainamount[ipf - 1] = np.nansum(iipfrainrate[iipfsf])
 
             # Convective echotop height statistics
             if iipfnpix_cc > 0:
+                iipfy_cc = iipfy[iipfcc]
+                iipfx_cc = iipfx[iipfcc]
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore", category=RuntimeWarning)
                     pfccmaxechotop10[ipf - 1] = np.nanmax(sub_echotop10_map[iipfy_cc, iipfx_cc])
@@ -1290,73 +1213,33 @@ def calc_pf_stats(
                         sub_echotop50_map[iipfy_cc, iipfx_cc] > 0
                     )
 
-            # Generate a binary map of PF
-            iipfflagmap = np.zeros((subdimy, subdimx), dtype=int)
-            iipfflagmap[iipfy, iipfx] = 1
-
-            # Geometric statistics
-            _sub_rainrate_map = np.copy(sub_rainrate_map)
-            _sub_rainrate_map[np.isnan(_sub_rainrate_map)] = -9999
-            pfproperties = regionprops(
-                iipfflagmap,
-                intensity_image=_sub_rainrate_map,
-            )
-            pfeccentricity[ipf - 1] = pfproperties[0].eccentricity
-            pfmajoraxis[ipf - 1] = (
-                    pfproperties[0].major_axis_length * pixel_radius
-            )
-
-            # Need to treat minor axis length with an error except
-            # since the python algorithm occasionally throws an error.
-            try:
-                pfminoraxis[ipf - 1] = (
-                        pfproperties[0].minor_axis_length
-                        * pixel_radius
-                )
-            except ValueError:
-                pass
-            if ~np.isnan(pfminoraxis[ipf - 1]) or \
-                    ~np.isnan(pfmajoraxis[ipf - 1]):
-                pfaspectratio[ipf - 1] = np.divide(
-                    pfmajoraxis[ipf - 1], pfminoraxis[ipf - 1]
-                )
-            pforientation[ipf - 1] = (
-                                         pfproperties[0].orientation
-                                     ) * (180 / float(pi))
-            pfperimeter[ipf - 1] = (
-                    pfproperties[0].perimeter * pixel_radius
-            )
-            [
-                ycentroid,
-                xcentroid,
-            ] = pfproperties[0].centroid
-            [
-                yweightedcentroid,
-                xweightedcentroid,
-            ] = pfproperties[0].weighted_centroid
-
-            # Shift the centroids by minx/miny
-            # since the PF is a subset from the full image
-            # Round the centroid values as indices
-            ycentroid = int(np.round(ycentroid + miny))
-            xcentroid = int(np.round(xcentroid + minx))
-            yweightedcentroid = int(np.round(yweightedcentroid + miny))
-            xweightedcentroid = int(np.round(xweightedcentroid + minx))
-
-            # Apply the indices to get centroid lat/lon
-            if (0 < (ycentroid) < ny) & (0 < (xcentroid) < nx):
-                pflon_centroid[ipf-1] = lon[ycentroid, xcentroid]
-                pflat_centroid[ipf-1] = lat[ycentroid, xcentroid]
-            if (0 < (yweightedcentroid) < ny) & (0 < (xweightedcentroid) < nx):
-                pflon_weightedcentroid[ipf-1] = lon[yweightedcentroid, xweightedcentroid]
-                pflat_weightedcentroid[ipf-1] = lat[yweightedcentroid, xweightedcentroid]
-
             # Shift the x, y indices by minx/miny
             pflon_maxrainrate[ipf - 1] = lon[iipfy_max + miny, iipfx_max + minx]
             pflat_maxrainrate[ipf - 1] = lat[iipfy_max + miny, iipfx_max + minx]
 
         else:
             sys.exit("Error: PF pixel count not matching!")
+
+    ###############################################
+    # Geometric statistics of all PFs
+    _sub_rainrate_map = np.copy(sub_rainrate_map)
+    _sub_rainrate_map[np.isnan(_sub_rainrate_map)] = -9999
+    pf_shape_stats = calc_label_shape_stats(
+        pfnumberlabelmap, npf_save, _sub_rainrate_map, pixel_radius,
+    )
+    pfeccentricity[:] = pf_shape_stats["eccentricity"]
+    pfmajoraxis[:] = pf_shape_stats["majoraxis"]
+    pfminoraxis[:] = pf_shape_stats["minoraxis"]
+    pfaspectratio[:] = pf_shape_stats["aspectratio"]
+    pforientation[:] = pf_shape_stats["orientation"]
+    pfperimeter[:] = pf_shape_stats["perimeter"]
+    # Get centroid lat/lon
+    pflon_centroid, pflat_centroid = get_centroid_latlon(
+        pf_shape_stats["ycentroid"], pf_shape_stats["xcentroid"], miny, minx, lat, lon, fillval_f,
+    )
+    pflon_weightedcentroid, pflat_weightedcentroid = get_centroid_latlon(
+        pf_shape_stats["yweightedcentroid"], pf_shape_stats["xweightedcentroid"], miny, minx, lat, lon, fillval_f,
+    )
     logger.debug("Loop done")
 
     # Put all variables in dictionary for output
@@ -1447,7 +1330,7 @@ def get_cloud_boundary(icloudlocationx, icloudlocationy, xdim, ydim):
 
 
 def add_merge_split_cloud_locations(
-        cloudnumbermap,
+        cloud_pixel_index,
         icloudlocationx,
         icloudlocationy,
         ittmergecloudnumber,
@@ -1458,67 +1341,32 @@ def add_merge_split_cloud_locations(
     Add pixel location indices of merge and split clouds to the current cloud indices.
 
     Args:
-        cloudnumbermap:
-        icloudlocationt:
-        icloudlocationx:
-        icloudlocationy:
-        ittmergecloudnumber:
-        ittsplitcloudnumber:
-        logger:
+        cloud_pixel_index: dictionary
+            Pixel index of the cloudnumber map from get_label_pixel_index.
+        icloudlocationx: numpy array
+            Cloud location indices in x-direction.
+        icloudlocationy: numpy array
+            Cloud location indices in y-direction.
+        ittmergecloudnumber: numpy array
+            Cloudnumbers for merging clouds.
+        ittsplitcloudnumber: numpy array
+            Cloudnumbers for splitting clouds.
+        logger: logger
+            Logger.
 
     Returns:
-        icloudlocationt: t-indices
         icloudlocationx: x-indices
         icloudlocationy: y-indices
     """
     ######################################################################
-    # Check if any small clouds merge
-    logger.debug("Finding mergers")
-    idmergecloudnumber = np.array(np.where(ittmergecloudnumber > 0))[0,:]
-    nmergecloud = len(idmergecloudnumber)
-    if nmergecloud > 0:
-        # Loop over each merging cloud
-        for imc in idmergecloudnumber:
-            # Find location of the merging cloud
-            (
-                imergelocationy,
-                imergelocationx,
-            ) = np.array(
-                np.where(cloudnumbermap == ittmergecloudnumber[imc])
-            )
-            nmergepix = len(imergelocationy)
-
-            # Add merge pixes to mcs pixels
-            if nmergepix > 0:
-                icloudlocationy = np.hstack(
-                    (icloudlocationy, imergelocationy)
-                )
-                icloudlocationx = np.hstack(
-                    (icloudlocationx, imergelocationx)
-                )
-    ######################################################################
-    # Check if any small clouds split
-    logger.debug("Finding splits")
-    idsplitcloudnumber = np.array(np.where(ittsplitcloudnumber > 0))[0,:]
-    nsplitcloud = len(idsplitcloudnumber)
-    if nsplitcloud > 0:
-        # Loop over each merging cloud
-        for imc in idsplitcloudnumber:
-            # Find location of the merging cloud
-            (
-                isplitlocationy,
-                isplitlocationx,
-            ) = np.array(
-                np.where(cloudnumbermap == ittsplitcloudnumber[imc])
-            )
-            nsplitpix = len(isplitlocationy)
-
-            # Add split pixels to mcs pixels
-            if nsplitpix > 0:
-                icloudlocationy = np.hstack(
-                    (icloudlocationy, isplitlocationy)
-                )
-                icloudlocationx = np.hstack(
-                    (icloudlocationx, isplitlocationx)
-                )
-    return icloudlocationx, icloudlocationy
\ No newline at end of file
+    # Find location of the merging and splitting clouds
+    logger.debug("Finding mergers and splits")
+    ms_cloudnumber = np.concatenate((
+        ittmergecloudnumber[ittmergecloudnumber > 0],
+        ittsplitcloudnumber[ittsplitcloudnumber > 0],
+    ))
+    ilocationy, ilocationx = get_label_pixels(cloud_pixel_index, ms_cloudnumber)
+    # Add merge/split pixels to mcs pixels
+    icloudlocationy = np.hstack((icloudlocationy, ilocationy))
+    icloudlocationx = np.hstack((icloudlocationx, ilocationx))
+    return icloudlocationx, icloudlocationy
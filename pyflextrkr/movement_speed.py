@@ -3,14 +3,17 @@ import sys
 import os
 import time
 import logging
+from collections import deque
 import numpy as np
 from netCDF4 import Dataset
 import xarray as xr
-from scipy.signal import fftconvolve
+from scipy import fft as sp_fft
 from scipy.interpolate import interp1d
+from scipy.ndimage import find_objects
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, build_basetime_index, match_nearest_basetime_index, \
+    get_file_pair_blocks, get_netcdf_encoding
 from pyflextrkr.ftfunctions import find_max_indices_to_roll, subset_roll_map
 
 def movement_speed(
@@ -102,25 +105,29 @@ def movement_speed(
     stats_basetime = ds_stats.variables['base_time'].values
     ds_stats.close()
 
-    # Make file pairs
-    filepairs = list(zip(filelist[0:-lag], filelist[lag::]))
-
+    # Split file pairs (ifile, ifile + lag) into contiguous blocks,
+    # each block reads its files once and keeps the last lag files in memory
+    if run_parallel == 0:
+        nblocks = 1
+    else:
+        nblocks = config.get("nblocks_for_speed", config.get("nprocesses", 1))
+    blocks = get_file_pair_blocks(nfiles, lag, nblocks)
 
     results = []
     # Serial
     if run_parallel == 0:
-        for ifile in range(0, nfiles-1):
-            result = movement_of_feature_fft(
-                filepairs[ifile], ntracks,
+        for istart, iend in blocks:
+            result = movement_of_feature_fft_block(
+                filelist[istart:iend + lag], lag, ntracks,
                 config,
             )
             results.append(result)
         final_result = results
     # Parallel
     elif run_parallel >= 1:
-        for ifile in range(0, nfiles-1):
-            result = dask.delayed(movement_of_feature_fft)(
-                filepairs[ifile], ntracks,
+        for istart, iend in blocks:
+            result = dask.delayed(movement_of_feature_fft_block)(
+                filelist[istart:iend + lag], lag, ntracks,
                 config,
             )
             results.append(result)
@@ -128,6 +135,8 @@ def movement_speed(
         wait(final_result)
     else:
         sys.exit('Valid parallelization flag not provided')
+    # Combine file pair results from all blocks
+    final_result = [result for block_result in final_result for result in block_result]
 
     move_y, move_x, time_lag, base_time = zip(*final_result)
     move_y = np.array(move_y)
@@ -172,8 +181,7 @@ def movement_speed(
         os.remove(statistics_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
 
     # Write to netcdf file
     dsout.to_netcdf(path=statistics_outfile, mode="w",
@@ -184,6 +192,49 @@ def movement_speed(
 
 
 
+def movement_of_feature_fft_block(
+        filelist,
+        lag,
+        ntracks,
+        config,
+        optimize_sub_array=True,
+):
+    """
+    Calculate movement of tracked features for a block of consecutive file pairs.
+
+    Each file is read once, the last lag files are kept in a ring buffer
+    to pair with the following files.
+
+    Args:
+        filelist: list
+            Pixel file names in the block, file pairs are (filelist[i], filelist[i + lag]).
+        lag: int
+            Number of files between the two files of a pair.
+        ntracks: int
+            Number of tracks.
+        config: dictionary
+            Dictionary containing config parameters.
+        optimize_sub_array: boolean
+            Flag to subset each tracked feature from the full image.
+
+    Returns:
+        results: list
+            List of (y_lag, x_lag, time_lag, base_time) for each file pair,
+            see movement_of_feature_fft.
+    """
+    frames = deque(maxlen=lag + 1)
+    results = []
+    for filename in filelist:
+        frames.append(load_feature_frame(filename, ntracks, config))
+        if len(frames) == lag + 1:
+            result = movement_of_feature_frames(
+                frames[0], frames[-1], ntracks, config,
+                optimize_sub_array=optimize_sub_array,
+            )
+            results.append(result)
+    return results
+
+
 def movement_of_feature_fft(
         filepairs,
         ntracks,
@@ -213,126 +264,349 @@ def movement_of_feature_fft(
         base_time: float
             Base time for the first pixel file.
     """
+    frame_1 = load_feature_frame(filepairs[0], ntracks, config)
+    frame_2 = load_feature_frame(filepairs[1], ntracks, config)
+    return movement_of_feature_frames(
+        frame_1, frame_2, ntracks, config,
+        optimize_sub_array=optimize_sub_array,
+    )
 
+
+def load_feature_frame(
+        filename,
+        ntracks,
+        config,
+):
+    """
+    Read the tracked feature variables from a pixel file.
+
+    Args:
+        filename: string
+            Pixel file name.
+        ntracks: int
+            Number of tracks.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        frame: dictionary
+            Dictionary containing the file name (filename), track number (tracknumber),
+            field values (field), pixel size of each track (cloud_size),
+            bounding slices of each track (objects) and time (time).
+    """
     tracknumber = config["track_number_for_speed"]
     track_field = config["track_field_for_speed"]
+
+    dset = Dataset(filename, 'r')
+    # Get tracknumber and field values
+    tracknumber_map = dset.variables[tracknumber][:].squeeze()
+    frame = {
+        "filename": filename,
+        "tracknumber": tracknumber_map,
+        "field": dset.variables[track_field][:].squeeze(),
+        "cloud_size": get_pixel_size_of_clouds(tracknumber_map, ntracks),
+        # Bounding slices of all tracks, None for absent tracks
+        "objects": find_objects(np.ma.filled(tracknumber_map, 0), max_label=ntracks),
+        "time": dset.variables['time'][0].copy(),
+    }
+    dset.close()
+    return frame
+
+
+def movement_of_feature_frames(
+        frame_1,
+        frame_2,
+        ntracks,
+        config,
+        optimize_sub_array=True,
+):
+    """
+    Calculate movement of tracked features between two pixel files.
+
+    Args:
+        frame_1: dictionary
+            First pixel file variables from load_feature_frame.
+        frame_2: dictionary
+            Second pixel file variables from load_feature_frame.
+        ntracks: int
+            Number of tracks.
+        config: dictionary
+            Dictionary containing config parameters.
+        optimize_sub_array: boolean
+            Flag to subset each tracked feature from the full image.
+
+    Returns:
+        y_lag: np.array
+            Movement magnitude in y-direction.
+        x_lag: np.array
+            Movement magnitude in x-direction.
+        time_lag: float
+            Time difference between two pixel files.
+        base_time: float
+            Base time for the first pixel file.
+    """
+
     min_size_thresh = config["min_size_thresh_for_speed"]
+    # Number of threads for FFT
+    fft_workers = config.get("fft_workers_for_speed", 1)
     # Parameters for handling perdiodic boundary condition
     pbc_direction = config.get("pbc_direction", "none")
     max_feature_frac_x = 0.95   # Max fraction of domain size for a feature in x-direction
     max_feature_frac_y = 0.95   # Max fraction of domain size for a feature in y-direction
 
     logger = logging.getLogger(__name__)
-    logger.debug("Starting Storm File: %s" % filepairs[0])
+    logger.debug("Starting Storm File: %s" % frame_1["filename"])
     sys.stdout.flush()
 
-    dset1 = Dataset(filepairs[0], 'r')
-    dset2 = Dataset(filepairs[1], 'r')
-    y_lag = np.zeros(ntracks)
-    x_lag = np.zeros(ntracks)
+    # Movement is NaN for tracks that are absent or too small in either file
+    y_lag = np.full(ntracks, np.nan)
+    x_lag = np.full(ntracks, np.nan)
 
     # Get minimum size of feature from pixel files
-    min_cloud_size = np.minimum(get_pixel_size_of_clouds(dset1, ntracks, tracknumber),
-                                get_pixel_size_of_clouds(dset2, ntracks, tracknumber))
+    min_cloud_size = np.minimum(frame_1["cloud_size"], frame_2["cloud_size"])
     # Get tracknumber and field values
-    tracknumber_1 = dset1.variables[tracknumber][:].squeeze()
-    tracknumber_2 = dset2.variables[tracknumber][:].squeeze()
-    field_1 = dset1.variables[track_field][:].squeeze()
-    field_2 = dset2.variables[track_field][:].squeeze()
+    tracknumber_1 = frame_1["tracknumber"]
+    tracknumber_2 = frame_2["tracknumber"]
+    field_1 = frame_1["field"]
+    field_2 = frame_2["field"]
     # Get dimensions of data
     ydim, xdim = np.shape(field_1)
 
+    # Find tracks present in both files that pass the min cloud size threshold
+    track_indices = np.where((min_cloud_size > 0) & (min_cloud_size >= min_size_thresh))[0]
+    # Bounding boxes of all tracks in each file
+    objects_1 = frame_1["objects"]
+    objects_2 = frame_2["objects"]
+
+    # Masked fields of each track
+    track_fields_1 = []
+    track_fields_2 = []
+
     # Loop over each track number
-    for track_number in np.arange(0, ntracks):
+    for track_number in track_indices:
         # In pixel mask files, track number need to +1
         # track indices start from 0, pixel mask track numbers start from 1
         track_number_pix = track_number + 1
-        # Check min cloud size against threshold
-        if min_cloud_size[track_number] < min_size_thresh:
-            y_lag[track_number] = np.nan
-            x_lag[track_number] = np.nan
+        if optimize_sub_array:
+            # Subset array to only contain the current track mask area
+            # Calculate size of bounding box
+            ymin, ymax, xmin, xmax = get_bounding_box_for_fft(
+                objects_1[track_number], objects_2[track_number],
+            )
+            masked_field_1 = field_1[ymin:ymax, xmin:xmax].copy()
+            masked_field_2 = field_2[ymin:ymax, xmin:xmax].copy()
+
+            # Replace data outside of the current track mask area or NaN with 0
+            masked_field_1[tracknumber_1[ymin:ymax, xmin:xmax] != track_number_pix] = 0
+            masked_field_1[np.isnan(masked_field_1)] = 0
+
+            masked_field_2[tracknumber_2[ymin:ymax, xmin:xmax] != track_number_pix] = 0
+            masked_field_2[np.isnan(masked_field_2)] = 0
+
+            # Check feature boundary span
+            # If boundary span > X fraction of domain, and periodic boundary condition is set,
+            # roll the data such that the feature does not span across the domain boundary
+            if (((xmax - xmin) >= xdim * max_feature_frac_x) or \
+                ((ymax - ymin) >= ydim * max_feature_frac_y)) and \
+                (pbc_direction != 'none'):
+                # Make a mask of valid values for both fields
+                masked_fields = (np.abs(masked_field_1) > 0) | (np.abs(masked_field_2) > 0)
+                # Find the indices to roll the array to avoid periodic boundary condition
+                shift_x_right, shift_y_top = find_max_indices_to_roll(
+                    masked_fields, xdim, ydim,
+                )
+                # Roll arrays to avoid periodic boundary condition
+                masked_field_1 = subset_roll_map(
+                    masked_field_1, shift_x_right, shift_y_top, xdim, ydim, fillval=0,
+                )
+                masked_field_2 = subset_roll_map(
+                    masked_field_2, shift_x_right, shift_y_top, xdim, ydim, fillval=0,
+                )
         else:
-            if optimize_sub_array:
-                # Subset array to only contain the current track mask area
-                # Calculate size of bounding box
-                ymin, ymax, xmin, xmax = get_bounding_box_for_fft(tracknumber_1, tracknumber_2, track_number_pix)
-                masked_field_1 = field_1[ymin:ymax, xmin:xmax].copy()
-                masked_field_2 = field_2[ymin:ymax, xmin:xmax].copy()
-
-                # Replace data outside of the current track mask area or NaN with 0
-                masked_field_1[tracknumber_1[ymin:ymax, xmin:xmax] != track_number_pix] = 0
-                masked_field_1[np.isnan(masked_field_1)] = 0
-
-                masked_field_2[tracknumber_2[ymin:ymax, xmin:xmax] != track_number_pix] = 0
-                masked_field_2[np.isnan(masked_field_2)] = 0
-
-                # Check feature boundary span
-                # If boundary span > X fraction of domain, and periodic boundary condition is set,
-                # roll the data such that the feature does not span across the domain boundary
-                if (((xmax - xmin) >= xdim * max_feature_frac_x) or \
-                    ((ymax - ymin) >= ydim * max_feature_frac_y)) and \
-                    (pbc_direction != 'none'):
-                    # Make a mask of valid values for both fields
-                    masked_fields = (np.abs(masked_field_1) > 0) | (np.abs(masked_field_2) > 0)
-                    # Find the indices to roll the array to avoid periodic boundary condition
-                    shift_x_right, shift_y_top = find_max_indices_to_roll(
-                        masked_fields, xdim, ydim,
-                    )
-                    # Roll arrays to avoid periodic boundary condition
-                    masked_field_1 = subset_roll_map(
-                        masked_field_1, shift_x_right, shift_y_top, xdim, ydim, fillval=0,
-                    )
-                    masked_field_2 = subset_roll_map(
-                        masked_field_2, shift_x_right, shift_y_top, xdim, ydim, fillval=0,
-                    )
-            else:
-                masked_field_1 = field_1.copy()
-                masked_field_2 = field_2.copy()
-
-                # Replace data outside of the current track mask area or NaN with 0
-                masked_field_1[tracknumber_1 != track_number_pix] = 0
-                masked_field_1[np.isnan(masked_field_1)] = 0
-
-                masked_field_2[tracknumber_2 != track_number_pix] = 0
-                masked_field_2[np.isnan(masked_field_2)] = 0
-
-            # Flip the second image, do an FFT convolution
-            result = fftconvolve(masked_field_1, masked_field_2[::-1, ::-1], mode='same')
-            # Get the index with max value (highest correlation)
-            # then reshape it to 2D to get x, y index
-
-            # ALTERNATIVE No. 1
-            y_step, x_step = np.apply_along_axis(np.mean, 1,
-                np.asarray(np.where(result>np.quantile(result, .995)))).round(0).astype('int')
-
-            y_dim, x_dim = np.shape(masked_field_1)
-            # Get the relative position from the center of the image
-            # This is the movement in x, y direction
-            y_lag[track_number] = np.floor(y_dim/2) - y_step
-            x_lag[track_number] = np.floor(x_dim/2) - x_step
+            masked_field_1 = field_1.copy()
+            masked_field_2 = field_2.copy()
 
-    # Get time difference between the file pair
-    time_lag = dset2.variables['time'][0] - dset1.variables['time'][0]
-    base_time = dset1.variables['time'][0].copy()
+            # Replace data outside of the current track mask area or NaN with 0
+            masked_field_1[tracknumber_1 != track_number_pix] = 0
+            masked_field_1[np.isnan(masked_field_1)] = 0
+
+            masked_field_2[tracknumber_2 != track_number_pix] = 0
+            masked_field_2[np.isnan(masked_field_2)] = 0
+
+        track_fields_1.append(masked_field_1)
+        track_fields_2.append(masked_field_2)
+
+    # Calculate movement of all tracks with batched FFT cross-correlation
+    y_lag[track_indices], x_lag[track_indices] = movement_of_fields_fft(
+        track_fields_1, track_fields_2, workers=fft_workers,
+    )
 
-    dset1.close()
-    dset2.close()
+    # Get time difference between the file pair
+    time_lag = frame_2["time"] - frame_1["time"]
+    base_time = frame_1["time"]
     return y_lag, x_lag, time_lag, base_time
 
 
+def movement_of_fields_fft(
+        fields_1,
+        fields_2,
+        workers=1,
+        max_batch_pixels=2**24,
+):
+    """
+    Calculate movement between pairs of fields with batched FFT cross-correlation.
+
+    The cross-correlation of each pair is the same as
+    fftconvolve(field_1, field_2[::-1, ::-1], mode='same').
+    Pairs are zero-padded to a few FFT-friendly sizes, pairs with the same padded size
+    are transformed together in one rfft2 call, which also reuses the cached FFT plans.
+
+    Args:
+        fields_1: list
+            List of 2D fields at the first time.
+        fields_2: list
+            List of 2D fields at the second time.
+        workers: int, default=1
+            Number of threads for FFT.
+        max_batch_pixels: int, default=2**24
+            Max number of padded pixels in a batch, to limit memory usage.
+
+    Returns:
+        y_lag: np.array
+            Movement in y-direction [number of grids].
+        x_lag: np.array
+            Movement in x-direction [number of grids].
+    """
+    npairs = len(fields_1)
+    y_lag = np.full(npairs, np.nan)
+    x_lag = np.full(npairs, np.nan)
+
+    # Group pairs by padded FFT shape
+    fft_groups = {}
+    for ipair in range(npairs):
+        fshape = get_fft_shape(np.shape(fields_1[ipair]), np.shape(fields_2[ipair]))
+        fft_groups.setdefault(fshape, []).append(ipair)
+
+    for fshape, group_pairs in fft_groups.items():
+        # Split the group into batches
+        nbatch = max(1, max_batch_pixels // (fshape[0] * fshape[1]))
+        for ibatch in range(0, len(group_pairs), nbatch):
+            batch_pairs = group_pairs[ibatch:ibatch + nbatch]
+            dtype = np.result_type(*[fields_1[ii] for ii in batch_pairs],
+                                   *[fields_2[ii] for ii in batch_pairs], np.float32)
+            batch_1 = np.zeros((len(batch_pairs),) + fshape, dtype=dtype)
+            batch_2 = np.zeros((len(batch_pairs),) + fshape, dtype=dtype)
+            for jj, ii in enumerate(batch_pairs):
+                ny1, nx1 = np.shape(fields_1[ii])
+                ny2, nx2 = np.shape(fields_2[ii])
+                batch_1[jj, :ny1, :nx1] = np.asarray(fields_1[ii])
+                # Flip the second image to calculate cross-correlation with a convolution
+                batch_2[jj, :ny2, :nx2] = np.asarray(fields_2[ii])[::-1, ::-1]
+
+            # FFT convolution of all pairs in the batch
+            spec = sp_fft.rfft2(batch_1, workers=workers)
+            spec *= sp_fft.rfft2(batch_2, workers=workers)
+            result = sp_fft.irfft2(spec, s=fshape, workers=workers)
+
+            for jj, ii in enumerate(batch_pairs):
+                ny1, nx1 = np.shape(fields_1[ii])
+                ny2, nx2 = np.shape(fields_2[ii])
+                # Take the center part of the convolution with the same size as the first field
+                ystart = (ny2 - 1) // 2
+                xstart = (nx2 - 1) // 2
+                result_same = result[jj, ystart:ystart + ny1, xstart:xstart + nx1]
+                # Get the mean index of the highest correlation values
+                y_step, x_step = get_correlation_peak(result_same)
+                # Get the relative position from the center of the image
+                # This is the movement in x, y direction
+                y_lag[ii] = np.floor(ny1/2) - y_step
+                x_lag[ii] = np.floor(nx1/2) - x_step
+
+    return y_lag, x_lag
+
+
+def get_fft_shape(shape_1, shape_2):
+    """
+    Get the padded FFT shape for the convolution of two 2D fields.
+
+    Each dimension is padded to a power of 2 or 3 times a power of 2,
+    so that fields of similar sizes share the same FFT shape.
+
+    Args:
+        shape_1: tuple
+            Shape of the first field.
+        shape_2: tuple
+            Shape of the second field.
+
+    Returns:
+        fshape: tuple
+            Padded FFT shape.
+    """
+    fshape = []
+    for n1, n2 in zip(shape_1, shape_2):
+        nconv = n1 + n2 - 1
+        nfft = 2 ** int(np.ceil(np.log2(nconv)))
+        if 3 * nfft // 4 >= nconv:
+            nfft = 3 * nfft // 4
+        fshape.append(nfft)
+    return tuple(fshape)
+
+
+def get_correlation_peak(result, quantile=0.995):
+    """
+    Get the mean location of the highest correlation values.
+
+    Same as the mean index of np.where(result > np.quantile(result, quantile)),
+    the values above the quantile are found with np.argpartition.
+
+    Args:
+        result: np.array
+            2D correlation values.
+        quantile: float, default=0.995
+            Quantile of the highest correlation values.
+
+    Returns:
+        y_step, x_step: float
+            Rounded mean y, x index of the highest correlation values, NaN if there are none.
+    """
+    values = result.ravel()
+    # Neighboring ranks of the quantile (linear interpolation)
+    vindex = np.float64(quantile) * (values.size - 1)
+    ilow = int(np.floor(vindex))
+    ihigh = min(ilow + 1, values.size - 1)
+    gamma = vindex - ilow
+    order = np.argpartition(values, (ilow, ihigh))
+    low = values[order[ilow]]
+    high = values[order[ihigh]]
+    diff = high - low
+    if gamma < 0.5:
+        thresh = low + diff * gamma
+    else:
+        thresh = high - diff * (1 - gamma)
+    thresh = values.dtype.type(thresh)
+    # Values above the quantile are ranked after ilow
+    top = order[ilow + 1:]
+    top = top[values[top] > thresh]
+    if len(top) == 0:
+        return np.nan, np.nan
+    y_idx, x_idx = np.unravel_index(top, result.shape)
+    y_step = np.round(np.mean(y_idx))
+    x_step = np.round(np.mean(x_idx))
+    return y_step, x_step
+
+
 def get_pixel_size_of_clouds(
-        dataset,
+        tracknumber_map,
         ntracks,
-        tracknumber,
 ):
     """
     Calculate pixel size of each identified cloud in the file.
 
     Args:
-        dataset: Dataset
-            netcdf Dataset
-        tracknumber: string
-            variable that contains pixel level values.
+        tracknumber_map: np.array
+            Pixel level track number values.
+        ntracks: int
+            Number of tracks.
 
     Returns:
         counts: array_like
@@ -340,7 +614,7 @@ def get_pixel_size_of_clouds(
     """
     storm_sizes = np.zeros(ntracks + 1)
 
-    track, counts = np.unique(dataset.variables[tracknumber][:], return_counts=True)
+    track, counts = np.unique(tracknumber_map, return_counts=True)
     storm_sizes[track] = counts
     # storm_sizes[0] = 0
     # Remove the first value (background, which is not storm)
@@ -348,40 +622,25 @@ def get_pixel_size_of_clouds(
     return storm_sizes
 
 
-def get_bounding_box_for_fft(in1, in2, track_number):
+def get_bounding_box_for_fft(object1, object2):
     """
-    Given two masks and a track number, calculate the maximum bounding box to fit both
+    Given the bounding slices of a track in two masks, calculate the maximum bounding box to fit both
 
     Args:
-        in1: np.array
-            First mask array
-        in2: np.array
-            Second mask array
-        track_number: int
-            Track number for masking.
+        object1: tuple
+            Bounding slices (y, x) of the track in the first mask, from ndimage.find_objects.
+        object2: tuple
+            Bounding slices (y, x) of the track in the second mask, from ndimage.find_objects.
 
     Returns:
         ymin, ymax, xmin, xmax: int
             Bounding box x, y indices.
     """
 
-    a = in1 == track_number
-    b = in2 == track_number
-
-    rows = np.any(a, axis=1)
-    cols = np.any(a, axis=0)
-    rmin1, rmax1 = np.where(rows)[0][[0, -1]]
-    cmin1, cmax1 = np.where(cols)[0][[0, -1]]
-
-    rows = np.any(b, axis=1)
-    cols = np.any(b, axis=0)
-    rmin2, rmax2 = np.where(rows)[0][[0, -1]]
-    cmin2, cmax2 = np.where(cols)[0][[0, -1]]
-
-    ymin = min(rmin1, rmin2)
-    ymax = max(rmax1, rmax2)
-    xmin = min(cmin1, cmin2)
-    xmax = max(cmax1, cmax2)
+    ymin = min(object1[0].start, object2[0].start)
+    ymax = max(object1[0].stop, object2[0].stop) - 1
+    xmin = min(object1[1].start, object2[1].start)
+    xmax = max(object1[1].stop, object2[1].stop) - 1
     return ymin, ymax, xmin, xmax
 
 def offset_to_speed(x, y, time_lag):
@@ -439,13 +698,11 @@ def define_movement_dataset(
     tracks_movement_dir = np.full((ntracks, ntimes), fillval_f, dtype=np.float32)
     tracks_movement_x = np.full((ntracks, ntimes), fillval_f, dtype=np.float32)
     tracks_movement_y = np.full((ntracks, ntimes), fillval_f, dtype=np.float32)
+    # Find the movement times matching the track start base_time
+    start_indices = match_nearest_basetime_index(build_basetime_index(base_time), stats_basetime[:, 0])
     # Loop over each track to align the data
     for track_number in np.arange(0, ntracks):
-        # Find matching track start base_time
-        start_time = stats_basetime[track_number, 0]
-        # base_time_diff = np.abs(base_time - np.array(start_time))
-        base_time_diff = np.abs(base_time - start_time)
-        start_idx = np.nanargmin(base_time_diff)
+        start_idx = start_indices[track_number]
         # Find valid movement value indices
         valid_indices = np.where(np.isfinite(movement_speed[:, track_number]))[0]
 
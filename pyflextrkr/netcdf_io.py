@@ -2,6 +2,8 @@ import time
 import numpy as np
 import xarray as xr
 from netCDF4 import stringtochar
+from pyflextrkr.cloudid_store import write_cloudid
+from pyflextrkr.ft_utilities import get_netcdf_encoding
 
 # ----------------------------------------------------------------------------------
 def write_cloudid_tb(
@@ -188,13 +190,10 @@ def write_cloudid_tb(
         ds_out["cloudnumber_orig"].attrs["_FillValue"] = 0
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
 
     # Write netCDF file
-    ds_out.to_netcdf(
-        path=cloudid_outfile, mode="w", format="NETCDF4", encoding=encoding,
-    )
+    write_cloudid(ds_out, cloudid_outfile, config, encoding=encoding)
     return cloudid_outfile
 
 # ----------------------------------------------------------------------------------
@@ -457,11 +456,8 @@ def write_radar_cellid(
         ds_out['core_steiner_orig'].attrs['unit'] = 'unitless'
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
 
     # Write to netcdf file
-    ds_out.to_netcdf(
-        path=cloudid_outfile, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding
-    )
+    write_cloudid(ds_out, cloudid_outfile, config, encoding=encoding, unlimited_dims='time')
     return cloudid_outfile
\ No newline at end of file
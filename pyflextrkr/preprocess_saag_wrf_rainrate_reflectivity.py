@@ -7,7 +7,7 @@ import xarray as xr
 import pandas as pd
 import dask
 # from dask.distributed import Client, LocalCluster
-from pyflextrkr.ft_utilities import load_config, setup_logging
+from pyflextrkr.ft_utilities import load_config, setup_logging, get_netcdf_encoding
 
 if __name__ == "__main__":
 
@@ -128,6 +128,7 @@ if __name__ == "__main__":
     comp = dict(zlib=True, dtype='float32')
     encoding = {var: comp for var in datasets[0].data_vars}
     encoding.update({var: comp for var in datasets[0].coords})
+    encoding = get_netcdf_encoding(datasets[0], config, encoding=encoding)
     kwargs = {'encoding':encoding, 'format':'NETCDF4', 'unlimited_dims':t_dimname}
 
     # Write to netCDF
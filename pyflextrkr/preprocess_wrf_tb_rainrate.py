@@ -11,7 +11,7 @@ from itertools import repeat
 from multiprocessing import Pool
 from pyflextrkr.ft_regrid_func import make_weight_file, make_grid4regridder
 from pyflextrkr.ftfunctions import olr_to_tb
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_netcdf_encoding
 
 #-------------------------------------------------------------------------------------
 def preprocess_wrf_tb_rainrate(config):
@@ -357,14 +357,13 @@ def write_netcdf(
     dsout[pcp_varname].attrs['long_name'] = 'Precipitation rate'
     dsout[pcp_varname].attrs['units'] = 'mm hr-1'
     # Write to netcdf file
-    encoding_dict = {
+    encoding_dict = get_netcdf_encoding(dsout, config, encoding={
         time_dimname: {'zlib': True, 'dtype': 'float'},
-        # 'Times':{'zlib':True},
         x_coordname: {'zlib': True, 'dtype': 'float32'},
         y_coordname: {'zlib': True, 'dtype': 'float32'},
         tb_varname: {'zlib': True, 'dtype': 'float32'},
         pcp_varname: {'zlib': True, 'dtype': 'float32'},
-    }
+    })
     dsout.to_netcdf(path=fileout, mode='w', format='NETCDF4', unlimited_dims=time_dimname, encoding=encoding_dict)
     return
 
@@ -9,6 +9,7 @@ from wrf import (getvar, vinterp, ALL_TIMES)
 from itertools import repeat
 from multiprocessing import Pool
 from pyflextrkr.ftfunctions import olr_to_tb
+from pyflextrkr.ft_utilities import get_netcdf_encoding
 
 def preprocess_wrf(config):
     """
@@ -270,6 +271,7 @@ def calc_rainrate_tb_ze(filepairnames, outdir, inbasename, outbasename, config):
             'time': {'zlib':True, 'dtype':'float64'},
         }
         encoding.update(bt_dict)
+        encoding = get_netcdf_encoding(dsout, config, encoding=encoding)
         dsout.to_netcdf(path=fileout, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding)
 
         logger.info(f'Output: {fileout}')
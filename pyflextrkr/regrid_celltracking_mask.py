@@ -7,7 +7,7 @@ import numpy as np
 import xarray as xr
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_netcdf_encoding
 
 def regrid_celltracking_mask(config):
     """
@@ -287,8 +287,7 @@ def regrid_file(in_filename, in_basename, out_dir, out_basename, config):
     ds_out = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
 
     # Write to netcdf file
     ds_out.to_netcdf(
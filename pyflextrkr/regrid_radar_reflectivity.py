@@ -8,7 +8,7 @@ from scipy import ndimage
 import xarray as xr
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_netcdf_encoding
 
 def create_semi_symmetric_array(size):
     """
@@ -309,8 +309,7 @@ def regrid_file(in_filename, in_basename, out_dir, out_basename, config):
     ds_out = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config)
 
     # Write to netcdf file
     ds_out.to_netcdf(
@@ -6,7 +6,7 @@ import xarray as xr
 import xesmf as xe
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange
+from pyflextrkr.ft_utilities import subset_files_timerange, get_netcdf_encoding
 from pyflextrkr.ft_regrid_func import make_weight_file, make_grid4regridder
 
 #-------------------------------------------------------------------------------------
@@ -100,6 +100,7 @@ def regrid_tracking_mask(
         'weight_filename': weight_filename_rev,
         'regrid_method': regrid_method_rev,
         'regrid_mask_varnames': regrid_mask_varnames,
+        'netcdf_encoding': config.get('netcdf_encoding', None),
     }
 
     # Build Regridder
@@ -180,8 +181,7 @@ def regrid_mask(inputfile, outdir, config_regrid):
         os.remove(outfilename)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in ds_out.data_vars}
+    encoding = get_netcdf_encoding(ds_out, config_regrid)
     # Write to netCDF file
     ds_out.to_netcdf(
         path=outfilename,
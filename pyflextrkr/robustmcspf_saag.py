@@ -5,6 +5,7 @@ import sys
 import time
 import warnings
 import logging
+from pyflextrkr.ft_utilities import get_netcdf_encoding
 
 def define_robust_mcs_pf(config):
     """
@@ -255,8 +256,7 @@ def define_robust_mcs_pf(config):
         os.remove(statistics_outfile)
 
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
 
     # Write to netcdf file
     dsout.to_netcdf(path=statistics_outfile, mode="w",
@@ -6,8 +6,8 @@ import time
 import dask
 from dask.distributed import Client, LocalCluster, wait
 from pyflextrkr.sl3d_func import gridrad_sl3d
-from pyflextrkr.ft_utilities import load_config
-from pyflextrkr.echotop_func import echotop_height
+from pyflextrkr.ft_utilities import load_config, get_netcdf_encoding
+from pyflextrkr.echotop_func import echotop_heights
 
 #--------------------------------------------------------------------------------------------------------
 def write_output_file(out_file, data_dict, config):
@@ -88,8 +88,7 @@ def write_output_file(out_file, data_dict, config):
     dsout[pcp_varname].attrs = data_dict[pcp_varname].attrs
     # Write output to file
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
     dsout.to_netcdf(path=out_file, mode='w', format='NETCDF4', unlimited_dims='time', encoding=encoding)
     logger.info(f'Output: {out_file}')
     return out_file
@@ -196,18 +195,10 @@ def process_file(infilename, config):
 
     # Calculate echo-top heights for various reflectivity thresholds
     shape_2d = sl3d.shape
-    echotop10 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=10, gap=echotop_gap, min_thick=0)
-    echotop20 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=20, gap=echotop_gap, min_thick=0)
-    echotop30 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=30, gap=echotop_gap, min_thick=0)
-    echotop40 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=40, gap=echotop_gap, min_thick=0)
-    echotop45 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=45, gap=echotop_gap, min_thick=0)
-    echotop50 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=50, gap=echotop_gap, min_thick=0)
+    echotop10, echotop20, echotop30, echotop40, echotop45, echotop50 = echotop_heights(
+        refl3d, height, z_dimname, shape_2d,
+        dbz_thresh=[10, 20, 30, 40, 45, 50], gap=echotop_gap, min_thick=0,
+    )
 
     data_dict= {
         'latitude': lat2d,
@@ -2,7 +2,7 @@ import numpy as np
 import math
 from scipy import ndimage
 import warnings
-from pyflextrkr.echotop_func import echotop_height
+from pyflextrkr.echotop_func import echotop_heights
 
 def run_sl3d(ds, config):
     """
@@ -103,18 +103,10 @@ def run_sl3d(ds, config):
 
     # Calculate echo-top heights for various reflectivity thresholds
     shape_2d = sl3d.shape
-    echotop10 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=10, gap=echotop_gap, min_thick=0)
-    echotop20 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=20, gap=echotop_gap, min_thick=0)
-    echotop30 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=30, gap=echotop_gap, min_thick=0)
-    echotop40 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=40, gap=echotop_gap, min_thick=0)
-    echotop45 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=45, gap=echotop_gap, min_thick=0)
-    echotop50 = echotop_height(refl3d, height, z_dimname, shape_2d,
-                                dbz_thresh=50, gap=echotop_gap, min_thick=0)
+    echotop10, echotop20, echotop30, echotop40, echotop45, echotop50 = echotop_heights(
+        refl3d, height, z_dimname, shape_2d,
+        dbz_thresh=[10, 20, 30, 40, 45, 50], gap=echotop_gap, min_thick=0,
+    )
 
     # Put variables in dictionary
     data_dict= {
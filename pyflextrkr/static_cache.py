@@ -0,0 +1,239 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import xarray as xr
+from pyflextrkr.ft_utilities import subset_ds_geolimit
+
+# Process-local cache of static fields, most recently used last
+_static_cache = OrderedDict()
+_static_cache_nbytes = {}
+_static_cache_lock = threading.Lock()
+
+
+def get_static_field(loader, filename, *args, config=None):
+    """
+    Get a static field (e.g., landmask, range mask, grid index) read from a file, cached in this process.
+
+    The field is cached by the loader, file path, file modification time and the loader arguments,
+    so a modified file is read again. The least recently used fields are evicted to keep the total size
+    under config static_cache_maxbytes (default: 1 GB, 0 disables the cache).
+    Cached arrays are read-only, as they are shared by all tasks in the process.
+
+    Args:
+        loader: function
+            Function to read the field, called as loader(filename, *args).
+        filename: string
+            Static file name.
+        *args:
+            Arguments passed to the loader (e.g., variable names, subset parameters), must be hashable.
+        config: dictionary, optional, default=None
+            Dictionary containing config parameters.
+
+    Returns:
+        field:
+            Value returned by the loader.
+    """
+    logger = logging.getLogger(__name__)
+    maxbytes = config.get("static_cache_maxbytes", 1e9) if config is not None else 1e9
+    if maxbytes <= 0:
+        return loader(filename, *args)
+
+    key = (
+        f"{loader.__module__}.{loader.__qualname__}",
+        os.path.abspath(filename),
+        os.path.getmtime(filename),
+        args,
+    )
+    with _static_cache_lock:
+        if key in _static_cache:
+            _static_cache.move_to_end(key)
+            return _static_cache[key]
+
+    field = loader(filename, *args)
+    set_readonly(field)
+    nbytes = get_nbytes(field)
+    if nbytes > maxbytes:
+        logger.debug(f"Static field is larger than static_cache_maxbytes, not cached: {filename}")
+        return field
+
+    with _static_cache_lock:
+        # Remove the field read from a previous version of the file
+        for old_key in [k for k in _static_cache if (k[0], k[1], k[3]) == (key[0], key[1], key[3])]:
+            _static_cache.pop(old_key)
+            _static_cache_nbytes.pop(old_key)
+        _static_cache[key] = field
+        _static_cache_nbytes[key] = nbytes
+        # Evict least recently used fields
+        while sum(_static_cache_nbytes.values()) > maxbytes:
+            old_key, _ = _static_cache.popitem(last=False)
+            _static_cache_nbytes.pop(old_key)
+            logger.debug(f"Evicted static field: {old_key[1]}")
+    return field
+
+
+def clear_static_cache():
+    """
+    Remove all static fields from the cache of this process.
+    """
+    with _static_cache_lock:
+        _static_cache.clear()
+        _static_cache_nbytes.clear()
+
+
+def get_nbytes(field):
+    """
+    Get the memory size of a static field (arrays, Xarray objects, or tuples of them).
+    """
+    if isinstance(field, (tuple, list)):
+        return sum(get_nbytes(item) for item in field)
+    return getattr(field, "nbytes", 0)
+
+
+def set_readonly(field):
+    """
+    Set numpy arrays in a static field (arrays, Xarray objects, or tuples of them) to read-only.
+    """
+    if isinstance(field, (tuple, list)):
+        for item in field:
+            set_readonly(item)
+    elif isinstance(field, np.ndarray):
+        field.flags.writeable = False
+    elif isinstance(field, xr.DataArray) & isinstance(getattr(field, "data", None), np.ndarray):
+        field.data.flags.writeable = False
+
+
+def preload_static_fields(fields, config):
+    """
+    Load static fields into the cache of this process.
+
+    Args:
+        fields: list
+            List of (loader, filename, args) for each static field.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        nfields: int
+            Number of static fields loaded.
+    """
+    for loader, filename, args in fields:
+        get_static_field(loader, filename, *args, config=config)
+    return len(fields)
+
+
+def preload_static_fields_workers(fields, config):
+    """
+    Load static fields into the cache of each Dask worker, so that tasks do not read them again.
+
+    Does nothing if there is no Dask distributed client (e.g., serial run).
+
+    Args:
+        fields: list
+            List of (loader, filename, args) for each static field.
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        None.
+    """
+    logger = logging.getLogger(__name__)
+    fields = [field for field in fields if os.path.isfile(field[1])]
+    if len(fields) == 0:
+        return
+    try:
+        from dask.distributed import get_client
+        client = get_client()
+    except (ImportError, ValueError):
+        return
+    client.run(preload_static_fields, fields, config)
+    logger.info(f"Preloaded {len(fields)} static field(s) on {len(client.scheduler_info()['workers'])} workers.")
+    return
+
+
+def read_landmask(
+    landmask_filename,
+    landmask_varname,
+    geolimits,
+    x_coordname,
+    y_coordname,
+    x_dimname,
+    y_dimname,
+):
+    """
+    Read landmask subset within geolimits.
+
+    Args:
+        landmask_filename: string
+            Landmask file name.
+        landmask_varname: string
+            Landmask variable name.
+        geolimits: tuple
+            Subset domain boundary (lat_min, lon_min, lat_max, lon_max).
+        x_coordname, y_coordname: string
+            Landmask x, y coordinate names.
+        x_dimname, y_dimname: string
+            Landmask x, y dimension names.
+
+    Returns:
+        landmask: np.array
+            Landmask array.
+    """
+    dslm = xr.open_dataset(landmask_filename).squeeze()
+    # Subset landmask to match geolimit
+    dslm = subset_ds_geolimit(
+        dslm, {"geolimits": geolimits},
+        x_coordname=x_coordname,
+        y_coordname=y_coordname,
+        x_dimname=x_dimname,
+        y_dimname=y_dimname,
+    )
+    landmask = dslm[landmask_varname].squeeze().values
+    dslm.close()
+    return landmask
+
+
+def get_landmask_field(config):
+    """
+    Get the landmask static field from config, for get_static_field.
+
+    Args:
+        config: dictionary
+            Dictionary containing config parameters.
+
+    Returns:
+        field: tuple
+            (read_landmask, landmask_filename, args).
+    """
+    geolimits = config.get("geolimits", None)
+    # Landmask coordinate, dimension names default to those of the input data
+    args = (
+        config.get("landmask_varname", ""),
+        tuple(geolimits) if geolimits is not None else None,
+        config.get("landmask_x_coordname", None) or config.get("x_coordname"),
+        config.get("landmask_y_coordname", None) or config.get("y_coordname"),
+        config.get("landmask_x_dimname", None) or config.get("x_dimname"),
+        config.get("landmask_y_dimname", None) or config.get("y_dimname"),
+    )
+    return (read_landmask, config.get("landmask_filename", ""), args)
+
+
+def read_rangemask(terrain_file, rangemask_varname):
+    """
+    Read radar range mask.
+
+    Args:
+        terrain_file: string
+            Terrain file name containing the range mask.
+        rangemask_varname: string
+            Range mask variable name.
+
+    Returns:
+        rangemask: np.array(int8)
+            Range mask array.
+    """
+    dster = xr.open_dataset(terrain_file, decode_cf=False, mask_and_scale=False)
+    rangemask = dster[rangemask_varname].values.astype('int8')
+    dster.close()
+    return rangemask
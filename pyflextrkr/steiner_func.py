@@ -1,5 +1,6 @@
 import numpy as np
 from scipy import ndimage, signal
+from pyflextrkr.ftfunctions import sort_renumber
 
 def background_intensity(refl, mask_goodvalues, dx, dy, bkg_rad, convolve_method):
     """
@@ -306,63 +307,11 @@ def label_cells(convmask, min_cellpix):
         Number of pixels for each labeled cell in 1D.
     """
 
-    # Create output arrays
-    sortedlabelcell_number2d = np.zeros(convmask.shape, dtype=int)
-
     # Label convective cells
     labelcell_number2d, nlabelcells = ndimage.label(convmask)
 
-    # Check if there is any cells identified
-    if (nlabelcells > 0):
-
-        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
-
-        # Loop over each labeled cell
-        for ilabelcell in range(1, nlabelcells + 1):
-            # Count number of pixels for the cell
-            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
-            # Check if cell satisfies size threshold
-            if (ilabelcell_npix > min_cellpix):
-                labelcell_npix[ilabelcell - 1] = ilabelcell_npix
-
-        # Check if any of the cells passes the size threshold test
-        ivalidcells = np.array(np.where(labelcell_npix > 0))[0, :]
-        ncells = len(ivalidcells)
-
-        if (ncells > 0):
-            # Isolate cells that satisfy size threshold
-            # Add one since label numbers start at 1 and indices, which validcells reports starts at 0
-            labelcell_number1d = np.copy(ivalidcells) + 1
-            labelcell_npix = labelcell_npix[ivalidcells]
-
-            # Sort cells from largest to smallest and get the sorted index
-            order = np.argsort(labelcell_npix)
-            order = order[::-1]  # Reverses the order
-
-            # Sort the cells by size
-            sortedcell_npix = np.copy(labelcell_npix[order])
-            sortedcell_number1d = np.copy(labelcell_number1d[order])
-
-            # Loop over the 2D cell number to re-number them by size
-            cellstep = 0
-            for icell in range(0, ncells):
-                # Find 2D indices that match the cell number
-                sortedcell_indices = np.where(labelcell_number2d == sortedcell_number1d[icell])
-                # Get one of the dimensions from the 2D indices to count the size
-                #             nsortedcellindices = np.shape(sortedcell_indices)[1]
-                nsortedcellindices = len(sortedcell_indices[1])
-                # Check if the size matches the sorted cell size
-                if (nsortedcellindices == sortedcell_npix[icell]):
-                    # Renumber the cell in 2D
-                    cellstep += 1
-                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
-
-        else:
-            # Return an empty array
-            sortedcell_npix = np.zeros(0)
-    else:
-        # Return an empty array
-        sortedcell_npix = np.zeros(0)
+    # Sort cells by size and remove cells smaller than min_cellpix
+    sortedlabelcell_number2d, sortedcell_npix = sort_renumber(labelcell_number2d, min_cellpix)
 
     return sortedlabelcell_number2d, sortedcell_npix
 
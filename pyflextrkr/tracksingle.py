@@ -5,6 +5,8 @@ import xarray as xr
 import pandas as pd
 import time
 import logging
+from pyflextrkr.ftfunctions import get_overlap_links
+from pyflextrkr.ft_utilities import get_netcdf_encoding, get_label_dtype
 
 def trackclouds(
         cloudid_filepairs,
@@ -100,9 +102,13 @@ def trackclouds(
         # Convert float type to int, missing value to 0
         # This should not be needed when setting mask_and_scale=False
         reference_convcold_cloudnumber[np.isnan(reference_convcold_cloudnumber)] = 0
-        reference_convcold_cloudnumber = reference_convcold_cloudnumber.astype("int")
+        reference_convcold_cloudnumber = reference_convcold_cloudnumber.astype(
+            get_label_dtype(np.max(nreference), name=feature_varname)
+        )
         new_convcold_cloudnumber[np.isnan(new_convcold_cloudnumber)] = 0
-        new_convcold_cloudnumber = new_convcold_cloudnumber.astype("int")
+        new_convcold_cloudnumber = new_convcold_cloudnumber.astype(
+            get_label_dtype(np.max(nnew), name=feature_varname)
+        )
 
         ############################################################
         # Get size of data
@@ -112,123 +118,23 @@ def trackclouds(
         nreference = nreference + 1
         nnew = nnew + 1
 
-        #######################################################
-        # Initialize matrices
-        reference_forward_index = (
-            np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
-        )
-        reference_forward_size = (
-            np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
-        )
-        new_backward_index = (
-            np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
-        )
-        new_backward_size = np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
-
         ######################################################
-        # Loop through each cloud / feature in reference time and look for overlaping clouds / features in the new file
-        for refindex in np.arange(1, nreference + 1):
-            # Locate where the cloud in the reference file overlaps with any cloud in the new file
-            forward_matchindices = np.where(
-                (reference_convcold_cloudnumber == refindex)
-                & (new_convcold_cloudnumber != 0)
-            )
-
-            # Get the convcold_cloudnumber of the clouds in the new file that overlap the cloud in the reference file
-            forward_newindex = new_convcold_cloudnumber[forward_matchindices]
-            unique_forwardnewindex = np.unique(forward_newindex)
-
-            # Calculate size of reference cloud in terms of number of pixels
-            sizeref = len(
-                np.extract(
-                    reference_convcold_cloudnumber == refindex,
-                    reference_convcold_cloudnumber,
-                )
-            )
-
-            # Loop through the overlapping clouds in the new file, determining if they statisfy the overlap requirement
-            forward_nmatch = 0  # Initialize overlap counter
-            for matchindex in unique_forwardnewindex:
-                sizematch = len(
-                    np.extract(forward_newindex == matchindex, forward_newindex)
-                )
-
-                if sizematch / float(sizeref) > othresh:
-                    if forward_nmatch > nmaxlinks:
-                        logger.debug(
-                            ("reference: " + number_filepath + files[ifile - 1])
-                        )
-                        logger.debug(("new: " + number_filepath + files[ifile]))
-                        sys.exit(
-                            "More than "
-                            + str(int(nmaxlinks))
-                            + " clouds in new file match with reference cloud?!"
-                        )
-                    else:
-                        reference_forward_index[
-                            0, int(refindex) - 1, forward_nmatch
-                        ] = matchindex
-                        reference_forward_size[
-                            0, int(refindex) - 1, forward_nmatch
-                        ] = len(
-                            np.extract(
-                                new_convcold_cloudnumber == matchindex,
-                                new_convcold_cloudnumber,
-                            )
-                        )
-
-                        forward_nmatch = forward_nmatch + 1
-
-        ######################################################
-        # Loop through each cloud / feature at new time and look for overlaping clouds / features in the reference file
-        for newindex in np.arange(1, nnew + 1):
-            # Locate where the cloud in the new file overlaps with any cloud in the reference file
-            backward_matchindices = np.where(
-                (new_convcold_cloudnumber == newindex)
-                & (reference_convcold_cloudnumber != 0)
-            )
-
-            # Get the convcold_cloudnumber of the clouds in the reference file that overlap the cloud in the new file
-            backward_refindex = reference_convcold_cloudnumber[backward_matchindices]
-            unique_backwardrefindex = np.unique(backward_refindex)
-
-            # Calculate size of reference cloud in terms of number of pixels
-            sizenew = len(
-                np.extract(
-                    new_convcold_cloudnumber == newindex, new_convcold_cloudnumber
-                )
-            )
-
-            # Loop through the overlapping clouds in the new file, determining if they statisfy the overlap requirement
-            backward_nmatch = 0  # Initialize overlap counter
-            for matchindex in unique_backwardrefindex:
-                sizematch = len(
-                    np.extract(backward_refindex == matchindex, backward_refindex)
-                )
-
-                if sizematch / float(sizenew) > othresh:
-                    if backward_nmatch > nmaxlinks:
-                        logger.debug(
-                            ("reference: " + number_filepath + files[ifile - 1])
-                        )
-                        logger.debug(("new: " + number_filepath + files[ifile]))
-                        sys.exit(
-                            "More than "
-                            + str(int(nmaxlinks))
-                            + " clouds in reference file match with new cloud?!"
-                        )
-                    else:
-                        new_backward_index[
-                            0, int(newindex) - 1, backward_nmatch
-                        ] = matchindex
-                        new_backward_size[0, int(newindex) - 1, backward_nmatch] = len(
-                            np.extract(
-                                reference_convcold_cloudnumber == matchindex,
-                                reference_convcold_cloudnumber,
-                            )
-                        )
-
-                        backward_nmatch = backward_nmatch + 1
+        # Build the reference x new pixel-overlap matrix in one pass and
+        # get the forward (reference -> new) and backward (new -> reference) links
+        (
+            reference_forward_index,
+            reference_forward_size,
+            new_backward_index,
+            new_backward_size,
+        ) = get_overlap_links(
+            reference_convcold_cloudnumber,
+            new_convcold_cloudnumber,
+            nreference,
+            nnew,
+            nmaxlinks,
+            othresh,
+            fillval,
+        )
 
         #########################################################
         # Save forward and backward indices and linked sizes in netcdf file
@@ -350,43 +256,28 @@ def trackclouds(
 
         # Write netcdf files
         # output_data.to_netcdf(path=track_outfile, mode='w', format='NETCDF4_CLASSIC', unlimited_dims='times', \
+        encoding = get_netcdf_encoding(output_data, config, encoding={
+            "basetime_new": {
+                "dtype": "int64",
+                "zlib": True,
+                "units": "seconds since 1970-01-01",
+            },
+            "basetime_ref": {
+                "dtype": "int64",
+                "zlib": True,
+                "units": "seconds since 1970-01-01",
+            },
+            "newcloud_backward_index": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+            "newcloud_backward_size": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+            "refcloud_forward_index": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+            "refcloud_forward_size": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+        }, format="NETCDF4_CLASSIC")
         output_data.to_netcdf(
             path=track_outfile,
             mode="w",
             format="NETCDF4_CLASSIC",
             unlimited_dims="time",
-            encoding={
-                "basetime_new": {
-                    "dtype": "int64",
-                    "zlib": True,
-                    "units": "seconds since 1970-01-01",
-                },
-                "basetime_ref": {
-                    "dtype": "int64",
-                    "zlib": True,
-                    "units": "seconds since 1970-01-01",
-                },
-                "newcloud_backward_index": {
-                    "dtype": "int",
-                    "zlib": True,
-                    "_FillValue": fillval,
-                },
-                "newcloud_backward_size": {
-                    "dtype": "int",
-                    "zlib": True,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_index": {
-                    "dtype": "int",
-                    "zlib": True,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_size": {
-                    "dtype": "int",
-                    "zlib": True,
-                    "_FillValue": fillval,
-                },
-            },
+            encoding=encoding,
         )
         logger.info(track_outfile)
         return track_outfile
\ No newline at end of file
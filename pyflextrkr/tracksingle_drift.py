@@ -6,6 +6,9 @@ import pandas as pd
 import time
 import scipy.ndimage as ndi
 import logging
+from pyflextrkr.ftfunctions import get_overlap_links
+from pyflextrkr.ft_utilities import get_netcdf_encoding, get_label_dtype
+from pyflextrkr.cloudid_store import open_cloudid
 
 def trackclouds(
     cloudid_filepairs,
@@ -41,14 +44,10 @@ def trackclouds(
     seconddatestring = pd.to_datetime(secondbasetime, unit="s").strftime("%Y%m%d")
     secondtimestring = pd.to_datetime(secondbasetime, unit="s").strftime("%H%M%S")
     dataoutpath = config["tracking_outpath"]
-    feature_varname = config.get("feature_varname", "feature_number")
-    nfeature_varname = config.get("nfeature_varname", "nfeatures")
     timegap = config["timegap"]
     nmaxlinks = config["nmaxlinks"]
     othresh = config["othresh"]
     fillval = config["fillval"]
-    if drift_data is not None:
-        datetime_drift, xdrift, ydrift = drift_data[0], drift_data[1], drift_data[2]
 
     logger.debug(("firstcloudidfilename: ", firstcloudidfilename))
     logger.debug(("secondcloudidfilename: ", secondcloudidfilename))
@@ -86,322 +85,431 @@ def trackclouds(
         ##############################################################
         # Load cloudid file from before, called reference file
         logger.debug(reference_filedatetime)
-
-        # Open file
-        reference_data = xr.open_dataset(
-            reference_file, mask_and_scale=False, decode_times=False, chunks=-1,
+        reference_convcold_cloudnumber, nreference, bt_ref, _ = load_cloudid_features(
+            reference_file, config,
         )
-        reference_convcold_cloudnumber = reference_data[feature_varname].load().data
-        nreference = reference_data[nfeature_varname].load().data
-        reference_data.close()
 
         ##########################################################
         # Load next cloudid file, called new file
         logger.debug(f"new_filedattime: {new_filedatetime}")
-
-        # Open file
-        new_data = xr.open_dataset(
-            new_file, mask_and_scale=False, decode_times=False, chunks=-1,
+        new_convcold_cloudnumber, nnew, bt_new, _ = load_cloudid_features(
+            new_file, config,
         )
-        new_convcold_cloudnumber = new_data[feature_varname].load().data
-        nnew = new_data[nfeature_varname].load().data
-        new_data.close()
-
-        # Convert float type to int, missing value to 0
-        # This should not be needed when setting mask_and_scale=False
-        reference_convcold_cloudnumber[np.isnan(reference_convcold_cloudnumber)] = 0
-        reference_convcold_cloudnumber = reference_convcold_cloudnumber.astype("int")
-        new_convcold_cloudnumber[np.isnan(new_convcold_cloudnumber)] = 0
-        new_convcold_cloudnumber = new_convcold_cloudnumber.astype("int")
 
         if drift_data is not None:
-            # Compare drift datetime with reference datetime
-            if reference_filedatetime == datetime_drift:
+            reference_convcold_cloudnumber = shift_reference_features(
+                reference_convcold_cloudnumber, reference_filedatetime, drift_data,
+            )
 
-                # Shift the reference cloudnumber and replace the original
-                reference_convcold_cloudnumber = ndi.shift(
-                    reference_convcold_cloudnumber, [0, ydrift, xdrift]
-                )
-            else:
-                logger.info(
-                    "Warning: datetime_drift does NOT match reference_filedatetime! No shifting is applied."
-                )
-                logger.info("reference_filedatetime: " + reference_filedatetime)
-                logger.info("datetime_drift: " + datetime_drift)
+        ######################################################
+        # Build the reference x new pixel-overlap matrix in one pass and
+        # get the forward (reference -> new) and backward (new -> reference) links
+        # Add 1 to nclouds for both reference and new cloudid files to account for files that have 0 clouds
+        (
+            reference_forward_index,
+            reference_forward_size,
+            new_backward_index,
+            new_backward_size,
+        ) = get_overlap_links(
+            reference_convcold_cloudnumber,
+            new_convcold_cloudnumber,
+            nreference + 1,
+            nnew + 1,
+            nmaxlinks,
+            othresh,
+            fillval,
+        )
 
+        #########################################################
+        # Save forward and backward indices and linked sizes in netcdf file
+        write_singletrack(
+            track_outfile,
+            bt_new,
+            bt_ref,
+            new_backward_index,
+            new_backward_size,
+            reference_forward_index,
+            reference_forward_size,
+            new_filedatetime,
+            reference_filedatetime,
+            new_file_basename,
+            reference_file_basename,
+            config,
+        )
+    return track_outfile
 
-        ############################################################
-        # Get size of data
-        times, ny, nx = np.shape(new_convcold_cloudnumber)
 
-        # Add 1 to nclouds for both reference and new cloudid files to account for files that have 0 clouds
-        nreference = nreference + 1
-        nnew = nnew + 1
+def load_cloudid_features(cloudid_file, config):
+    """
+    Load labeled features from a cloudid file.
 
-        #######################################################
-        # Initialize matrices
-        reference_forward_index = (
-            np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
-        )
-        reference_forward_size = (
-            np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
-        )
-        new_backward_index = (
-            np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
-        )
-        new_backward_size = np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
+    Args:
+        cloudid_file: string
+            Cloudid file name.
+        config: dictionary
+            Dictionary containing config parameters
 
-        ######################################################
-        # Loop through each cloud / feature in reference time and look for overlaping clouds / features in the new file
-        for refindex in np.arange(1, nreference + 1):
-            # Locate where the cloud in the reference file overlaps with any cloud in the new file
-            forward_matchindices = np.where(
-                (reference_convcold_cloudnumber == refindex)
-                & (new_convcold_cloudnumber != 0)
-            )
+    Returns:
+        feature_number: np.ndarray(LABEL_DTYPE)
+            Labeled feature number array, missing values set to 0.
+        nfeatures: int
+            Number of features.
+        base_time: float
+            Base time of the file (seconds since 1970-01-01).
+        npix_feature: np.ndarray(int)
+            Number of pixels for each feature.
+    """
+    feature_varname = config.get("feature_varname", "feature_number")
+    nfeature_varname = config.get("nfeature_varname", "nfeatures")
+    featuresize_varname = config.get("featuresize_varname", "npix_feature")
+
+    # Open file
+    ds = open_cloudid(
+        cloudid_file, config, mask_and_scale=False, decode_times=False, chunks=-1,
+    )
+    feature_number = ds[feature_varname].load().data
+    nfeatures = int(np.squeeze(ds[nfeature_varname].load().data))
+    base_time = ds["base_time"].load().data
+    if featuresize_varname in ds:
+        npix_feature = ds[featuresize_varname].load().data
+    else:
+        npix_feature = None
+    ds.close()
+
+    # Convert float type to int, missing value to 0
+    # This should not be needed when setting mask_and_scale=False
+    feature_number[np.isnan(feature_number)] = 0
+    feature_number = feature_number.astype(get_label_dtype(nfeatures, name=feature_varname))
+    return feature_number, nfeatures, base_time, npix_feature
+
+
+def shift_reference_features(reference_number, reference_filedatetime, drift_data):
+    """
+    Shift reference features by the drift (advection) distance.
+
+    Args:
+        reference_number: np.ndarray(int)
+            Labeled feature number array at the reference time.
+        reference_filedatetime: string
+            Reference file date time string (yyyymodd_hhmmss).
+        drift_data: tuple
+            Drift data (datetime_string, xdrift, ydrift)
 
-            # Get the convcold_cloudnumber of the clouds in the new file that overlap the cloud in the reference file
-            forward_newindex = new_convcold_cloudnumber[forward_matchindices]
-            unique_forwardnewindex = np.unique(forward_newindex)
+    Returns:
+        reference_number: np.ndarray(int)
+            Shifted labeled feature number array.
+    """
+    logger = logging.getLogger(__name__)
+    datetime_drift, xdrift, ydrift = drift_data[0], drift_data[1], drift_data[2]
+    # Compare drift datetime with reference datetime
+    if reference_filedatetime == datetime_drift:
+        # Shift the reference cloudnumber and replace the original
+        reference_number = ndi.shift(reference_number, [0, ydrift, xdrift])
+    else:
+        logger.info(
+            "Warning: datetime_drift does NOT match reference_filedatetime! No shifting is applied."
+        )
+        logger.info("reference_filedatetime: " + reference_filedatetime)
+        logger.info("datetime_drift: " + datetime_drift)
+    return reference_number
 
-            # Calculate size of reference cloud in terms of number of pixels
-            sizeref = len(
-                np.extract(
-                    reference_convcold_cloudnumber == refindex,
-                    reference_convcold_cloudnumber,
-                )
-            )
 
-            # Loop through the overlapping clouds in the new file, determining if they statisfy the overlap requirement
-            forward_nmatch = 0  # Initialize overlap counter
-            for matchindex in unique_forwardnewindex:
-                sizematch = len(
-                    np.extract(forward_newindex == matchindex, forward_newindex)
-                )
+def stream_singletrack_links(
+    cloudidfiles,
+    cloudidfiles_basetime,
+    config,
+    drift_data=None,
+):
+    """
+    Link features in successive cloudid files, streaming the files in time order.
 
-                if sizematch / float(sizeref) > othresh:
-                    if forward_nmatch > nmaxlinks:
-                        logger.debug(
-                            ("reference: " + reference_file)
-                        )
-                        logger.debug(("new: " + new_file))
-                        sys.exit(
-                            "More than "
-                            + str(int(nmaxlinks))
-                            + " clouds in new file match with reference cloud?!"
-                        )
-                    else:
-                        reference_forward_index[
-                            0, int(refindex) - 1, forward_nmatch
-                        ] = matchindex
-                        reference_forward_size[
-                            0, int(refindex) - 1, forward_nmatch
-                        ] = len(
-                            np.extract(
-                                new_convcold_cloudnumber == matchindex,
-                                new_convcold_cloudnumber,
-                            )
-                        )
-
-                        forward_nmatch = forward_nmatch + 1
+    Each cloudid file is read once. Only the previous frame's labels and sizes are kept in memory.
+    Writing the single track files is optional (config: write_singletrack, default: False).
 
-        ######################################################
-        # Loop through each cloud / feature at new time and look for overlaping clouds / features in the reference file
-        for newindex in np.arange(1, nnew + 1):
-            # Locate where the cloud in the new file overlaps with any cloud in the reference file
-            backward_matchindices = np.where(
-                (new_convcold_cloudnumber == newindex)
-                & (reference_convcold_cloudnumber != 0)
-            )
+    Args:
+        cloudidfiles: list
+            Cloudid file names, sorted by time.
+        cloudidfiles_basetime: list
+            Cloudid file base times.
+        config: dictionary
+            Dictionary containing config parameters
+        drift_data: list, optional. Default: None.
+            Drift data (datetime_string, xdrift, ydrift) for each reference file.
 
-            # Get the convcold_cloudnumber of the clouds in the reference file that overlap the cloud in the new file
-            backward_refindex = reference_convcold_cloudnumber[backward_matchindices]
-            unique_backwardrefindex = np.unique(backward_refindex)
+    Yields:
+        singletrack: dictionary
+            Linking information of a pair of files, with the same content as a single track file.
+    """
+    logger = logging.getLogger(__name__)
+    dataoutpath = config["tracking_outpath"]
+    timegap = config["timegap"]
+    nmaxlinks = config["nmaxlinks"]
+    othresh = config["othresh"]
+    fillval = config["fillval"]
+    write_files = config.get("write_singletrack", False)
+    outfilebase = "track_"
 
-            # Calculate size of reference cloud in terms of number of pixels
-            sizenew = len(
-                np.extract(
-                    new_convcold_cloudnumber == newindex, new_convcold_cloudnumber
+    reference = None
+    for ifile, new_file in enumerate(cloudidfiles):
+        new_basetime = cloudidfiles_basetime[ifile]
+        new_filedatetime = pd.to_datetime(new_basetime, unit="s").strftime("%Y%m%d_%H%M%S")
+
+        # Check time difference with the previous file before reading the new file
+        if ifile > 0:
+            reference_basetime = cloudidfiles_basetime[ifile - 1]
+            hour_diff = (np.subtract(new_basetime, reference_basetime)) / float(3600)
+            link_pair = (hour_diff < timegap) and (hour_diff > 0)
+        else:
+            link_pair = False
+        # Skip reading a file that does not link to either neighbor
+        if (not link_pair) and (ifile < len(cloudidfiles) - 1):
+            next_diff = (np.subtract(cloudidfiles_basetime[ifile + 1], new_basetime)) / float(3600)
+            if not ((next_diff < timegap) and (next_diff > 0)):
+                reference = None
+                continue
+
+        new_number, nnew, bt_new, npix_new = load_cloudid_features(new_file, config)
+        new = (new_file, new_filedatetime, new_number, nnew, bt_new, npix_new)
+
+        if link_pair and (reference is not None):
+            reference_file, reference_filedatetime, reference_number, nreference, bt_ref, npix_reference = reference
+            logger.debug(f"Linking: {os.path.basename(reference_file)}, {os.path.basename(new_file)}")
+            if drift_data is not None:
+                reference_number = shift_reference_features(
+                    reference_number, reference_filedatetime, drift_data[ifile - 1],
                 )
+            (
+                reference_forward_index,
+                reference_forward_size,
+                new_backward_index,
+                new_backward_size,
+            ) = get_overlap_links(
+                reference_number,
+                new_number,
+                nreference + 1,
+                nnew + 1,
+                nmaxlinks,
+                othresh,
+                fillval,
             )
-
-            # Loop through the overlapping clouds in the new file, determining if they statisfy the overlap requirement
-            backward_nmatch = 0  # Initialize overlap counter
-            for matchindex in unique_backwardrefindex:
-                sizematch = len(
-                    np.extract(backward_refindex == matchindex, backward_refindex)
+            if write_files:
+                track_outfile = dataoutpath + outfilebase + new_filedatetime + ".nc"
+                write_singletrack(
+                    track_outfile,
+                    bt_new,
+                    bt_ref,
+                    new_backward_index,
+                    new_backward_size,
+                    reference_forward_index,
+                    reference_forward_size,
+                    new_filedatetime,
+                    reference_filedatetime,
+                    os.path.basename(new_file),
+                    os.path.basename(reference_file),
+                    config,
                 )
 
-                if sizematch / float(sizenew) > othresh:
-                    if backward_nmatch > nmaxlinks:
-                        logger.debug(
-                            ("reference: " + reference_file)
-                        )
-                        logger.debug(("new: " + new_file))
-                        sys.exit(
-                            "More than "
-                            + str(int(nmaxlinks))
-                            + " clouds in reference file match with new cloud?!"
-                        )
-                    else:
-                        new_backward_index[
-                            0, int(newindex) - 1, backward_nmatch
-                        ] = matchindex
-                        new_backward_size[0, int(newindex) - 1, backward_nmatch] = len(
-                            np.extract(
-                                reference_convcold_cloudnumber == matchindex,
-                                reference_convcold_cloudnumber,
-                            )
-                        )
-
-                        backward_nmatch = backward_nmatch + 1
+            yield {
+                "nclouds_ref": nreference + 1,
+                "nclouds_new": nnew + 1,
+                "basetime_ref": np.array(pd.to_datetime(bt_ref, unit="s"), dtype="datetime64[s]"),
+                "basetime_new": np.array(pd.to_datetime(bt_new, unit="s"), dtype="datetime64[s]"),
+                "refcloud_forward_index": reference_forward_index,
+                "newcloud_backward_index": new_backward_index,
+                "ref_file": os.path.basename(reference_file),
+                "new_file": os.path.basename(new_file),
+                "ref_date": reference_filedatetime,
+                "new_date": new_filedatetime,
+                "npix_ref": npix_reference,
+                "npix_new": npix_new,
+            }
+
+        # The new frame becomes the reference frame for the next pair
+        reference = new
+
+
+def write_singletrack(
+    track_outfile,
+    bt_new,
+    bt_ref,
+    new_backward_index,
+    new_backward_size,
+    reference_forward_index,
+    reference_forward_size,
+    new_filedatetime,
+    reference_filedatetime,
+    new_file_basename,
+    reference_file_basename,
+    config,
+):
+    """
+    Write forward and backward indices and linked sizes to a single track netCDF file.
 
-        #########################################################
-        # Save forward and backward indices and linked sizes in netcdf file
+    Args:
+        track_outfile: string
+            Output file name.
+        bt_new: float
+            Base time of the new file (seconds since 1970-01-01).
+        bt_ref: float
+            Base time of the reference file (seconds since 1970-01-01).
+        new_backward_index: np.ndarray(int)
+            Reference feature numbers linked to each new feature.
+        new_backward_size: np.ndarray(int)
+            Number of pixels of the linked reference features.
+        reference_forward_index: np.ndarray(int)
+            New feature numbers linked to each reference feature.
+        reference_forward_size: np.ndarray(int)
+            Number of pixels of the linked new features.
+        new_filedatetime: string
+            New file date time string.
+        reference_filedatetime: string
+            Reference file date time string.
+        new_file_basename: string
+            New cloudid file base name.
+        reference_file_basename: string
+            Reference cloudid file base name.
+        config: dictionary
+            Dictionary containing config parameters
 
-        # Check if file already exists. If exists, delete
-        if os.path.isfile(track_outfile):
-            os.remove(track_outfile)
-
-        logger.debug("Writing single tracks")
-
-        bt_new = np.array(
-                    [pd.to_datetime(new_data["base_time"].data, unit="s")],
-                    dtype="datetime64[ns]",
-                )[0]
-        bt_ref = np.array(
-                    [pd.to_datetime(reference_data["base_time"].data, unit="s")],
-                    dtype="datetime64[ns]",
-                )[0]
-
-        # Define output variables dictionary
-        dim_new = ["time", "nclouds_new", "nlinks"]
-        dim_ref = ["time", "nclouds_ref", "nlinks"]
-        var_dict = {
-            "basetime_new": (["time"], bt_new,),
-            "basetime_ref": (["time"], bt_ref,),
-            "newcloud_backward_index": (dim_new, new_backward_index,),
-            "newcloud_backward_size": (dim_new, new_backward_size,),
-            "refcloud_forward_index": (dim_ref, reference_forward_index,),
-            "refcloud_forward_size": (dim_ref, reference_forward_size,),
-        }
-        coord_dict = {
-            "time": (["time"], np.arange(0, 1)),
-            "nclouds_new": (["nclouds_new"], np.arange(0, nnew)),
-            "nclouds_ref": (["nclouds_ref"], np.arange(0, nreference)),
-            "nlinks": (["nlinks"], np.arange(0, nmaxlinks)),
-        }
-        gattr_dict = {
-            "title": "Indices linking clouds in two consecutive files " + \
-                     "forward and backward in time and the size of the linked cloud",
-            # "Conventions": "CF-1.6",
-            "Institution": "Pacific Northwest National Laboratory",
-            "Contact": "Zhe Feng, zhe.feng@pnnl.gov",
-            "Created_on": time.ctime(time.time()),
-            "new_date": new_filedatetime,
-            "ref_date": reference_filedatetime,
-            "new_file": new_file_basename,
-            "ref_file": reference_file_basename,
-            "overlap_threshold": str(int(othresh * 100)) + "%",
-            "maximum_gap_allowed": str(timegap) + " hr",
-        }
-        # Define xarray dataset
-        output_data = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
-
-        # Specify variable attributes
-        output_data.nclouds_new.attrs["long_name"] = "number of cloud in new file"
-        output_data.nclouds_new.attrs["units"] = "unitless"
-
-        output_data.nclouds_ref.attrs["long_name"] = "number of cloud in reference file"
-        output_data.nclouds_ref.attrs["units"] = "unitless"
-
-        output_data.nlinks.attrs[
-            "long_name"
-        ] = "maximum number of clouds that can be linked to a given cloud"
-        output_data.nlinks.attrs["units"] = "unitless"
-
-        output_data.basetime_new.attrs[
-            "long_name"
-        ] = "epoch time (seconds since 01/01/1970 00:00) of new file"
-        output_data.basetime_new.attrs["standard_name"] = "time"
-
-        output_data.basetime_ref.attrs[
-            "long_name"
-        ] = "epoch time (seconds since 01/01/1970 00:00) of reference file"
-        output_data.basetime_ref.attrs["standard_name"] = "time"
-
-        output_data.newcloud_backward_index.attrs["long_name"] = "reference cloud index"
-        output_data.newcloud_backward_index.attrs[
-            "usage"
-        ] = "each row represents a cloud in the new file and " + \
-            "the numbers in that row provide all reference cloud indices linked to that new cloud"
-        output_data.newcloud_backward_index.attrs["units"] = "unitless"
-        output_data.newcloud_backward_index.attrs["valid_min"] = 1
-        output_data.newcloud_backward_index.attrs["valid_max"] = nreference
-
-        output_data.refcloud_forward_index.attrs["long_name"] = "new cloud index"
-        output_data.refcloud_forward_index.attrs[
-            "usage"
-        ] = "each row represents a cloud in the reference file and " + \
-            "the numbers provide all new cloud indices linked to that reference cloud"
-        output_data.refcloud_forward_index.attrs["units"] = "unitless"
-        output_data.refcloud_forward_index.attrs["valid_min"] = 1
-        output_data.refcloud_forward_index.attrs["valid_max"] = nnew
-
-        output_data.newcloud_backward_size.attrs["long_name"] = "reference cloud area"
-        output_data.newcloud_backward_size.attrs[
-            "usage"
-        ] = "each row represents a cloud in the new file and " + \
-            "the numbers provide the area of all reference clouds linked to that new cloud"
-        output_data.newcloud_backward_size.attrs["units"] = "km^2"
-
-        output_data.refcloud_forward_size.attrs["long_name"] = "new cloud area"
-        output_data.refcloud_forward_size.attrs[
-            "usage"
-        ] = "each row represents a cloud in the reference file and " + \
-            "the numbers provide the area of all new clouds linked to that reference cloud"
-        output_data.refcloud_forward_size.attrs["units"] = "km^2"
-
-        # Write netcdf files
-        # output_data.to_netcdf(path=track_outfile, mode='w', format='NETCDF4_CLASSIC', unlimited_dims='times', \
-        zlib = True
-        output_data.to_netcdf(
-            path=track_outfile,
-            mode="w",
-            format="NETCDF4",
-            unlimited_dims="time",
-            encoding={
-                "basetime_new": {
-                    "dtype": "int64",
-                    "zlib": zlib,
-                    "units": "seconds since 1970-01-01",
-                },
-                "basetime_ref": {
-                    "dtype": "int64",
-                    "zlib": zlib,
-                    "units": "seconds since 1970-01-01",
-                },
-                "newcloud_backward_index": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "newcloud_backward_size": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_index": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-                "refcloud_forward_size": {
-                    "dtype": "int",
-                    "zlib": zlib,
-                    "_FillValue": fillval,
-                },
-            },
-        )
-        logger.info(track_outfile)
-    return track_outfile
\ No newline at end of file
+    Returns:
+        track_outfile: string
+            Track file name.
+    """
+    logger = logging.getLogger(__name__)
+    timegap = config["timegap"]
+    nmaxlinks = config["nmaxlinks"]
+    othresh = config["othresh"]
+    fillval = config["fillval"]
+    nnew = new_backward_index.shape[1]
+    nreference = reference_forward_index.shape[1]
+
+    # Check if file already exists. If exists, delete
+    if os.path.isfile(track_outfile):
+        os.remove(track_outfile)
+
+    logger.debug("Writing single tracks")
+
+    bt_new = np.array(
+                [pd.to_datetime(bt_new, unit="s")],
+                dtype="datetime64[ns]",
+            )[0]
+    bt_ref = np.array(
+                [pd.to_datetime(bt_ref, unit="s")],
+                dtype="datetime64[ns]",
+            )[0]
+
+    # Define output variables dictionary
+    dim_new = ["time", "nclouds_new", "nlinks"]
+    dim_ref = ["time", "nclouds_ref", "nlinks"]
+    var_dict = {
+        "basetime_new": (["time"], bt_new,),
+        "basetime_ref": (["time"], bt_ref,),
+        "newcloud_backward_index": (dim_new, new_backward_index,),
+        "newcloud_backward_size": (dim_new, new_backward_size,),
+        "refcloud_forward_index": (dim_ref, reference_forward_index,),
+        "refcloud_forward_size": (dim_ref, reference_forward_size,),
+    }
+    coord_dict = {
+        "time": (["time"], np.arange(0, 1)),
+        "nclouds_new": (["nclouds_new"], np.arange(0, nnew)),
+        "nclouds_ref": (["nclouds_ref"], np.arange(0, nreference)),
+        "nlinks": (["nlinks"], np.arange(0, nmaxlinks)),
+    }
+    gattr_dict = {
+        "title": "Indices linking clouds in two consecutive files " + \
+                 "forward and backward in time and the size of the linked cloud",
+        # "Conventions": "CF-1.6",
+        "Institution": "Pacific Northwest National Laboratory",
+        "Contact": "Zhe Feng, zhe.feng@pnnl.gov",
+        "Created_on": time.ctime(time.time()),
+        "new_date": new_filedatetime,
+        "ref_date": reference_filedatetime,
+        "new_file": new_file_basename,
+        "ref_file": reference_file_basename,
+        "overlap_threshold": str(int(othresh * 100)) + "%",
+        "maximum_gap_allowed": str(timegap) + " hr",
+    }
+    # Define xarray dataset
+    output_data = xr.Dataset(var_dict, coords=coord_dict, attrs=gattr_dict)
+
+    # Specify variable attributes
+    output_data.nclouds_new.attrs["long_name"] = "number of cloud in new file"
+    output_data.nclouds_new.attrs["units"] = "unitless"
+
+    output_data.nclouds_ref.attrs["long_name"] = "number of cloud in reference file"
+    output_data.nclouds_ref.attrs["units"] = "unitless"
+
+    output_data.nlinks.attrs[
+        "long_name"
+    ] = "maximum number of clouds that can be linked to a given cloud"
+    output_data.nlinks.attrs["units"] = "unitless"
+
+    output_data.basetime_new.attrs[
+        "long_name"
+    ] = "epoch time (seconds since 01/01/1970 00:00) of new file"
+    output_data.basetime_new.attrs["standard_name"] = "time"
+
+    output_data.basetime_ref.attrs[
+        "long_name"
+    ] = "epoch time (seconds since 01/01/1970 00:00) of reference file"
+    output_data.basetime_ref.attrs["standard_name"] = "time"
+
+    output_data.newcloud_backward_index.attrs["long_name"] = "reference cloud index"
+    output_data.newcloud_backward_index.attrs[
+        "usage"
+    ] = "each row represents a cloud in the new file and " + \
+        "the numbers in that row provide all reference cloud indices linked to that new cloud"
+    output_data.newcloud_backward_index.attrs["units"] = "unitless"
+    output_data.newcloud_backward_index.attrs["valid_min"] = 1
+    output_data.newcloud_backward_index.attrs["valid_max"] = nreference
+
+    output_data.refcloud_forward_index.attrs["long_name"] = "new cloud index"
+    output_data.refcloud_forward_index.attrs[
+        "usage"
+    ] = "each row represents a cloud in the reference file and " + \
+        "the numbers provide all new cloud indices linked to that reference cloud"
+    output_data.refcloud_forward_index.attrs["units"] = "unitless"
+    output_data.refcloud_forward_index.attrs["valid_min"] = 1
+    output_data.refcloud_forward_index.attrs["valid_max"] = nnew
+
+    output_data.newcloud_backward_size.attrs["long_name"] = "reference cloud area"
+    output_data.newcloud_backward_size.attrs[
+        "usage"
+    ] = "each row represents a cloud in the new file and " + \
+        "the numbers provide the area of all reference clouds linked to that new cloud"
+    output_data.newcloud_backward_size.attrs["units"] = "km^2"
+
+    output_data.refcloud_forward_size.attrs["long_name"] = "new cloud area"
+    output_data.refcloud_forward_size.attrs[
+        "usage"
+    ] = "each row represents a cloud in the reference file and " + \
+        "the numbers provide the area of all new clouds linked to that reference cloud"
+    output_data.refcloud_forward_size.attrs["units"] = "km^2"
+
+    # Write netcdf files
+    # output_data.to_netcdf(path=track_outfile, mode='w', format='NETCDF4_CLASSIC', unlimited_dims='times', \
+    encoding = get_netcdf_encoding(output_data, config, encoding={
+        "basetime_new": {
+            "dtype": "int64",
+            "zlib": True,
+            "units": "seconds since 1970-01-01",
+        },
+        "basetime_ref": {
+            "dtype": "int64",
+            "zlib": True,
+            "units": "seconds since 1970-01-01",
+        },
+        "newcloud_backward_index": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+        "newcloud_backward_size": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+        "refcloud_forward_index": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+        "refcloud_forward_size": {"dtype": "int", "zlib": True, "_FillValue": fillval},
+    })
+    output_data.to_netcdf(
+        path=track_outfile,
+        mode="w",
+        format="NETCDF4",
+        unlimited_dims="time",
+        encoding=encoding,
+    )
+    logger.info(track_outfile)
+    return track_outfile
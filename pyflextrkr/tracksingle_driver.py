@@ -2,7 +2,8 @@ import sys
 import logging
 import dask
 from dask.distributed import wait
-from pyflextrkr.ft_utilities import subset_files_timerange, match_drift_times
+from pyflextrkr.ft_utilities import match_drift_times
+from pyflextrkr.cloudid_store import subset_cloudid_files
 from pyflextrkr.tracksingle_drift import trackclouds
 
 def tracksingle_driver(config):
@@ -26,15 +27,20 @@ def tracksingle_driver(config):
     end_basetime = config["end_basetime"]
     run_parallel = config["run_parallel"]
     driftfile = config.get("driftfile", None)
+    link_and_number = config.get("link_and_number", False)
+
+    # Features are linked while getting track numbers (Step 3) in link_and_number mode
+    if link_and_number:
+        logger.info('link_and_number mode: linking is done in gettracknumbers, skipping')
+        return
 
     # Identify files to process
     cloudidfiles, \
     cloudidfiles_basetime, \
     cloudidfiles_datestring, \
-    cloudidfiles_timestring = subset_files_timerange(tracking_outpath,
-                                                     cloudid_filebase,
-                                                     start_basetime,
-                                                     end_basetime)
+    cloudidfiles_timestring = subset_cloudid_files(config,
+                                                   start_basetime,
+                                                   end_basetime)
     cloudidfilestep = len(cloudidfiles)
     logger.info(f"Total number of files to process: {cloudidfilestep}")
 
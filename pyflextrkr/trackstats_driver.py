@@ -11,6 +11,9 @@ import logging
 import dask
 from dask.distributed import wait
 from pyflextrkr.trackstats_func import calc_stats_singlefile, adjust_mergesplit_numbers, get_track_startend_status
+from pyflextrkr.ft_utilities import load_tracknumbers, get_netcdf_encoding
+from pyflextrkr.cloudid_store import open_cloudid
+from pyflextrkr.static_cache import preload_static_fields_workers, read_rangemask
 
 def trackstats_driver(config):
     """
@@ -60,25 +63,23 @@ def trackstats_driver(config):
     # Load track data
     logger.debug("Loading tracknumbers data")
     cloudtrack_file = f"{stats_path}{tracknumbers_filebase}{startdate}_{enddate}.nc"
-    ds = xr.open_dataset(cloudtrack_file,
-                         mask_and_scale=False,
-                         decode_times=False,
-                         concat_characters=True)
-    numtracks = ds["ntracks"]
-    cloudidfiles = ds["cloudid_files"].values
-    nfiles = ds.sizes["nfiles"]
-    tracknumbers = ds["track_numbers"].squeeze()
-    trackreset = ds["track_reset"].squeeze()
-    tracksplit = ds["track_splitnumbers"].squeeze()
-    trackmerge = ds["track_mergenumbers"].squeeze()
-    trackstatus = ds["track_status"].squeeze()
-    ds.close()
+    track_dict = load_tracknumbers(cloudtrack_file)
+    numtracks = track_dict["ntracks"]
+    cloudidfiles = track_dict["cloudid_files"]
+    nfiles = len(cloudidfiles)
+    # Track variables of cloudid file nf are [file_offsets[nf]:file_offsets[nf+1]]
+    file_offsets = track_dict["file_offsets"]
+    tracknumbers = track_dict["track_numbers"]
+    trackreset = track_dict["track_reset"]
+    tracksplit = track_dict["track_splitnumbers"]
+    trackmerge = track_dict["track_mergenumbers"]
+    trackstatus = track_dict["track_status"]
 
     # import pdb; pdb.set_trace()
 
     # Read one cloudid file to get domain & coordinates information
     fname = chartostring(cloudidfiles[0]).item()
-    dspix = xr.open_dataset(f"{tracking_outpath}{fname}")
+    dspix = open_cloudid(f"{tracking_outpath}{fname}", config)
 
     # Get 2D lat/lon coordinates
     latitude = dspix["latitude"].values
@@ -115,12 +116,12 @@ def trackstats_driver(config):
     if run_parallel == 0:
         for nf in range(0, nfiles):
             result = calc_stats_singlefile(
-                tracknumbers[nf, :],
+                tracknumbers[file_offsets[nf]:file_offsets[nf + 1]],
                 cloudidfiles[nf],
-                trackstatus[nf, :],
-                trackmerge[nf, :],
-                tracksplit[nf, :],
-                trackreset[nf, :],
+                trackstatus[file_offsets[nf]:file_offsets[nf + 1]],
+                trackmerge[file_offsets[nf]:file_offsets[nf + 1]],
+                tracksplit[file_offsets[nf]:file_offsets[nf + 1]],
+                trackreset[file_offsets[nf]:file_offsets[nf + 1]],
                 config,
             )
             results.append(result)
@@ -130,14 +131,19 @@ def trackstats_driver(config):
 
     # Parallel
     elif run_parallel >= 1:
+        # Load the radar range mask once on each worker
+        if (config.get("feature_type", None) == "radar_cells") & (config.get("terrain_file", None) is not None):
+            preload_static_fields_workers(
+                [(read_rangemask, config["terrain_file"], (config.get("rangemask_varname", 'None'),))], config,
+            )
         for nf in range(0, nfiles):
             result = dask.delayed(calc_stats_singlefile)(
-                tracknumbers[nf, :],
+                tracknumbers[file_offsets[nf]:file_offsets[nf + 1]],
                 cloudidfiles[nf],
-                trackstatus[nf, :],
-                trackmerge[nf, :],
-                tracksplit[nf, :],
-                trackreset[nf, :],
+                trackstatus[file_offsets[nf]:file_offsets[nf + 1]],
+                trackmerge[file_offsets[nf]:file_offsets[nf + 1]],
+                tracksplit[file_offsets[nf]:file_offsets[nf + 1]],
+                trackreset[file_offsets[nf]:file_offsets[nf + 1]],
                 config,
             )
             results.append(result)
@@ -193,15 +199,13 @@ def trackstats_driver(config):
                      "merge_tracknumbers",
                      "split_tracknumbers"]
     # Loop over variable list to create the dictionary entry
+    # Values from each file are collected in lists and concatenated once
     for ivar in var_names:
-        out_dict[ivar] = np.array([])
+        out_dict[ivar] = []
         out_dict_attrs[ivar] = var_attrs[ivar]
 
-    # Initialize row/col indices arrays
-    row_idx = np.array([])
-    col_idx = np.array([])
-
     # Collect results
+    tracknumber_list = []
     for nf in range(0, nfiles):
         # Get the return results for this pixel file
         # The result is a tuple: (out_dict, out_dict_attrs)
@@ -209,30 +213,30 @@ def trackstats_driver(config):
         iResult = final_result[nf][0]
         if iResult is not None:
             # unique tracknumbers in the current file
-            tracknumbertmp = iResult["uniquetracknumbers"] - 1
-            # number of tracks in the current file
-            numtrackstmp = iResult["numtracks"]
-
-            # Record the current length of the track by adding 1
-            out_dict["track_duration"][tracknumbertmp] = (
-                    out_dict["track_duration"][tracknumbertmp] + 1
-            )
-
-            # Find track lengths that are within max_trackduration
-            # Only record these to avoid array index out of bounds
-            # itracklength = out_tracklength[tracknumbertmp]
-            itracklength = out_dict["track_duration"][tracknumbertmp]
-            ridx = itracklength <= max_trackduration
-            # Loop over each variable and assign values to output dictionary
+            tracknumber_list.append(iResult["uniquetracknumbers"] - 1)
+            # Loop over each variable and collect values
             for ivar in var_names:
-                # Concatenate arrays for 2D variables
-                out_dict[ivar] = np.concatenate(
-                    (out_dict[ivar], iResult[ivar])
-                )
-            # row, column indices for sparse matrix
-            # row:tracks, col:times
-            row_idx = np.concatenate((row_idx, tracknumbertmp[ridx])).astype(int)
-            col_idx = np.concatenate((col_idx, itracklength[ridx] - 1)).astype(int)
+                out_dict[ivar].append(iResult[ivar])
+
+    # Track indices of all features in file order
+    tracknumbertmp = np.concatenate(tracknumber_list).astype(int)
+    # Count the number of times each track appears to get the track duration
+    track_duration = np.bincount(tracknumbertmp, minlength=numtracks)
+    out_dict["track_duration"] = track_duration.astype(np.int32)
+    # Time index of each feature within its track (order of appearance of the track)
+    # row, column indices for sparse matrix
+    # row:tracks, col:times
+    sort_idx = np.argsort(tracknumbertmp, kind="stable")
+    track_start = np.cumsum(track_duration) - track_duration
+    col_idx = np.empty(len(tracknumbertmp), dtype=int)
+    col_idx[sort_idx] = np.arange(len(tracknumbertmp)) - track_start[tracknumbertmp[sort_idx]]
+    # Find track lengths that are within max_trackduration
+    # Only record these to avoid array index out of bounds
+    ridx = col_idx < max_trackduration
+    row_idx = tracknumbertmp[ridx]
+    col_idx = col_idx[ridx]
+    for ivar in var_names:
+        out_dict[ivar] = np.concatenate(out_dict[ivar])[ridx]
 
     #########################################################################################
     # Check data max duration against config set up
@@ -594,8 +598,7 @@ def write_trackstats_sparse(config, numtracks, out_dict_attrs, out_dict, row_out
     # Define output Xarray dataset
     dsout = xr.Dataset(varlist, coords=coordlist, attrs=gattrlist)
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
     # Write to netcdf file
     dsout.to_netcdf(path=trackstats_sparse_outfile,
                     mode='w',
@@ -695,8 +698,7 @@ def write_trackstats_dense(config, fillval, fillval_f,
     # Define output Xarray dataset
     dsout = xr.Dataset(varlist, coords=coordlist, attrs=gattrlist)
     # Set encoding/compression for all variables
-    comp = dict(zlib=True)
-    encoding = {var: comp for var in dsout.data_vars}
+    encoding = get_netcdf_encoding(dsout, config)
     # Write to netcdf file
     dsout.to_netcdf(path=trackstats_outfile,
                     mode='w',
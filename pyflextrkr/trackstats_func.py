@@ -3,8 +3,9 @@ from netCDF4 import chartostring
 import xarray as xr
 import sys
 import logging
-import warnings
 from pyflextrkr.ftfunctions import circular_mean
+from pyflextrkr.cloudid_store import open_cloudid
+from pyflextrkr.static_cache import get_static_field, read_rangemask
 
 def calc_stats_singlefile(
         tracknumbers,
@@ -58,9 +59,9 @@ def calc_stats_singlefile(
 
         # Load cloudid file
         cloudid_file = f"{tracking_outpath}{fname}"
-        ds = xr.open_dataset(cloudid_file,
-                             mask_and_scale=False,
-                             decode_times=False)
+        ds = open_cloudid(cloudid_file, config,
+                          mask_and_scale=False,
+                          decode_times=False)
         latitude = ds["latitude"].values
         longitude = ds["longitude"].values
         nx = ds.sizes["lon"]
@@ -102,11 +103,9 @@ def calc_stats_singlefile(
             file_echotop40 = ds["echotop40"].squeeze().values / 1000.
             file_echotop50 = ds["echotop50"].squeeze().values / 1000.
 
-            # Range mask file
+            # Range mask file (cached for all files in this process)
             if terrain_file is not None:
-                dster = xr.open_dataset(terrain_file, decode_cf=False, mask_and_scale=False)
-                rangemask = dster[rangemask_varname].values.astype('int8')
-                dster.close()
+                rangemask = get_static_field(read_rangemask, terrain_file, rangemask_varname, config=config)
 
         if "tb" in feature_type:
             file_tb = ds["tb"].squeeze().values
@@ -114,10 +113,14 @@ def calc_stats_singlefile(
 
         # ds.close()
 
-        # Find unique track numbers
-        uniquetracknumbers = np.unique(tracknumbers)
-        uniquetracknumbers = uniquetracknumbers[np.isfinite(uniquetracknumbers)]
-        uniquetracknumbers = uniquetracknumbers[uniquetracknumbers > 0].astype(np.int32)
+        # Find unique track numbers, and the first cloud of each track
+        uniquetracknumbers, cloudindex, track_nclouds = np.unique(
+            tracknumbers, return_index=True, return_counts=True,
+        )
+        valid = np.isfinite(uniquetracknumbers) & (uniquetracknumbers > 0)
+        uniquetracknumbers = uniquetracknumbers[valid].astype(np.int32)
+        cloudindex = cloudindex[valid]
+        track_nclouds = track_nclouds[valid]
 
         # Create output variables
         fillval = -9999
@@ -200,186 +203,160 @@ def calc_stats_singlefile(
             # plt.pcolormesh(Zm)
 
 
-        # Loop over unique tracknumbers
-        for itrack in range(numtracks):
-            # Map the tracknumbers in this frame to cloudnumbers
-            cloudnumber_map = np.where(tracknumbers == uniquetracknumbers[itrack])[0] + 1
-            # Handle edge case where more than 1 cloudnumber is returned
-            if len(cloudnumber_map) > 1:
-                logger.warning(f'Cloudid file: {cloudid_file}')
-                logger.warning(f'More than 1 {feature_varname} found for tracknumber: {uniquetracknumbers[itrack]}')
-                logger.warning(f'{feature_varname}: {cloudnumber_map}')
-                logger.warning(f'Only use {feature_varname}: {cloudnumber_map[0]}')
-                cloudnumber_map = cloudnumber_map[0]
-            cloudindex = cloudnumber_map - 1
-
-            # # Get the cloudmask for the current track (this is the slow method!)
-            # mask_corecold = file_corecold_cloudnumber == cloudnumber_map
-            # mask_cloud = file_cloudnumber == cloudnumber_map
-
-            # Get corecold cloud pixel location indices
-            corecold_npix, corecold_indices = get_loc_indices(
-                cloudnumber1d_uniq, cloudnumber1d_counts,
-                ast_corecoldarea, cumcounts_corecoldarea,
-                cloudnumber_map, nx, ny
-            )
-
-            if corecold_npix > 0:
-                out_area[itrack] = corecold_npix * pixel_radius ** 2
-                corecold_lat = latitude[corecold_indices[0], corecold_indices[1]]
-                corecold_lon = longitude[corecold_indices[0], corecold_indices[1]]
-
-                if pbc_direction in ['x', 'both']:
-                    mean_lon = circular_mean(corecold_lon, longitude_min, longitude_max)
-                else:
-                    mean_lon = np.nanmean(corecold_lon)
-
-                if pbc_direction in ['y', 'both']:
-                    mean_lat = circular_mean(corecold_lat, latitude_min, latitude_max)
-                else:
-                    mean_lat = np.nanmean(corecold_lat)
-                
-                # Store the calculated mean positions
-                out_meanlon[itrack] = mean_lon
-                out_meanlat[itrack] = mean_lat
-
-                # Calculate feature specific statistics
-                # Satellite Tb
-                if "tb" in feature_type:
-                    # Get cold core pixel location indices
-                    core_npix, core_indices = get_loc_indices(
-                        corenumber1d_uniq, corenumber1d_counts,
-                        ast_corearea, cumcounts_corearea,
-                        cloudnumber_map, nx, ny,
-                    )
-
-                    # Get cold anvil pixel location indices
-                    cold_npix, cold_indices = get_loc_indices(
-                        coldnumber1d_uniq, coldnumber1d_counts,
-                        ast_coldarea, cumcounts_coldarea,
-                        cloudnumber_map, nx, ny,
-                    )
-
-                    out_core_area[itrack] = core_npix * pixel_radius ** 2
-                    out_cold_area[itrack] = cold_npix * pixel_radius ** 2
-                    out_corecold_mintb[itrack] = np.nanmin(file_tb[corecold_indices[0], corecold_indices[1]])
-                    out_corecold_meantb[itrack] = np.nanmean(file_tb[corecold_indices[0], corecold_indices[1]])
-                    # Get min Tb location
-                    mintb_index = np.nanargmin(file_tb[corecold_indices[0], corecold_indices[1]])
-                    out_mintb_lat[itrack] = latitude[corecold_indices[0], corecold_indices[1]][mintb_index]
-                    out_mintb_lon[itrack] = longitude[corecold_indices[0], corecold_indices[1]][mintb_index]
-                    if core_npix > 0:
-                        out_core_meantb[itrack] = np.nanmean(file_tb[core_indices[0], core_indices[1]])
-
-                    # iy_min, iy_max = np.min(corecold_indices[0]), np.max(corecold_indices[0])
-                    # ix_min, ix_max = np.min(corecold_indices[1]), np.max(corecold_indices[1])
-
-                # Calculate feature specific statistics
-                # Radar cells
-                if feature_type == "radar_cells":
-                    # Get core pixel location indices
-                    core_npix, core_indices = get_loc_indices(
-                        corenumber1d_uniq, corenumber1d_counts,
-                        ast_corearea, cumcounts_corearea,
-                        cloudnumber_map, nx, ny,
-                    )
+        # Handle edge case where more than 1 cloudnumber is found for a track
+        for itrack in np.where(track_nclouds > 1)[0]:
+            cloudnumbers = np.where(tracknumbers == uniquetracknumbers[itrack])[0] + 1
+            logger.warning(f'Cloudid file: {cloudid_file}')
+            logger.warning(f'More than 1 {feature_varname} found for tracknumber: {uniquetracknumbers[itrack]}')
+            logger.warning(f'{feature_varname}: {cloudnumbers}')
+            logger.warning(f'Only use {feature_varname}: {cloudnumbers[0]}')
+        # Map the tracknumbers in this frame to cloudnumbers
+        cloudnumber_map = cloudindex + 1
+
+        # Flatten 2D coordinates to index with pre-sorted 1D pixel indices
+        latitude1d = latitude.ravel()
+        longitude1d = longitude.ravel()
+
+        # Get corecold cloud pixel indices of all tracks
+        corecold_npix, corecold_pixels = get_segment_indices(
+            cloudnumber1d_uniq, cloudnumber1d_counts,
+            ast_corecoldarea, cumcounts_corecoldarea,
+            cloudnumber_map,
+        )
+        # Tracks with corecold cloud pixels
+        hascloud = corecold_npix > 0
 
-                    # Get dilated cell pixel location indices
-                    dilatedcell_npix, dilatedcell_indices = get_loc_indices(
-                        dilatednumber1d_uniq, dilatednumber1d_counts,
-                        ast_dilatedcellarea, cumcounts_dilatedcellarea,
-                        cloudnumber_map, nx, ny,
-                    )
+        out_area[hascloud] = corecold_npix[hascloud] * pixel_radius ** 2
+        corecold_lat = latitude1d[corecold_pixels]
+        corecold_lon = longitude1d[corecold_pixels]
 
-                    # Location of core
-                    core_lat = latitude[core_indices[0], core_indices[1]]
-                    core_lon = longitude[core_indices[0], core_indices[1]]
-                    core_y = y_coords[core_indices[0]]
-                    core_x = x_coords[core_indices[1]]
-
-                    # Location of cell (same as corecold location)
-                    cell_lat = corecold_lat
-                    cell_lon = corecold_lon
-                    cell_y = y_coords[corecold_indices[0]]
-                    cell_x = x_coords[corecold_indices[1]]
-
-                    # Core center location
-                    if pbc_direction in ['x', 'both']:
-                        out_core_meanlon[itrack] = circular_mean(core_lon, longitude_min, longitude_max)
-                        out_core_mean_x[itrack] = circular_mean(core_x, x_coords_min, x_coords_max)
-                    else:
-                        out_core_meanlon[itrack] = np.nanmean(core_lon)
-                        out_core_mean_x[itrack] = np.nanmean(core_x)
-                    
-                    if pbc_direction in ['y', 'both']:
-                        out_core_meanlat[itrack] = circular_mean(core_lat, latitude_min, latitude_max)
-                        out_core_mean_y[itrack] = circular_mean(core_y, y_coords_min, y_coords_max)
-                    else:
-                        out_core_meanlat[itrack] = np.nanmean(core_lat)                    
-                        out_core_mean_y[itrack] = np.nanmean(core_y)                    
+        if pbc_direction in ['x', 'both']:
+            out_meanlon[:] = segment_circular_mean(corecold_lon, corecold_npix, longitude_min, longitude_max)
+        else:
+            out_meanlon[:] = segment_mean(corecold_lon, corecold_npix)
 
-                    # Cell center location
-                    if pbc_direction in ['x', 'both']:
-                        out_cell_meanlon[itrack] = circular_mean(cell_lon, longitude_min, longitude_max)
-                        out_cell_mean_x[itrack] = circular_mean(cell_x, x_coords_min, x_coords_max)
-                    else:
-                        out_cell_meanlon[itrack] = np.nanmean(cell_lon)
-                        out_cell_mean_x[itrack] = np.nanmean(cell_x)
+        if pbc_direction in ['y', 'both']:
+            out_meanlat[:] = segment_circular_mean(corecold_lat, corecold_npix, latitude_min, latitude_max)
+        else:
+            out_meanlat[:] = segment_mean(corecold_lat, corecold_npix)
 
-                    if pbc_direction in ['y', 'both']:
-                        out_cell_meanlat[itrack] = circular_mean(cell_lat, latitude_min, latitude_max)
-                        out_cell_mean_y[itrack] = circular_mean(cell_y, y_coords_min, y_coords_max)
-                    else:
-                        out_cell_meanlat[itrack] = np.nanmean(cell_lat)                    
-                        out_cell_mean_y[itrack] = np.nanmean(cell_y)                        
+        # Calculate feature specific statistics
+        # Satellite Tb
+        if "tb" in feature_type:
+            # Get cold core pixel indices
+            core_npix, core_pixels = get_segment_indices(
+                corenumber1d_uniq, corenumber1d_counts,
+                ast_corearea, cumcounts_corearea,
+                cloudnumber_map,
+            )
+            # Get cold anvil pixel indices
+            cold_npix, cold_pixels = get_segment_indices(
+                coldnumber1d_uniq, coldnumber1d_counts,
+                ast_coldarea, cumcounts_coldarea,
+                cloudnumber_map,
+            )
+            file_tb1d = file_tb.ravel()
+            corecold_tb = file_tb1d[corecold_pixels]
+
+            out_core_area[hascloud] = core_npix[hascloud] * pixel_radius ** 2
+            out_cold_area[hascloud] = cold_npix[hascloud] * pixel_radius ** 2
+            out_corecold_mintb[:] = segment_reduce(corecold_tb, corecold_npix, np.fmin)
+            out_corecold_meantb[:] = segment_mean(corecold_tb, corecold_npix)
+            # Get min Tb location
+            mintb_index = segment_argmin(corecold_tb, corecold_npix)
+            hasmintb = mintb_index >= 0
+            out_mintb_lat[hasmintb] = corecold_lat[mintb_index[hasmintb]]
+            out_mintb_lon[hasmintb] = corecold_lon[mintb_index[hasmintb]]
+            out_core_meantb[:] = segment_mean(file_tb1d[core_pixels], core_npix)
+
+        # Calculate feature specific statistics
+        # Radar cells
+        if feature_type == "radar_cells":
+            # Get core pixel indices
+            core_npix, core_pixels = get_segment_indices(
+                corenumber1d_uniq, corenumber1d_counts,
+                ast_corearea, cumcounts_corearea,
+                cloudnumber_map,
+            )
 
-                    out_core_area[itrack] = core_npix * pixel_radius ** 2
-                    out_cell_area[itrack] = corecold_npix * pixel_radius ** 2
+            # Get dilated cell pixel indices
+            dilatedcell_npix, dilatedcell_pixels = get_segment_indices(
+                dilatednumber1d_uniq, dilatednumber1d_counts,
+                ast_dilatedcellarea, cumcounts_dilatedcellarea,
+                cloudnumber_map,
+            )
 
-                    out_cell_max_dbz[itrack] = np.nanmax(
-                        file_dbz[corecold_indices[0], corecold_indices[1]]
-                    )
+            # Location of core
+            x_coords1d = np.asarray(x_coords)
+            y_coords1d = np.asarray(y_coords)
+            core_lat = latitude1d[core_pixels]
+            core_lon = longitude1d[core_pixels]
+            core_y = y_coords1d[core_pixels // nx]
+            core_x = x_coords1d[core_pixels % nx]
+
+            # Location of cell (same as corecold location)
+            cell_lat = corecold_lat
+            cell_lon = corecold_lon
+            cell_y = y_coords1d[corecold_pixels // nx]
+            cell_x = x_coords1d[corecold_pixels % nx]
+
+            # Core center location
+            if pbc_direction in ['x', 'both']:
+                out_core_meanlon[:] = segment_circular_mean(core_lon, core_npix, longitude_min, longitude_max)
+                out_core_mean_x[:] = segment_circular_mean(core_x, core_npix, x_coords_min, x_coords_max)
+            else:
+                out_core_meanlon[:] = segment_mean(core_lon, core_npix)
+                out_core_mean_x[:] = segment_mean(core_x, core_npix)
+
+            if pbc_direction in ['y', 'both']:
+                out_core_meanlat[:] = segment_circular_mean(core_lat, core_npix, latitude_min, latitude_max)
+                out_core_mean_y[:] = segment_circular_mean(core_y, core_npix, y_coords_min, y_coords_max)
+            else:
+                out_core_meanlat[:] = segment_mean(core_lat, core_npix)
+                out_core_mean_y[:] = segment_mean(core_y, core_npix)
+
+            # Cell center location
+            if pbc_direction in ['x', 'both']:
+                out_cell_meanlon[:] = segment_circular_mean(cell_lon, corecold_npix, longitude_min, longitude_max)
+                out_cell_mean_x[:] = segment_circular_mean(cell_x, corecold_npix, x_coords_min, x_coords_max)
+            else:
+                out_cell_meanlon[:] = segment_mean(cell_lon, corecold_npix)
+                out_cell_mean_x[:] = segment_mean(cell_x, corecold_npix)
+
+            if pbc_direction in ['y', 'both']:
+                out_cell_meanlat[:] = segment_circular_mean(cell_lat, corecold_npix, latitude_min, latitude_max)
+                out_cell_mean_y[:] = segment_circular_mean(cell_y, corecold_npix, y_coords_min, y_coords_max)
+            else:
+                out_cell_meanlat[:] = segment_mean(cell_lat, corecold_npix)
+                out_cell_mean_y[:] = segment_mean(cell_y, corecold_npix)
+
+            out_core_area[hascloud] = core_npix[hascloud] * pixel_radius ** 2
+            out_cell_area[hascloud] = corecold_npix[hascloud] * pixel_radius ** 2
+
+            out_cell_max_dbz[:] = segment_reduce(file_dbz.ravel()[corecold_pixels], corecold_npix, np.fmax)
+            out_cell_maxETH10dbz[:] = segment_reduce(file_echotop10.ravel()[corecold_pixels], corecold_npix, np.fmax)
+            out_cell_maxETH20dbz[:] = segment_reduce(file_echotop20.ravel()[corecold_pixels], corecold_npix, np.fmax)
+            out_cell_maxETH30dbz[:] = segment_reduce(file_echotop30.ravel()[corecold_pixels], corecold_npix, np.fmax)
+            out_cell_maxETH40dbz[:] = segment_reduce(file_echotop40.ravel()[corecold_pixels], corecold_npix, np.fmax)
+            out_cell_maxETH50dbz[:] = segment_reduce(file_echotop50.ravel()[corecold_pixels], corecold_npix, np.fmax)
 
-                    # Ignore "All-NaN slice encountered" error in ETH variables
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore", category=RuntimeWarning)
-
-                        out_cell_maxETH10dbz[itrack] = np.nanmax(
-                            file_echotop10[corecold_indices[0], corecold_indices[1]]
-                        )
-                        out_cell_maxETH20dbz[itrack] = np.nanmax(
-                            file_echotop20[corecold_indices[0], corecold_indices[1]]
-                        )
-                        out_cell_maxETH30dbz[itrack] = np.nanmax(
-                            file_echotop30[corecold_indices[0], corecold_indices[1]]
-                        )
-                        out_cell_maxETH40dbz[itrack] = np.nanmax(
-                            file_echotop40[corecold_indices[0], corecold_indices[1]]
-                        )
-                        out_cell_maxETH50dbz[itrack] = np.nanmax(
-                            file_echotop50[corecold_indices[0], corecold_indices[1]]
-                        )
-
-                    if terrain_file is not None:
-                        # The min range mask value within the dilated cell area
-                        # 1: cell completely within range mask
-                        # 0: some portion of the cell outside range mask
-                        out_cell_rangeflag[itrack] = np.min(
-                            rangemask[dilatedcell_indices[0], dilatedcell_indices[1]])
-
-            out_basetime[itrack] = file_basetime
-            out_cloudnumber[itrack] = cloudnumber_map
-            # out_cloudidfile[itrack][:] = fname
-            # out_area[itrack] = np.count_nonzero(mask_corecold) * pixel_radius ** 2
-            # out_meanlat[itrack] = np.nanmean(latitude[mask_corecold])
-            # out_meanlon[itrack] = np.nanmean(longitude[mask_corecold])
-            # out_cell_max_dbz[itrack] = np.nanmax(file_dbz[mask_corecold])
-
-            # Save track status, merge/split information
-            out_status[itrack] = trackstatus[cloudindex]
-            out_mergenumber[itrack] = trackmerge[cloudindex]
-            out_splitnumber[itrack] = tracksplit[cloudindex]
-            out_trackinterruptions[itrack] = trackreset[cloudindex]
+            if terrain_file is not None:
+                # The min range mask value within the dilated cell area
+                # 1: cell completely within range mask
+                # 0: some portion of the cell outside range mask
+                hasdilatedcell = hascloud & (dilatedcell_npix > 0)
+                out_cell_rangeflag[hasdilatedcell] = segment_reduce(
+                    rangemask.ravel()[dilatedcell_pixels], dilatedcell_npix, np.minimum,
+                )[hasdilatedcell]
+
+        out_basetime[:] = file_basetime.values
+        out_cloudnumber[:] = cloudnumber_map
+
+        # Save track status, merge/split information
+        out_status[:] = trackstatus[cloudindex]
+        out_mergenumber[:] = trackmerge[cloudindex]
+        out_splitnumber[:] = tracksplit[cloudindex]
+        out_trackinterruptions[:] = trackreset[cloudindex]
 
         # Track status explanation
         track_status_explanation = (
@@ -793,6 +770,154 @@ def define_extra_radar_cells(fillval, fillval_f, out_cell_area, out_cell_maxETH1
     return out_dict_attrs_extra, out_dict_extra
 
 
+def get_segment_indices(
+        cloudnumber1d_uniq,
+        cloudnumber1d_counts,
+        ast_cloudarea,
+        cumcounts_cloudarea,
+        cloudnumbers,
+):
+    """
+    Get the 1D pixel location indices for a list of cloudnumbers from a pre-sorted list.
+
+    The pixels of all clouds are returned in a single array, grouped by cloud in the order of cloudnumbers,
+    so that statistics of all clouds can be computed with segment reductions.
+
+    Args:
+        cloudnumber1d_uniq: numpy array
+            Unique cloudnumbers in the current pixel file.
+        cloudnumber1d_counts: numpy array
+            Pixel counts (area) of each unique cloud.
+        ast_cloudarea: numpy array
+            Cloud area flatten 1D indices sorted by cloud size.
+        cumcounts_cloudarea: numpy array
+            Cumulative counts for each cloud area.
+        cloudnumbers: numpy array
+            Cloud number values.
+
+    Returns:
+        npix: numpy array
+            Number of pixels for each cloudnumber.
+        pixel_indices: numpy array
+            Flatten 1D pixel location indices of all clouds.
+    """
+    # Find index of pre-sorted cloudnumber matching each cloud
+    idx = np.searchsorted(cloudnumber1d_uniq, cloudnumbers)
+    idx = np.minimum(idx, len(cloudnumber1d_uniq) - 1)
+    found = cloudnumber1d_uniq[idx] == cloudnumbers
+    npix = np.where(found, cloudnumber1d_counts[idx], 0)
+    # Start of each cloud in the sorted list, and in the output array
+    start = cumcounts_cloudarea[idx] - cloudnumber1d_counts[idx]
+    offsets = np.cumsum(npix) - npix
+    pixel_indices = ast_cloudarea[np.repeat(start - offsets, npix) + np.arange(np.sum(npix))]
+    return npix, pixel_indices
+
+
+def segment_mean(values, npix):
+    """
+    Calculate the mean of each segment, ignoring NaN.
+
+    Args:
+        values: numpy array
+            Values of all segments concatenated.
+        npix: numpy array
+            Number of values in each segment.
+
+    Returns:
+        mean_values: numpy array
+            Mean of each segment, NaN for segments without valid values.
+    """
+    segment_id = np.repeat(np.arange(len(npix)), npix)
+    valid = np.isfinite(values)
+    sums = np.bincount(segment_id[valid], weights=values[valid], minlength=len(npix))
+    counts = np.bincount(segment_id[valid], minlength=len(npix))
+    mean_values = np.full(len(npix), np.nan, dtype=float)
+    np.divide(sums, counts, out=mean_values, where=counts > 0)
+    return mean_values
+
+
+def segment_circular_mean(values, npix, domain_min, domain_max):
+    """
+    Calculate the circular mean of each segment in a periodic domain.
+
+    Args:
+        values: numpy array
+            Positions of all segments concatenated.
+        npix: numpy array
+            Number of values in each segment.
+        domain_min: float
+            Minimum value of the domain.
+        domain_max: float
+            Maximum value of the domain.
+
+    Returns:
+        mean_values: numpy array
+            Mean position of each segment in the original domain range.
+    """
+    # Convert to radians within the domain
+    domain_range = domain_max - domain_min
+    normalized_values = (values - domain_min) / domain_range * 2 * np.pi
+    # Compute the circular mean using trigonometry
+    mean_angle = np.arctan2(segment_mean(np.sin(normalized_values), npix),
+                            segment_mean(np.cos(normalized_values), npix))
+    # Convert back to original domain
+    mean_values = (mean_angle / (2 * np.pi) * domain_range) + domain_min
+    return (mean_values - domain_min) % domain_range + domain_min
+
+
+def segment_reduce(values, npix, ufunc, fillval=np.nan):
+    """
+    Reduce the values of each segment with a ufunc (e.g., np.fmax, np.fmin).
+
+    Args:
+        values: numpy array
+            Values of all segments concatenated.
+        npix: numpy array
+            Number of values in each segment.
+        ufunc: numpy ufunc
+            Function to reduce each segment.
+        fillval: float
+            Value for empty segments.
+
+    Returns:
+        reduced_values: numpy array
+            Reduced value of each segment.
+    """
+    nonempty = npix > 0
+    reduced_values = np.full(len(npix), fillval, dtype=np.result_type(values, fillval))
+    if np.any(nonempty):
+        offsets = np.cumsum(npix) - npix
+        reduced_values[nonempty] = ufunc.reduceat(values, offsets[nonempty])
+    return reduced_values
+
+
+def segment_argmin(values, npix):
+    """
+    Get the index of the minimum value of each segment, ignoring NaN.
+
+    Ties are resolved by the first occurrence within the segment (same as np.nanargmin).
+
+    Args:
+        values: numpy array
+            Values of all segments concatenated.
+        npix: numpy array
+            Number of values in each segment.
+
+    Returns:
+        min_index: numpy array
+            Index into values of the minimum of each segment, -1 for segments without valid values.
+    """
+    segment_id = np.repeat(np.arange(len(npix)), npix)
+    # Sort by segment then value, NaN sorts to the end of each segment
+    order = np.lexsort((values, segment_id))
+    offsets = np.cumsum(npix) - npix
+    nonempty = npix > 0
+    min_index = np.full(len(npix), -1, dtype=int)
+    min_index[nonempty] = order[offsets[nonempty]]
+    min_index[(min_index >= 0) & ~np.isfinite(values[np.maximum(min_index, 0)])] = -1
+    return min_index
+
+
 def get_loc_indices(
         cloudnumber1d_uniq,
         cloudnumber1d_counts,
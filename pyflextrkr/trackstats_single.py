@@ -43,7 +43,7 @@ def calc_stats_single(
     fname = "".join(chartostring(cloudidfiles))
     logger.debug(fname)
 
-    # Load cloudid file
+    # Load cloudid file (netCDF files only, cloudid_store: zarr is not supported)
     cloudid_file = tracking_inpath + fname
     # logger.info(cloudid_file)
 
@@ -34,6 +34,8 @@ setuptools.setup(
         "Topic :: Scientific/Engineering :: Atmospheric Science"
     ],
     install_requires=required,
+    # Optional compiled kernels (e.g., growing cold cores into cold anvils)
+    extras_require={"numba": ["numba"]},
     python_requires='>=3.10',
     include_package_data=True,
     project_urls={
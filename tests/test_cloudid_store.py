@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+import pytest
+from pyflextrkr.cloudid_store import write_cloudid, subset_cloudid_files, open_cloudid, get_cloudid_frame_configs
+
+start_time = pd.Timestamp("2020-01-01")
+start_basetime = int((start_time - pd.Timestamp("1970-01-01")).total_seconds())
+
+# Make a synthetic cloudid Dataset with one time, in the format written by idfeature_generic
+def make_cloudid_frame(itime, ny=20, nx=30):
+    rng = np.random.default_rng(itime)
+    nfeatures = itime + 2
+    feature_mask = rng.integers(0, nfeatures + 1, size=(1, ny, nx))
+    basetime = np.array([start_basetime + 3600. * itime])
+    bt_attrs = {"long_name": "Base time in Epoch", "units": "Seconds since 1970-1-1 0:00:00 0:00"}
+    var_dict = {
+        "base_time": (["time"], basetime, bt_attrs),
+        "tb": (["time", "lat", "lon"], rng.random((1, ny, nx)).astype(np.float32)),
+        "feature_number": (["time", "lat", "lon"], feature_mask),
+        "nfeatures": (["time"], np.array([nfeatures])),
+        "npix_feature": (["features"], np.bincount(feature_mask.ravel(), minlength=nfeatures + 1)[1:]),
+    }
+    coord_dict = {
+        "time": (["time"], basetime, bt_attrs),
+        "lat": (["lat"], np.linspace(0., 5., ny)),
+        "lon": (["lon"], np.linspace(0., 6., nx)),
+        "features": (["features"], np.arange(1, nfeatures + 1)),
+    }
+    return xr.Dataset(var_dict, coords=coord_dict)
+
+def make_config(tracking_outpath, cloudid_store):
+    return {
+        "tracking_outpath": tracking_outpath,
+        "cloudid_filebase": "cloudid_",
+        "startdate": "20200101.0000",
+        "enddate": "20200102.0000",
+        "cloudid_store": cloudid_store,
+        "maxnclouds": 10,
+    }
+
+# Test cloudid frames written to the Zarr store are read back the same as the netCDF files
+def test_cloudid_store_roundtrip(tmp_path):
+    pytest.importorskip("zarr")
+    nfiles = 4
+    files_basetime = start_basetime + 3600 * np.arange(nfiles)
+    results = {}
+    for cloudid_store in ["netcdf", "zarr"]:
+        config = make_config(f"{tmp_path}/{cloudid_store}/", cloudid_store)
+        (tmp_path / cloudid_store).mkdir()
+        frame_configs = get_cloudid_frame_configs(config, nfiles)
+        # Write frames out of order, the first frame written creates the store
+        for ifile in [2, 0, 3, 1]:
+            frame_config = frame_configs[ifile]
+            if ifile == 2:
+                frame_config = dict(frame_config, cloudid_store_basetime=files_basetime)
+            ds_out = make_cloudid_frame(ifile)
+            timestring = pd.Timestamp(ds_out["base_time"].item(), unit="s").strftime("%Y%m%d_%H%M%S")
+            write_cloudid(ds_out, f"{config['tracking_outpath']}cloudid_{timestring}.nc", frame_config)
+        cloudid_files = subset_cloudid_files(config, start_basetime + 1800, start_basetime + 86400)
+        results[cloudid_store] = (
+            cloudid_files,
+            [open_cloudid(ifile, config, mask_and_scale=False, decode_times=False).load()
+             for ifile in cloudid_files[0]],
+        )
+
+    files_netcdf, ds_netcdf = results["netcdf"]
+    files_zarr, ds_zarr = results["zarr"]
+    assert len(files_netcdf[0]) == nfiles - 1, "Files within the time range should be found"
+    assert [f.split("/")[-1] for f in files_zarr[0]] == [f.split("/")[-1] for f in files_netcdf[0]]
+    np.testing.assert_array_equal(files_zarr[1], files_netcdf[1])
+    assert files_zarr[2:] == files_netcdf[2:]
+    for dsn, dsz in zip(ds_netcdf, ds_zarr):
+        assert set(dsz.variables) == set(dsn.variables)
+        for var in dsn.variables:
+            assert dsz[var].dims == dsn[var].dims, var
+            np.testing.assert_array_equal(dsz[var].values, dsn[var].values, err_msg=var)
+
+# Write a Tb input file with two times
+def make_tb_file(filename, minutes, ny=20, nx=30):
+    rng = np.random.default_rng(0)
+    times = [start_time + pd.Timedelta(minutes=minute) for minute in minutes]
+    xr.Dataset(
+        {
+            "tb": (["time", "lat", "lon"], 200. + 100. * rng.random((len(times), ny, nx))),
+            "precipitation": (["time", "lat", "lon"], rng.random((len(times), ny, nx))),
+        },
+        coords={"time": times, "lat": np.linspace(0., 5., ny), "lon": np.linspace(0., 6., nx)},
+    ).to_netcdf(filename)
+
+def make_tbpf_config(tracking_outpath):
+    return {
+        **make_config(tracking_outpath, "zarr"),
+        "clouddata_path": tracking_outpath, "databasename": "tb_", "time_format": "yyyymodd_hhmm",
+        "clouddatasource": "model", "absolutetb_threshs": [160, 330],
+        "cloudtb_core": 225., "cloudtb_cold": 241., "cloudtb_warm": 261., "cloudtb_cloud": 261.,
+        "miss_thresh": 0.4, "tb_varname": "tb", "geolimits": [-90, -180, 90, 360],
+        "cloudidmethod": "label_grow", "pixel_radius": 10., "area_thresh": 800, "mincoldcorepix": 4,
+        "smoothwindowdimensions": 3, "warmanvilexpansion": 0, "pcp_varname": "precipitation",
+        "feature_type": "tb_pf", "x_coordname": "lon", "y_coordname": "lat",
+    }
+
+# Test that multiple times in an input file are not written to the same time index of the store
+def test_idclouds_tbpf_zarr_multitime(tmp_path):
+    pytest.importorskip("zarr")
+    from pyflextrkr.idclouds_tbpf import idclouds_tbpf
+    input_file = f"{tmp_path}/tb_20200101_0000.nc"
+    make_tb_file(input_file, [0, 10])
+    config = dict(make_tbpf_config(f"{tmp_path}/"), cloudid_store_index=0)
+    with pytest.raises(SystemExit):
+        idclouds_tbpf(input_file, config)
+    # Times not selected by idclouds_hourly are not written
+    config = dict(config, idclouds_hourly=1, idclouds_minute=30, idclouds_dt_thresh=5)
+    assert idclouds_tbpf(input_file, config) is None
+
+def test_idcells_reflectivity_zarr_multitime(monkeypatch):
+    pytest.importorskip("zarr")
+    pytest.importorskip("healpix")
+    from pyflextrkr import idcells_reflectivity
+    comp_dict = {"time_coords": xr.DataArray(np.arange(2), dims="time"), "is_3d": True}
+    monkeypatch.setattr(idcells_reflectivity, "get_composite_reflectivity_generic", lambda *args: comp_dict)
+    config_keys = [
+        "absConvThres", "minZdiff", "truncZconvThres", "mindBZuse", "dBZforMaxConvRadius",
+        "conv_rad_increment", "conv_rad_start", "bkg_refl_increment", "maxConvRadius", "radii_expand",
+        "weakEchoThres", "bkgrndRadius", "echotop_gap", "sfc_dz_min", "sfc_dz_max", "return_diag",
+        "dx", "dy", "fillval",
+    ]
+    config = dict(make_config("./", "zarr"), cloudid_store_index=0, **{key: 0 for key in config_keys})
+    with pytest.raises(SystemExit):
+        idcells_reflectivity.idcells_reflectivity("radar.nc", config)
@@ -0,0 +1,394 @@
+import numpy as np
+from scipy.ndimage import label, gaussian_filter
+from pyflextrkr.ftfunctions import grow_cells, grow_cells_numba, grow_cells_numpy, _grow_cells_queue, link_pf_tb, get_overlap_links
+from pyflextrkr.ftfunctions import sort_renumber, sort_renumber2vars
+from pyflextrkr.steiner_func import label_cells
+
+# Make a synthetic cold core/cold anvil field for growing
+def make_grow_grid(seed, ny=60, nx=80):
+    rng = np.random.default_rng(seed)
+    field = gaussian_filter(rng.random((ny, nx)), 2)
+    # Cold cores are the seeded regions, cold anvils are grown, the rest is excluded
+    grid, ncores = label(field > np.quantile(field, 0.9))
+    grid[field < np.quantile(field, 0.4)] = -1
+    # Add seeds in the first row, which are handled specially by the seed point queue
+    grid[0, ::7] = 1
+    return grid
+
+# Test the compiled version of grow_cells against the Python implementation
+def test_grow_cells_numba():
+    for seed in range(5):
+        grid = make_grow_grid(seed)
+        expected = grow_cells(np.copy(grid), method="python")
+        assert np.count_nonzero(expected > 0) > np.count_nonzero(grid > 0), "Seeded regions should grow"
+        assert np.array_equal(grow_cells_numba(np.copy(grid)), expected), "numba grow_cells should match Python"
+        assert np.array_equal(grow_cells(np.copy(grid)), expected), "Default grow_cells should match Python"
+
+# Test the kernel without compiling, in case numba is not installed
+def test_grow_cells_queue():
+    grid = make_grow_grid(10, ny=30, nx=40)
+    expected = grow_cells(np.copy(grid), method="python")
+    result = np.copy(grid)
+    seed_points = np.where(result > 0)
+    nseeds = np.count_nonzero(seed_points[0])
+    _grow_cells_queue(result, seed_points[0][:nseeds], seed_points[1][:nseeds])
+    assert np.array_equal(result, expected), "Grow cells kernel should match Python"
+
+
+def link_pf_tb_reference(
+    convcold_cloudnumber,
+    cloudnumber,
+    pf_number,
+    tb,
+    tb_thresh,
+):
+    """
+    Previous loop implementation of link_pf_tb, used as a reference.
+    """
+
+    # Get number of PFs
+    npf = np.nanmax(pf_number)
+
+    # Make a copy of the input arrays
+    pf_convcold_cloudnumber = np.copy(convcold_cloudnumber)
+    pf_cloudnumber = np.copy(cloudnumber)
+
+    # Create a 2D index array with the same shape as the full image
+    # This index array is used to map the indices of indices back to the full image
+    arrayindex2d = np.reshape(np.arange(tb.size), tb.shape)
+
+    # If number of PF > 0, proceed
+    if npf > 0:
+
+        # Initiallize masks to keep track of which clouds have been renumbered
+        pf_convcold_mask = np.zeros(tb.shape, dtype=int)
+        pf_cloud_mask = np.zeros(tb.shape, dtype=int)
+
+        # Loop over each PF
+        for ipf in range(1, npf):
+
+            # Find pixel index for this PF
+            pfidx = np.where(pf_number == ipf)
+            npix_pf = len(pfidx[0])
+
+            if npix_pf > 0:
+                # Get unique cloud number defined within this PF
+                # cn_uniq = np.unique(convcold_cloudnumber[pfidx])
+                cn_uniq = np.unique(pf_convcold_cloudnumber[pfidx])
+
+                # Find actual clouds (cloudnumber > 0)
+                cn_uniq = cn_uniq[np.where(cn_uniq > 0)]
+                nclouds_uniq = len(cn_uniq)
+                # If there is at least 1 cloud, proceed
+                if nclouds_uniq >= 1:
+
+                    # Loop over each cloudnumber and get the size
+                    npix_uniq = np.zeros(nclouds_uniq, dtype=np.int64)
+                    for ic in range(0, nclouds_uniq):
+                        # Find pixels for each cloud, save the size
+                        # npix_uniq[ic] = len(np.where(convcold_cloudnumber == cn_uniq[ic])[0])
+                        npix_uniq[ic] = len(
+                            np.where(pf_convcold_cloudnumber == cn_uniq[ic])[0]
+                        )
+
+                    # Find cloud number that has maximum size
+                    cn_max = cn_uniq[np.argmax(npix_uniq)]
+
+                    # Loop over each cloudnumber again
+                    for ic in range(0, nclouds_uniq):
+
+                        # Find pixel locations within each cloud, and mask = 0 (cloud has not been renumbered)
+                        # idx_convcold = np.where((convcold_cloudnumber == cn_uniq[ic]) & (pf_convcold_mask == 0))
+                        idx_convcold = np.where(
+                            (pf_convcold_cloudnumber == cn_uniq[ic])
+                            & (pf_convcold_mask == 0)
+                        )
+                        # idx_cloud = np.where((cloudnumber == cn_uniq[ic]) & (pf_cloud_mask == 0))
+                        idx_cloud = np.where(
+                            (pf_cloudnumber == cn_uniq[ic]) & (pf_cloud_mask == 0)
+                        )
+                        if len(idx_convcold[0]) > 0:
+                            # Renumber the cloud to the largest cloud number (that overlaps with this PF)
+                            pf_convcold_cloudnumber[idx_convcold] = cn_max
+                            pf_convcold_mask[idx_convcold] = 1
+                        if len(idx_cloud[0]) > 0:
+                            # Renumber the cloud to the largest cloud number (that overlaps with this PF)
+                            pf_cloudnumber[idx_cloud] = cn_max
+                            pf_cloud_mask[idx_cloud] = 1
+
+                    # Find area within the PF that has no cloudnumber, Tb < warm threshold, and has not been labeled yet
+                    #                     idx_nocloud = np.asarray((pf_convcold_cloudnumber[pfidx] == 0) & (tb[pfidx] < tb_thresh) & (pf_convcold_mask[pfidx] == 0)).nonzero()
+                    idx_nocloud = np.asarray(
+                        (pf_convcold_cloudnumber[pfidx] == 0)
+                        & (pf_convcold_mask[pfidx] == 0)
+                    ).nonzero()
+                    if np.count_nonzero(idx_nocloud) > 0:
+                        # At this point, idx_nocloud is a 1D index referring to the subset within pfidx
+                        # Applying idx_nocloud of pfidx to the 2D full image index array gets the 1D indices referring to the full image,
+                        # then unravel_index converts those 1D indices back to 2D, which can then be applied to the 2D full image
+                        idx_loc = np.unravel_index(
+                            arrayindex2d[pfidx][idx_nocloud], tb.shape
+                        )
+                        # Label the no cloud area using the largest cloud number
+                        pf_convcold_cloudnumber[idx_loc] = cn_max
+                        pf_convcold_mask[idx_loc] = 1
+
+                    # Find area within the PF that has no cloudnumber, Tb < warm threshold, and has not been labeled yet
+                    #                     idx_nocloud = np.asarray((pf_cloudnumber[pfidx] == 0) & (tb[pfidx] < tb_thresh) & (pf_cloud_mask[pfidx] == 0)).nonzero()
+                    idx_nocloud = np.asarray(
+                        (pf_cloudnumber[pfidx] == 0) & (pf_cloud_mask[pfidx] == 0)
+                    ).nonzero()
+                    if np.count_nonzero(idx_nocloud) > 0:
+                        idx_loc = np.unravel_index(
+                            arrayindex2d[pfidx][idx_nocloud], tb.shape
+                        )
+                        # Label the no cloud area using the largest cloud number
+                        pf_cloudnumber[idx_loc] = cn_max
+                        pf_cloud_mask[idx_loc] = 1
+
+    else:
+        # Pass input variables to output if no PFs are defined
+        pf_convcold_cloudnumber = np.copy(convcold_cloudnumber)
+        pf_cloudnumber = np.copy(cloudnumber)
+
+    return (
+        pf_convcold_cloudnumber,
+        pf_cloudnumber,
+    )
+
+# Make synthetic cloud and PF fields for linking
+def make_link_pf_fields(seed, ny=60, nx=80):
+    rng = np.random.default_rng(seed)
+    field = gaussian_filter(rng.random((ny, nx)), 2)
+    tb = 300. - 100. * (field - field.min()) / (field.max() - field.min())
+    # Clouds with a warm anvil, convective-cold anvil clouds are within the clouds
+    cloudnumber, nclouds = label(tb < 250)
+    convcold_cloudnumber = np.where(tb < 240, cloudnumber, 0)
+    # PFs overlap several clouds and clear areas
+    pf_field = gaussian_filter(rng.random((ny, nx)), 3)
+    pf_number, npf = label(pf_field > np.quantile(pf_field, 0.6))
+    return convcold_cloudnumber, cloudnumber, pf_number, tb
+
+# Test link_pf_tb against the previous loop implementation
+def test_link_pf_tb():
+    for seed in range(10):
+        convcold_cloudnumber, cloudnumber, pf_number, tb = make_link_pf_fields(seed)
+        expected = link_pf_tb_reference(convcold_cloudnumber, cloudnumber, pf_number, tb, 250)
+        result = link_pf_tb(convcold_cloudnumber, cloudnumber, pf_number, tb, 250)
+        assert not np.array_equal(expected[0], convcold_cloudnumber), "Clouds should be renumbered"
+        assert np.array_equal(result[0], expected[0]), "Convective-cold anvil cloud number should match"
+        assert np.array_equal(result[1], expected[1]), "Cloud number should match"
+
+# Make small dense random cloud and PF fields, with ties in cloud size
+# and the PF first pixel often being its only no cloud pixel
+def make_dense_link_pf_fields(seed, ny=6, nx=8, nclouds=6, npf=8):
+    rng = np.random.default_rng(seed)
+    cloudnumber = rng.integers(1, nclouds + 1, size=(ny, nx))
+    pf_number = rng.integers(0, npf + 1, size=(ny, nx))
+    convcold_cloudnumber = np.copy(cloudnumber)
+    _, pf_first = np.unique(pf_number, return_index=True)
+    convcold_cloudnumber.flat[pf_first[rng.random(len(pf_first)) < 0.7]] = 0
+    tb = np.full((ny, nx), 220.)
+    return convcold_cloudnumber, cloudnumber, pf_number, tb
+
+# Test link_pf_tb against the previous loop implementation on small dense fields
+def test_link_pf_tb_dense():
+    for seed in range(2000):
+        convcold_cloudnumber, cloudnumber, pf_number, tb = make_dense_link_pf_fields(seed)
+        expected = link_pf_tb_reference(convcold_cloudnumber, cloudnumber, pf_number, tb, 250)
+        result = link_pf_tb(convcold_cloudnumber, cloudnumber, pf_number, tb, 250)
+        assert np.array_equal(result[0], expected[0]), f"Convective-cold anvil cloud number should match (seed {seed})"
+        assert np.array_equal(result[1], expected[1]), f"Cloud number should match (seed {seed})"
+
+# Test the vectorized NumPy version of grow_cells against the Python implementation
+def test_grow_cells_numpy():
+    for seed in range(5):
+        grid = make_grow_grid(seed)
+        expected = grow_cells(np.copy(grid), method="python")
+        assert np.array_equal(grow_cells_numpy(np.copy(grid)), expected), "NumPy grow_cells should match Python"
+        assert np.array_equal(grow_cells(np.copy(grid), method="numpy"), expected), "NumPy grow_cells should match Python"
+    # Small random grids with many ties between labels
+    for seed in range(200):
+        rng = np.random.default_rng(seed)
+        grid = rng.choice([-1, 0, 1, 2, 3], size=(8, 10), p=[0.2, 0.5, 0.1, 0.1, 0.1])
+        grid[0, 0] = 1
+        expected = grow_cells(np.copy(grid), method="python")
+        assert np.array_equal(grow_cells_numpy(np.copy(grid)), expected), f"NumPy grow_cells should match Python (seed {seed})"
+
+def get_overlap_links_reference(
+    reference_number,
+    new_number,
+    nreference,
+    nnew,
+    nmaxlinks,
+    othresh,
+    fillval,
+):
+    """
+    Previous loop implementation of the overlap links in trackclouds, used as a reference.
+    """
+    reference_forward_index = np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
+    reference_forward_size = np.ones((1, int(nreference), int(nmaxlinks)), dtype=int) * fillval
+    new_backward_index = np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
+    new_backward_size = np.ones((1, int(nnew), int(nmaxlinks)), dtype=int) * fillval
+
+    for refindex in np.arange(1, nreference + 1):
+        forward_matchindices = np.where((reference_number == refindex) & (new_number != 0))
+        forward_newindex = new_number[forward_matchindices]
+        unique_forwardnewindex = np.unique(forward_newindex)
+        sizeref = len(np.extract(reference_number == refindex, reference_number))
+        forward_nmatch = 0
+        for matchindex in unique_forwardnewindex:
+            sizematch = len(np.extract(forward_newindex == matchindex, forward_newindex))
+            if sizematch / float(sizeref) > othresh:
+                reference_forward_index[0, int(refindex) - 1, forward_nmatch] = matchindex
+                reference_forward_size[0, int(refindex) - 1, forward_nmatch] = len(
+                    np.extract(new_number == matchindex, new_number)
+                )
+                forward_nmatch = forward_nmatch + 1
+
+    for newindex in np.arange(1, nnew + 1):
+        backward_matchindices = np.where((new_number == newindex) & (reference_number != 0))
+        backward_refindex = reference_number[backward_matchindices]
+        unique_backwardrefindex = np.unique(backward_refindex)
+        sizenew = len(np.extract(new_number == newindex, new_number))
+        backward_nmatch = 0
+        for matchindex in unique_backwardrefindex:
+            sizematch = len(np.extract(backward_refindex == matchindex, backward_refindex))
+            if sizematch / float(sizenew) > othresh:
+                new_backward_index[0, int(newindex) - 1, backward_nmatch] = matchindex
+                new_backward_size[0, int(newindex) - 1, backward_nmatch] = len(
+                    np.extract(reference_number == matchindex, reference_number)
+                )
+                backward_nmatch = backward_nmatch + 1
+
+    return (
+        reference_forward_index,
+        reference_forward_size,
+        new_backward_index,
+        new_backward_size,
+    )
+
+# Make synthetic labeled features at a reference and a new time, the new features are moved and reshaped
+def make_overlap_fields(seed, ny=60, nx=80):
+    rng = np.random.default_rng(seed)
+    field = gaussian_filter(rng.random((ny, nx)), 2)
+    reference_number, nreference = label(field > np.quantile(field, 0.7))
+    field = np.roll(field, (1, 2), axis=(0, 1)) + 0.02 * gaussian_filter(rng.random((ny, nx)), 1)
+    new_number, nnew = label(field > np.quantile(field, 0.65))
+    return reference_number, new_number, nreference, nnew
+
+# Test get_overlap_links against the previous loop implementation
+def test_get_overlap_links():
+    for seed in range(10):
+        reference_number, new_number, nreference, nnew = make_overlap_fields(seed)
+        args = (reference_number, new_number, nreference + 1, nnew + 1, 50, 0.5, -9999)
+        expected = get_overlap_links_reference(*args)
+        result = get_overlap_links(*args)
+        assert np.any(expected[0] > 0), "Features should be linked"
+        for iresult, iexpected in zip(result, expected):
+            assert np.array_equal(iresult, iexpected), "Overlap links should match"
+    # Small random fields with many links per feature and low overlap thresholds
+    for seed in range(200):
+        rng = np.random.default_rng(seed)
+        reference_number = rng.integers(0, 6, size=(6, 8))
+        new_number = rng.integers(0, 8, size=(6, 8))
+        for othresh in [0., 0.1, 0.3]:
+            args = (reference_number, new_number, 7, 9, 10, othresh, -9999)
+            expected = get_overlap_links_reference(*args)
+            result = get_overlap_links(*args)
+            for iresult, iexpected in zip(result, expected):
+                assert np.array_equal(iresult, iexpected), f"Overlap links should match (seed {seed})"
+
+
+def sort_renumber_reference(
+    labelcell_number2d,
+    min_size,
+    grid_area=None,
+    labelcell2_number2d=None,
+):
+    """
+    Previous loop implementation of sort_renumber and sort_renumber2vars, used as a reference.
+    """
+    sortedlabelcell_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
+    sortedlabelcell2_number2d = np.zeros(np.shape(labelcell_number2d), dtype=int)
+    nlabelcells = np.nanmax(labelcell_number2d)
+    sortedcell_npix = np.zeros(0)
+
+    if nlabelcells > 0:
+        labelcell_npix = np.full(nlabelcells, -999, dtype=int)
+        for ilabelcell in range(1, nlabelcells + 1):
+            ilabelcell_npix = np.count_nonzero(labelcell_number2d == ilabelcell)
+            if grid_area is None:
+                if ilabelcell_npix > min_size:
+                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
+            else:
+                ilabelcell_area = np.sum(grid_area[labelcell_number2d == ilabelcell])
+                if ilabelcell_area > min_size:
+                    labelcell_npix[ilabelcell - 1] = ilabelcell_npix
+
+        ivalidcells = np.where(labelcell_npix > 0)[0]
+        ncells = len(ivalidcells)
+        if ncells > 0:
+            labelcell_number1d = np.copy(ivalidcells) + 1
+            labelcell_npix = labelcell_npix[ivalidcells]
+            order = np.argsort(labelcell_npix)[::-1]
+            sortedcell_npix = np.copy(labelcell_npix[order])
+            sortedcell_number1d = np.copy(labelcell_number1d[order])
+
+            cellstep = 0
+            for icell in range(0, ncells):
+                sortedcell_indices = np.where(labelcell_number2d == sortedcell_number1d[icell])
+                nsortedcellindices = len(sortedcell_indices[1])
+                if nsortedcellindices == sortedcell_npix[icell]:
+                    cellstep += 1
+                    sortedlabelcell_number2d[sortedcell_indices] = np.copy(cellstep)
+                    if labelcell2_number2d is not None:
+                        sortedcell2_indices = np.where(labelcell2_number2d == sortedcell_number1d[icell])
+                        sortedlabelcell2_number2d[sortedcell2_indices] = np.copy(cellstep)
+
+    if labelcell2_number2d is not None:
+        return sortedlabelcell_number2d, sortedlabelcell2_number2d, sortedcell_npix
+    return sortedlabelcell_number2d, sortedcell_npix
+
+# Make random labeled cells, with non-sequential and negative labels, and ties in cell size
+def make_renumber_fields(seed, ny=30, nx=40):
+    rng = np.random.default_rng(seed)
+    labelcell_number2d, ncells = label(gaussian_filter(rng.random((ny, nx)), 1.5) > 0.52)
+    # Remove some cells, and mark missing pixels with a negative value
+    labelcell_number2d[np.isin(labelcell_number2d, rng.integers(1, ncells + 1, size=3))] = 0
+    labelcell_number2d[rng.random((ny, nx)) < 0.02] = -1
+    # A second variable with the same cells expanded by a pixel
+    labelcell2_number2d = np.maximum(labelcell_number2d, np.roll(labelcell_number2d, 1, axis=1))
+    grid_area = rng.uniform(50., 150., size=(ny, nx))
+    return labelcell_number2d, labelcell2_number2d, grid_area
+
+# Test sort_renumber, sort_renumber2vars and label_cells against the previous loop implementation
+def test_sort_renumber():
+    for seed in range(20):
+        labelcell_number2d, labelcell2_number2d, grid_area = make_renumber_fields(seed)
+        for min_size in [0, 3]:
+            expected = sort_renumber_reference(labelcell_number2d, min_size)
+            result = sort_renumber(labelcell_number2d, min_size)
+            assert len(expected[1]) > 1, "Cells should be renumbered"
+            assert np.array_equal(result[0], expected[0]), f"Renumbered cells should match (seed {seed})"
+            assert np.array_equal(result[1], expected[1]), f"Cell sizes should match (seed {seed})"
+
+            expected = sort_renumber_reference(labelcell_number2d, 300. * min_size, grid_area=grid_area)
+            result = sort_renumber(labelcell_number2d, 300. * min_size, grid_area=grid_area)
+            assert np.array_equal(result[0], expected[0]), f"Renumbered cells by area should match (seed {seed})"
+            assert np.array_equal(result[1], expected[1]), f"Cell sizes by area should match (seed {seed})"
+
+            expected = sort_renumber_reference(labelcell_number2d, min_size, labelcell2_number2d=labelcell2_number2d)
+            result = sort_renumber2vars(labelcell_number2d, labelcell2_number2d, min_size)
+            for iresult, iexpected in zip(result, expected):
+                assert np.array_equal(iresult, iexpected), f"Renumbered 2 variables should match (seed {seed})"
+
+            convmask = labelcell_number2d > 0
+            expected = sort_renumber_reference(label(convmask)[0], min_size)
+            result = label_cells(convmask, min_size)
+            assert np.array_equal(result[0], expected[0]), f"Labeled cells should match (seed {seed})"
+            assert np.array_equal(result[1], expected[1]), f"Labeled cell sizes should match (seed {seed})"
+    # No cells
+    result = sort_renumber(np.zeros((4, 5), dtype=int), 0)
+    assert (np.count_nonzero(result[0]) == 0) & (len(result[1]) == 0)
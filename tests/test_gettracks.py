@@ -0,0 +1,96 @@
+import numpy as np
+from pyflextrkr.gettracks import get_link_graph, get_associated_clouds
+
+
+def get_associated_clouds_reference(ncr, refcloud_forward_index, newcloud_backward_index):
+    """
+    Previous search of the clouds associated with a reference cloud in gettracknumbers, used as a reference.
+    """
+    nreferenceclouds = 0
+    ntemp_referenceclouds = 1
+    temp_referenceclouds = [ncr]
+    associated_newclouds = []
+
+    trackpresent = 0
+    while ntemp_referenceclouds > nreferenceclouds:
+        associated_referenceclouds = np.copy(temp_referenceclouds).astype(int)
+        nreferenceclouds = ntemp_referenceclouds
+
+        for nr in range(0, nreferenceclouds):
+            tempncr = associated_referenceclouds[nr]
+
+            # Find indices of forward linked clouds
+            newforwardindex = np.array(np.where(refcloud_forward_index[0, tempncr - 1, :] > 0))
+            nnewforward = np.shape(newforwardindex)[1]
+            if nnewforward > 0:
+                core_newforward = refcloud_forward_index[0, tempncr - 1, newforwardindex[0, :]]
+
+            # Find indices of backwards linked clouds
+            newbackwardindex = np.array(np.where(newcloud_backward_index[0, :, :] == tempncr))
+            nnewbackward = np.shape(newbackwardindex)[1]
+            if nnewbackward > 0:
+                core_newbackward = (newbackwardindex[0, :] + 1)
+
+            if nnewforward > 0:
+                if trackpresent == 0:
+                    associated_newclouds = core_newforward[:].astype(int)
+                    trackpresent = trackpresent + 1
+                else:
+                    associated_newclouds = np.append(associated_newclouds, core_newforward.astype(int))
+
+            if nnewbackward > 0:
+                if trackpresent == 0:
+                    associated_newclouds = core_newbackward[:]
+                    trackpresent = trackpresent + 1
+                else:
+                    associated_newclouds = np.append(associated_newclouds, core_newbackward.astype(int))
+
+            if nnewbackward == 0 and nnewforward == 0:
+                associated_newclouds = []
+
+            if trackpresent > 0:
+                if len(associated_newclouds) > 1:
+                    associated_newclouds = np.unique(np.sort(associated_newclouds))
+                nnewclouds = len(associated_newclouds)
+
+                # Look to see if these new clouds are linked to other cells in the reference file as well
+                for nnew in range(0, nnewclouds):
+                    referencecloudindex = np.array(
+                        np.where(refcloud_forward_index[0, :, :] == associated_newclouds[nnew])
+                    )
+                    nassociatedreference = np.shape(referencecloudindex)[1]
+                    if nassociatedreference > 0:
+                        temp_referenceclouds = np.append(temp_referenceclouds, referencecloudindex[0] + 1)
+                        temp_referenceclouds = np.unique(np.sort(temp_referenceclouds))
+
+                ntemp_referenceclouds = len(temp_referenceclouds)
+
+    return associated_referenceclouds, np.array(associated_newclouds, dtype=int)
+
+# Make random forward and backward link indices, with one-way links between the clouds
+def make_link_indices(seed, nclouds_reference=12, nclouds_new=10, nmaxlinks=4, fillval=-9999):
+    rng = np.random.default_rng(seed)
+    refcloud_forward_index = np.full((1, nclouds_reference + 1, nmaxlinks), fillval)
+    newcloud_backward_index = np.full((1, nclouds_new + 1, nmaxlinks), fillval)
+    for index, nclouds, nlinked in [
+        (refcloud_forward_index, nclouds_reference, nclouds_new),
+        (newcloud_backward_index, nclouds_new, nclouds_reference),
+    ]:
+        for icloud in range(nclouds):
+            nlinks = rng.choice(3, p=[0.4, 0.45, 0.15])
+            index[0, icloud, :nlinks] = np.sort(rng.choice(np.arange(1, nlinked + 1), nlinks, replace=False))
+    return refcloud_forward_index, newcloud_backward_index, nclouds_reference, nclouds_new
+
+# Test get_associated_clouds against the previous search for each reference cloud
+def test_get_associated_clouds():
+    nclusters = 0
+    for seed in range(200):
+        refcloud_forward_index, newcloud_backward_index, nclouds_reference, nclouds_new = make_link_indices(seed)
+        link_graph = get_link_graph(refcloud_forward_index, newcloud_backward_index, nclouds_reference, nclouds_new)
+        for ncr in range(1, nclouds_reference + 1):
+            expected = get_associated_clouds_reference(ncr, refcloud_forward_index, newcloud_backward_index)
+            result = get_associated_clouds(ncr, link_graph)
+            nclusters += (len(expected[0]) > 1) & (len(expected[1]) > 1)
+            assert np.array_equal(result[0], expected[0]), f"Reference clouds should match (seed {seed}, cloud {ncr})"
+            assert np.array_equal(result[1], expected[1]), f"New clouds should match (seed {seed}, cloud {ncr})"
+    assert nclusters > 0, "Some clouds should merge and split"
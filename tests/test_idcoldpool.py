@@ -0,0 +1,49 @@
+import types
+import numpy as np
+from scipy import integrate
+from scipy.ndimage import gaussian_filter
+from pyflextrkr import idcoldpool
+from pyflextrkr.idcoldpool import calc_coldpool_intensity
+
+# Make a synthetic buoyancy field with surface cold pools of different depths
+def make_buoyancy(seed, nk=20, nj=40, ni=50):
+    rng = np.random.default_rng(seed)
+    buoy = ((gaussian_filter(rng.random((nk, nj, ni)), [2, 1, 1]) - 0.5) * 0.2).astype(np.float32)
+    # Irregularly spaced levels that vary slightly between columns
+    zlev = np.cumsum(rng.random(nk) * 100 + 20)
+    zz = (zlev[:, None, None] + rng.random((nk, nj, ni)) * 5).astype(np.float32)
+    return buoy, zz
+
+# Test the vectorized cold pool intensity against the column loop
+def test_calc_coldpool_intensity_vectorized():
+    for seed in range(5):
+        buoy, zz = make_buoyancy(seed)
+        for min_cp_depth in (0, 100):
+            expected = calc_coldpool_intensity(buoy, zz, min_cp_depth=min_cp_depth, method="loop")
+            result = calc_coldpool_intensity(buoy, zz, min_cp_depth=min_cp_depth)
+            assert np.count_nonzero(expected["cp_intensity"]) > 0, "Cold pools should be found"
+            for key in expected:
+                np.testing.assert_allclose(result[key], expected[key], rtol=1e-5, equal_nan=True, err_msg=key)
+
+
+def simpson_avg_reference(y, x):
+    """
+    scipy.integrate.simpson before scipy 1.11 (even='avg'), used as a reference.
+    """
+    if (len(y) % 2 == 1) | (len(y) < 4):
+        return integrate.simpson(y, x=x)
+    first = integrate.simpson(y[:-1], x=x[:-1]) + 0.5 * (x[-1] - x[-2]) * (y[-1] + y[-2])
+    last = 0.5 * (x[1] - x[0]) * (y[0] + y[1]) + integrate.simpson(y[1:], x=x[1:])
+    return 0.5 * (first + last)
+
+# Test the vectorized cold pool intensity against the column loop with scipy < 1.11
+def test_calc_coldpool_intensity_vectorized_simpson_avg(monkeypatch):
+    monkeypatch.setattr(idcoldpool, "SIMPSON_CARTWRIGHT", False)
+    monkeypatch.setattr(idcoldpool, "integrate", types.SimpleNamespace(simpson=simpson_avg_reference))
+    for seed in range(5):
+        for nk in (3, 4, 20):
+            buoy, zz = make_buoyancy(seed, nk=nk)
+            expected = calc_coldpool_intensity(buoy, zz, method="loop")
+            result = calc_coldpool_intensity(buoy, zz)
+            for key in expected:
+                np.testing.assert_allclose(result[key], expected[key], rtol=1e-5, equal_nan=True, err_msg=key)
@@ -0,0 +1,111 @@
+import numpy as np
+import xarray as xr
+from scipy.ndimage import label, gaussian_filter
+from pyflextrkr.mapfeature_func import map_feature
+
+
+def map_feature_reference(
+    feature_number,
+    file_trackindex,
+    file_cloudnumber,
+    file_trackstatus,
+    file_mergetracknumber,
+    file_splittracknumber,
+    file_mergecloudnumber,
+    file_splitcloudnumber,
+    fillval,
+):
+    """
+    Previous loop implementation of the track number maps in map_feature, used as a reference.
+    """
+    ny, nx = feature_number.shape
+    statusmap = np.full((1, ny, nx), fillval, dtype=int)
+    trackmap = np.zeros((1, ny, nx), dtype=int)
+    allmergemap = np.zeros((1, ny, nx), dtype=int)
+    allsplitmap = np.zeros((1, ny, nx), dtype=int)
+    trackmap_include_ms = np.zeros((1, ny, nx), dtype=int)
+    trackmap_merge = np.zeros((1, ny, nx), dtype=int)
+    trackmap_split = np.zeros((1, ny, nx), dtype=int)
+
+    for jj in range(0, len(file_cloudnumber)):
+        jjcloudnumber = file_cloudnumber[jj]
+        cmask = feature_number == jjcloudnumber
+        if np.count_nonzero(cmask) > 0:
+            trackmap[0, cmask] = file_trackindex[jj] + 1
+            trackmap_include_ms[0, cmask] = file_trackindex[jj] + 1
+            statusmap[0, cmask] = file_trackstatus[jj]
+
+        for isplit in np.where(file_splitcloudnumber[jj, :] > 0)[0]:
+            s_cmask = feature_number == file_splitcloudnumber[jj, isplit]
+            if np.count_nonzero(s_cmask) > 0:
+                trackmap_include_ms[0, s_cmask] = file_trackindex[jj] + 1
+                trackmap_split[0, s_cmask] = file_trackindex[jj] + 1
+
+        for imerge in np.where(file_mergecloudnumber[jj, :] > 0)[0]:
+            m_cmask = feature_number == file_mergecloudnumber[jj, imerge]
+            if np.count_nonzero(m_cmask) > 0:
+                trackmap_include_ms[0, m_cmask] = file_trackindex[jj] + 1
+                trackmap_merge[0, m_cmask] = file_trackindex[jj] + 1
+
+        if file_splittracknumber[jj] > 0:
+            allsplitmap[0, feature_number == jjcloudnumber] = file_splittracknumber[jj]
+        if file_mergetracknumber[jj] > 0:
+            allmergemap[0, feature_number == jjcloudnumber] = file_mergetracknumber[jj]
+
+    return {
+        "tracknumber": trackmap,
+        "merge_tracknumber": allmergemap,
+        "split_tracknumber": allsplitmap,
+        "track_status": statusmap,
+        "cloudtracknumber": trackmap_include_ms,
+        "cloudmerge_tracknumber": trackmap_merge,
+        "cloudsplit_tracknumber": trackmap_split,
+    }
+
+# Make a synthetic feature number field and matched track stats, with features repeated in several tracks,
+# merging/splitting clouds that are also tracked, and feature numbers without pixels
+def make_mapfeature_inputs(seed, ny=30, nx=40, nmatch=12, nmerge=3):
+    rng = np.random.default_rng(seed)
+    feature_number, nfeatures = label(gaussian_filter(rng.random((ny, nx)), 1.5) > 0.5)
+    feature_number[rng.random((ny, nx)) < 0.02] = -1
+    file_cloudnumber = rng.integers(1, nfeatures + 3, size=nmatch)
+    file_trackindex = rng.integers(0, 50, size=nmatch)
+    file_trackstatus = rng.integers(0, 40, size=nmatch)
+    file_mergetracknumber = np.where(rng.random(nmatch) < 0.4, rng.integers(1, 50, size=nmatch), -9999)
+    file_splittracknumber = np.where(rng.random(nmatch) < 0.4, rng.integers(1, 50, size=nmatch), -9999)
+    file_mergecloudnumber = np.where(
+        rng.random((nmatch, nmerge)) < 0.3, rng.integers(1, nfeatures + 3, size=(nmatch, nmerge)), -9999
+    )
+    file_splitcloudnumber = np.where(
+        rng.random((nmatch, nmerge)) < 0.3, rng.integers(1, nfeatures + 3, size=(nmatch, nmerge)), -9999
+    )
+    return feature_number, (
+        file_trackindex,
+        file_cloudnumber,
+        file_trackstatus,
+        file_mergetracknumber,
+        file_splittracknumber,
+        file_mergecloudnumber,
+        file_splitcloudnumber,
+    )
+
+# Test the track number maps written by map_feature against the previous loop implementation
+def test_map_feature(tmp_path):
+    config = {"feature_varname": "feature_number", "feature_type": "generic", "fillval": -9999}
+    for seed in range(10):
+        feature_number, file_stats = make_mapfeature_inputs(seed)
+        ny, nx = feature_number.shape
+        cloudid_filename = f"{tmp_path}/cloudid_{seed}.nc"
+        xr.Dataset(
+            {"feature_number": (["time", "lat", "lon"], feature_number[None, :, :])},
+            coords={"time": [3600. * seed], "lat": np.arange(ny), "lon": np.arange(nx)},
+        ).to_netcdf(cloudid_filename)
+
+        expected = map_feature_reference(feature_number, *file_stats, config["fillval"])
+        tracksmap_outfile = map_feature(
+            cloudid_filename, 3600 * seed, *file_stats, "", config, f"{tmp_path}/", "tracks_",
+        )
+        with xr.open_dataset(tracksmap_outfile, mask_and_scale=False) as ds:
+            for var, expected_map in expected.items():
+                assert np.array_equal(ds[var].values, expected_map), f"{var} should match (seed {seed})"
+        assert np.count_nonzero(expected["cloudmerge_tracknumber"]) > 0, "Merging clouds should be mapped"